@@ -0,0 +1,4 @@
+"""
+DPR Analysis System - Benchmarks
+Run from the backend directory, e.g. `python -m benchmarks.bench_pdf_extraction`
+"""
@@ -0,0 +1,74 @@
+"""
+Benchmark: single-pass field scanner vs the previous per-call regex cascade
+Usage (from backend/): python -m benchmarks.bench_field_scanner
+
+Each input is doubled in size a few times. A linear-time extractor shows a
+time ratio of ~2x per doubling; the legacy cascade goes ~4x (quadratic) on the
+pathological inputs, so it is only run at small sizes there.
+"""
+
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_app
+from benchmarks.synthetic import sample_dpr_lines
+
+MB = 1024 * 1024
+
+
+def legacy_scan(text: str):
+    """The previous extraction: every pattern rebuilt and searched over the whole text"""
+    for keyword in ["Project Title", "Title", "Project Name", "Location", "Project Location", "Site",
+                    "Implementing Agency", "Nodal Agency"]:
+        re.search(rf'{keyword}\s*[:\-]?\s*(.+?)(?:\n\n|\r\n\r\n|(?:\n(?=[A-Z])|$))', text, re.IGNORECASE | re.DOTALL)
+    for pattern, _ in simple_app.BUDGET_PATTERNS:
+        if re.search(pattern, text, re.IGNORECASE):
+            break
+    re.search(simple_app.DURATION_PATTERN, text, re.IGNORECASE)
+
+
+def realistic(size: int) -> str:
+    block = "\n".join(sample_dpr_lines()) + "\n"
+    return (block * (size // len(block) + 1))[:size]
+
+
+INPUTS = {
+    # name: (builder, sizes for the scanner, sizes for the legacy cascade)
+    "realistic_dpr": (realistic, [1 * MB, 2 * MB, 4 * MB], [1 * MB, 2 * MB, 4 * MB]),
+    "digit_run": (lambda n: "9" * n, [1 * MB, 2 * MB, 4 * MB], [4096, 8192, 16384]),
+    "whitespace_after_keyword": (lambda n: "Cost" + " " * n + "x", [1 * MB, 2 * MB, 4 * MB], [4096, 8192, 16384]),
+    "keyword_flood": (lambda n: ("Total Cost Rs " * (n // 14 + 1))[:n], [1 * MB, 2 * MB, 4 * MB], [1 * MB, 2 * MB, 4 * MB]),
+}
+
+
+def timed(func, text: str) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(text)
+    return time.perf_counter() - start
+
+
+def report(label: str, func, builder, sizes):
+    previous = None
+    for size in sizes:
+        elapsed = timed(func, builder(size))
+        ratio = f"{elapsed / previous:5.2f}x" if previous else "    -"
+        print(f"  {label:<8} {size:>10,} chars {elapsed:9.4f}s  growth {ratio}")
+        previous = elapsed
+
+
+def main():
+    for name, (builder, scanner_sizes, legacy_sizes) in INPUTS.items():
+        print(name)
+        report("scanner", simple_app.scan_dpr_fields, builder, scanner_sizes)
+        report("legacy", legacy_scan, builder, legacy_sizes)
+
+
+if __name__ == "__main__":
+    main()
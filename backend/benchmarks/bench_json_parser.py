@@ -0,0 +1,127 @@
+"""
+Benchmark: tolerant single-pass JSON parser vs the previous repair chain
+Usage (from backend/): python -m benchmarks.bench_json_parser [fuzz_cases]
+
+For every corpus case (and a few thousand random corruptions of a full
+analysis response) reports whether each parser recovers a usable object
+without the model-repair round-trip, how many top-level keys it keeps, and
+how long it takes. The fuzz run also checks the tolerant parser never raises.
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_app
+from benchmarks.json_corpus import base_response_text, handwritten_cases, mutate
+
+
+def legacy_parse(text: str):
+    """The previous stages 3-6 (brace slice, trailing commas, truncation, brace balance); None means model repair"""
+    def attempt_load(candidate: str):
+        try:
+            return json.loads(candidate), None
+        except Exception as e:
+            return None, e
+
+    parsed, err = attempt_load(text)
+    if parsed is not None:
+        return parsed
+    brace_start, brace_end = text.find('{'), text.rfind('}')
+    candidate = text[brace_start:brace_end + 1].strip() if -1 < brace_start < brace_end else text
+    candidate = re.sub(r',\s*(?=[}\]])', '', candidate)
+    parsed, err2 = attempt_load(candidate)
+    if parsed is not None:
+        return parsed
+    working = candidate
+    if 'Unterminated string' in str(err2) or 'Expecting' in str(err2):
+        if hasattr(err2, 'pos'):
+            working = working[:err2.pos]
+            last_quote = working.rfind('"')
+            if last_quote > 0:
+                cutoff = max(working[:last_quote].rfind(','), working[:last_quote].rfind('{'), working[:last_quote].rfind('['))
+                if cutoff > 0:
+                    working = working[:cutoff]
+    if working.count('}') < working.count('{'):
+        working += '\n' + '}' * (working.count('{') - working.count('}'))
+    if working.count(']') < working.count('['):
+        working += ']' * (working.count('[') - working.count(']'))
+    parsed, _ = attempt_load(working)
+    return parsed
+
+
+def tolerant_parse(text: str):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return simple_app.parse_json_tolerant(text)[0]
+
+
+def usable(value) -> bool:
+    return isinstance(value, dict) and bool(value)
+
+
+def timed(func, text: str, repeat: int = 5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return value, best
+
+
+def corpus_report():
+    print(f"{'case':<22} {'chars':>7}  {'legacy keys':>11} {'ms':>7}  {'tolerant keys':>13} {'ms':>7}")
+    for name, text in handwritten_cases():
+        legacy, legacy_time = timed(legacy_parse, text)
+        tolerant, tolerant_time = timed(tolerant_parse, text)
+        legacy_keys = len(legacy) if usable(legacy) else "repair"
+        tolerant_keys = len(tolerant) if usable(tolerant) else "repair"
+        print(f"{name:<22} {len(text):>7}  {legacy_keys:>11} {legacy_time * 1000:7.2f}  {tolerant_keys:>13} {tolerant_time * 1000:7.2f}")
+
+
+def size_report():
+    print("\nTruncated responses by size (60% of the text kept)")
+    for repeat in (1, 4, 16):
+        text = base_response_text(repeat)
+        text = text[:int(len(text) * 0.6)]
+        _, legacy_time = timed(legacy_parse, text)
+        _, tolerant_time = timed(tolerant_parse, text)
+        print(f"  {len(text):>8,} chars  legacy {legacy_time * 1000:8.2f} ms  tolerant {tolerant_time * 1000:8.2f} ms")
+
+
+def fuzz_report(cases: int, seed: int = 1234):
+    rng = random.Random(seed)
+    base = base_response_text()
+    needs_repair = {"legacy": 0, "tolerant": 0}
+    for _ in range(cases):
+        text = mutate(base, rng)
+        if not usable(legacy_parse(text)):
+            needs_repair["legacy"] += 1
+        try:
+            value = tolerant_parse(text)
+        except Exception as e:
+            print(f"  tolerant parser raised {type(e).__name__}: {e} on {text[:80]!r}")
+            raise
+        if not usable(value):
+            needs_repair["tolerant"] += 1
+    print(f"\nFuzz: {cases} corrupted responses, model repair needed by "
+          f"legacy {needs_repair['legacy']} ({needs_repair['legacy'] / cases:.1%}), "
+          f"tolerant {needs_repair['tolerant']} ({needs_repair['tolerant'] / cases:.1%})")
+
+
+def main():
+    fuzz_cases = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    corpus_report()
+    size_report()
+    fuzz_report(fuzz_cases)
+
+
+if __name__ == "__main__":
+    main()
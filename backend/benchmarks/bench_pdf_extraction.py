@@ -0,0 +1,48 @@
+"""
+Benchmark: sequential vs process-pool PDF text extraction
+Usage (from backend/): python -m benchmarks.bench_pdf_extraction [page counts...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_app
+from benchmarks.synthetic import synthetic_pages, write_text_pdf
+
+DEFAULT_PAGE_COUNTS = [10, 50, 100, 300]
+
+
+def time_call(func, *args, repeat: int = 3) -> float:
+    """Best wall-clock time of `repeat` runs, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(page_counts):
+    print(f"Extraction workers: {simple_app.PDF_EXTRACT_WORKERS}")
+    print(f"{'pages':>6} {'sequential_s':>13} {'parallel_s':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Warm the pool so process start-up is not charged to the first row
+        warmup = os.path.join(tmp, "warmup.pdf")
+        write_text_pdf(warmup, synthetic_pages(simple_app.PDF_PARALLEL_MIN_PAGES))
+        simple_app.extract_pdf_pages(warmup)
+
+        for page_count in page_counts:
+            path = os.path.join(tmp, f"dpr_{page_count}.pdf")
+            write_text_pdf(path, synthetic_pages(page_count))
+            sequential = time_call(simple_app.extract_pdf_pages, path, False)
+            parallel = time_call(simple_app.extract_pdf_pages, path, True)
+            assert simple_app.extract_pdf_pages(path, False) == simple_app.extract_pdf_pages(path, True)
+            print(f"{page_count:>6} {sequential:>13.3f} {parallel:>11.3f} {sequential / parallel:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_PAGE_COUNTS)
@@ -0,0 +1,144 @@
+"""
+Benchmark: whole upload pipeline replayed against recorded model calls
+Usage (from backend/):
+    python -m benchmarks.bench_pipeline record CASSETTE [files...]
+    python -m benchmarks.bench_pipeline replay CASSETTE [files...] [--speed 1] [--repeat 3] [--json out.json]
+
+`record` uploads every file through /api/upload-dpr with the configured model
+backend (DPR_LLM_BACKEND) and stores each call on the cassette; `replay`
+serves the same responses with their recorded latency (scaled by --speed,
+0 = no model latency at all), so two runs differ only by the code under test.
+Files default to the PDF/DOCX uploads in uploads/, or DOCX versions of the
+sample DPRs when there are none. Caches are disabled and the run happens in a
+scratch directory (guidelines are linked in), so every upload does the full
+extraction, parsing and report work. Reports wall time and per-stage totals.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.synthetic import SAMPLE_DPR_DIR
+from benchmarks.workspace import scratch_workspace
+
+
+def default_corpus(scratch: str) -> list:
+    """Real uploads if there are any, otherwise the sample DPRs as DOCX"""
+    uploads = os.path.join(BACKEND_DIR, "uploads")
+    if os.path.isdir(uploads):
+        files = sorted(
+            os.path.join(uploads, name) for name in os.listdir(uploads)
+            if name.lower().endswith((".pdf", ".docx")) and not name.startswith("temp_")
+        )
+        if files:
+            return files
+    import docx
+    files = []
+    for name in sorted(os.listdir(SAMPLE_DPR_DIR)):
+        if name.endswith(".txt"):
+            document = docx.Document()
+            with open(os.path.join(SAMPLE_DPR_DIR, name), "r", encoding="utf-8") as f:
+                for line in f:
+                    document.add_paragraph(line.rstrip("\n"))
+            path = os.path.join(scratch, name.replace(".txt", ".docx"))
+            document.save(path)
+            files.append(path)
+    return files
+
+
+def stage_deltas(before: dict, after: dict) -> dict:
+    """Seconds spent per stage between two stage_timing_snapshot() calls"""
+    return {
+        stage: seconds - before.get(stage, (0, 0.0))[1]
+        for stage, (count, seconds) in after.items()
+        if count > before.get(stage, (0, 0.0))[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("cassette")
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay latency multiplier (0 = instant)")
+    parser.add_argument("--repeat", type=int, default=1, help="uploads per file (the median is reported)")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    cassette = os.path.abspath(args.cassette)
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    if args.mode == "record" and os.path.exists(cassette):
+        os.remove(cassette)
+    os.environ.update({
+        "DPR_LLM_CASSETTE": cassette,
+        "DPR_LLM_CASSETTE_MODE": args.mode,
+        "DPR_LLM_CASSETTE_SPEED": str(args.speed),
+        "DPR_ANALYSIS_CACHE_MAX_ENTRIES": "0",
+    })
+
+    files = [os.path.abspath(path) for path in args.files]
+    results = []
+    with scratch_workspace() as scratch:
+        files = files or default_corpus(scratch)
+
+        import simple_app
+        from fastapi.testclient import TestClient
+
+        simple_app.get_guideline_index()  # Build the guideline index before timing anything
+        with TestClient(simple_app.app) as client:
+            for path in files:
+                runs = []
+                for _ in range(max(1, args.repeat)):
+                    shutil.rmtree(simple_app.EXTRACTION_STORE_DIR, ignore_errors=True)
+                    before = simple_app.stage_timing_snapshot()
+                    started = time.perf_counter()
+                    with open(path, "rb") as f:
+                        response = client.post(
+                            "/api/upload-dpr",
+                            files={"file": (os.path.basename(path), f)},
+                            data={"language": args.language},
+                        )
+                    wall = time.perf_counter() - started
+                    if response.status_code != 200:
+                        print(f"{os.path.basename(path)}: HTTP {response.status_code} {response.text[:200]}")
+                        break
+                    runs.append((wall, stage_deltas(before, simple_app.stage_timing_snapshot())))
+                if runs:
+                    stages = sorted({stage for _, deltas in runs for stage in deltas})
+                    results.append({
+                        "file": os.path.basename(path),
+                        "bytes": os.path.getsize(path),
+                        "wall_seconds": statistics.median(wall for wall, _ in runs),
+                        "stages": {stage: statistics.median(deltas.get(stage, 0.0) for _, deltas in runs) for stage in stages},
+                    })
+
+    print(f"\n{args.mode} {cassette} (speed {args.speed}, repeat {args.repeat})")
+    print(f"{'file':<40} {'bytes':>10} {'wall_s':>8}")
+    for result in results:
+        print(f"{result['file'][:40]:<40} {result['bytes']:>10,} {result['wall_seconds']:>8.3f}")
+    if results:
+        total_wall = sum(result["wall_seconds"] for result in results)
+        stages = sorted({stage for result in results for stage in result["stages"]})
+        print(f"\n{'stage':<40} {'total_s':>10} {'per_upload_s':>13} {'of_wall':>8}")
+        for stage in sorted(stages, key=lambda s: -sum(r["stages"].get(s, 0.0) for r in results)):
+            seconds = sum(result["stages"].get(stage, 0.0) for result in results)
+            print(f"{stage:<40} {seconds:>10.3f} {seconds / len(results):>13.3f} {seconds / total_wall:>8.1%}")
+        print(f"{'wall clock':<40} {total_wall:>10.3f} {total_wall / len(results):>13.3f}")
+        print("Stages overlap (chunk calls run in parallel, extraction overlaps analysis), so shares can exceed 100%.")
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"mode": args.mode, "cassette": cassette, "speed": args.speed, "repeat": args.repeat,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
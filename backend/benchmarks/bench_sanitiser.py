@@ -0,0 +1,72 @@
+"""
+Benchmark: model-output sanitiser vs the previous printable filter
+Usage (from backend/): python -m benchmarks.bench_sanitiser
+
+Builds translated-report style JSON responses in English, Hindi, Bengali and
+Assamese at several sizes, sprinkled with the control characters models emit,
+and reports time per call plus how many non-control characters each
+sanitiser keeps.
+"""
+
+import json
+import os
+import re
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simple_app
+from benchmarks.json_corpus import analysis_response
+
+KB = 1024
+
+BENGALI = "প্রকল্পের বাজেট বিশ্লেষণ এবং ঝুঁকি মূল্যায়ন সম্পূর্ণ হয়েছে। পরিবেশগত ছাড়পত্র এখনও বাকি আছে।"
+ASSAMESE = "প্ৰকল্পৰ বাজেট বিশ্লেষণ আৰু বিপদ মূল্যায়ন সম্পূৰ্ণ হৈছে। পৰিৱেশ অনুমতি এতিয়াও বাকী আছে।"
+CONTROL_NOISE = "\x00\x08\x0b\x1b\x7f\x85﻿"
+
+
+def legacy_sanitise(text: str) -> str:
+    """The previous step 2: per-character membership test against string.printable, then a regex"""
+    printable_chars = string.printable
+    cleaned = ''.join(char for char in text if char in printable_chars or char in '\n\r\t ')
+    return re.sub(r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]', '', cleaned)
+
+
+def response(language: str, size: int) -> str:
+    if language == "english":
+        block = json.dumps(analysis_response(), indent=2, ensure_ascii=False)
+    elif language == "hindi":
+        block = json.dumps(analysis_response(filename="Sample_Road_DPR_Hindi.txt"), indent=2, ensure_ascii=False)
+    else:
+        sentence = BENGALI if language == "bengali" else ASSAMESE
+        block = json.dumps({"summary": sentence * 10, "actionable_insights": [sentence] * 10}, indent=2, ensure_ascii=False)
+    block += CONTROL_NOISE
+    return (block * (size // len(block) + 1))[:size]
+
+
+def timed(func, text: str, repeat: int = 5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    print(f"{'language':<9} {'chars':>9}  {'legacy ms':>10} {'kept':>7}  {'new ms':>9} {'kept':>7}")
+    for language in ("english", "hindi", "bengali", "assamese"):
+        for size in (30 * KB, 256 * KB, 1024 * KB):
+            text = response(language, size)
+            expected = len(text) - sum(text.count(c) for c in CONTROL_NOISE)
+            legacy, legacy_time = timed(legacy_sanitise, text)
+            current, new_time = timed(simple_app.sanitize_model_output, text)
+            print(f"{language:<9} {len(text):>9,}  {legacy_time * 1000:10.2f} {len(legacy) / expected:7.1%}"
+                  f"  {new_time * 1000:9.2f} {len(current) / expected:7.1%}")
+
+
+if __name__ == "__main__":
+    main()
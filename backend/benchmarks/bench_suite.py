@@ -0,0 +1,274 @@
+"""
+Benchmark: end-to-end DPR suite on a synthetic corpus, saved for regression comparison
+Usage (from backend/):
+    python -m benchmarks.bench_suite [--pages 10 100 500] [--languages en hi] [--repeat 3]
+                                     [--model-latency 0] [--json out.json] [--compare baseline.json]
+
+Generates synthetic DPRs (benchmarks.synthetic) and times the hot functions
+on them: extract_text (store miss and hit), structure_dpr_data,
+parse_json_response, generate_structured_json_sections, save_analysis_to_json
+and load_documents at several store sizes, plus whole /api/upload-dpr requests
+against the offline fake model (DPR_LLM_BACKEND=fake, --model-latency seconds
+per call). Caches are disabled and everything runs in a scratch directory.
+
+Every result has a name, its parameters and best/median/p95 seconds; --json
+writes them with the machine and commit they came from, and --compare prints
+the median ratio against an earlier run and exits non-zero when any benchmark
+is slower than --threshold (and --min-delta-ms) allows.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.json_corpus import analysis_response, base_response_text
+from benchmarks.synthetic import write_synthetic_dpr
+from benchmarks.workspace import BACKEND_DIR, scratch_workspace
+
+EXTRACTABLE_FORMATS = ("pdf", "docx")  # extract_text does not take .txt; TXT files are generated but not timed
+
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """Time `func` `repeat` times (after an untimed `setup` each run)"""
+    samples = []
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "best_s": samples[0],
+        "median_s": statistics.median(samples),
+        "p95_s": samples[min(len(samples) - 1, math.ceil(0.95 * len(samples)) - 1)],
+    }
+
+
+class Suite:
+    def __init__(self, args, app, out):
+        self.args = args
+        self.app = app
+        self.out = out  # The app's own logging goes to /dev/null while the suite runs
+        self.results = []
+
+    def record(self, benchmark: str, params: dict, timing: dict):
+        self.results.append({"benchmark": benchmark, "params": params, **timing})
+        label = " ".join(f"{key}={value}" for key, value in params.items())
+        print(f"{benchmark:<34} {label:<50} {timing['median_s'] * 1000:>10.2f} {timing['p95_s'] * 1000:>10.2f}",
+              file=self.out, flush=True)
+
+    def clear_extraction_store(self):
+        shutil.rmtree(self.app.EXTRACTION_STORE_DIR, ignore_errors=True)
+
+    def corpus(self) -> list:
+        """(path, params) for every generated document, written once per run"""
+        os.makedirs("corpus", exist_ok=True)
+        documents = []
+        for language in self.args.languages:
+            for file_format in self.args.formats:
+                for page_count in self.args.pages:
+                    path = write_synthetic_dpr("corpus", file_format, page_count, language)
+                    documents.append((path, {"format": file_format, "language": language, "pages": page_count}))
+        return documents
+
+    def document_benchmarks(self, documents: list):
+        app, repeat = self.app, self.args.repeat
+        for path, params in documents:
+            file_format = params["format"]
+            if file_format not in EXTRACTABLE_FORMATS:
+                continue
+            self.record("extract_text.cold", params,
+                        measure(lambda: app.extract_text(path, file_format), repeat, setup=self.clear_extraction_store))
+            self.record("extract_text.store_hit", params, measure(lambda: app.extract_text(path, file_format), repeat))
+            text = app.extract_text(path, file_format)
+            self.record("structure_dpr_data", params, measure(lambda: app.structure_dpr_data(text), repeat))
+
+    def parser_benchmarks(self):
+        repeat = self.args.repeat * 5
+        for size in (1, 4, 16):
+            full = base_response_text(size)
+            cases = {
+                "clean": full,
+                "fenced": "Here is the analysis:\n```json\n" + full + "\n```",
+                "truncated": full[:int(len(full) * 0.6)],
+            }
+            for shape, text in cases.items():
+                self.record("parse_json_response", {"shape": shape, "chars": len(text)},
+                            measure(lambda: self.app.parse_json_response(text), repeat))
+
+    def report_benchmarks(self):
+        app, repeat = self.app, self.args.repeat * 5
+        for size in (1, 4):
+            analysis = analysis_response(size)
+            insights = analysis["actionable_insights"]
+            risks = dict(analysis["risk_assessment"], resource_risks=[])
+            structured = app.structure_dpr_data("\n".join(analysis["key_highlights"]))
+            self.record("generate_structured_json_sections", {"scale": size},
+                        measure(lambda: app.generate_structured_json_sections(analysis, insights, risks, structured), repeat))
+            result = {"dpr_id": "bench", "filename": "bench.pdf", "analysis": analysis,
+                      "actionable_insights": insights, "risk_assessment": risks, "extracted_data": structured}
+            sections = app.generate_structured_json_sections(analysis, insights, risks, structured)
+            self.record("save_analysis_to_json", {"scale": size},
+                        measure(lambda: app.save_analysis_to_json(dict(result), "bench.pdf", structured_sections=sections), repeat))
+
+    def document_store_benchmarks(self):
+        app, repeat = self.app, self.args.repeat * 5
+        conn = app.get_documents_db()
+        seeded = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        for total in sorted(self.args.documents):
+            conn.execute("BEGIN")
+            for number in range(seeded, total):
+                app.insert_document({
+                    "id": f"bench_{number}",
+                    "title": f"Synthetic DPR {number}",
+                    "status": ("pending", "approved", "rejected")[number % 3],
+                    "uploadedBy": {"email": f"officer{number % 20}@example.gov.in", "name": f"Officer {number % 20}"},
+                    "uploadDate": f"2025-{number % 12 + 1:02d}-{number % 28 + 1:02d}",
+                })
+            conn.execute("COMMIT")
+            seeded = total
+            self.record("load_documents", {"documents": total, "filter": "none"},
+                        measure(lambda: app.load_documents(), repeat))
+            self.record("load_documents", {"documents": total, "filter": "email"},
+                        measure(lambda: app.load_documents(user_email="officer3@example.gov.in"), repeat))
+            self.record("load_documents", {"documents": total, "filter": "status"},
+                        measure(lambda: app.load_documents(status="pending"), repeat))
+
+    def request_benchmarks(self, documents: list):
+        from fastapi.testclient import TestClient
+
+        with TestClient(self.app.app) as client:
+            for path, params in documents:
+                if params["format"] not in EXTRACTABLE_FORMATS:
+                    continue
+                failures = []
+
+                def upload():
+                    with open(path, "rb") as f:
+                        response = client.post("/api/upload-dpr", files={"file": (os.path.basename(path), f)},
+                                               data={"language": "en"})
+                    if response.status_code != 200:
+                        failures.append(f"HTTP {response.status_code} {response.text[:200]}")
+
+                timing = measure(upload, self.args.requests, setup=self.clear_extraction_store)
+                if failures:
+                    print(f"upload_dpr {os.path.basename(path)}: {failures[0]}", file=self.out)
+                    continue
+                self.record("upload_dpr", dict(params, model_latency=self.args.model_latency), timing)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def result_key(result: dict) -> str:
+    return result["benchmark"] + " " + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results: list, baseline_path: str, threshold: float, min_delta: float) -> int:
+    """Print median ratios against a saved run; returns how many benchmarks regressed
+
+    A slowdown only counts when it is over `threshold` and over `min_delta`
+    seconds, so sub-millisecond benchmarks do not flag on timer noise.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {result_key(result): result for result in json.load(f)["results"]}
+    regressions = 0
+    print(f"\nAgainst {baseline_path} (median, regression over {threshold:.0%})")
+    for result in results:
+        previous = baseline.get(result_key(result))
+        if previous is None or previous["median_s"] <= 0:
+            continue
+        ratio = result["median_s"] / previous["median_s"]
+        flag = ""
+        if ratio > 1 + threshold and result["median_s"] - previous["median_s"] > min_delta:
+            regressions += 1
+            flag = "  REGRESSION"
+        label = " ".join(f"{key}={value}" for key, value in result["params"].items())
+        print(f"{result['benchmark']:<34} {label:<50} {previous['median_s'] * 1000:>10.2f} "
+              f"{result['median_s'] * 1000:>10.2f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--languages", nargs="+", choices=("en", "hi"), default=["en", "hi"])
+    parser.add_argument("--formats", nargs="+", choices=("pdf", "docx", "txt"), default=["pdf", "docx", "txt"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per document benchmark (5x for the small ones)")
+    parser.add_argument("--requests", type=int, default=3, help="uploads per document for upload_dpr")
+    parser.add_argument("--documents", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--model-latency", type=float, default=0.0, help="fake model seconds per call")
+    parser.add_argument("--skip-requests", action="store_true", help="only run the micro-benchmarks")
+    parser.add_argument("--json", dest="json_path", help="write the results to this file")
+    parser.add_argument("--compare", help="results JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="median slowdown that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    os.environ.pop("DPR_LLM_CASSETTE", None)
+    os.environ.update({
+        "DPR_LLM_BACKEND": "fake",
+        "DPR_FAKE_LLM_LATENCY": str(args.model_latency),
+        "DPR_FAKE_LLM_JITTER": "0",
+        "DPR_FAKE_LLM_TOKENS_PER_SECOND": "0",
+        "DPR_FAKE_LLM_ERROR_RATE": "0",
+        "DPR_FAKE_LLM_MALFORMED_RATE": "0",
+        "DPR_ANALYSIS_CACHE_MAX_ENTRIES": "0",
+    })
+
+    print(f"{'benchmark':<34} {'params':<50} {'median_ms':>10} {'p95_ms':>10}")
+    with scratch_workspace(), open(os.devnull, "w") as devnull:
+        out = sys.stdout
+        with contextlib.redirect_stdout(devnull):
+            import simple_app
+            simple_app.get_guideline_index()  # Build the guideline index before timing anything
+            suite = Suite(args, simple_app, out)
+            documents = suite.corpus()
+            suite.document_benchmarks(documents)
+            suite.parser_benchmarks()
+            suite.report_benchmarks()
+            suite.document_store_benchmarks()
+            if not args.skip_requests:
+                suite.request_benchmarks(documents)
+
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": suite.results,
+    }
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"\nResults written to {json_path}")
+    if baseline_path and compare(suite.results, baseline_path, args.threshold, args.min_delta_ms / 1000):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Corpus of malformed model responses for the JSON parser benchmarks
+Hand-written cases reproduce the failure shapes seen from Gemini (fences and
+prose around the JSON, output cut off at max_output_tokens, unescaped quotes,
+raw newlines, Python literals, missing or extra commas); `mutate` derives
+random fuzz cases from a full-size analysis response.
+"""
+
+import json
+import random
+from typing import Dict, List, Tuple
+
+from benchmarks.synthetic import sample_dpr_lines
+
+
+def analysis_response(repeat: int = 1, filename: str = "Sample_Bridge_DPR.txt") -> Dict:
+    """A comprehensive-analysis shaped response; `repeat` scales the text fields"""
+    lines = sample_dpr_lines(filename)
+
+    def text(start: int, count: int) -> str:
+        return " ".join(lines[(start + i) % len(lines)] for i in range(count * repeat))
+
+    return {
+        "overall_score": 72,
+        "summary": text(0, 6),
+        "completeness_analysis": {"score": 70, "comments": text(6, 5), "missing_sections": ["EIA", "R&R plan"]},
+        "budget_validation": {"is_valid": True, "comments": text(11, 5), "concerns": [text(16, 2), text(18, 2)]},
+        "timeline_validation": {"is_realistic": False, "comments": text(20, 4)},
+        "technical_feasibility": {"score": 68, "is_feasible": True, "comments": text(24, 5)},
+        "risk_assessment": {
+            "overall_risk_level": "medium",
+            "overall_risk_score": 45,
+            "financial_risks": [text(29, 2), text(31, 2)],
+            "timeline_risks": [text(33, 2)],
+            "environmental_risks": [text(35, 2)],
+        },
+        "actionable_insights": [f"PRIORITY {i + 1} - [BUDGET] {text(37 + i * 3, 3)}" for i in range(6)],
+        "recommendations": [text(55 + i * 2, 2) for i in range(5)],
+        "approval_recommendation": {"decision": "REVISE", "confidence": 78, "reasoning": text(65, 4)},
+        "key_highlights": [text(69 + i, 1) for i in range(5)],
+    }
+
+
+def base_response_text(repeat: int = 1, filename: str = "Sample_Bridge_DPR.txt") -> str:
+    return json.dumps(analysis_response(repeat, filename), indent=2, ensure_ascii=False)
+
+
+def handwritten_cases() -> List[Tuple[str, str]]:
+    """(name, response text) pairs; every one of them fails a plain json.loads"""
+    full = base_response_text()
+    hindi = base_response_text(filename="Sample_Road_DPR_Hindi.txt")
+    return [
+        ("prose_and_fence", "Here is the analysis you asked for:\n```json\n" + full + "\n```\nLet me know if you need more."),
+        ("trailing_commas", full.replace('"\n  }', '",\n  }').replace("]\n", "],\n")),
+        ("truncated_mid_string", full[:int(len(full) * 0.6)]),
+        ("truncated_mid_number", '{"summary": "Bridge DPR", "approval_recommendation": {"decision": "REVISE", "confidence": 7'),
+        ("truncated_hindi", hindi[:int(len(hindi) * 0.7)]),
+        ("unescaped_quotes", '{"summary": "The so called "Phase 1" works lack a DPR annex", "overall_score": 61,'
+                             ' "approval_recommendation": {"decision": "REVISE", "confidence": 60, "reasoning": "See "Annex B""}}'),
+        ("raw_newlines", '{"summary": "Line one\nline two\ttabbed", "overall_score": 70, "actionable_insights": ["a\nb"]}'),
+        ("python_literals", "{'overall_score': 55, 'budget_validation': {'is_valid': False, 'comments': None}, 'summary': 'ok'}"),
+        ("missing_commas", '{"overall_score": 64\n"summary": "Adequate"\n"actionable_insights": ["one" "two"]}'),
+        ("extra_closing", full + "\n}\n}"),
+        ("mismatched_close", '{"actionable_insights": ["a", "b"}, "overall_score": 50, "summary": "x"}'),
+        ("comments", '{\n  // score out of 100\n  "overall_score": 58, /* model note */ "summary": "x"\n}'),
+        ("unquoted_enum", '{"approval_recommendation": {"decision": REVISE, "confidence": 70}, "overall_score": 66}'),
+        ("invalid_escapes", '{"summary": "Cost \\Rs 120 Cr \\ (revised)", "overall_score": 71}'),
+        ("double_object", full + "\n" + full),
+    ]
+
+
+MUTATION_CHARS = ',"{}[]:\n\\\''
+
+
+def mutate(text: str, rng: random.Random) -> str:
+    """One random corruption of a valid response: truncate, delete, insert or duplicate"""
+    kind = rng.choice(("truncate", "delete", "insert", "duplicate", "truncate"))
+    position = rng.randrange(1, len(text))
+    if kind == "truncate":
+        return text[:position]
+    if kind == "delete":
+        return text[:position] + text[position + rng.randint(1, 20):]
+    if kind == "insert":
+        return text[:position] + rng.choice(MUTATION_CHARS) + text[position:]
+    end = min(len(text), position + rng.randint(1, 200))
+    return text[:end] + text[position:end] + text[end:]
@@ -0,0 +1,162 @@
+"""
+Synthetic DPR documents for benchmarks
+Builds multi-page documents from the sample DPRs in backend/sample_dprs, as
+PDF, DOCX or TXT, in English or Hindi.
+Usage (from backend/): python -m benchmarks.synthetic OUT_DIR [--pages 10 100 500] [--formats pdf docx txt] [--languages en hi]
+"""
+
+import argparse
+import os
+from typing import List
+
+SAMPLE_DPR_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_dprs")
+LINES_PER_PAGE = 55
+SAMPLE_FILES = {"en": "Sample_Bridge_DPR.txt", "hi": "Sample_Road_DPR_Hindi.txt"}
+FORMATS = ("pdf", "docx", "txt")
+
+
+def sample_dpr_lines(filename: str = "Sample_Bridge_DPR.txt") -> List[str]:
+    """Non-empty lines of a sample DPR"""
+    with open(os.path.join(SAMPLE_DPR_DIR, filename), "r", encoding="utf-8") as f:
+        return [line.rstrip() for line in f if line.strip()]
+
+
+def synthetic_pages(page_count: int, filename: str = "Sample_Bridge_DPR.txt") -> List[List[str]]:
+    """`page_count` pages of DPR-like text, cycling through a sample DPR"""
+    lines = sample_dpr_lines(filename)
+    pages = []
+    cursor = 0
+    for page_number in range(page_count):
+        page = [f"Page {page_number + 1}"]
+        for _ in range(LINES_PER_PAGE):
+            page.append(lines[cursor % len(lines)])
+            cursor += 1
+        pages.append(page)
+    return pages
+
+
+class _PdfTextEncoder:
+    """Single-byte codes for the text of a synthetic PDF.
+
+    Printable ASCII keeps its own code; every other character gets a free
+    code in 0x80-0xFF and the font carries a ToUnicode CMap for them, so
+    Hindi text extracts as Devanagari (it is not rendered with real glyphs).
+    """
+
+    def __init__(self):
+        self.codes = {}
+
+    def encode(self, line: str) -> bytes:
+        out = bytearray()
+        for char in line:
+            if " " <= char <= "~":
+                if char in "\\()":
+                    out += b"\\"
+                out += char.encode("ascii")
+                continue
+            code = self.codes.get(char)
+            if code is None and len(self.codes) < 128:
+                code = self.codes[char] = 0x80 + len(self.codes)
+            out += b"\\%03o" % code if code is not None else b"?"
+        return bytes(out)
+
+    def to_unicode_cmap(self) -> bytes:
+        entries = "\n".join(f"<{code:02X}> <{ord(char):04X}>" for char, code in self.codes.items() if ord(char) <= 0xFFFF)
+        return (
+            "/CIDInit /ProcSet findresource begin 12 dict begin begincmap\n"
+            "/CMapName /Synthetic-UCS def /CMapType 2 def\n"
+            "1 begincodespacerange <00> <FF> endcodespacerange\n"
+            f"{len(self.codes)} beginbfchar\n{entries}\nendbfchar\n"
+            "endcmap CMapName currentdict /CMap defineresource pop end end"
+        ).encode("ascii")
+
+
+def write_text_pdf(path: str, pages: List[List[str]]):
+    """Write a minimal text-only PDF (Helvetica, one text block per page)"""
+    encoder = _PdfTextEncoder()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages tree, filled in once the page object numbers are known
+        None,  # Font, filled in once the ToUnicode map is complete
+    ]
+    page_refs = []
+    for page in pages:
+        stream = b"BT /F1 9 Tf 40 800 Td 13 TL\n"
+        stream += b"\n".join(b"(%s) Tj T*" % encoder.encode(line) for line in page)
+        stream += b"\nET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    if encoder.codes:
+        cmap = encoder.to_unicode_cmap()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(cmap), cmap))
+        objects[2] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /ToUnicode %d 0 R >>" % len(objects)
+    else:
+        objects[2] = b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode("ascii")
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def write_docx(path: str, pages: List[List[str]]):
+    """Write a DOCX with one paragraph per line and a page break between pages"""
+    import docx
+    from docx.enum.text import WD_BREAK
+    document = docx.Document()
+    for number, page in enumerate(pages):
+        for line in page:
+            document.add_paragraph(line)
+        if number < len(pages) - 1:
+            document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+    document.save(path)
+
+
+def write_txt(path: str, pages: List[List[str]]):
+    """Write a UTF-8 text file with a form feed between pages"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\f".join("\n".join(page) for page in pages) + "\n")
+
+
+WRITERS = {"pdf": write_text_pdf, "docx": write_docx, "txt": write_txt}
+
+
+def write_synthetic_dpr(directory: str, file_format: str, page_count: int, language: str = "en") -> str:
+    """Write one synthetic DPR and return its path (dpr_<language>_<pages>p.<format>)"""
+    path = os.path.join(directory, f"dpr_{language}_{page_count}p.{file_format}")
+    WRITERS[file_format](path, synthetic_pages(page_count, SAMPLE_FILES[language]))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a corpus of synthetic DPRs")
+    parser.add_argument("out_dir")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 100, 500])
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--languages", nargs="+", choices=sorted(SAMPLE_FILES), default=sorted(SAMPLE_FILES))
+    args = parser.parse_args()
+    os.makedirs(args.out_dir, exist_ok=True)
+    for language in args.languages:
+        for file_format in args.formats:
+            for page_count in args.pages:
+                path = write_synthetic_dpr(args.out_dir, file_format, page_count, language)
+                print(f"{path}  {os.path.getsize(path):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
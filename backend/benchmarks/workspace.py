@@ -0,0 +1,30 @@
+"""
+Scratch working directory for benchmarks that import simple_app
+The app keeps its uploads, caches, results and document store under the
+current directory; benchmarks run in a throwaway directory instead (with the
+real guidelines linked in) so they neither read stale state nor leave any.
+"""
+
+import contextlib
+import os
+import shutil
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextlib.contextmanager
+def scratch_workspace(prefix: str = "dpr_bench_"):
+    """chdir into a fresh directory for the duration of the block, then delete it"""
+    scratch = tempfile.mkdtemp(prefix=prefix)
+    os.makedirs(os.path.join(scratch, "data"))
+    guidelines = os.path.join(BACKEND_DIR, "data", "guidelines")
+    if os.path.isdir(guidelines):
+        os.symlink(guidelines, os.path.join(scratch, "data", "guidelines"))
+    previous = os.getcwd()
+    os.chdir(scratch)
+    try:
+        yield scratch
+    finally:
+        os.chdir(previous)
+        shutil.rmtree(scratch, ignore_errors=True)
@@ -0,0 +1,53 @@
+"""
+PDF page extraction for the extraction process pool
+Kept apart from simple_app so pool workers import only the PDF libraries,
+not the web app, its thread pools or the LLM backend.
+"""
+
+import logging
+import warnings
+from typing import List
+
+logging.getLogger('pdfminer').setLevel(logging.ERROR)
+logging.getLogger('pdfplumber').setLevel(logging.ERROR)
+
+try:
+    import PyPDF2
+    import pdfplumber
+except ImportError:
+    print("[WARNING] Install: pip install PyPDF2 pdfplumber")
+
+
+def extract_pdf_page_range(file_path: str, start: int, end: int) -> List[tuple]:
+    """Extract pages [start, end) with pdfplumber, falling back to PyPDF2 page by page.
+
+    Returns (page_text, engine) pairs. Runs in the calling process for small
+    PDFs and inside extraction worker processes for large ones.
+    """
+    pages = []
+    fallback_reader = None
+
+    def fallback_page(index: int) -> tuple:
+        nonlocal fallback_reader
+        try:
+            if fallback_reader is None:
+                fallback_reader = PyPDF2.PdfReader(file_path)
+            return fallback_reader.pages[index].extract_text() or "", "pypdf2"
+        except Exception as fallback_error:
+            print(f"[ERROR] PDF extraction error on page {index + 1}: {fallback_error}")
+            return "", "failed"
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            pdf = pdfplumber.open(file_path)
+        except Exception:
+            # Document cannot be opened by pdfplumber at all - use PyPDF2 for every page
+            return [fallback_page(index) for index in range(start, end)]
+        with pdf:
+            for index in range(start, end):
+                try:
+                    pages.append((pdf.pages[index].extract_text() or "", "pdfplumber"))
+                except Exception:
+                    pages.append(fallback_page(index))
+    return pages
@@ -4,17 +4,32 @@ AI-Powered DPR Analysis using Google Gemini
 All-in-One: No external service files needed
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response, PlainTextResponse
 import os
-import shutil
 from datetime import datetime
 import json
 import re
 import warnings
 import logging
-from typing import Dict, List, Optional
+import asyncio
+import threading
+import sqlite3
+import hashlib
+import heapq
+import math
+import copy
+import uuid
+import time
+import functools
+import random
+import multiprocessing
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
 
 # Suppress all warnings for cleaner output
 warnings.filterwarnings('ignore')
@@ -40,10 +55,21 @@ try:
 except ImportError:
     print("[WARNING] Install: pip install python-docx")
 
+# PDF page extraction lives in its own module so extraction workers stay import-light
+from pdf_worker import extract_pdf_page_range
+
+# Budget analysis (optional - outlier and quantity x rate checks fall back to pure Python)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("[WARNING] Install: pip install numpy")
+
 # Gemini AI import
 try:
     import google.generativeai as genai
 except ImportError:
+    genai = None
     print("[WARNING] Install: pip install google-generativeai")
 
 # ============================================================================
@@ -58,929 +84,3759 @@ GEMINI_MODEL = "gemini-2.0-flash-exp"  # Fastest model available (Oct 2025)
 APP_HOST = "0.0.0.0"
 APP_PORT = 8000
 MAX_UPLOAD_SIZE_MB = 50
+MAX_UPLOAD_BYTES = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024  # Multipart framing and form fields allowed on top of the file
+UPLOAD_CHUNK_BYTES = 1024 * 1024        # Block size for streaming uploads to disk
+
+# LLM Client Configuration (overridable via environment)
+LLM_MAX_IN_FLIGHT = int(os.getenv("DPR_LLM_MAX_IN_FLIGHT", "8"))             # Concurrent Gemini calls per worker
+LLM_EXECUTOR_THREADS = int(os.getenv("DPR_LLM_EXECUTOR_THREADS", "16"))      # Threads for blocking SDK calls
+LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("DPR_LLM_CALL_TIMEOUT", "120"))   # Per-call timeout
+LLM_MAX_RETRIES = int(os.getenv("DPR_LLM_MAX_RETRIES", "2"))                 # Extra attempts after a transient error
+LLM_RETRY_BASE_SECONDS = float(os.getenv("DPR_LLM_RETRY_BASE", "1"))         # First backoff, doubled per attempt (full jitter)
+LLM_RETRY_MAX_SECONDS = float(os.getenv("DPR_LLM_RETRY_MAX", "20"))          # Backoff cap
+LLM_BREAKER_FAILURES = int(os.getenv("DPR_LLM_BREAKER_FAILURES", "5"))       # Consecutive outage errors that open the circuit
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("DPR_LLM_BREAKER_RESET", "30"))  # Open time before one probe call is let through
+LLM_HEDGE_ENABLED = os.getenv("DPR_LLM_HEDGE", "false").lower() == "true"    # Duplicate calls slower than the p95
+LLM_HEDGE_MIN_SAMPLES = 20         # Latency samples needed before hedging starts
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("DPR_LLM_HEDGE_MIN_DELAY", "2"))  # Never hedge sooner than this
+
+# PDF Extraction Configuration
+PDF_EXTRACT_WORKERS = int(os.getenv("DPR_PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))  # Extraction processes
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("DPR_PDF_PARALLEL_MIN_PAGES", "16"))  # Smaller PDFs are parsed in-process
+PDF_PAGES_PER_TASK = 8             # Page batch handed to one worker at a time
+PIPELINED_EXTRACTION_ENABLED = os.getenv("DPR_PIPELINED_EXTRACTION", "true").lower() == "true"
+PIPELINE_MIN_PAGES = int(os.getenv("DPR_PIPELINE_MIN_PAGES", "24"))  # Smaller PDFs are extracted before analysis starts
+
+# Extraction Store Configuration
+EXTRACTION_STORE_DIR = "data/cache/extracted"
+EXTRACTOR_VERSION = "1"            # Bump when extraction output changes so stale entries are re-parsed
+
+# Chunked (map-reduce) Analysis Configuration
+CHUNKED_ANALYSIS_ENABLED = os.getenv("DPR_CHUNKED_ANALYSIS", "true").lower() == "true"
+ANALYSIS_PROMPT_CHARS = 20000      # Document characters that fit in one analysis prompt
+FAST_PROMPT_CHARS = 15000          # Document characters that fit in one recommendations prompt
+ANALYSIS_CHUNK_MAX_PARALLEL = int(os.getenv("DPR_ANALYSIS_CHUNK_PARALLEL", "4"))  # Chunk calls in flight per document
+
+# Guideline Retrieval Configuration
+GUIDELINES_DIR = "data/guidelines"
+GUIDELINE_INDEX_PATH = "data/cache/guidelines_index.json"
+GUIDELINE_CHUNK_CHARS = 1200       # Passage size for indexing
+GUIDELINE_TOP_K = int(os.getenv("DPR_GUIDELINE_TOP_K", "5"))  # Passages retrieved per prompt
+GUIDELINE_CONTEXT_CHARS = 5000     # Guideline characters injected into a prompt
+
+# Analysis Cache Configuration
+ANALYSIS_CACHE_DIR = "data/cache/analysis"
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("DPR_ANALYSIS_CACHE_MAX_ENTRIES", "500"))
+ANALYSIS_CACHE_MAX_MB = int(os.getenv("DPR_ANALYSIS_CACHE_MAX_MB", "200"))
+ANALYSIS_CACHE_MAX_AGE_DAYS = int(os.getenv("DPR_ANALYSIS_CACHE_MAX_AGE_DAYS", "30"))
+
+# Bump the version for a mode whenever its prompt template changes so stale
+# cached analyses are never served for the new prompt
+PROMPT_TEMPLATE_VERSIONS = {
+    "full": "detailed-v2",
+    "fast": "recommendations-v2",
+}
+
+# Admission Control Configuration (per worker process)
+ANALYSIS_MAX_IN_FLIGHT = int(os.getenv("DPR_ANALYSIS_MAX_IN_FLIGHT", "4"))   # Analyses running at once
+ANALYSIS_MAX_QUEUE = int(os.getenv("DPR_ANALYSIS_MAX_QUEUE", "16"))          # Analyses waiting for a slot; more get 429
+ANALYSIS_QUEUE_TIMEOUT_SECONDS = float(os.getenv("DPR_ANALYSIS_QUEUE_TIMEOUT", "60"))   # Longest wait before 429
+ANALYSIS_EXPECTED_SECONDS = float(os.getenv("DPR_ANALYSIS_EXPECTED_SECONDS", "30"))     # Assumed duration until measured
+RETRY_AFTER_MAX_SECONDS = 300      # Cap on the Retry-After hint
+
+# Background Job Configuration
+JOB_WORKERS = int(os.getenv("DPR_JOB_WORKERS", "2"))              # Concurrent background analyses
+JOB_MAX_ATTEMPTS = int(os.getenv("DPR_JOB_MAX_ATTEMPTS", "2"))    # Starts allowed before an interrupted job is failed
+JOB_RETENTION_DAYS = int(os.getenv("DPR_JOB_RETENTION_DAYS", "14"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("DPR_JOB_HEARTBEAT_SECONDS", "15"))  # How often a process marks its jobs alive
+JOB_STALE_SECONDS = float(os.getenv("DPR_JOB_STALE_SECONDS", "90"))          # Silence after which a running job is requeued
+
+# Metrics Configuration
+METRICS_ENABLED = os.getenv("DPR_METRICS", "true").lower() == "true"
+STAGE_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
 
 # ============================================================================
-# INITIALIZE GEMINI
+# METRICS (PROMETHEUS TEXT FORMAT)
 # ============================================================================
+# In-process histograms and counters, rendered on /metrics in the Prometheus
+# text exposition format. Every pipeline stage reports its latency into
+# dpr_stage_duration_seconds{stage=...}; event counters (model repairs,
+# fallbacks, cache outcomes) live alongside. Values are per worker process.
+
+_metrics_lock = threading.Lock()
+_stage_histograms: Dict[tuple, Dict] = {}    # (stage, outcome) -> {"buckets", "sum", "count"}
+_event_counters: Dict[tuple, float] = {}     # (name, sorted label items) -> value
+
+METRIC_HELP = {
+    "dpr_stage_duration_seconds": "Latency of each DPR pipeline stage",
+    "dpr_json_parse_total": "parse_json_response results by the repair stage that succeeded",
+    "dpr_json_repairs_total": "Defects fixed by the tolerant JSON parser, by kind",
+    "dpr_model_repair_total": "Model-based JSON repair calls by result",
+    "dpr_fallback_total": "Fallback (non-model) results returned to clients by kind",
+    "dpr_cache_requests_total": "Cache lookups by cache and outcome",
+    "dpr_llm_calls_total": "Gemini calls by result",
+    "dpr_llm_retries_total": "Gemini calls retried after a transient error, by HTTP status (or error type)",
+    "dpr_llm_hedges_total": "Hedged duplicate Gemini calls by outcome (launched, won)",
+    "dpr_llm_circuit_total": "Circuit breaker events (opened, closed, rejected)",
+    "dpr_jobs_total": "Background jobs finished by kind and status",
+    "dpr_single_flight_total": "Coalesced computations by mode and role (leader computes, followers share)",
+    "dpr_compliance_decisions_total": "Mandatory compliance requirements decided, by decider (checklist or model)",
+    "dpr_uploads_rejected_total": "Request bodies rejected with 413 for exceeding the upload limit, by where the limit was hit",
+    "dpr_admission_total": "Analysis requests by endpoint and admission outcome (admitted, queue_full, queue_timeout)",
+}
+
+
+def observe_stage(stage: str, seconds: float, outcome: str = ""):
+    """Record one latency sample for a pipeline stage"""
+    if not METRICS_ENABLED:
+        return
+    key = (stage, outcome)
+    with _metrics_lock:
+        histogram = _stage_histograms.get(key)
+        if histogram is None:
+            histogram = {"buckets": [0] * len(STAGE_LATENCY_BUCKETS), "sum": 0.0, "count": 0}
+            _stage_histograms[key] = histogram
+        for i, bound in enumerate(STAGE_LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+
+def inc_counter(name: str, value: float = 1, **labels):
+    """Increment an event counter, e.g. inc_counter("dpr_fallback_total", kind="translation")"""
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _event_counters[key] = _event_counters.get(key, 0) + value
+
+
+def stage_timing_snapshot() -> Dict[str, tuple]:
+    """(count, total seconds) per stage, summed over outcomes, for before/after comparisons"""
+    totals = {}
+    with _metrics_lock:
+        for (stage, _), histogram in _stage_histograms.items():
+            count, seconds = totals.get(stage, (0, 0.0))
+            totals[stage] = (count + histogram["count"], seconds + histogram["sum"])
+    return totals
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block of code as one pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def timed_stage(stage: str):
+    """Decorator form of stage_timer for sync and async functions"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage_timer(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
 
-genai.configure(api_key=GEMINI_API_KEY)
-gemini_model = genai.GenerativeModel(GEMINI_MODEL)
-guidelines_context = ""
 
-print(f"[READY] Gemini AI initialized with model: {GEMINI_MODEL}")
+def render_prometheus_metrics(gauges: Dict[str, float] = None) -> str:
+    """Render histograms, counters and the given gauges in Prometheus text format"""
+    with _metrics_lock:
+        histograms = {key: (list(h["buckets"]), h["sum"], h["count"]) for key, h in _stage_histograms.items()}
+        counters = dict(_event_counters)
+    
+    lines = [
+        f"# HELP dpr_stage_duration_seconds {METRIC_HELP['dpr_stage_duration_seconds']}",
+        "# TYPE dpr_stage_duration_seconds histogram",
+    ]
+    for (stage, outcome), (buckets, total, count) in sorted(histograms.items()):
+        labels = [("stage", stage)] + ([("outcome", outcome)] if outcome else [])
+        for bound, bucket_count in zip(STAGE_LATENCY_BUCKETS, buckets):
+            lines.append(f"dpr_stage_duration_seconds_bucket{_format_labels(labels + [('le', repr(float(bound)))])} {bucket_count}")
+        lines.append(f"dpr_stage_duration_seconds_bucket{_format_labels(labels + [('le', '+Inf')])} {count}")
+        lines.append(f"dpr_stage_duration_seconds_sum{_format_labels(labels)} {total}")
+        lines.append(f"dpr_stage_duration_seconds_count{_format_labels(labels)} {count}")
+    
+    by_name: Dict[str, List[tuple]] = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for name in sorted(by_name):
+        lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in sorted(by_name[name]):
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    
+    return "\n".join(lines) + "\n"
 
 # ============================================================================
-# DOCUMENT PROCESSING FUNCTIONS
+# LLM BACKENDS
 # ============================================================================
-
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from PDF file"""
-    text = ""
-    try:
-        # Try pdfplumber first (better extraction)
-        # Suppress warnings during PDF processing
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-    except Exception as e:
-        # Fallback to PyPDF2
-        try:
-            with warnings.catch_warnings():
-                warnings.simplefilter("ignore")
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    for page in pdf_reader.pages:
-                        text += page.extract_text() + "\n"
-        except Exception as fallback_error:
-            print(f"[ERROR] PDF extraction error: {fallback_error}")
-    return text
+# Every model call goes through `llm_backend`, selected with DPR_LLM_BACKEND:
+#   gemini - Google Gemini (GEMINI_MODEL); the default
+#   fake   - local stand-in with no network or quota. It answers each prompt
+#            kind (analysis, compliance, recommendations, risks, insights,
+#            translation, repair, budget narration) with schema-valid JSON.
+#            Latency, token rate, error rate and malformed-output rate are
+#            configurable (DPR_FAKE_LLM_*), so the whole API can be run and
+#            load-tested offline:  DPR_LLM_BACKEND=fake uvicorn simple_app:app
+# A backend provides `model_name`, `generate(prompt, generation_config)` and
+# `stream(prompt, generation_config)` (an iterator of text pieces); both are
+# blocking and run on the LLM client thread pool. DPR_LLM_CASSETTE wraps the
+# backend to record its calls, or replays a recording without any backend.
+
+LLM_BACKEND = os.getenv("DPR_LLM_BACKEND", "gemini").lower()
+
+# Fake backend configuration
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("DPR_FAKE_LLM_LATENCY", "0.8"))        # Time to first token
+FAKE_LLM_LATENCY_JITTER = float(os.getenv("DPR_FAKE_LLM_JITTER", "0.25"))         # +/- fraction of the latency
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("DPR_FAKE_LLM_TOKENS_PER_SECOND", "150"))  # 0 = instant output
+FAKE_LLM_ERROR_RATE = float(os.getenv("DPR_FAKE_LLM_ERROR_RATE", "0"))            # Share of calls that raise
+FAKE_LLM_MALFORMED_RATE = float(os.getenv("DPR_FAKE_LLM_MALFORMED_RATE", "0"))    # Share of responses with broken JSON
+FAKE_LLM_SEED = os.getenv("DPR_FAKE_LLM_SEED")                                     # Fixes the error/malformed draws
+
+# Cassette configuration: record every call of the backend above to a file, or replay one
+LLM_CASSETTE_PATH = os.getenv("DPR_LLM_CASSETTE", "")                             # JSONL file; empty = off
+LLM_CASSETTE_MODE = os.getenv("DPR_LLM_CASSETTE_MODE", "replay").lower()          # record or replay
+LLM_CASSETTE_SPEED = float(os.getenv("DPR_LLM_CASSETTE_SPEED", "1"))              # Replay latency multiplier, 0 = instant
+
+
+def make_generation_config(**options):
+    """Generation config for the active SDK (a plain dict when Gemini is not installed)"""
+    if genai is None:
+        return dict(options)
+    return genai.GenerationConfig(**options)
+
+
+class GeminiBackend:
+    """Google Gemini via google-generativeai"""
+    
+    name = "gemini"
+    
+    def __init__(self, model_name: str = GEMINI_MODEL, api_key: str = GEMINI_API_KEY):
+        if genai is None:
+            raise RuntimeError("google-generativeai is not installed (or set DPR_LLM_BACKEND=fake)")
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+    
+    def generate(self, prompt: str, generation_config=None) -> str:
+        if generation_config is not None:
+            return self.model.generate_content(prompt, generation_config=generation_config).text
+        return self.model.generate_content(prompt).text
+    
+    def stream(self, prompt: str, generation_config=None):
+        if generation_config is not None:
+            response = self.model.generate_content(prompt, generation_config=generation_config, stream=True)
+        else:
+            response = self.model.generate_content(prompt, stream=True)
+        for chunk in response:
+            text = getattr(chunk, "text", "")
+            if text:
+                yield text
 
 
-def extract_text_from_docx(file_path: str) -> str:
-    """Extract text from DOCX file"""
-    doc = docx.Document(file_path)
-    text = "\n".join([para.text for para in doc.paragraphs])
+class FakeLLMError(RuntimeError):
+    """A simulated model API failure; `code` is the HTTP status the real API would return"""
     
-    # Also extract from tables
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                text += "\n" + cell.text
-    return text
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message} (simulated)")
+        self.code = code
 
 
-def extract_text(file_path: str, file_extension: str) -> str:
-    """Extract text from document based on file type"""
-    file_extension = file_extension.lower().replace('.', '')
-    
-    if file_extension == 'pdf':
-        return extract_text_from_pdf(file_path)
-    elif file_extension in ['docx', 'doc']:
-        return extract_text_from_docx(file_path)
-    else:
-        raise ValueError(f"Unsupported file type: {file_extension}")
+FAKE_LLM_ERRORS = [(429, "Resource has been exhausted"), (500, "Internal error"), (503, "The model is overloaded")]
 
+_FAKE_SENTENCES = [
+    "The DPR documents the project components and the implementing arrangements in reasonable detail.",
+    "Unit rates for the major civil items should be cross-checked against the current state schedule of rates.",
+    "The implementation schedule does not allow for the monsoon months in the construction programme.",
+    "Environmental clearance status is stated, but the supporting correspondence is not annexed.",
+    "The funding pattern follows the 90:10 central and state share applicable to the North Eastern Region.",
+    "Land acquisition and utility shifting are identified as the main risks to the timeline.",
+    "Operation and maintenance responsibilities after completion need to be defined with a budget.",
+    "The technical specifications refer to the relevant IRC and BIS codes for design and materials.",
+    "Stakeholder consultation records are summarised, with minutes from the public hearing.",
+    "Contingency provisions are within the ceiling permitted by the scheme guidelines.",
+]
 
-def structure_dpr_data(text: str) -> Dict:
-    """Extract and structure key information from DPR text"""
+
+class FakeLLMBackend:
+    """Offline stand-in for Gemini that answers with schema-valid JSON for each prompt kind.
+
+    Response content is derived from a hash of the prompt, so the same prompt
+    always gets the same answer; latency, errors and malformed output are
+    drawn from a separate random stream (seeded by DPR_FAKE_LLM_SEED).
+    """
     
-    # Helper function to extract fields with better text cleaning
-    def extract_field(keywords: List[str]) -> str:
-        for keyword in keywords:
-            # More flexible pattern that handles multi-line titles
-            pattern = rf'{keyword}\s*[:\-]?\s*(.+?)(?:\n\n|\r\n\r\n|(?:\n(?=[A-Z])|$))'
-            match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-            if match:
-                value = match.group(1).strip()
-                # Clean up the text - remove extra whitespace and newlines
-                value = ' '.join(value.split())
-                # Limit length but try to complete the sentence
-                if len(value) > 200:
-                    value = value[:200].rsplit(' ', 1)[0] + '...'
-                return value
-        return "Not Found"
+    name = "fake"
     
-    # Extract budget - comprehensive pattern matching
-    budget = {"total": 0, "currency": "INR", "details": "Not Found"}
-    budget_patterns = [
-        # Pattern 1: "Total 1,940 Lakhs (n19.4 Cr)" - dual format
-        (r'Total\s+([\d,]+)\s+Lakhs?\s*\(n?([\d\.]+)\s+Cr', 'dual'),
-        # Pattern 2: "Estimated Cost: Rs. 245.50 Crores"
-        (r'(?:Estimated|Total|Project)\s+Cost[\s:]*Rs\.?\s*([\d\.]+)\s+(?:Crores?|Cr)', 'crores'),
-        # Pattern 3: "Project Cost: n18.75 Crores"
-        (r'Project Cost:\s*n?([\d\.]+)\s+Crores?', 'crores'),
-        # Pattern 4: "Budget: Rs. 114.93 Crores"
-        (r'Budget[\s:]*Rs\.?\s*([\d\.]+)\s+(?:Crores?|Cr)', 'crores'),
-        # Pattern 5: Generic Lakhs format
-        (r'(?:Total|Budget|Cost)[\s:]*n?\s*([\d,]+)\s+Lakhs?', 'lakhs'),
-        # Pattern 6: Generic Crores format
-        (r'(?:Total|Budget|Cost)[\s:]*n?\s*([\d\.]+)\s+(?:Crores?|Cr)', 'crores'),
-        # Pattern 7: Simple "Rs. X Cr" anywhere in text
-        (r'Rs\.?\s*([\d\.]+)\s+Cr(?:ores?)?', 'crores'),
-        # Pattern 8: Just number with Crores
-        (r'(\d+(?:\.\d+)?)\s+Crores?', 'crores'),
-    ]
+    def __init__(
+        self,
+        latency: float = FAKE_LLM_LATENCY_SECONDS,
+        jitter: float = FAKE_LLM_LATENCY_JITTER,
+        tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        malformed_rate: float = FAKE_LLM_MALFORMED_RATE,
+        seed: Optional[str] = FAKE_LLM_SEED
+    ):
+        self.model_name = "fake-gemini"
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
     
-    for pattern, unit_type in budget_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            try:
-                if unit_type == 'dual':
-                    # "Total 1,940 Lakhs (n19.4 Cr)" format
-                    lakhs_str = match.group(1).replace(',', '').strip()
-                    crores_str = match.group(2).strip()
-                    lakhs = float(lakhs_str)
-                    crores = float(crores_str)
-                    budget["total"] = crores * 10000000  # Use Crores as more accurate
-                    budget["details"] = f"{lakhs:,.0f} Lakhs (Rs. {crores} Crores)"
-                elif unit_type == 'lakhs':
-                    # Lakhs format
-                    amount_str = match.group(1).replace(',', '').strip()
-                    amount = float(amount_str)
-                    budget["total"] = amount * 100000  # 1 Lakh = 1,00,000
-                    budget["details"] = f"{amount:,.0f} Lakhs (Rs. {amount/10:.2f} Crores)"
-                elif unit_type == 'crores':
-                    # Crores format
-                    amount_str = match.group(1).replace(',', '').strip()
-                    amount = float(amount_str)
-                    budget["total"] = amount * 10000000  # 1 Crore = 1,00,00,000
-                    budget["details"] = f"Rs. {amount} Crores"
-                
-                # If we found a valid budget, break
-                if budget["total"] > 0:
-                    print(f"[DEBUG] Budget extracted: {budget['details']} (pattern: {pattern})")
-                    break
-            except (ValueError, IndexError) as e:
-                print(f"[DEBUG] Budget pattern matched but parsing failed: {e}")
-                continue
+    # ---- response content ------------------------------------------------
     
-    if budget["total"] == 0:
-        print(f"[DEBUG] No budget found in text. First 500 chars: {text[:500]}")
+    @staticmethod
+    def _prompt_random(prompt: str) -> random.Random:
+        return random.Random(hashlib.sha256(prompt.encode("utf-8", "surrogatepass")).hexdigest())
     
-    # Extract timeline
-    timeline = {"duration": "Not specified", "duration_months": 0}
-    duration_match = re.search(r'(?:Duration|Timeline|Project Duration)[:\s]+(\d+)\s*(months?|years?)', text, re.IGNORECASE)
-    if duration_match:
-        value = int(duration_match.group(1))
-        unit = duration_match.group(2).lower()
-        if 'year' in unit:
-            timeline["duration_months"] = value * 12
-            timeline["duration"] = f"{value} years"
+    @staticmethod
+    def _text(rng: random.Random, sentences: int) -> str:
+        return " ".join(rng.choice(_FAKE_SENTENCES) for _ in range(sentences))
+    
+    def _analysis(self, rng: random.Random) -> Dict:
+        score = rng.randint(45, 90)
+        decision = "APPROVE" if score >= 75 else "REVISE" if score >= 50 else "REJECT"
+        section = lambda sentences: {"score": rng.randint(40, 95), "comments": self._text(rng, sentences)}
+        return {
+            "completeness_analysis": dict(section(6), missing_sections=rng.sample(
+                ["Environmental Impact Assessment", "R&R plan", "Geotechnical report", "O&M plan"], 2)),
+            "budget_validation": {"is_valid": score >= 60, "concerns": [self._text(rng, 2) for _ in range(3)],
+                                  "comments": self._text(rng, 8)},
+            "timeline_validation": {"is_realistic": rng.random() > 0.4, "total_duration": f"{rng.choice([18, 24, 36])} months",
+                                    "critical_milestones": [self._text(rng, 1) for _ in range(6)],
+                                    "comments": self._text(rng, 8)},
+            "technical_feasibility": dict(section(8), is_feasible=score >= 50,
+                                          strengths=[self._text(rng, 3) for _ in range(4)],
+                                          weaknesses=[self._text(rng, 3) for _ in range(3)]),
+            "risk_assessment": self._risks(rng),
+            "compliance_check": {"is_compliant": score >= 60, "guideline_gaps": [self._text(rng, 1) for _ in range(2)],
+                                 "comments": self._text(rng, 4)},
+            "stakeholder_analysis": {"comments": self._text(rng, 4)},
+            "sustainability_assessment": {"comments": self._text(rng, 4)},
+            "actionable_insights": [
+                f"PRIORITY {i + 1} - [{rng.choice(['BUDGET', 'TIMELINE', 'TECHNICAL', 'COMPLIANCE', 'RISK'])}] {self._text(rng, 4)}"
+                for i in range(6)
+            ],
+            "recommendations": [self._text(rng, 2) for _ in range(5)],
+            "overall_score": score,
+            "scoring_breakdown": {"completeness": rng.randint(10, 20), "budget": rng.randint(10, 20),
+                                  "technical": rng.randint(10, 20), "risk": rng.randint(5, 15)},
+            "approval_recommendation": {"decision": decision, "confidence": rng.randint(60, 95),
+                                        "reasoning": self._text(rng, 5)},
+            "summary": self._text(rng, 4),
+            "key_highlights": [self._text(rng, 1) for _ in range(5)],
+        }
+    
+    def _risks(self, rng: random.Random) -> Dict:
+        risk = lambda: {"risk": self._text(rng, 1), "severity": rng.choice(["low", "medium", "high"]),
+                        "mitigation": self._text(rng, 1)}
+        return {
+            "overall_risk_level": rng.choice(["low", "medium", "high"]),
+            "overall_risk_score": rng.randint(20, 80),
+            "financial_risks": [risk() for _ in range(2)],
+            "timeline_risks": [risk() for _ in range(2)],
+            "environmental_risks": [risk()],
+            "resource_risks": [risk()],
+            "comments": self._text(rng, 3),
+        }
+    
+    def _compliance(self, rng: random.Random, prompt: str) -> Dict:
+        asked = [int(n) for n in re.findall(r'^(\d+)\. \*\*', prompt, re.MULTILINE)] or list(MDONER_MANDATORY_REQUIREMENTS)
+        met = sorted(n for n in set(asked) if rng.random() < 0.85)
+        unmet = [MDONER_MANDATORY_REQUIREMENTS.get(n, f"Requirement {n}") for n in sorted(set(asked) - set(met))]
+        return {
+            "compliant": not unmet,
+            "compliance_score": round(100 * len(met) / max(1, len(set(asked)))),
+            "critical_violations": unmet,
+            "missing_sections": unmet[:2],
+            "rejection_reason": None if not unmet else "Not demonstrated in the DPR: " + "; ".join(unmet),
+            "compliance_summary": self._text(rng, 2),
+            "requirements_met": met,
+        }
+    
+    def _dimension(self, rng: random.Random) -> Dict:
+        score = rng.randint(45, 92)
+        return {
+            "score": score,
+            "rating": "EXCELLENT" if score >= 80 else "GOOD" if score >= 65 else "ADEQUATE" if score >= 50 else "WEAK",
+            "strengths": [self._text(rng, 1) for _ in range(3)],
+            "concerns": [self._text(rng, 1) for _ in range(2)],
+            "detailed_analysis": self._text(rng, 4),
+            "recommendation": self._text(rng, 1),
+        }
+    
+    def _admin_assessment(self, rng: random.Random) -> Dict:
+        technical, financial, risk = self._dimension(rng), self._dimension(rng), self._dimension(rng)
+        score = round(0.35 * technical["score"] + 0.35 * financial["score"] + 0.3 * risk["score"])
+        return {
+            "overall_recommendation": "APPROVE" if score >= 75 else "CONDITIONAL_APPROVE" if score >= 60 else "REQUEST_REVISIONS",
+            "confidence_level": rng.choice(["HIGH", "MEDIUM"]),
+            "approval_score": score,
+            "technical_feasibility": technical,
+            "financial_feasibility": dict(financial, budget_adequacy=self._text(rng, 1), economic_viability=self._text(rng, 1)),
+            "risk_assessment": dict(risk, critical_risks=[self._text(rng, 1) for _ in range(3)],
+                                    mitigation_adequacy=self._text(rng, 1)),
+            "key_highlights": [self._text(rng, 1) for _ in range(5)],
+            "conditions_for_approval": [self._text(rng, 1) for _ in range(2)],
+            "admin_action_summary": self._text(rng, 3),
+            "estimated_success_probability": f"{rng.randint(55, 90)}%",
+            "timeline_realism": self._text(rng, 1),
+            "overall_justification": self._text(rng, 5),
+        }
+    
+    def _admin_recommendation(self, rng: random.Random) -> Dict:
+        assessment = {"technical": self._dimension(rng), "financial": self._dimension(rng), "risk": self._dimension(rng)}
+        score = round(sum(d["score"] for d in assessment.values()) / 3)
+        return {
+            "assessment": assessment,
+            "recommendation": {
+                "action": "APPROVE" if score >= 75 else "CONDITIONAL_APPROVE" if score >= 60 else "REQUEST_REVISIONS",
+                "overall_score": score,
+                "confidence": rng.randint(60, 90),
+                "summary": self._text(rng, 5),
+            },
+        }
+    
+    def respond(self, prompt: str) -> str:
+        """The well-formed response text for a prompt"""
+        rng = self._prompt_random(prompt)
+        if "Translate this DPR analysis" in prompt:
+            report, _ = parse_json_tolerant(prompt[prompt.find("{"):])
+            return json.dumps(report if isinstance(report, dict) else {}, ensure_ascii=False)
+        if "JSON array of strings" in prompt:
+            value = [f"{rng.choice(['Include', 'Revise', 'Add', 'Clarify'])} {self._text(rng, 2)}" for _ in range(6)]
+        elif '"requirements_met"' in prompt:
+            value = self._compliance(rng, prompt)
+        elif '"detailed_recommendations"' in prompt:
+            value = {
+                "standard_assessment": self._text(rng, 3),
+                "detailed_recommendations": [
+                    f"PRIORITY {i + 1} - [{rng.choice(['BUDGET', 'TIMELINE', 'TECHNICAL', 'COMPLIANCE'])}] {self._text(rng, 5)}"
+                    for i in range(7)
+                ],
+            }
+        elif '"overall_recommendation"' in prompt:
+            value = self._admin_assessment(rng)
+        elif '"assessment": {' in prompt:
+            value = self._admin_recommendation(rng)
+        elif '"narrative"' in prompt:
+            value = {"narrative": self._text(rng, 4)}
+        elif "Analyze risks" in prompt:
+            value = self._risks(rng)
         else:
-            timeline["duration_months"] = value
-            timeline["duration"] = f"{value} months"
+            # Comprehensive analysis (also the answer to model-repair prompts)
+            value = self._analysis(rng)
+        return json.dumps(value, ensure_ascii=False, indent=2)
     
-    # Identify project type - prioritize more specific types first
-    text_lower = text.lower()
-    project_type = 'general'
-    project_types = {
-        'it_park': ['it park', 'information technology park', 'tech park', 'technology park', 'software park', 'ites'],
-        'hospital': ['hospital', 'health center', 'medical center', 'health care'],
-        'school': ['school', 'college', 'university', 'education', 'institute'],
-        'bridge': ['bridge', 'flyover', 'overpass'],
-        'water': ['water supply', 'irrigation', 'water treatment', 'reservoir'],
-        'road': ['road', 'highway', 'expressway', 'connectivity'],
-    }
-    for ptype, keywords in project_types.items():
-        if any(kw in text_lower for kw in keywords):
-            project_type = ptype
-            break
+    # ---- failure and timing simulation -----------------------------------
     
-    structured_data = {
-        "project_title": extract_field(["Project Title", "Title", "Project Name"]),
-        "project_type": project_type,
-        "budget": budget,
-        "timeline": timeline,
-        "location": extract_field(["Location", "Project Location", "Site"]),
-        "implementing_agency": extract_field(["Implementing Agency", "Nodal Agency"]),
-        "word_count": len(text.split()),
-    }
+    def _draw(self) -> tuple:
+        """(error or None, malformed kind or None, first-token latency) for one call"""
+        with self._random_lock:
+            error = self._random.choice(FAKE_LLM_ERRORS) if self._random.random() < self.error_rate else None
+            malformed = (self._random.choice(("truncated", "fenced", "trailing_commas"))
+                         if self._random.random() < self.malformed_rate else None)
+            latency = self.latency * (1 + self.jitter * (2 * self._random.random() - 1))
+        return error, malformed, max(0.0, latency)
     
-    # Debug logging
-    print(f"[DEBUG] Structured DPR Data:")
-    print(f"  - Title: {structured_data['project_title']}")
-    print(f"  - Location: {structured_data['location']}")
-    print(f"  - Budget: {structured_data['budget']['details']}")
-    print(f"  - Duration: {structured_data['timeline']['duration']}")
+    @staticmethod
+    def _malform(text: str, kind: Optional[str]) -> str:
+        if kind == "truncated":
+            return text[:int(len(text) * 0.6)]
+        if kind == "fenced":
+            return "Here is the analysis:\n```json\n" + text + "\n```"
+        if kind == "trailing_commas":
+            return re.sub(r'(["\d\]}])(\s*\n\s*[}\]])', r'\1,\2', text)
+        return text
     
-    return structured_data
+    def _seconds_for(self, text: str) -> float:
+        # ~4 characters per token
+        return len(text) / 4 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+    
+    def generate(self, prompt: str, generation_config=None) -> str:
+        error, malformed, latency = self._draw()
+        if error is not None:
+            time.sleep(latency)
+            raise FakeLLMError(*error)
+        text = self._malform(self.respond(prompt), malformed)
+        time.sleep(latency + self._seconds_for(text))
+        return text
+    
+    def stream(self, prompt: str, generation_config=None):
+        error, malformed, latency = self._draw()
+        time.sleep(latency)
+        if error is not None:
+            raise FakeLLMError(*error)
+        text = self._malform(self.respond(prompt), malformed)
+        for start in range(0, len(text), 64):
+            piece = text[start:start + 64]
+            time.sleep(self._seconds_for(piece))
+            yield piece
 
 
-# ============================================================================
-# GEMINI AI ANALYSIS FUNCTIONS
-# ============================================================================
+# Timestamps that end up in prompts (upload times, dated file names) are masked
+# before hashing so a replayed run finds the calls recorded on another day
+_CASSETTE_VOLATILE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?|\d{8}_\d{6}')
 
-def parse_json_response(text: str, enable_aggressive_repair: bool = True) -> Dict:
-    """Parse JSON from Gemini response with robust multi-stage repair strategies."""
-    
-    original_text = text
-    print(f"[DEBUG] Raw response length: {len(text)} characters")
 
-    # 1. Strip markdown fences if present
-    if "```json" in text:
-        try:
-            text = text.split("```json", 1)[1].split("```", 1)[0]
-        except Exception:
-            pass
-    elif "```" in text:
-        parts = text.split("```")
-        if len(parts) >= 2:
-            text = parts[1]
+class CassetteMissError(RuntimeError):
+    """A replayed run sent a prompt that is not on the cassette"""
 
-    text = text.strip()
 
-    # 2. Remove control characters but preserve essential whitespace
-    import string
-    printable_chars = string.printable
-    cleaned = ''.join(char for char in text if char in printable_chars or char in '\n\r\t ')
-    cleaned = re.sub(r'[\x00-\x08\x0B-\x0C\x0E-\x1F\x7F]', '', cleaned)
-    text = cleaned
+class CassetteBackend:
+    """Record/replay wrapper around another backend.
 
-    def attempt_load(label: str, candidate: str):
+    record: every call is forwarded to `inner` and stored as one JSON line
+    keyed by the SHA-256 of the prompt, with the raw response (or error), the
+    measured latency and, for streams, the arrival time of every piece.
+    replay: responses come from the cassette with the recorded timing scaled
+    by `speed`, so pipeline changes can be benchmarked against identical
+    model behaviour; `inner` is never called and an unknown prompt raises
+    CassetteMissError.
+    """
+    
+    name = "cassette"
+    
+    def __init__(self, path: str, mode: str = "replay", inner=None, speed: float = LLM_CASSETTE_SPEED):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode} (expected record or replay)")
+        if mode == "record" and inner is None:
+            raise ValueError("Recording a cassette needs a backend to record")
+        self.path = path
+        self.mode = mode
+        self.inner = inner
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._entries = self._load() if mode == "replay" else {}
+        if inner is not None:
+            self.model_name = inner.model_name
+        else:
+            self.model_name = next((e["model"] for e in self._entries.values()), "cassette")
+    
+    def _load(self) -> Dict[str, Dict]:
+        entries = {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if entry.get("error") == "cancelled" and entry["key"] in entries:
+                        continue  # A stream the consumer abandoned never hides a finished recording
+                    entries[entry["key"]] = entry  # Latest recording of a prompt wins
+        print(f"[CASSETTE] Replaying {len(entries)} recorded calls from {self.path}")
+        return entries
+    
+    @staticmethod
+    def prompt_key(prompt: str) -> str:
+        normalized = _CASSETTE_VOLATILE_PATTERN.sub("<time>", prompt)
+        return hashlib.sha256(normalized.encode("utf-8", "surrogatepass")).hexdigest()
+    
+    def _record(self, entry: Dict):
+        entry["model"] = self.model_name
+        entry["recorded_at"] = datetime.now().isoformat()
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+    
+    def _replayed(self, prompt: str) -> Dict:
+        entry = self._entries.get(self.prompt_key(prompt))
+        if entry is None:
+            raise CassetteMissError(f"Prompt {self.prompt_key(prompt)[:12]} ({len(prompt)} chars) is not on the cassette")
+        return entry
+    
+    @staticmethod
+    def _error(entry: Dict) -> Exception:
+        return FakeLLMError(entry["error_code"], entry["error"]) if entry.get("error_code") else RuntimeError(entry["error"])
+    
+    def generate(self, prompt: str, generation_config=None) -> str:
+        if self.mode == "replay":
+            entry = self._replayed(prompt)
+            time.sleep(entry["latency"] * self.speed)
+            if entry.get("error") is not None:
+                raise self._error(entry)
+            return entry["response"]
+        
+        started = time.perf_counter()
+        entry = {"key": self.prompt_key(prompt), "prompt_chars": len(prompt), "stream": False}
         try:
-            if not candidate.strip():
-                return None, ValueError("Empty candidate")
-            return json.loads(candidate), None
-        except json.JSONDecodeError as je:
-            return None, je
+            text = self.inner.generate(prompt, generation_config)
+            entry.update(response=text, error=None)
+            return text
         except Exception as e:
-            return None, e
+            entry.update(response=None, error=str(e), error_code=getattr(e, "code", None))
+            raise
+        finally:
+            entry["latency"] = round(time.perf_counter() - started, 4)
+            self._record(entry)
+    
+    def stream(self, prompt: str, generation_config=None):
+        if self.mode == "replay":
+            entry = self._replayed(prompt)
+            pieces = entry.get("pieces") or ([[entry["latency"], entry["response"]]] if entry.get("response") else [])
+            elapsed = 0.0
+            for offset, piece in pieces:
+                time.sleep(max(0.0, offset - elapsed) * self.speed)
+                elapsed = offset
+                yield piece
+            time.sleep(max(0.0, entry["latency"] - elapsed) * self.speed)
+            if entry.get("error") is not None:
+                raise self._error(entry)
+            return
+        
+        started = time.perf_counter()
+        entry = {"key": self.prompt_key(prompt), "prompt_chars": len(prompt), "stream": True}
+        pieces = []
+        try:
+            for piece in self.inner.stream(prompt, generation_config):
+                pieces.append([round(time.perf_counter() - started, 4), piece])
+                yield piece
+            entry.update(response="".join(p for _, p in pieces), error=None)
+        except GeneratorExit:
+            # Closed early (timeout or client disconnect): replay must fail, not serve the pieces as a complete answer
+            entry.update(response=None, error="cancelled")
+            raise
+        except Exception as e:
+            entry.update(response=None, error=str(e), error_code=getattr(e, "code", None))
+            raise
+        finally:
+            entry["latency"] = round(time.perf_counter() - started, 4)
+            entry["pieces"] = pieces
+            self._record(entry)
+
+
+def create_llm_backend(name: str = LLM_BACKEND):
+    """Instantiate the backend named by DPR_LLM_BACKEND, wrapped in a cassette when DPR_LLM_CASSETTE is set"""
+    if LLM_CASSETTE_PATH and LLM_CASSETTE_MODE == "replay":
+        return CassetteBackend(LLM_CASSETTE_PATH, "replay")
+    if name == "fake":
+        backend = FakeLLMBackend()
+    elif name == "gemini":
+        backend = GeminiBackend()
+    else:
+        raise ValueError(f"Unknown LLM backend: {name} (expected gemini or fake)")
+    if LLM_CASSETTE_PATH:
+        return CassetteBackend(LLM_CASSETTE_PATH, LLM_CASSETTE_MODE, inner=backend)
+    return backend
 
-    # Quick direct attempt
-    parsed, err = attempt_load("direct", text)
-    if parsed is not None:
-        print("[SUCCESS] JSON parsed successfully")
-        return parsed
 
-    print(f"[WARNING] Initial parse failed: {str(err)[:200]}")
+def set_llm_backend(backend):
+    """Swap the backend used by every model call (benchmarks, offline runs)"""
+    global llm_backend
+    llm_backend = backend
+    print(f"[READY] LLM backend: {backend.name} ({backend.model_name})")
 
-    # 3. Extract JSON object with brace matching
-    brace_start = text.find('{')
-    brace_end = text.rfind('}')
-    if brace_start != -1 and brace_end != -1 and brace_end > brace_start:
-        candidate = text[brace_start:brace_end+1].strip()
-    else:
-        candidate = text
 
-    # 4. Remove trailing commas
-    candidate = re.sub(r',\s*(?=[}\]])', '', candidate)
-    
-    parsed, err2 = attempt_load("trailing-comma-fix", candidate)
-    if parsed is not None:
-        print("[SUCCESS] JSON parsed after trailing comma removal")
-        return parsed
+llm_backend = None
+set_llm_backend(create_llm_backend())
 
-    # 5. Fix common JSON issues more aggressively
-    working = candidate
-    
-    # Fix unterminated strings by finding last valid quote
-    if 'Unterminated string' in str(err2) or 'Expecting' in str(err2):
-        print("[REPAIR] Attempting to fix unterminated strings...")
-        try:
-            # Find the error position if available
-            if hasattr(err2, 'pos'):
-                pos = err2.pos
-                # Truncate at the error position
-                working = working[:pos]
-                # Find the last complete key-value pair
-                last_quote = working.rfind('"')
-                if last_quote > 0:
-                    # Find the comma or brace before this
-                    last_comma = working[:last_quote].rfind(',')
-                    last_brace = working[:last_quote].rfind('{')
-                    last_bracket = working[:last_quote].rfind('[')
-                    cutoff = max(last_comma, last_brace, last_bracket)
-                    if cutoff > 0:
-                        working = working[:cutoff]
-                        if working[cutoff] == ',':
-                            working = working[:cutoff]  # Remove trailing comma
-        except Exception as e:
-            print(f"[DEBUG] String repair error: {e}")
+# ============================================================================
+# LLM RESILIENCE
+# ============================================================================
+# Transient Gemini errors (quota 429, 5xx, dropped connections) are retried
+# a bounded number of times with exponential backoff and full jitter, so a
+# burst of clients does not retry in lockstep. A circuit breaker counts
+# consecutive outage errors; once open, calls fail immediately with
+# LLMUnavailableError (served as 503 + Retry-After) instead of waiting out
+# timeouts, and after LLM_BREAKER_RESET_SECONDS a single probe call decides
+# whether to close it again. Optionally, a call still running after the p95
+# of recent call latencies gets a duplicate ("hedged") call and the first
+# answer wins; hedges are only sent when an in-flight slot is free.
 
-    # 6. Balance braces and brackets
-    open_braces = working.count('{')
-    close_braces = working.count('}')
-    open_brackets = working.count('[')
-    close_brackets = working.count(']')
-    
-    if close_braces < open_braces:
-        working += '\n' + ('}' * (open_braces - close_braces))
-    if close_brackets < open_brackets:
-        working += ']' * (open_brackets - close_brackets)
+TRANSIENT_LLM_STATUS = {408, 429, 500, 502, 503, 504}
 
-    parsed, err3 = attempt_load("brace-balance", working)
-    if parsed is not None:
-        print("[SUCCESS] JSON repaired via brace balancing")
-        return parsed
 
-    # 7. Last resort: Use model to repair (if enabled)
-    if enable_aggressive_repair:
-        print("[REPAIR] Attempting model-based repair...")
-        schema_hint = '{"keys": ["overall_score", "actionable_insights", "recommendations", "approval_recommendation", "summary"]}'
-        repaired = attempt_model_repair(original_text[:15000], schema_hint)  # Limit input size
-        if repaired is not None:
-            print("[SUCCESS] Model-based repair succeeded")
-            return repaired
+class LLMUnavailableError(RuntimeError):
+    """Raised without calling the model while the circuit breaker is open"""
+    
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        super().__init__(f"Gemini is unavailable after repeated errors; retry in {self.retry_after}s")
 
-    # 8. Final fallback: return minimal valid structure
-    print("[FALLBACK] Generating minimal valid structure")
-    fallback = {
-        "_error": "JSON parsing failed after all repair attempts",
-        "_original_error": str(err3 or err2 or err)[:500],
-        "overall_score": 50,
-        "actionable_insights": [
-            "Manual review required - automated parsing encountered errors",
-            "Document may have formatting issues that need correction",
-            "Please ensure DPR document is properly structured"
-        ],
-        "recommendations": [
-            "Review document formatting and structure",
-            "Ensure all required sections are complete",
-            "Resubmit document after addressing formatting issues"
-        ],
-        "approval_recommendation": {
-            "decision": "REVISE",
-            "confidence": 0,
-            "reasoning": "Analysis could not be completed due to technical processing errors. Manual expert review is required, or document should be reformatted and resubmitted."
-        },
-        "summary": "Technical error prevented complete automated analysis. Manual review by expert assessor is strongly recommended.",
-        "completeness_analysis": {
-            "score": 50,
-            "comments": "Could not complete automated analysis"
-        },
-        "budget_validation": {
-            "is_valid": False,
-            "comments": "Analysis incomplete"
-        },
-        "timeline_validation": {
-            "is_realistic": False,
-            "comments": "Analysis incomplete"
-        },
-        "technical_feasibility": {
-            "score": 50,
-            "is_feasible": False,
-            "comments": "Analysis incomplete"
-        },
-        "risk_assessment": {
-            "overall_risk_level": "high",
-            "overall_risk_score": 70,
-            "comments": "Unable to complete risk assessment"
-        },
-        "compliance_check": {
-            "is_compliant": False,
-            "comments": "Analysis incomplete"
-        }
-    }
-    return fallback
-def attempt_model_repair(raw_response: str, schema_hint: str) -> Optional[Dict]:
-    """Use the model itself to repair malformed JSON.
-    Returns dict on success, or None on failure.
-    """
+
+def llm_error_status(error: Exception) -> Optional[int]:
+    """HTTP status carried by a model error (google.api_core and fake backend errors have `code`)"""
+    code = getattr(error, "code", None)
+    if callable(code):
+        return None
     try:
-        # Very simple, constrained repair prompt
-        repair_prompt = f"""
-The following JSON response is malformed. Extract and return ONLY a corrected JSON object with these required keys:
+        return int(code)
+    except (TypeError, ValueError):
+        return None
 
-Required structure:
-{{
-    "overall_score": <number 0-100>,
-    "actionable_insights": ["insight 1", "insight 2", "insight 3"],
-    "recommendations": ["rec 1", "rec 2"],
-    "approval_recommendation": {{
-        "decision": "APPROVE" or "REVISE" or "REJECT",
-        "confidence": <number 0-100>,
-        "reasoning": "brief explanation"
-    }},
-    "summary": "brief summary text"
-}}
 
-Malformed input (extract what you can):
-{raw_response[:10000]}
+def is_transient_llm_error(error: Exception) -> bool:
+    """Worth retrying: rate limits, server errors and connection failures (not timeouts or bad requests)"""
+    return llm_error_status(error) in TRANSIENT_LLM_STATUS or isinstance(error, ConnectionError)
 
-Return ONLY the corrected JSON object. Do not include markdown, explanations, or code blocks.
-"""
-        
-        response = gemini_model.generate_content(
-            repair_prompt,
-            generation_config=genai.GenerationConfig(
-                temperature=0.1,
-                max_output_tokens=2048,
-                response_mime_type="application/json",
-            )
-        )
-        
-        print(f"[REPAIR] Model repair response length: {len(response.text)}")
-        
-        # Parse the repair response without aggressive repair to avoid recursion
-        result = parse_json_response(response.text, enable_aggressive_repair=False)
-        
-        # Validate that required keys are present
-        required_keys = ["overall_score", "actionable_insights", "approval_recommendation"]
-        if all(key in result for key in required_keys):
-            return result
-        else:
-            print(f"[REPAIR] Repaired JSON missing required keys")
+
+def is_llm_outage_error(error: Exception) -> bool:
+    """Counts towards opening the circuit: transient errors and timeouts"""
+    return is_transient_llm_error(error) or isinstance(error, TimeoutError)
+
+
+def llm_retry_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)"""
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+
+def _note_llm_retry(error: Exception, attempt: int, delay: float):
+    reason = llm_error_status(error) or type(error).__name__
+    inc_counter("dpr_llm_retries_total", reason=reason)
+    print(f"[LLM-RETRY] Attempt {attempt + 1} failed ({reason}: {str(error)[:120]}); retrying in {delay:.1f}s")
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker (closed -> open -> half_open -> closed), thread-safe"""
+    
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._counts = {"opened": 0, "rejected": 0}
+    
+    def before_call(self):
+        """Raise LLMUnavailableError unless a call may go ahead now"""
+        with self._lock:
+            if self._state == "closed":
+                return
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if self._state == "open" and remaining <= 0:
+                self._state = "half_open"  # Every other call is rejected until the probe finishes
+                print("[CIRCUIT] Half-open: letting one probe call through")
+                return
+            self._counts["rejected"] += 1
+        inc_counter("dpr_llm_circuit_total", event="rejected")
+        raise LLMUnavailableError(max(remaining, 1))
+    
+    def record_success(self):
+        with self._lock:
+            was_open = self._state != "closed"
+            self._state = "closed"
+            self._failures = 0
+        if was_open:
+            inc_counter("dpr_llm_circuit_total", event="closed")
+            print("[CIRCUIT] Closed: model calls are succeeding again")
+    
+    def abandon_probe(self):
+        """A call was cancelled; if it was the half-open probe, let the next call probe instead"""
+        with self._lock:
+            if self._state == "half_open":
+                self._state = "open"
+                self._opened_at = time.monotonic() - self.reset_seconds
+    
+    def record_failure(self, error: Exception):
+        if not is_llm_outage_error(error):
+            # Not an outage (bad request, local error): breaks a run of failures but proves nothing to a probe
+            with self._lock:
+                if self._state == "closed":
+                    self._failures = 0
+            self.abandon_probe()
+            return
+        with self._lock:
+            self._failures += 1
+            failures = self._failures
+            opened = self._state == "half_open" or (self._state == "closed" and failures >= self.failure_threshold)
+            if opened:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._counts["opened"] += 1
+        if opened:
+            inc_counter("dpr_llm_circuit_total", event="opened")
+            print(f"[CIRCUIT] Open for {self.reset_seconds:.0f}s after {failures} consecutive failures: {str(error)[:120]}")
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_seconds": self.reset_seconds,
+                **self._counts,
+            }
+
+
+class LatencyWindow:
+    """Rolling window of recent call latencies"""
+    
+    def __init__(self, size: int = 200):
+        self._samples: "deque[float]" = deque(maxlen=size)
+        self._lock = threading.Lock()
+    
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def percentile(self, fraction: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < max(1, min_samples):
             return None
-            
-    except Exception as e:
-        print(f"[REPAIR] Model-based repair failed: {str(e)[:200]}")
+        return samples[min(len(samples) - 1, math.ceil(fraction * len(samples)) - 1)]
+
+
+llm_circuit = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS)
+llm_call_latency = LatencyWindow()
+
+
+def llm_hedge_delay() -> Optional[float]:
+    """Seconds after which a still-running call is hedged, or None when hedging is off"""
+    if not LLM_HEDGE_ENABLED:
         return None
+    p95 = llm_call_latency.percentile(0.95, LLM_HEDGE_MIN_SAMPLES)
+    return None if p95 is None else max(p95, LLM_HEDGE_MIN_DELAY_SECONDS)
 
 
-async def analyze_dpr_comprehensive_fast(dpr_text: str, structured_data: Dict) -> Dict:
-    """OPTIMIZED: Single API call for complete DPR analysis with DETAILED content"""
-    
-    guidelines_section = ""
-    if guidelines_context:
-        guidelines_section = f"""
-**MDONER GUIDELINES REFERENCE:**
-{guidelines_context[:5000]}
-"""
+def llm_unavailable(error: LLMUnavailableError) -> HTTPException:
+    """503 with Retry-After for requests that need the model while the circuit is open"""
+    return HTTPException(503, str(error), headers={"Retry-After": str(error.retry_after)})
+
+
+# ============================================================================
+# LLM CLIENT (NON-BLOCKING)
+# ============================================================================
+# Every Gemini call goes through this layer. The SDK call itself is blocking,
+# so it runs on a dedicated thread pool while the event loop keeps serving
+# other requests. An asyncio semaphore caps the number of calls in flight; a
+# slot is freed when the worker thread returns, not when the caller gives up
+# waiting, so calls abandoned on timeout still count against the cap.
+# Each public call goes through the circuit breaker and retry loop above.
+
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_EXECUTOR_THREADS, thread_name_prefix="gemini")
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+_llm_stats_lock = threading.Lock()
+_llm_stats = {"in_flight": 0, "waiting": 0, "completed": 0, "failed": 0, "timeouts": 0, "retries": 0, "hedges": 0}
+
+
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    """Create the in-flight semaphore lazily so it binds to the running loop"""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(LLM_MAX_IN_FLIGHT)
+    return _llm_semaphore
+
+
+def _bump_llm_stat(key: str, delta: int = 1):
+    with _llm_stats_lock:
+        _llm_stats[key] += delta
+
+
+def _generate_text_blocking(prompt: str, generation_config=None) -> str:
+    """Run a single model call on the current thread and return the response text"""
+    _bump_llm_stat("in_flight")
+    started = time.perf_counter()
+    try:
+        text = llm_backend.generate(prompt, generation_config)
+        _bump_llm_stat("completed")
+        inc_counter("dpr_llm_calls_total", result="completed")
+        return text
+    except Exception:
+        _bump_llm_stat("failed")
+        inc_counter("dpr_llm_calls_total", result="failed")
+        raise
+    finally:
+        _bump_llm_stat("in_flight", -1)
+        observe_stage("llm_call", time.perf_counter() - started)
+
+
+async def _acquire_llm_slot() -> asyncio.Semaphore:
+    """Wait for an in-flight slot; hand it to _run_in_llm_slot, which frees it"""
+    semaphore = _get_llm_semaphore()
+    _bump_llm_stat("waiting")
+    queued = time.perf_counter()
+    try:
+        await semaphore.acquire()
+    finally:
+        _bump_llm_stat("waiting", -1)
+    observe_stage("llm_queue_wait", time.perf_counter() - queued)
+    return semaphore
+
+
+def _run_in_llm_slot(loop, semaphore: asyncio.Semaphore, func, *args) -> asyncio.Future:
+    """Start `func` on the LLM thread pool and free the slot once the thread returns"""
+    try:
+        future = loop.run_in_executor(_llm_executor, func, *args)
+    except BaseException:
+        semaphore.release()
+        raise
+    future.add_done_callback(lambda _: semaphore.release())
+    return future
+
+
+async def _llm_generate_once(prompt: str, generation_config, timeout: float, started: asyncio.Event = None) -> str:
+    """One model call: wait for an in-flight slot, run it on the LLM thread pool, enforce `timeout`"""
+    loop = asyncio.get_running_loop()
+    semaphore = await _acquire_llm_slot()
+    if started is not None:
+        started.set()
+    future = _run_in_llm_slot(loop, semaphore, _generate_text_blocking, prompt, generation_config)
+    try:
+        # shield: a timeout or cancellation stops the wait, but the thread keeps its slot until it returns
+        return await asyncio.wait_for(asyncio.shield(future), timeout)
+    except asyncio.TimeoutError:
+        _bump_llm_stat("timeouts")
+        inc_counter("dpr_llm_calls_total", result="timeout")
+        raise TimeoutError(f"Gemini call exceeded {timeout:.0f}s timeout")
+
+
+def _discard_outcome(task: asyncio.Future):
+    if not task.cancelled():
+        task.exception()  # Mark a losing hedge's error as retrieved
+
+
+async def _llm_generate_hedged(prompt: str, generation_config, timeout: float) -> str:
+    """One logical call, duplicated once if it is still running after the hedge delay.
+
+    Records the call's latency from when it got a slot to the first answer,
+    so the hedge threshold tracks what callers see rather than the losers.
+    """
+    delay = llm_hedge_delay()
+    started = asyncio.Event()
+    primary = asyncio.ensure_future(_llm_generate_once(prompt, generation_config, timeout, started))
+    slot_taken = asyncio.ensure_future(started.wait())
+    tasks = [primary]
+    try:
+        # The hedge clock starts once the primary call holds a slot, not while it queues
+        await asyncio.wait([primary, slot_taken], return_when=asyncio.FIRST_COMPLETED)
+        slot_at = time.perf_counter()
+        if delay is not None and not primary.done():
+            await asyncio.wait([primary], timeout=delay)
+        # No hedge when every slot is taken, counting calls still running after a timeout
+        if delay is None or primary.done() or _get_llm_semaphore().locked():
+            text = await primary
+            llm_call_latency.add(time.perf_counter() - slot_at)
+            return text
+        
+        _bump_llm_stat("hedges")
+        inc_counter("dpr_llm_hedges_total", outcome="launched")
+        print(f"[LLM-HEDGE] Call still running after {delay:.1f}s (p95); sending a duplicate")
+        hedge = asyncio.ensure_future(_llm_generate_once(prompt, generation_config, timeout))
+        tasks.append(hedge)
+        pending = set(tasks)
+        winner = None
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = next((task for task in done if task.exception() is None), None)
+        for task in pending:
+            task.add_done_callback(_discard_outcome)  # Let the loser finish in its slot; its answer is ignored
+        if winner is None:
+            hedge.exception()
+            return primary.result()  # Both failed: raise the primary's error
+        if winner is hedge:
+            inc_counter("dpr_llm_hedges_total", outcome="won")
+        llm_call_latency.add(time.perf_counter() - slot_at)
+        return winner.result()
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        slot_taken.cancel()
+
+
+async def llm_generate(prompt: str, generation_config=None, timeout: float = LLM_CALL_TIMEOUT_SECONDS) -> str:
+    """Generate content with Gemini without blocking the event loop.
+
+    Waits for a free slot on the in-flight semaphore, runs the call on the LLM
+    thread pool and raises TimeoutError if it takes longer than `timeout`.
+    Transient errors are retried with backoff; raises LLMUnavailableError
+    straight away while the circuit breaker is open.
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        llm_circuit.before_call()
+        try:
+            text = await _llm_generate_hedged(prompt, generation_config, timeout)
+        except asyncio.CancelledError:
+            llm_circuit.abandon_probe()
+            raise
+        except Exception as e:
+            llm_circuit.record_failure(e)
+            if attempt == LLM_MAX_RETRIES or not is_transient_llm_error(e):
+                raise
+            delay = llm_retry_delay(attempt)
+            _bump_llm_stat("retries")
+            _note_llm_retry(e, attempt, delay)
+            await asyncio.sleep(delay)
+            continue
+        llm_circuit.record_success()
+        return text
+
+
+def _stream_text_blocking(prompt: str, generation_config, loop, queue: asyncio.Queue, cancelled: threading.Event):
+    """Run a streaming model call on the current thread, forwarding chunks to `queue`"""
+    _bump_llm_stat("in_flight")
+    started = time.perf_counter()
+    try:
+        for text in llm_backend.stream(prompt, generation_config):
+            if cancelled.is_set():
+                break
+            loop.call_soon_threadsafe(queue.put_nowait, ("chunk", text))
+        _bump_llm_stat("completed")
+        inc_counter("dpr_llm_calls_total", result="completed")
+        loop.call_soon_threadsafe(queue.put_nowait, ("done", None))
+    except Exception as e:
+        _bump_llm_stat("failed")
+        inc_counter("dpr_llm_calls_total", result="failed")
+        loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+    finally:
+        _bump_llm_stat("in_flight", -1)
+        observe_stage("llm_stream", time.perf_counter() - started)
+
+
+async def _llm_stream_once(prompt: str, generation_config, timeout: float):
+    """One streaming model call holding an in-flight slot until its worker thread ends"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+    semaphore = await _acquire_llm_slot()
+    deadline = loop.time() + timeout
+    _run_in_llm_slot(loop, semaphore, _stream_text_blocking, prompt, generation_config, loop, queue, cancelled)
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                kind, payload = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                _bump_llm_stat("timeouts")
+                inc_counter("dpr_llm_calls_total", result="timeout")
+                raise TimeoutError(f"Gemini stream exceeded {timeout:.0f}s timeout")
+            if kind == "chunk":
+                yield payload
+            elif kind == "error":
+                raise payload
+            else:
+                return
+    finally:
+        cancelled.set()  # The worker stops at its next chunk and then frees the slot
+
+
+async def llm_generate_stream(prompt: str, generation_config=None, timeout: float = LLM_CALL_TIMEOUT_SECONDS):
+    """Async generator yielding Gemini output text chunks as they arrive.
+
+    Holds one in-flight slot for the whole stream; `timeout` bounds the total
+    stream duration. Closing the generator early stops reading the stream.
+    A transient error is retried only if it happens before the first chunk
+    (streams are never hedged).
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        llm_circuit.before_call()
+        yielded = False
+        try:
+            async for text in _llm_stream_once(prompt, generation_config, timeout):
+                yielded = True
+                yield text
+        except (asyncio.CancelledError, GeneratorExit):
+            llm_circuit.abandon_probe()
+            raise
+        except Exception as e:
+            llm_circuit.record_failure(e)
+            if yielded or attempt == LLM_MAX_RETRIES or not is_transient_llm_error(e):
+                raise
+            delay = llm_retry_delay(attempt)
+            _bump_llm_stat("retries")
+            _note_llm_retry(e, attempt, delay)
+            await asyncio.sleep(delay)
+            continue
+        llm_circuit.record_success()
+        return
+
+
+async def parse_json_response_async(text: str, enable_aggressive_repair: bool = True) -> Dict:
+    """
+    parse_json_response, run off the event loop. When local repair recovers
+    nothing and enable_aggressive_repair is set, the model is asked to repair
+    the output through llm_generate, so the call takes an in-flight slot.
+    """
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    outcome, parsed, error = await loop.run_in_executor(None, _parse_json_response_staged, text)
+    if outcome is None and enable_aggressive_repair:
+        print("[REPAIR] Attempting model-based repair...")
+        schema_hint = '{"keys": ["overall_score", "actionable_insights", "recommendations", "approval_recommendation", "summary"]}'
+        parsed = await attempt_model_repair(text[:15000], schema_hint)  # Limit input size
+        if parsed is not None:
+            print("[SUCCESS] Model-based repair succeeded")
+            outcome = "model_repair"
+    return _finish_json_parse(outcome, parsed, error, started)
+
+
+def llm_client_stats() -> Dict:
+    """Snapshot of LLM client load for health reporting"""
+    with _llm_stats_lock:
+        stats = dict(_llm_stats)
+    p95 = llm_call_latency.percentile(0.95)
+    stats.update({
+        "max_in_flight": LLM_MAX_IN_FLIGHT,
+        "executor_threads": LLM_EXECUTOR_THREADS,
+        "timeout_seconds": LLM_CALL_TIMEOUT_SECONDS,
+        "max_retries": LLM_MAX_RETRIES,
+        "p95_call_seconds": round(p95, 3) if p95 is not None else None,
+        "hedge_delay_seconds": llm_hedge_delay(),
+        "circuit": llm_circuit.stats(),
+    })
+    return stats
+
+# ============================================================================
+# DOCUMENT PROCESSING FUNCTIONS
+# ============================================================================
+
+_pdf_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def count_pdf_pages(file_path: str) -> int:
+    """Number of pages in a PDF (0 if it cannot be read)"""
+    try:
+        return len(PyPDF2.PdfReader(file_path).pages)
+    except Exception:
+        try:
+            with pdfplumber.open(file_path) as pdf:
+                return len(pdf.pages)
+        except Exception:
+            return 0
+
+
+def _pdf_pool_context():
+    """Never fork: the pool starts lazily while other threads may hold locks (stdout, SQLite, LLM pool)"""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["pdf_worker"])  # Also hands the server our sys.path
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _get_pdf_process_pool() -> ProcessPoolExecutor:
+    global _pdf_process_pool
+    if _pdf_process_pool is None:
+        _pdf_process_pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=_pdf_pool_context())
+    return _pdf_process_pool
+
+
+def extract_pdf_page_records(file_path: str, parallel: bool = True) -> List[tuple]:
+    """Extract (page_text, engine) for every PDF page, in page order.
+
+    Large PDFs are split into page batches that run on a process pool; small
+    PDFs (or parallel=False) are parsed in the calling process.
+    """
+    global _pdf_process_pool
+    page_count = count_pdf_pages(file_path)
+    if page_count == 0:
+        return []
+    if not parallel or PDF_EXTRACT_WORKERS <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        return extract_pdf_page_range(file_path, 0, page_count)
+
+    batch = max(1, min(PDF_PAGES_PER_TASK, -(-page_count // PDF_EXTRACT_WORKERS)))
+    ranges = [(start, min(start + batch, page_count)) for start in range(0, page_count, batch)]
+    try:
+        pool = _get_pdf_process_pool()
+        futures = [pool.submit(extract_pdf_page_range, file_path, start, end) for start, end in ranges]
+        records = []
+        for future in futures:
+            records.extend(future.result())
+        return records
+    except Exception as e:
+        print(f"[WARNING] Parallel PDF extraction failed ({e}), extracting sequentially")
+        if _pdf_process_pool is not None:
+            _pdf_process_pool.shutdown(wait=False)
+        _pdf_process_pool = None
+        return extract_pdf_page_range(file_path, 0, page_count)
+
+
+def iter_pdf_page_records(file_path: str, parallel: bool = True, page_count: Optional[int] = None):
+    """Lazily yield (page_text, engine) for every PDF page, in page order.
+
+    Page batches are extracted one at a time in-process, or all submitted to
+    the process pool up front and yielded as each batch (in order) finishes,
+    so a consumer can start on the first pages while later ones are parsed.
+    """
+    global _pdf_process_pool
+    if page_count is None:
+        page_count = count_pdf_pages(file_path)
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count)) for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    futures = []
+    if parallel and PDF_EXTRACT_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES:
+        try:
+            pool = _get_pdf_process_pool()
+            futures = [pool.submit(extract_pdf_page_range, file_path, start, end) for start, end in ranges]
+        except Exception as e:
+            print(f"[WARNING] Parallel PDF extraction failed ({e}), extracting sequentially")
+            futures = []
+    for index, (start, end) in enumerate(ranges):
+        if index < len(futures):
+            try:
+                yield from futures[index].result()
+                continue
+            except Exception as e:
+                print(f"[WARNING] Parallel PDF extraction failed ({e}), extracting sequentially")
+                for future in futures[index + 1:]:
+                    future.cancel()
+                futures = []
+                if _pdf_process_pool is not None:
+                    _pdf_process_pool.shutdown(wait=False)
+                _pdf_process_pool = None
+        yield from extract_pdf_page_range(file_path, start, end)
+
+
+def extract_pdf_pages(file_path: str, parallel: bool = True) -> List[str]:
+    """Extract the text of every PDF page, in page order"""
+    return [page_text for page_text, _ in extract_pdf_page_records(file_path, parallel)]
+
+
+def extract_text_from_pdf(file_path: str) -> str:
+    """Extract text from PDF file"""
+    return "".join(page_text + "\n" for page_text in extract_pdf_pages(file_path) if page_text)
+
+
+def extract_text_from_docx(file_path: str) -> str:
+    """Extract text from DOCX file"""
+    doc = docx.Document(file_path)
+    text = "\n".join([para.text for para in doc.paragraphs])
     
-    prompt = f"""You are a senior DPR analyst for the Ministry of Development of North Eastern Region (MDoNER), India, with 15+ years of experience in infrastructure project evaluation.
+    # Also extract from tables
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                text += "\n" + cell.text
+    return text
 
-{guidelines_section}
 
-**PROJECT DETAILS:**
-- Project Title: {structured_data.get('project_title', 'N/A')}
-- Project Type: {structured_data.get('project_type', 'N/A')}
-- Total Budget: {structured_data.get('budget', {}).get('details', 'Not specified')}
-- Project Duration: {structured_data.get('timeline', {}).get('duration', 'N/A')}
-- Location: {structured_data.get('location', 'N/A')}
-- State/Region: North Eastern Region
+@timed_stage("extract_text")
+def extract_text(file_path: str, file_extension: str) -> str:
+    """Extract text from document based on file type (served from the extraction store when possible)"""
+    return extract_document(file_path, file_extension)["text"]
 
-**COMPLETE DPR DOCUMENT TEXT:**
-{dpr_text[:20000]}
 
-CRITICAL: You MUST return ONLY valid JSON. No markdown formatting, no code blocks, no extra text.
-Ensure all strings are properly escaped, all commas are in place, and all brackets/braces are balanced.
+# ============================================================================
+# EXTRACTION STORE
+# ============================================================================
+# Persistent sidecar of extracted text keyed by the SHA-256 of the file bytes,
+# so a document that was already parsed (by any endpoint) costs one small
+# disk read instead of a full PDF/DOCX parse. Each entry also records where
+# every page starts in the text and which engine produced it.
 
-TASK: Provide an EXTREMELY DETAILED, COMPREHENSIVE analysis of this DPR. Be thorough, specific, and professional.
+_extraction_store_lock = threading.Lock()
+_extraction_store_stats = {"hits": 0, "misses": 0, "stores": 0}
+# (path, size, mtime_ns) -> SHA-256 for files hashed while they were written
+_known_content_hashes: "OrderedDict[tuple, str]" = OrderedDict()
+KNOWN_CONTENT_HASHES_MAX = 256
 
-Return analysis in this JSON format with DETAILED content in each section:
 
-{{
-    "completeness_analysis": {{
-        "score": <0-100>,
-        "missing_sections": ["list each missing section with specific names"],
-        "present_sections": ["list all sections that are present"],
-        "quality_assessment": "3-4 paragraphs analyzing the quality and depth of each section present",
-        "comments": "Detailed 4-5 paragraph assessment covering: documentation completeness, information depth, data sufficiency, formatting quality, and overall presentation standards"
-    }},
-    "budget_validation": {{
-        "is_valid": <true/false>,
-        "total_budget": "exact amount with currency",
-        "budget_breakdown": {{
-            "civil_works": "amount and percentage",
-            "equipment": "amount and percentage", 
-            "consultancy": "amount and percentage",
-            "contingency": "amount and percentage",
-            "other": "specify categories with amounts"
-        }},
-        "issues": [
-            {{
-                "severity": "low/medium/high/critical",
-                "category": "calculation/allocation/justification/documentation",
-                "description": "Very detailed description of the issue (3-4 sentences)",
-                "impact": "Explain the potential impact",
-                "recommendation": "Specific step-by-step fix"
-            }}
-        ],
-        "cost_analysis": "5-6 paragraphs analyzing: cost reasonableness, market rates comparison, allocation appropriateness, contingency adequacy, hidden costs, value for money",
-        "financial_viability": "3-4 paragraphs on sustainability, funding sources, revenue generation potential, operational costs",
-        "comments": "Comprehensive 5-7 paragraph budget assessment with specific numbers, calculations verification, and detailed recommendations"
-    }},
-    "timeline_validation": {{
-        "is_realistic": <true/false>,
-        "total_duration": "specify duration",
-        "phase_breakdown": {{
-            "pre_construction": "duration and activities",
-            "construction": "duration and activities",
-            "post_construction": "duration and activities"
-        }},
-        "critical_milestones": ["list 8-10 key milestones with expected completion times"],
-        "issues": [
-            {{
-                "issue": "Detailed description",
-                "impact": "Project impact analysis", 
-                "likelihood": "high/medium/low",
-                "mitigation": "Detailed mitigation strategy"
-            }}
-        ],
-        "seasonal_considerations": "Detailed analysis of weather, monsoon, festivals, local conditions affecting timeline",
-        "dependency_analysis": "4-5 paragraphs on dependencies, critical path, bottlenecks, parallel activities",
-        "comments": "Comprehensive 6-8 paragraph timeline analysis including feasibility, risks, optimization opportunities, buffer requirements"
-    }},
-    "technical_feasibility": {{
-        "score": <0-100>,
-        "is_feasible": <true/false>,
-        "technical_specifications": {{
-            "design_standards": "detailed analysis",
-            "material_specifications": "detailed analysis",
-            "quality_standards": "detailed analysis",
-            "safety_measures": "detailed analysis"
-        }},
-        "strengths": [
-            "Strength 1: Very detailed description with examples and evidence (3-4 sentences each)",
-            "Strength 2: ...",
-            "Strength 3: ...",
-            "Strength 4: ...",
-            "Strength 5: ..."
-        ],
-        "weaknesses": [
-            "Weakness 1: Detailed description with specific examples and impact analysis (3-4 sentences each)",
-            "Weakness 2: ...",
-            "Weakness 3: ...",
-            "Weakness 4: ..."
-        ],
-        "implementation_approach": "5-6 paragraphs covering methodology, phasing, resource mobilization, quality control, supervision",
-        "technology_assessment": "Analysis of proposed technology, alternatives, appropriateness for region",
-        "comments": "Comprehensive 7-10 paragraph technical assessment covering all aspects: design, specifications, implementation, quality, innovation, appropriateness for NE region"
-    }},
-    "risk_assessment": {{
-        "overall_risk_level": "low/medium/high/critical",
-        "overall_risk_score": <0-100>,
-        "risk_matrix_summary": "2-3 paragraphs explaining the overall risk profile",
-        "financial_risks": [
-            {{
-                "risk": "Detailed risk description with context and examples",
-                "severity": "low/medium/high/critical",
-                "probability": "low/medium/high",
-                "impact_analysis": "Detailed multi-sentence impact analysis",
-                "financial_impact": "Estimated cost impact",
-                "mitigation": "Detailed 4-5 step mitigation strategy",
-                "contingency_plan": "Alternative approach if risk materializes"
-            }},
-            {{
-                "risk": "Cost overrun due to material price fluctuation...",
-                "severity": "high",
-                "probability": "medium",
-                "impact_analysis": "...",
-                "financial_impact": "15-20% budget increase",
-                "mitigation": "...",
-                "contingency_plan": "..."
-            }}
-        ],
-        "timeline_risks": [
-            {{
-                "risk": "Detailed description",
-                "severity": "...",
-                "probability": "...",
-                "delay_impact": "months/years",
-                "mitigation": "Detailed strategy",
-                "acceleration_options": "Fast-tracking possibilities"
-            }}
-        ],
-        "environmental_risks": [
-            {{
-                "risk": "Detailed environmental risk with scientific basis",
-                "severity": "...",
-                "ecological_impact": "Detailed impact on ecosystem",
-                "compliance_requirement": "Specific regulations and clearances",
-                "mitigation": "Detailed environmental management plan",
-                "monitoring_plan": "How to track and manage"
-            }}
-        ],
-        "resource_risks": [
-            {{
-                "risk": "Specific resource availability issue",
-                "severity": "...",
-                "affected_resources": "manpower/materials/equipment",
-                "availability_analysis": "Market analysis and sourcing challenges",
-                "mitigation": "Detailed procurement and mobilization strategy",
-                "alternatives": "Backup resource options"
-            }}
-        ],
-        "social_risks": [
-            {{
-                "risk": "Community/social challenge",
-                "severity": "...",
-                "stakeholders_affected": "list",
-                "mitigation": "Community engagement plan",
-                "benefit_sharing": "How project benefits locals"
-            }}
-        ],
-        "comments": "Comprehensive 8-10 paragraph risk analysis covering: risk identification methodology, inter-dependencies between risks, cumulative impact, risk prioritization, overall risk management strategy, monitoring and control mechanisms"
-    }},
-    "compliance_check": {{
-        "is_compliant": <true/false>,
-        "overall_compliance_score": <0-100>,
-        "mdoner_guidelines": {{
-            "compliant_aspects": ["detailed list with explanations"],
-            "non_compliant_aspects": ["detailed list with explanations"],
-            "gaps": ["specific gaps with impact"]
-        }},
-        "statutory_clearances": {{
-            "environmental_clearance": "status and requirements",
-            "forest_clearance": "status and requirements",
-            "wildlife_clearance": "status and requirements",
-            "other_clearances": ["list all with status"]
-        }},
-        "guideline_gaps": [
-            {{
-                "guideline": "Specific guideline reference",
-                "current_status": "What is present",
-                "gap": "Detailed gap description",
-                "impact": "Impact of non-compliance",
-                "remediation": "Detailed steps to achieve compliance",
-                "timeline": "Time needed to fix"
-            }}
-        ],
-        "documentation_quality": "4-5 paragraphs on document quality, completeness, clarity, professionalism",
-        "comments": "Comprehensive 6-8 paragraph compliance assessment with specific references to guidelines, detailed gap analysis, and actionable remediation plan"
-    }},
-    "stakeholder_analysis": {{
-        "beneficiaries": "Detailed analysis of who benefits and how",
-        "affected_parties": "Detailed analysis of impacted communities",
-        "consultation_status": "Description of consultations done",
-        "social_impact": "5-6 paragraphs on social benefits, displacement, employment, equity"
-    }},
-    "sustainability_assessment": {{
-        "environmental_sustainability": "4-5 paragraphs on environmental impact, conservation, green practices",
-        "financial_sustainability": "3-4 paragraphs on long-term financial viability, O&M costs, revenue",
-        "social_sustainability": "3-4 paragraphs on social acceptance, community ownership, equity",
-        "institutional_sustainability": "Analysis of governance, capacity, maintenance planning"
-    }},
-    "actionable_insights": [
-        "PRIORITY 1 - [Category]: Extremely detailed recommendation with specific steps, responsible parties, timeline, expected outcome, and success metrics (5-7 sentences)",
-        "PRIORITY 2 - [Category]: Extremely detailed recommendation...",
-        "PRIORITY 3 - [Category]: Extremely detailed recommendation...",
-        "PRIORITY 4 - [Category]: Extremely detailed recommendation...",
-        "PRIORITY 5 - [Category]: Extremely detailed recommendation...",
-        "PRIORITY 6 - [Category]: Extremely detailed recommendation...",
-        "PRIORITY 7 - [Category]: Extremely detailed recommendation...",
-        "PRIORITY 8 - [Category]: Extremely detailed recommendation..."
-    ],
-    "recommendations": [
-        "Detailed recommendation 1 with rationale and implementation steps",
-        "Detailed recommendation 2...",
-        "Detailed recommendation 3...",
-        "Detailed recommendation 4...",
-        "Detailed recommendation 5..."
-    ],
-    "overall_score": <0-100>,
-    "scoring_breakdown": {{
-        "completeness": <0-100>,
-        "technical_quality": <0-100>,
-        "financial_soundness": <0-100>,
-        "compliance": <0-100>,
-        "feasibility": <0-100>,
-        "risk_management": <0-100>
-    }},
-    "approval_recommendation": {{
-        "decision": "APPROVE/APPROVE_WITH_CONDITIONS/REVISE/REJECT",
-        "confidence": <0-100>,
-        "reasoning": "Comprehensive 6-8 paragraph reasoning covering all aspects: strengths that support decision, weaknesses that concern, conditions for approval, revision requirements, timeline for resubmission, expected improvements",
-        "conditions": ["Specific condition 1 if APPROVE_WITH_CONDITIONS", "Specific condition 2..."],
-        "revision_requirements": ["Specific requirement 1 if REVISE", "Specific requirement 2..."],
-        "approval_process": "Next steps and timeline for approval"
-    }},
-    "summary": "Comprehensive executive summary in 8-10 sentences covering: project overview, key findings, major strengths, critical concerns, risk level, compliance status, recommendation, and expected impact",
-    "key_highlights": {{
-        "major_strengths": ["strength 1 with detail", "strength 2...", "strength 3..."],
-        "critical_concerns": ["concern 1 with detail", "concern 2...", "concern 3..."],
-        "must_address_immediately": ["urgent item 1", "urgent item 2", "urgent item 3"]
-    }}
-}}
+def _file_identity(file_path: str) -> tuple:
+    stat_result = os.stat(file_path)
+    return os.path.abspath(file_path), stat_result.st_size, stat_result.st_mtime_ns
 
-CRITICAL: Provide DETAILED, COMPREHENSIVE, PROFESSIONAL analysis. Each section should have substantial content with specific examples, numbers, analysis, and recommendations. This is for ministerial review - be thorough!
 
-CRITICAL: Provide DETAILED, COMPREHENSIVE, PROFESSIONAL analysis. Each section should have substantial content with specific examples, numbers, analysis, and recommendations. This is for ministerial review - be thorough!
+def remember_content_hash(file_path: str, content_hash: str):
+    """Record the hash of a file that was just written so it is never re-read to hash it"""
+    with _extraction_store_lock:
+        _known_content_hashes[_file_identity(file_path)] = content_hash
+        while len(_known_content_hashes) > KNOWN_CONTENT_HASHES_MAX:
+            _known_content_hashes.popitem(last=False)
 
-Return ONLY valid JSON, no markdown formatting, no code blocks.
-"""
-    
+
+def file_content_hash(file_path: str) -> str:
+    """SHA-256 of a file's bytes, read in 1 MB blocks (free for files hashed on upload)"""
+    with _extraction_store_lock:
+        known = _known_content_hashes.get(_file_identity(file_path))
+    if known is not None:
+        return known
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extraction_store_path(content_hash: str) -> str:
+    return os.path.join(EXTRACTION_STORE_DIR, f"{content_hash}.json")
+
+
+def load_stored_extraction(content_hash: str) -> Optional[Dict]:
+    """The stored extraction for a content hash, or None (missing or from an older extractor)"""
     try:
-        print("[DETAILED-ANALYSIS] Running comprehensive detailed analysis...")
-        response = gemini_model.generate_content(
-            prompt,
-            generation_config=genai.GenerationConfig(
-                temperature=0.3,  # Lower temperature for more consistent JSON
-                top_p=0.85,
-                top_k=40,
-                max_output_tokens=8192,  # Increased for detailed content
-                response_mime_type="application/json",  # Force JSON output
-            )
-        )
+        with open(_extraction_store_path(content_hash), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return entry if entry.get("extractor_version") == EXTRACTOR_VERSION else None
+
+
+def store_extraction(content_hash: str, file_extension: str, entry: Dict) -> Dict:
+    """Add the store metadata to a fresh extraction and write it (atomically) to the store"""
+    entry.update({
+        "content_hash": content_hash,
+        "extractor_version": EXTRACTOR_VERSION,
+        "file_type": file_extension,
+        "page_count": len(entry["page_offsets"]),
+        "characters": len(entry["text"]),
+        "created_at": datetime.now().isoformat(),
+    })
+    store_path = _extraction_store_path(content_hash)
+    try:
+        os.makedirs(EXTRACTION_STORE_DIR, exist_ok=True)
+        tmp_path = f"{store_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, store_path)
+        with _extraction_store_lock:
+            _extraction_store_stats["stores"] += 1
+    except OSError as e:
+        print(f"[EXTRACTION-STORE] Could not store {content_hash[:12]}: {e}")
+    entry["from_store"] = False
+    return entry
+
+
+def assemble_pdf_extraction(records: List[tuple]) -> Dict:
+    """Join (page_text, engine) records into text with page offsets and engine"""
+    parts, page_offsets, offset = [], [], 0
+    for page_text, _ in records:
+        page_offsets.append(offset)
+        if page_text:
+            parts.append(page_text + "\n")
+            offset += len(page_text) + 1
+    engines = sorted({engine for _, engine in records})
+    return {"text": "".join(parts), "page_offsets": page_offsets, "engine": "+".join(engines) or "none"}
+
+
+def _run_extraction(file_path: str, file_extension: str) -> Dict:
+    """Parse a document and return its text with page offsets and engine"""
+    if file_extension == 'pdf':
+        return assemble_pdf_extraction(extract_pdf_page_records(file_path))
+    elif file_extension in ['docx', 'doc']:
+        return {"text": extract_text_from_docx(file_path), "page_offsets": [0], "engine": "python-docx"}
+    else:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+
+def extract_document(file_path: str, file_extension: str) -> Dict:
+    """Extract a document, consulting the extraction store first.
+
+    Returns a dict with text, page_offsets, engine, content_hash and
+    from_store (True when no parsing was needed).
+    """
+    file_extension = file_extension.lower().replace('.', '')
+    if file_extension not in ['pdf', 'docx', 'doc']:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+    content_hash = file_content_hash(file_path)
+    entry = load_stored_extraction(content_hash)
+    if entry is not None:
+        with _extraction_store_lock:
+            _extraction_store_stats["hits"] += 1
+        inc_counter("dpr_cache_requests_total", cache="extraction", outcome="hit")
+        print(f"[EXTRACTION-STORE] Hit for {content_hash[:12]} ({entry.get('engine')})")
+        entry["from_store"] = True
+        return entry
+
+    with _extraction_store_lock:
+        _extraction_store_stats["misses"] += 1
+    inc_counter("dpr_cache_requests_total", cache="extraction", outcome="miss")
+    return store_extraction(content_hash, file_extension, _run_extraction(file_path, file_extension))
+
+
+def extraction_store_stats() -> Dict:
+    """Extraction store counters for health reporting"""
+    with _extraction_store_lock:
+        return dict(_extraction_store_stats)
 
-        print(f"[DEBUG] Response length: {len(response.text)} characters")
 
+# ============================================================================
+# UPLOAD INGESTION
+# ============================================================================
+# Uploads are copied to disk in UPLOAD_CHUNK_BYTES blocks and hashed in the
+# same pass, so the extraction store and single-flight keys never read the
+# file again. DPR uploads are stored under their content hash: the same
+# document uploaded twice occupies one file. Anything over
+# MAX_UPLOAD_SIZE_MB is refused with 413, first by UploadSizeLimitMiddleware
+# before the multipart body is parsed (see FASTAPI APPLICATION), then
+# exactly here on the file itself.
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(413, f"Upload exceeds the {MAX_UPLOAD_SIZE_MB} MB limit")
+
+
+def _write_upload_blocking(source, directory: str, file_extension: str, prefix: str, filename: Optional[str]) -> Dict:
+    os.makedirs(directory, exist_ok=True)
+    part_path = os.path.join(directory, f".upload_{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(part_path, "wb") as out:
+            for block in iter(lambda: source.read(UPLOAD_CHUNK_BYTES), b""):
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    inc_counter("dpr_uploads_rejected_total", limit="file")
+                    raise upload_too_large()
+                digest.update(block)
+                out.write(block)
+        content_hash = digest.hexdigest()
+        stored_filename = filename or f"{prefix}_{content_hash}.{file_extension}"
+        file_path = f"{directory}/{stored_filename}"
+        if filename is None and os.path.exists(file_path):
+            # Same bytes are already stored - keep the existing file, marked as just uploaded
+            os.remove(part_path)
+            os.utime(file_path)
+        else:
+            os.replace(part_path, file_path)
+    except BaseException:
         try:
-            analysis = parse_json_response(response.text)
-            print(f"[COMPLETE] Detailed analysis done. Score: {analysis.get('overall_score', 'N/A')}")
-            return analysis
-        except json.JSONDecodeError as primary_err:
-            print(f"[RETRY] Primary parse failed: {primary_err}. Attempting model-based repair...")
-            # Provide compact schema hint (avoid huge prompt duplication)
-            schema_hint = '{"keys": ["completeness_analysis","budget_validation","timeline_validation","technical_feasibility","risk_assessment","compliance_check","stakeholder_analysis","sustainability_assessment","actionable_insights","recommendations","overall_score","scoring_breakdown","approval_recommendation","summary","key_highlights"]}'
-            repaired = attempt_model_repair(response.text, schema_hint)
-            if repaired is not None:
-                print("[REPAIR] Model-based repair succeeded.")
-                return repaired
-            else:
-                print("[REPAIR] Model-based repair failed – returning fallback.")
-                raise primary_err
-    except Exception as e:
-        print(f"[ERROR] Analysis error: {e}")
-        print(f"[ERROR] Full error details: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return {
-            "error": str(e),
-            "overall_score": 50,
-            "actionable_insights": ["Manual review required due to processing error"],
-            "recommendations": ["System encountered an error - manual expert review is required"],
-            "approval_recommendation": {
-                "decision": "REVISE",
-                "confidence": 0,
-                "reasoning": "Analysis could not be completed due to technical error. Please ensure document is properly formatted and try again, or conduct manual review."
-            },
-            "summary": "Analysis encountered a technical error and could not be completed. Manual review by expert assessor is recommended."
-        }
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    remember_content_hash(file_path, content_hash)
+    return {"file_path": file_path, "stored_filename": stored_filename, "content_hash": content_hash, "size": size}
 
 
-async def analyze_dpr_with_gemini(dpr_text: str, structured_data: Dict) -> Dict:
-    """Comprehensive DPR analysis using Gemini AI"""
-    
-    guidelines_section = ""
-    if guidelines_context:
-        guidelines_section = f"""
-**MDONER GUIDELINES CONTEXT:**
-{guidelines_context[:5000]}
-"""
-    
-    prompt = f"""
-You are an expert DPR (Detailed Project Report) analyst for the Ministry of Development of North Eastern Region (MDoNER), India.
+async def ingest_upload(
+    file: UploadFile,
+    file_extension: str,
+    directory: str = "uploads",
+    prefix: str = "dpr",
+    filename: Optional[str] = None
+) -> Dict:
+    """
+    Stream an upload to `directory`, hashing it on the way.
 
-{guidelines_section}
+    The file is stored as `{prefix}_{sha256}.{file_extension}` unless an
+    explicit `filename` is given. Returns file_path, stored_filename,
+    content_hash and size; raises HTTPException(413) as soon as the upload
+    exceeds MAX_UPLOAD_SIZE_MB (nothing is left on disk).
+    """
+    loop = asyncio.get_running_loop()
+    with stage_timer("upload_save"):
+        return await loop.run_in_executor(
+            None, _write_upload_blocking, file.file, directory, file_extension, prefix, filename
+        )
 
-**PROJECT INFORMATION:**
-- Project Title: {structured_data.get('project_title', 'N/A')}
-- Project Type: {structured_data.get('project_type', 'N/A')}
-- Budget: {structured_data.get('budget', {}).get('details', 'Not specified')}
-- Timeline: {structured_data.get('timeline', {}).get('duration', 'N/A')}
-- Location: {structured_data.get('location', 'N/A')}
 
-**DPR TEXT (excerpt):**
-{dpr_text[:15000]}
+# ============================================================================
+# FIELD EXTRACTION ENGINE
+# ============================================================================
+# All field patterns are compiled once at import. A single anchor scan over
+# the text finds every position where a field keyword (or a number) starts;
+# each candidate pattern is then tried only at those positions and only
+# within a bounded window, so extraction is linear in the document size and
+# no pattern can backtrack across the whole text.
+
+FIELD_VALUE_WINDOW = 2000          # Max characters a field value may span
+BUDGET_MATCH_WINDOW = 200          # Max characters a budget expression may span
+
+_FIELD_VALUE_TAIL = r'\s*[:\-]?\s*(.+?)(?:\n\n|\r\n\r\n|(?:\n(?=[A-Z])|$))'
+
+# (field, keyword) in priority order - the first keyword found wins for a field
+FIELD_KEYWORDS = [
+    ("project_title", "Project Title"),
+    ("project_title", "Title"),
+    ("project_title", "Project Name"),
+    ("location", "Location"),
+    ("location", "Project Location"),
+    ("location", "Site"),
+    ("implementing_agency", "Implementing Agency"),
+    ("implementing_agency", "Nodal Agency"),
+]
+
+# (pattern, unit) in priority order - the first pattern that yields a positive amount wins
+BUDGET_PATTERNS = [
+    # Pattern 1: "Total 1,940 Lakhs (n19.4 Cr)" - dual format
+    (r'Total\s+([\d,]+)\s+Lakhs?\s*\(n?([\d\.]+)\s+Cr', 'dual'),
+    # Pattern 2: "Estimated Cost: Rs. 245.50 Crores"
+    (r'(?:Estimated|Total|Project)\s+Cost[\s:]*Rs\.?\s*([\d\.]+)\s+(?:Crores?|Cr)', 'crores'),
+    # Pattern 3: "Project Cost: n18.75 Crores"
+    (r'Project Cost:\s*n?([\d\.]+)\s+Crores?', 'crores'),
+    # Pattern 4: "Budget: Rs. 114.93 Crores"
+    (r'Budget[\s:]*Rs\.?\s*([\d\.]+)\s+(?:Crores?|Cr)', 'crores'),
+    # Pattern 5: Generic Lakhs format
+    (r'(?:Total|Budget|Cost)[\s:]*n?\s*([\d,]+)\s+Lakhs?', 'lakhs'),
+    # Pattern 6: Generic Crores format
+    (r'(?:Total|Budget|Cost)[\s:]*n?\s*([\d\.]+)\s+(?:Crores?|Cr)', 'crores'),
+    # Pattern 7: Simple "Rs. X Cr" anywhere in text
+    (r'Rs\.?\s*([\d\.]+)\s+Cr(?:ores?)?', 'crores'),
+    # Pattern 8: Just number with Crores
+    (r'(\d+(?:\.\d+)?)\s+Crores?', 'crores'),
+]
+
+DURATION_PATTERN = r'(?:Duration|Timeline|Project Duration)[:\s]+(\d+)\s*(months?|years?)'
+
+
+def _pattern_anchor(pattern: str) -> List[str]:
+    """Lower-case words a pattern can start with ("#num" for a leading number)"""
+    if pattern.startswith('(?:'):
+        return sorted({word.split()[0].lower() for word in pattern[3:pattern.index(')')].split('|')})
+    if pattern.startswith('(\\d'):
+        return ["#num"]
+    return [re.match(r'[A-Za-z]+', pattern).group(0).lower()]
+
+
+def _compile_field_rules() -> Dict[str, List[tuple]]:
+    """Map each anchor word to the (kind, rule_index, compiled_pattern, window) rules starting with it"""
+    rules = {}
+
+    def add(kind, index, pattern, flags, window):
+        compiled = re.compile(pattern, flags)
+        for anchor in _pattern_anchor(pattern):
+            rules.setdefault(anchor, []).append((kind, index, compiled, window))
+
+    for index, (_, keyword) in enumerate(FIELD_KEYWORDS):
+        add("field", index, re.escape(keyword) + _FIELD_VALUE_TAIL, re.IGNORECASE | re.DOTALL, FIELD_VALUE_WINDOW)
+    for index, (pattern, _) in enumerate(BUDGET_PATTERNS):
+        add("budget", index, pattern, re.IGNORECASE, BUDGET_MATCH_WINDOW)
+    add("duration", 0, DURATION_PATTERN, re.IGNORECASE, BUDGET_MATCH_WINDOW)
+    return rules
+
+
+_FIELD_RULES = _compile_field_rules()
+# Zero-width lookahead so overlapping anchors ("CrSite") are all reported. It
+# runs case-sensitively over the lower-cased text, which is about twice as fast
+# as an IGNORECASE alternation.
+_FIELD_ANCHOR_SOURCE = r'(?=(' + '|'.join(re.escape(a) for a in sorted(_FIELD_RULES) if a != "#num") + r'|(?<!\d)\d))'
+_FIELD_ANCHOR_PATTERN = re.compile(_FIELD_ANCHOR_SOURCE)
+_FIELD_ANCHOR_PATTERN_IGNORECASE = re.compile(_FIELD_ANCHOR_SOURCE, re.IGNORECASE)
+_FIELD_RULE_COUNT = len(FIELD_KEYWORDS) + len(BUDGET_PATTERNS) + 1
+
+
+def scan_dpr_fields(text: str, text_lower: Optional[str] = None) -> Dict:
+    """Single pass over `text` returning the first match of every field rule.
+
+    Result maps ("field", i) / ("budget", i) / ("duration", 0) to the match
+    object of the earliest occurrence of that rule.
+    """
+    if text_lower is None:
+        text_lower = text.lower()
+    if len(text_lower) == len(text):
+        anchors = _FIELD_ANCHOR_PATTERN.finditer(text_lower)
+    else:
+        # Lower-casing changed the length (rare Unicode), so offsets would not line up
+        anchors = _FIELD_ANCHOR_PATTERN_IGNORECASE.finditer(text)
+    found = {}
+    for anchor in anchors:
+        token = anchor.group(1)
+        rules = _FIELD_RULES.get("#num" if token[0].isdigit() else token.lower(), ())
+        pos = anchor.start()
+        for kind, index, compiled, window in rules:
+            if (kind, index) in found:
+                continue
+            match = compiled.match(text, pos, min(len(text), pos + window))
+            if match:
+                found[(kind, index)] = match
+        if len(found) == _FIELD_RULE_COUNT:
+            break
+    return found
 
-Analyze this DPR comprehensively and provide assessment in JSON format:
 
-{{
-    "completeness_analysis": {{
-        "score": <0-100>,
-        "missing_sections": [list of missing sections],
-        "comments": "Overall completeness assessment"
-    }},
-    "budget_validation": {{
-        "is_valid": <true/false>,
-        "issues": [list of budget issues with severity and description],
-        "comments": "Budget assessment"
-    }},
-    "timeline_validation": {{
-        "is_realistic": <true/false>,
-        "issues": [list of timeline issues],
-        "comments": "Timeline assessment"
-    }},
-    "technical_feasibility": {{
-        "score": <0-100>,
-        "is_feasible": <true/false>,
-        "strengths": [list],
-        "weaknesses": [list],
-        "comments": "Technical assessment"
-    }},
-    "risk_assessment": {{
-        "overall_risk_level": "low/medium/high/critical",
-        "financial_risks": [list of risks with severity],
-        "timeline_risks": [list of risks],
-        "environmental_risks": [list of risks],
-        "resource_risks": [list of risks],
-        "comments": "Risk assessment"
-    }},
-    "compliance_check": {{
-        "is_compliant": <true/false>,
-        "guideline_gaps": [list of gaps],
-        "comments": "Compliance assessment"
-    }},
-    "recommendations": ["list of actionable recommendations"],
-    "overall_score": <0-100>,
-    "approval_recommendation": {{
-        "decision": "APPROVE/REVISE/REJECT",
-        "confidence": <0-100>,
-        "reasoning": "Detailed reasoning"
-    }},
-    "summary": "Executive summary in 2-3 sentences"
-}}
+def _clean_field_value(value: str) -> str:
+    """Collapse whitespace and cap a field value at ~200 characters"""
+    value = ' '.join(value.strip().split())
+    # Limit length but try to complete the sentence
+    if len(value) > 200:
+        value = value[:200].rsplit(' ', 1)[0] + '...'
+    return value
 
-Return ONLY valid JSON, no markdown.
-"""
+
+def _parse_budget_match(match, unit_type: str) -> Dict:
+    """Convert a budget pattern match into the structured budget dict"""
+    budget = {"total": 0, "currency": "INR", "details": "Not Found"}
+    if unit_type == 'dual':
+        # "Total 1,940 Lakhs (n19.4 Cr)" format
+        lakhs = float(match.group(1).replace(',', '').strip())
+        crores = float(match.group(2).strip())
+        budget["total"] = crores * 10000000  # Use Crores as more accurate
+        budget["details"] = f"{lakhs:,.0f} Lakhs (Rs. {crores} Crores)"
+    elif unit_type == 'lakhs':
+        amount = float(match.group(1).replace(',', '').strip())
+        budget["total"] = amount * 100000  # 1 Lakh = 1,00,000
+        budget["details"] = f"{amount:,.0f} Lakhs (Rs. {amount/10:.2f} Crores)"
+    elif unit_type == 'crores':
+        amount = float(match.group(1).replace(',', '').strip())
+        budget["total"] = amount * 10000000  # 1 Crore = 1,00,00,000
+        budget["details"] = f"Rs. {amount} Crores"
+    return budget
+
+
+@timed_stage("structure_dpr_data")
+def structure_dpr_data(text: str) -> Dict:
+    """Extract and structure key information from DPR text"""
     
-    try:
-        print("[ANALYZING] Analyzing DPR with Gemini AI...")
-        response = gemini_model.generate_content(prompt)
-        analysis = parse_json_response(response.text)
-        print(f"[COMPLETE] Analysis complete. Score: {analysis.get('overall_score', 'N/A')}")
-        return analysis
-    except Exception as e:
-        print(f"[ERROR] Analysis error: {e}")
-        return {
-            "error": str(e),
-            "overall_score": 50,
-            "recommendations": ["Manual review required due to error"],
-            "approval_recommendation": {"decision": "REVISE", "confidence": 0, "reasoning": "Analysis error"}
-        }
+    text_lower = text.lower()
+    found = scan_dpr_fields(text, text_lower)
+    
+    # Text fields - first keyword (in priority order) that occurs anywhere wins
+    fields = {}
+    for index, (field, _) in enumerate(FIELD_KEYWORDS):
+        if field not in fields and ("field", index) in found:
+            fields[field] = _clean_field_value(found[("field", index)].group(1))
+    
+    # Extract budget - comprehensive pattern matching
+    budget = {"total": 0, "currency": "INR", "details": "Not Found"}
+    for index, (pattern, unit_type) in enumerate(BUDGET_PATTERNS):
+        match = found.get(("budget", index))
+        if match:
+            try:
+                candidate = _parse_budget_match(match, unit_type)
+                # If we found a valid budget, break
+                if candidate["total"] > 0:
+                    budget = candidate
+                    print(f"[DEBUG] Budget extracted: {budget['details']} (pattern: {pattern})")
+                    break
+            except (ValueError, IndexError) as e:
+                print(f"[DEBUG] Budget pattern matched but parsing failed: {e}")
+                continue
+    
+    if budget["total"] == 0:
+        print(f"[DEBUG] No budget found in text. First 500 chars: {text[:500]}")
+    
+    # Extract timeline
+    timeline = {"duration": "Not specified", "duration_months": 0}
+    duration_match = found.get(("duration", 0))
+    if duration_match:
+        value = int(duration_match.group(1))
+        unit = duration_match.group(2).lower()
+        if 'year' in unit:
+            timeline["duration_months"] = value * 12
+            timeline["duration"] = f"{value} years"
+        else:
+            timeline["duration_months"] = value
+            timeline["duration"] = f"{value} months"
+    
+    # Identify project type - prioritize more specific types first
+    project_type = 'general'
+    project_types = {
+        'it_park': ['it park', 'information technology park', 'tech park', 'technology park', 'software park', 'ites'],
+        'hospital': ['hospital', 'health center', 'medical center', 'health care'],
+        'school': ['school', 'college', 'university', 'education', 'institute'],
+        'bridge': ['bridge', 'flyover', 'overpass'],
+        'water': ['water supply', 'irrigation', 'water treatment', 'reservoir'],
+        'road': ['road', 'highway', 'expressway', 'connectivity'],
+    }
+    for ptype, keywords in project_types.items():
+        if any(kw in text_lower for kw in keywords):
+            project_type = ptype
+            break
+    
+    structured_data = {
+        "project_title": fields.get("project_title", "Not Found"),
+        "project_type": project_type,
+        "budget": budget,
+        "timeline": timeline,
+        "location": fields.get("location", "Not Found"),
+        "implementing_agency": fields.get("implementing_agency", "Not Found"),
+        "word_count": len(text.split()),
+        "sections": build_section_index(text),
+    }
+    
+    # Debug logging
+    print(f"[DEBUG] Structured DPR Data:")
+    print(f"  - Title: {structured_data['project_title']}")
+    print(f"  - Location: {structured_data['location']}")
+    print(f"  - Budget: {structured_data['budget']['details']}")
+    print(f"  - Duration: {structured_data['timeline']['duration']}")
+    print(f"  - Sections: {len(structured_data['sections'])}")
+    
+    return structured_data
 
 
-async def generate_insights(analysis: Dict) -> List[str]:
-    """Generate actionable insights from analysis"""
+# ============================================================================
+# DPR SECTION INDEX
+# ============================================================================
+# Headings are detected once per document. Two kinds count: numbered headings
+# in capitals or title case ("3. PROJECT COST ESTIMATES", "3.2 Funding
+# Mechanism"), and short capitalised or non-Latin lines framed by separator
+# rules. Each heading gets character offsets and topic tags. Prompts then
+# slice the sections they need instead of a fixed prefix of the document.
+
+DPR_SECTION_HEAD_CHARS = 1500    # Title-page characters kept ahead of sliced sections
+
+# Sections each focused prompt reads
+PROMPT_SECTION_TOPICS = {
+    "risk": ("risk", "environment", "social", "implementation_schedule", "cost_estimate", "funding"),
+    "feasibility": ("executive_summary", "background", "technical", "cost_estimate", "funding", "economic_analysis",
+                    "implementation_schedule", "risk", "institutional", "environment", "social"),
+}
+
+DPR_SECTION_TOPICS = {
+    "executive_summary": ["executive summary", "summary", "सारांश"],
+    "background": ["background", "introduction", "justification", "need for", "objective", "पृष्ठभूमि", "परिचय", "औचित्य", "उद्देश्य"],
+    "technical": ["technical", "design", "specification", "scope", "engineering", "structural", "तकनीकी", "डिजाइन", "विनिर्देश", "दायरा"],
+    "cost_estimate": ["cost", "budget", "estimate", "financial", "boq", "bill of quantities", "लागत", "बजट", "वित्तीय"],
+    "funding": ["funding", "fund", "financing", "share", "वित्त पोषण", "वित्तपोषण", "निधि"],
+    "economic_analysis": ["economic", "viability", "benefit", "bcr", "irr", "आर्थिक", "लाभ"],
+    "implementation_schedule": ["schedule", "timeline", "time frame", "milestone", "phasing", "critical path", "अनुसूची", "समय"],
+    "environment": ["environment", "eia", "ecolog", "पर्यावरण"],
+    "social": ["social", "resettlement", "rehabilitation", "land", "stakeholder", "सामाजिक", "पुनर्वास", "भूमि", "हितधारक"],
+    "risk": ["risk", "जोखिम"],
+    "institutional": ["agency", "institutional", "organisation", "organization", "implementation arrangement", "एजेंसी", "संस्थागत"],
+    "clearances": ["clearance", "approval", "statutory", "legal", "regulatory", "noc", "मंजूरी", "स्वीकृति", "वैधानिक"],
+    "operation_maintenance": ["operation", "maintenance", "o&m", "संचालन", "रखरखाव"],
+    "procurement": ["procurement", "tender", "contract", "खरीद", "निविदा"],
+    "monitoring": ["quality", "monitoring", "गुणवत्ता", "निगरानी"],
+    "conclusion": ["conclusion", "recommendation", "निष्कर्ष", "सिफारिश"],
+}
+_DPR_SECTION_TOPIC_PATTERNS = {
+    topic: re.compile(r'(?<!\w)(?:' + "|".join(re.escape(k) for k in keywords) + r')')
+    for topic, keywords in DPR_SECTION_TOPICS.items()
+}
+_NUMBERED_HEADING_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)\.?[ \t]+([^\n|]{3,80}?)[ \t]*:?[ \t]*$', re.MULTILINE)
+_UNNUMBERED_HEADING_PATTERN = re.compile(r'^([^\s\d=\-_*|][^\n|:.]{2,60}?)[ \t]*:?[ \t]*$', re.MULTILINE)
+_SEPARATOR_RULE_PATTERN = re.compile(r'^[ \t]*[=\-_*#]{5,}[ \t]*$')
+_MINOR_TITLE_WORDS = frozenset("a an and as at by for from in of on or the to with vs".split())
+
+
+def _is_heading_title(title: str) -> bool:
+    """Capitals, title case, or a non-Latin script; never a sentence"""
+    if title.endswith(('.', ',', ';')) or len(title.split()) > 12:
+        return False
+    latin = [c for c in title if c.isascii() and c.isalpha()]
+    if not latin:
+        return any(c.isalpha() for c in title)
+    if sum(c.isupper() for c in latin) >= 0.8 * len(latin):
+        return True
+    words = [w for w in re.findall(r"[A-Za-z][\w'&-]*", title) if w.lower() not in _MINOR_TITLE_WORDS]
+    return bool(words) and all(w[0].isupper() for w in words)
+
+
+def section_topics(title: str) -> List[str]:
+    """Topic tags for a heading title"""
+    lowered = title.lower()
+    return [topic for topic, pattern in _DPR_SECTION_TOPIC_PATTERNS.items() if pattern.search(lowered)]
+
+
+def build_section_index(text: str) -> List[Dict]:
+    """
+    Headings in document order as dicts with title, number, level, start, end
+    and topics. A section runs until the next heading of the same or a higher
+    level. Chapter numbers must increase and sub-section numbers must sit under
+    the current chapter, which keeps numbered list items out of the index.
+    """
+    lines = text.split("\n")
+    offsets, offset = [], 0
+    for line in lines:
+        offsets.append(offset)
+        offset += len(line) + 1
+    # Nearest non-blank line before / after each line, for "framed by separator rules"
+    previous, last = [], ""
+    for line in lines:
+        previous.append(last)
+        if line.strip():
+            last = line
+    following, last = [""] * len(lines), ""
+    for index in range(len(lines) - 1, -1, -1):
+        following[index] = last
+        if lines[index].strip():
+            last = lines[index]
     
-    # Extract key information for context
-    score = analysis.get('overall_score', 0)
-    decision = analysis.get('approval_recommendation', {}).get('decision', 'REVISE')
+    sections, chapter = [], None
+    for index, line in enumerate(lines):
+        if not line or line[0].isspace():
+            continue
+        framed = bool(_SEPARATOR_RULE_PATTERN.match(previous[index]) or _SEPARATOR_RULE_PATTERN.match(following[index]))
+        numbered = _NUMBERED_HEADING_PATTERN.match(line)
+        if numbered and _is_heading_title(numbered.group(2)):
+            number, title = numbered.group(1), numbered.group(2).strip()
+            parts = [int(part) for part in number.split(".")]
+            level = len(parts)
+            if level == 1 and chapter is not None and parts[0] <= chapter and not framed:
+                continue
+            if level > 1 and parts[0] != chapter:
+                continue
+            if level == 1:
+                chapter = parts[0]
+        else:
+            plain = _UNNUMBERED_HEADING_PATTERN.match(line)
+            if not plain or not plain.group(1)[0].isalpha() or not _is_heading_title(plain.group(1)):
+                continue
+            number, title = "", plain.group(1).strip()
+            latin = [c for c in title if c.isascii() and c.isalpha()]
+            if latin and not all(c.isupper() for c in latin):
+                continue  # Unnumbered title-case lines are too often ordinary labels
+            if not latin and not framed:
+                continue  # Without capitals, only a framed line is recognisably a heading
+            # Framed by separator rules it is a chapter; otherwise a minor heading inside one
+            level = 1 if framed else 9
+        sections.append({
+            "title": title, "number": number, "level": level,
+            "start": offsets[index], "end": len(text), "topics": section_topics(title),
+        })
     
-    prompt = f"""
-Based on this DPR analysis (Score: {score}/100, Decision: {decision}), generate 5-7 clear, actionable recommendations to improve the DPR.
+    open_sections = []
+    for section in sections:
+        while open_sections and open_sections[-1]["level"] >= section["level"]:
+            open_sections.pop()["end"] = section["start"]
+        open_sections.append(section)
+    return sections
 
-**Full Analysis Summary:**
-{json.dumps(analysis, indent=2)[:4000]}
 
-Generate specific, actionable recommendations that address:
-1. Budget or financial concerns
-2. Timeline or implementation issues
-3. Technical improvements needed
-4. Compliance requirements
-5. Risk mitigation strategies
+def _fit_parts(parts: List[str], max_chars: int) -> List[str]:
+    """Trim parts so their total fits max_chars, sharing the room evenly (short parts stay whole)"""
+    if sum(len(part) for part in parts) <= max_chars:
+        return parts
+    order = sorted(range(len(parts)), key=lambda i: len(parts[i]))
+    allowance, remaining = {}, max_chars
+    for rank, i in enumerate(order):
+        allowance[i] = min(len(parts[i]), remaining // (len(parts) - rank))
+        remaining -= allowance[i]
+    return [parts[i][:allowance[i]] for i in range(len(parts))]
 
-Return ONLY a JSON array of strings:
-["Specific actionable recommendation 1", "Specific actionable recommendation 2", ...]
 
-Each recommendation should:
-- Start with an action verb (e.g., "Include", "Revise", "Add", "Clarify")
-- Be specific about what needs to be done
-- Reference the section/area that needs improvement
-"""
+def slice_dpr_sections(text: str, topics, max_chars: Optional[int] = None,
+                       sections: Optional[List[Dict]] = None) -> str:
+    """
+    The title page plus every section tagged with one of `topics`, in
+    document order. Falls back to the document prefix when no section
+    matches. With max_chars the sections share the room evenly instead of
+    the tail being cut off.
+    """
+    if sections is None:
+        sections = build_section_index(text)
+    wanted = set(topics)
+    selected, covered_until = [], -1
+    for section in sections:
+        if section["start"] >= covered_until and wanted.intersection(section["topics"]):
+            selected.append(section)
+            covered_until = section["end"]
+    if not selected:
+        return text if max_chars is None else text[:max_chars]
     
+    first_topical = next((s["start"] for s in sections if s["topics"]), selected[0]["start"])
+    head_end = min(DPR_SECTION_HEAD_CHARS, first_topical, selected[0]["start"])
+    parts = ([text[:head_end].rstrip()] if head_end > 0 else []) + [text[s["start"]:s["end"]].rstrip() for s in selected]
+    if max_chars is not None:
+        parts = _fit_parts(parts, max(0, max_chars - 2 * len(parts)))
+    sliced = "\n\n".join(part for part in parts if part)
+    print(f"[SECTIONS] {len(selected)} sections for {sorted(wanted)}: {len(sliced)} of {len(text)} characters")
+    return sliced
+
+
+# ============================================================================
+# TOLERANT JSON PARSER
+# ============================================================================
+# Single linear pass over model output that recovers what it can instead of
+# failing on the first defect. Handles prose or fences around the JSON,
+# trailing/duplicate/missing commas, missing colons, comments, single-quoted
+# or unquoted keys and values, Python literals, raw control characters and
+# unescaped quotes inside strings, invalid escapes and mismatched closers.
+# Truncated output keeps every complete member; a scalar cut off by the end
+# of the text (a half number or string) is dropped rather than guessed.
+
+TOLERANT_JSON_MAX_DEPTH = 200
+
+_TJ_SPACE = re.compile(r'(?:\s+|//[^\n]*|/\*.*?(?:\*/|\Z))*', re.DOTALL)
+_TJ_STRING_CHUNK = {'"': re.compile(r'[^"\\]*'), "'": re.compile(r"[^'\\]*")}
+_TJ_NUMBER = re.compile(r'-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?')
+_TJ_WORD = re.compile(r'[A-Za-z_$][\w$\-]*')
+_TJ_BARE_VALUE = re.compile(r'[^,}\]\n]*')
+_TJ_ROOT = re.compile(r'[{\[]')
+_TJ_LITERALS = {
+    "true": True, "false": False, "null": None,
+    "True": True, "False": False, "None": None,
+}
+_TJ_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', "'": "'"}
+_TJ_CLOSES_STRING = frozenset(',:}]"')
+_TJ_MISSING = object()
+
+
+class TolerantJsonParser:
+    """Error-tolerant JSON parser; `parse(text)` returns the value and `repairs` lists what was fixed"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.length = len(text)
+        self.pos = 0
+        self.repairs: List[str] = []
+
+    def note(self, repair: str):
+        self.repairs.append(repair)
+
+    def parse(self):
+        """Parse the first JSON object/array in the text; None if there is none"""
+        root = _TJ_ROOT.search(self.text)
+        if root is None:
+            return None
+        if root.start() > 0 and self.text[:root.start()].strip():
+            self.note("leading_text")
+        self.pos = root.start()
+        value = self._value(0)
+        if value is _TJ_MISSING:
+            return None
+        self._skip_space()
+        if self.pos < self.length:
+            self.note("trailing_text")
+        return value
+
+    def _skip_space(self):
+        self.pos = _TJ_SPACE.match(self.text, self.pos).end()
+
+    def _value(self, depth: int):
+        char = self.text[self.pos]
+        if char == '{' or char == '[':
+            if depth >= TOLERANT_JSON_MAX_DEPTH:
+                self.note("max_depth")
+                self.pos = self.length
+                return _TJ_MISSING
+            return self._object(depth + 1) if char == '{' else self._array(depth + 1)
+        if char == '"' or char == "'":
+            return self._string(char)
+        if char == '-' or char == '.' or char.isdigit():
+            match = _TJ_NUMBER.match(self.text, self.pos)
+            if match:
+                self.pos = match.end()
+                if self.pos >= self.length:
+                    self.note("truncated_number")
+                    return _TJ_MISSING
+                token = match.group()
+                if '.' in token or 'e' in token or 'E' in token:
+                    return float(token)
+                return int(token)
+        word = _TJ_WORD.match(self.text, self.pos)
+        if word:
+            if word.end() >= self.length:
+                self.pos = self.length
+                self.note("truncated_literal")
+                return _TJ_MISSING
+            if word.group() in _TJ_LITERALS:
+                self.pos = word.end()
+                if word.group() not in ("true", "false", "null"):
+                    self.note("python_literal")
+                return _TJ_LITERALS[word.group()]
+        if char in ',:}]':
+            return _TJ_MISSING
+        bare = _TJ_BARE_VALUE.match(self.text, self.pos)
+        if bare.end() >= self.length:
+            self.pos = self.length
+            self.note("truncated_value")
+            return _TJ_MISSING
+        self.pos = bare.end()
+        self.note("unquoted_value")
+        return bare.group().strip()
+
+    def _string(self, quote: str):
+        """Parse a quoted string; returns _TJ_MISSING if the text ends inside it"""
+        chunk_pattern = _TJ_STRING_CHUNK[quote]
+        text = self.text
+        self.pos += 1
+        parts = []
+        while True:
+            chunk = chunk_pattern.match(text, self.pos)
+            parts.append(chunk.group())
+            self.pos = chunk.end()
+            if self.pos >= self.length:
+                self.note("unterminated_string")
+                return _TJ_MISSING
+            if text[self.pos] == quote:
+                # A quote only closes the string if what follows could follow a string
+                after = _TJ_SPACE.match(text, self.pos + 1).end()
+                if after >= self.length or text[after] in _TJ_CLOSES_STRING:
+                    self.pos += 1
+                    return ''.join(parts)
+                self.note("unescaped_quote")
+                parts.append(quote)
+                self.pos += 1
+                continue
+            # Backslash escape
+            if self.pos + 1 >= self.length:
+                self.note("unterminated_string")
+                return _TJ_MISSING
+            escape = text[self.pos + 1]
+            if escape == 'u':
+                code = text[self.pos + 2:self.pos + 6]
+                if len(code) < 4 and self.pos + 6 > self.length:
+                    self.note("unterminated_string")
+                    return _TJ_MISSING
+                try:
+                    codepoint = int(code, 16)
+                except ValueError:
+                    self.note("invalid_escape")
+                    parts.append('u')
+                    self.pos += 2
+                    continue
+                self.pos += 6
+                if 0xD800 <= codepoint < 0xDC00 and text.startswith('\\u', self.pos):
+                    try:
+                        low = int(text[self.pos + 2:self.pos + 6], 16)
+                    except ValueError:
+                        low = 0
+                    if 0xDC00 <= low < 0xE000:
+                        codepoint = 0x10000 + ((codepoint - 0xD800) << 10) + (low - 0xDC00)
+                        self.pos += 6
+                parts.append(chr(codepoint) if not 0xD800 <= codepoint < 0xE000 else '�')
+                continue
+            replacement = _TJ_ESCAPES.get(escape)
+            if replacement is None:
+                self.note("invalid_escape")
+                replacement = escape
+            parts.append(replacement)
+            self.pos += 2
+
+    def _key(self):
+        """Parse an object key; returns (key, ok) where ok is False at end of text"""
+        char = self.text[self.pos]
+        if char == '"' or char == "'":
+            key = self._string(char)
+            return (None, False) if key is _TJ_MISSING else (key, True)
+        word = _TJ_WORD.match(self.text, self.pos)
+        if word:
+            self.pos = word.end()
+            if self.pos >= self.length:
+                return None, False
+            self.note("unquoted_key")
+            return word.group(), True
+        return None, True
+
+    def _object(self, depth: int) -> Dict:
+        self.pos += 1
+        obj = {}
+        text = self.text
+        after_member = after_comma = False
+        while True:
+            self._skip_space()
+            if self.pos >= self.length:
+                self.note("truncated")
+                return obj
+            char = text[self.pos]
+            if char == '}':
+                if after_comma:
+                    self.note("trailing_comma")
+                self.pos += 1
+                return obj
+            if char == ',':
+                if not after_member:
+                    self.note("extra_comma")
+                after_member, after_comma = False, True
+                self.pos += 1
+                continue
+            if char == ']':
+                self.note("mismatched_close")
+                self.pos += 1
+                return obj
+            if after_member:
+                self.note("missing_comma")
+            after_comma = False
+            key, ok = self._key()
+            if not ok:
+                self.note("truncated")
+                return obj
+            if key is None:
+                self.note("skipped_character")
+                self.pos += 1
+                continue
+            self._skip_space()
+            if self.pos < self.length and text[self.pos] in ':=':
+                self.pos += 1
+                self._skip_space()
+            elif self.pos < self.length:
+                self.note("missing_colon")
+            if self.pos >= self.length:
+                self.note("truncated")
+                return obj
+            value = self._value(depth)
+            if value is _TJ_MISSING:
+                if self.pos >= self.length:
+                    return obj
+                self.note("missing_value")
+            else:
+                obj[key] = value
+            after_member = True
+
+    def _array(self, depth: int) -> List:
+        self.pos += 1
+        items = []
+        text = self.text
+        after_item = after_comma = False
+        while True:
+            self._skip_space()
+            if self.pos >= self.length:
+                self.note("truncated")
+                return items
+            char = text[self.pos]
+            if char == ']':
+                if after_comma:
+                    self.note("trailing_comma")
+                self.pos += 1
+                return items
+            if char == ',':
+                if not after_item:
+                    self.note("extra_comma")
+                after_item, after_comma = False, True
+                self.pos += 1
+                continue
+            if char == '}':
+                self.note("mismatched_close")
+                self.pos += 1
+                return items
+            if char == ':':
+                self.note("skipped_character")
+                self.pos += 1
+                continue
+            if after_item:
+                self.note("missing_comma")
+            after_comma = False
+            start = self.pos
+            value = self._value(depth)
+            if value is _TJ_MISSING:
+                if self.pos >= self.length:
+                    return items
+                if self.pos == start:
+                    self.note("skipped_character")
+                    self.pos += 1
+                continue
+            items.append(value)
+            after_item = True
+
+
+# Tolerant-parser repairs that mean the model output ended early, so later members are missing
+TRUNCATION_REPAIRS = frozenset({
+    "truncated", "truncated_number", "truncated_literal", "truncated_value", "unterminated_string",
+})
+
+
+def parse_json_tolerant(text: str) -> tuple:
+    """Parse possibly malformed JSON in one pass; returns (value or None, list of repairs applied)"""
+    parser = TolerantJsonParser(text)
     try:
-        response = gemini_model.generate_content(prompt)
-        insights = parse_json_response(response.text)
-        if isinstance(insights, list) and len(insights) >= 3:
-            return insights
+        value = parser.parse()
+    except RecursionError:
+        return None, parser.repairs + ["max_depth"]
+    return value, parser.repairs
+
+
+# ============================================================================
+# GEMINI AI ANALYSIS FUNCTIONS
+# ============================================================================
+
+# Characters stripped from model output before parsing: C0 controls other than
+# tab/newline/carriage return, DEL, C1 controls and the byte-order mark. All
+# other Unicode (Devanagari, Bengali/Assamese, ZWJ/ZWNJ used by Indic scripts)
+# is kept. The set is compiled once into a character class; re.sub scans the
+# text in C in a single pass (str.translate with a dict table measured ~4x
+# slower on non-ASCII text because it looks up every character).
+_CONTROL_CODEPOINTS = [c for c in range(0x20) if c not in (0x09, 0x0A, 0x0D)] + list(range(0x7F, 0xA0)) + [0xFEFF]
+_CONTROL_CHAR_PATTERN = re.compile('[' + ''.join(re.escape(chr(c)) for c in _CONTROL_CODEPOINTS) + ']+')
+
+
+def sanitize_model_output(text: str) -> str:
+    """Remove control characters in one pass, preserving all other Unicode text"""
+    return _CONTROL_CHAR_PATTERN.sub('', text)
+
+
+def parse_json_response(text: str) -> Dict:
+    """Parse JSON from Gemini response with robust multi-stage local repair strategies.
+
+    Never calls the model; parse_json_response_async adds the model repair step.
+    """
+    started = time.perf_counter()
+    outcome, parsed, error = _parse_json_response_staged(text)
+    return _finish_json_parse(outcome, parsed, error, started)
+
+
+def _finish_json_parse(outcome: Optional[str], parsed, error, started: float) -> Dict:
+    """Record which stage produced the result; the minimal fallback if none did"""
+    if outcome is None:
+        outcome, parsed = "fallback", json_parse_fallback(error)
+    observe_stage("parse_json_response", time.perf_counter() - started, outcome)
+    inc_counter("dpr_json_parse_total", stage=outcome)
+    if outcome == "fallback":
+        inc_counter("dpr_fallback_total", kind="parse_json")
+    return parsed
+
+
+def _parse_json_response_staged(text: str) -> tuple:
+    """Local parse stages; returns (stage that produced the result, parsed dict, None),
+    or (None, None, last error) when only the model or the fallback can help"""
+    
+    print(f"[DEBUG] Raw response length: {len(text)} characters")
+
+    # 1. Strip markdown fences if present
+    if "```json" in text:
+        try:
+            text = text.split("```json", 1)[1].split("```", 1)[0]
+        except Exception:
+            pass
+    elif "```" in text:
+        parts = text.split("```")
+        if len(parts) >= 2:
+            text = parts[1]
+
+    text = text.strip()
+
+    # 2. Remove control characters but preserve essential whitespace and non-ASCII text
+    text = sanitize_model_output(text)
+
+    def attempt_load(label: str, candidate: str):
+        try:
+            if not candidate.strip():
+                return None, ValueError("Empty candidate")
+            return json.loads(candidate), None
+        except json.JSONDecodeError as je:
+            return None, je
+        except Exception as e:
+            return None, e
+
+    # Quick direct attempt
+    parsed, err = attempt_load("direct", text)
+    if parsed is not None:
+        print("[SUCCESS] JSON parsed successfully")
+        return "direct", parsed, None
+
+    print(f"[WARNING] Initial parse failed: {str(err)[:200]}")
+
+    # 3. Tolerant single-pass parse: recovers complete members from malformed or truncated output
+    parsed, repairs = parse_json_tolerant(text)
+    if isinstance(parsed, dict) and parsed:
+        for repair in set(repairs):
+            inc_counter("dpr_json_repairs_total", kind=repair)
+        print(f"[SUCCESS] JSON recovered by tolerant parser ({len(parsed)} keys; repairs: {', '.join(sorted(set(repairs))) or 'none'})")
+        if TRUNCATION_REPAIRS.intersection(repairs):
+            parsed["_partial"] = True  # Cut off mid-output: usable for this request, never cached
+        return "tolerant", parsed, None
+
+    # 4. Model repair (parse_json_response_async only), then the fallback
+    return None, None, err
+
+
+def json_parse_fallback(err) -> Dict:
+    """Minimal valid analysis structure for output no repair stage could recover"""
+    print("[FALLBACK] Generating minimal valid structure")
+    fallback = {
+        "_error": "JSON parsing failed after all repair attempts",
+        "_original_error": str(err)[:500],
+        "overall_score": 50,
+        "actionable_insights": [
+            "Manual review required - automated parsing encountered errors",
+            "Document may have formatting issues that need correction",
+            "Please ensure DPR document is properly structured"
+        ],
+        "recommendations": [
+            "Review document formatting and structure",
+            "Ensure all required sections are complete",
+            "Resubmit document after addressing formatting issues"
+        ],
+        "approval_recommendation": {
+            "decision": "REVISE",
+            "confidence": 0,
+            "reasoning": "Analysis could not be completed due to technical processing errors. Manual expert review is required, or document should be reformatted and resubmitted."
+        },
+        "summary": "Technical error prevented complete automated analysis. Manual review by expert assessor is strongly recommended.",
+        "completeness_analysis": {
+            "score": 50,
+            "comments": "Could not complete automated analysis"
+        },
+        "budget_validation": {
+            "is_valid": False,
+            "comments": "Analysis incomplete"
+        },
+        "timeline_validation": {
+            "is_realistic": False,
+            "comments": "Analysis incomplete"
+        },
+        "technical_feasibility": {
+            "score": 50,
+            "is_feasible": False,
+            "comments": "Analysis incomplete"
+        },
+        "risk_assessment": {
+            "overall_risk_level": "high",
+            "overall_risk_score": 70,
+            "comments": "Unable to complete risk assessment"
+        },
+        "compliance_check": {
+            "is_compliant": False,
+            "comments": "Analysis incomplete"
+        }
+    }
+    return fallback
+
+
+async def attempt_model_repair(raw_response: str, schema_hint: str) -> Optional[Dict]:
+    """Use the model itself to repair malformed JSON.
+    Returns dict on success, or None on failure.
+    """
+    try:
+        # Very simple, constrained repair prompt
+        repair_prompt = f"""
+The following JSON response is malformed. Extract and return ONLY a corrected JSON object with these required keys:
+
+Required structure:
+{{
+    "overall_score": <number 0-100>,
+    "actionable_insights": ["insight 1", "insight 2", "insight 3"],
+    "recommendations": ["rec 1", "rec 2"],
+    "approval_recommendation": {{
+        "decision": "APPROVE" or "REVISE" or "REJECT",
+        "confidence": <number 0-100>,
+        "reasoning": "brief explanation"
+    }},
+    "summary": "brief summary text"
+}}
+
+Malformed input (extract what you can):
+{raw_response[:10000]}
+
+Return ONLY the corrected JSON object. Do not include markdown, explanations, or code blocks.
+"""
+        
+        response_text = await llm_generate(
+            repair_prompt,
+            generation_config=make_generation_config(
+                temperature=0.1,
+                max_output_tokens=2048,
+                response_mime_type="application/json",
+            )
+        )
+        
+        print(f"[REPAIR] Model repair response length: {len(response_text)}")
+        
+        # Parse the repair response without aggressive repair to avoid recursion
+        result = await parse_json_response_async(response_text, enable_aggressive_repair=False)
+        
+        # Validate that required keys are present
+        required_keys = ["overall_score", "actionable_insights", "approval_recommendation"]
+        if all(key in result for key in required_keys):
+            inc_counter("dpr_model_repair_total", result="success")
+            return result
+        else:
+            print(f"[REPAIR] Repaired JSON missing required keys")
+            inc_counter("dpr_model_repair_total", result="missing_keys")
+            return None
+            
+    except Exception as e:
+        print(f"[REPAIR] Model-based repair failed: {str(e)[:200]}")
+        inc_counter("dpr_model_repair_total", result="error")
+        return None
+
+
+def comprehensive_analysis_config():
+    """Generation config shared by the blocking and streaming comprehensive analysis"""
+    return make_generation_config(
+        temperature=0.3,  # Lower temperature for more consistent JSON
+        top_p=0.85,
+        top_k=40,
+        max_output_tokens=8192,  # Increased for detailed content
+        response_mime_type="application/json",  # Force JSON output
+    )
+
+
+def build_comprehensive_analysis_prompt(dpr_text: str, structured_data: Dict, part_note: str = "") -> str:
+    """Build the single-call detailed analysis prompt (`part_note` marks a chunk of a long DPR)"""
+    
+    guidelines_section = ""
+    guidelines_excerpt = guidelines_prompt_context(structured_data, dpr_text)
+    if guidelines_excerpt:
+        guidelines_section = f"""
+**MDONER GUIDELINES REFERENCE:**
+{guidelines_excerpt}
+"""
+    
+    prompt = f"""You are a senior DPR analyst for the Ministry of Development of North Eastern Region (MDoNER), India, with 15+ years of experience in infrastructure project evaluation.
+
+{guidelines_section}
+
+**PROJECT DETAILS:**
+- Project Title: {structured_data.get('project_title', 'N/A')}
+- Project Type: {structured_data.get('project_type', 'N/A')}
+- Total Budget: {structured_data.get('budget', {}).get('details', 'Not specified')}
+- Project Duration: {structured_data.get('timeline', {}).get('duration', 'N/A')}
+- Location: {structured_data.get('location', 'N/A')}
+- State/Region: North Eastern Region
+
+{part_note}
+**COMPLETE DPR DOCUMENT TEXT:**
+{dpr_text[:ANALYSIS_PROMPT_CHARS]}
+
+CRITICAL: You MUST return ONLY valid JSON. No markdown formatting, no code blocks, no extra text.
+Ensure all strings are properly escaped, all commas are in place, and all brackets/braces are balanced.
+
+TASK: Provide an EXTREMELY DETAILED, COMPREHENSIVE analysis of this DPR. Be thorough, specific, and professional.
+
+Return analysis in this JSON format with DETAILED content in each section:
+
+{{
+    "completeness_analysis": {{
+        "score": <0-100>,
+        "missing_sections": ["list each missing section with specific names"],
+        "present_sections": ["list all sections that are present"],
+        "quality_assessment": "3-4 paragraphs analyzing the quality and depth of each section present",
+        "comments": "Detailed 4-5 paragraph assessment covering: documentation completeness, information depth, data sufficiency, formatting quality, and overall presentation standards"
+    }},
+    "budget_validation": {{
+        "is_valid": <true/false>,
+        "total_budget": "exact amount with currency",
+        "budget_breakdown": {{
+            "civil_works": "amount and percentage",
+            "equipment": "amount and percentage", 
+            "consultancy": "amount and percentage",
+            "contingency": "amount and percentage",
+            "other": "specify categories with amounts"
+        }},
+        "issues": [
+            {{
+                "severity": "low/medium/high/critical",
+                "category": "calculation/allocation/justification/documentation",
+                "description": "Very detailed description of the issue (3-4 sentences)",
+                "impact": "Explain the potential impact",
+                "recommendation": "Specific step-by-step fix"
+            }}
+        ],
+        "cost_analysis": "5-6 paragraphs analyzing: cost reasonableness, market rates comparison, allocation appropriateness, contingency adequacy, hidden costs, value for money",
+        "financial_viability": "3-4 paragraphs on sustainability, funding sources, revenue generation potential, operational costs",
+        "comments": "Comprehensive 5-7 paragraph budget assessment with specific numbers, calculations verification, and detailed recommendations"
+    }},
+    "timeline_validation": {{
+        "is_realistic": <true/false>,
+        "total_duration": "specify duration",
+        "phase_breakdown": {{
+            "pre_construction": "duration and activities",
+            "construction": "duration and activities",
+            "post_construction": "duration and activities"
+        }},
+        "critical_milestones": ["list 8-10 key milestones with expected completion times"],
+        "issues": [
+            {{
+                "issue": "Detailed description",
+                "impact": "Project impact analysis", 
+                "likelihood": "high/medium/low",
+                "mitigation": "Detailed mitigation strategy"
+            }}
+        ],
+        "seasonal_considerations": "Detailed analysis of weather, monsoon, festivals, local conditions affecting timeline",
+        "dependency_analysis": "4-5 paragraphs on dependencies, critical path, bottlenecks, parallel activities",
+        "comments": "Comprehensive 6-8 paragraph timeline analysis including feasibility, risks, optimization opportunities, buffer requirements"
+    }},
+    "technical_feasibility": {{
+        "score": <0-100>,
+        "is_feasible": <true/false>,
+        "technical_specifications": {{
+            "design_standards": "detailed analysis",
+            "material_specifications": "detailed analysis",
+            "quality_standards": "detailed analysis",
+            "safety_measures": "detailed analysis"
+        }},
+        "strengths": [
+            "Strength 1: Very detailed description with examples and evidence (3-4 sentences each)",
+            "Strength 2: ...",
+            "Strength 3: ...",
+            "Strength 4: ...",
+            "Strength 5: ..."
+        ],
+        "weaknesses": [
+            "Weakness 1: Detailed description with specific examples and impact analysis (3-4 sentences each)",
+            "Weakness 2: ...",
+            "Weakness 3: ...",
+            "Weakness 4: ..."
+        ],
+        "implementation_approach": "5-6 paragraphs covering methodology, phasing, resource mobilization, quality control, supervision",
+        "technology_assessment": "Analysis of proposed technology, alternatives, appropriateness for region",
+        "comments": "Comprehensive 7-10 paragraph technical assessment covering all aspects: design, specifications, implementation, quality, innovation, appropriateness for NE region"
+    }},
+    "risk_assessment": {{
+        "overall_risk_level": "low/medium/high/critical",
+        "overall_risk_score": <0-100>,
+        "risk_matrix_summary": "2-3 paragraphs explaining the overall risk profile",
+        "financial_risks": [
+            {{
+                "risk": "Detailed risk description with context and examples",
+                "severity": "low/medium/high/critical",
+                "probability": "low/medium/high",
+                "impact_analysis": "Detailed multi-sentence impact analysis",
+                "financial_impact": "Estimated cost impact",
+                "mitigation": "Detailed 4-5 step mitigation strategy",
+                "contingency_plan": "Alternative approach if risk materializes"
+            }},
+            {{
+                "risk": "Cost overrun due to material price fluctuation...",
+                "severity": "high",
+                "probability": "medium",
+                "impact_analysis": "...",
+                "financial_impact": "15-20% budget increase",
+                "mitigation": "...",
+                "contingency_plan": "..."
+            }}
+        ],
+        "timeline_risks": [
+            {{
+                "risk": "Detailed description",
+                "severity": "...",
+                "probability": "...",
+                "delay_impact": "months/years",
+                "mitigation": "Detailed strategy",
+                "acceleration_options": "Fast-tracking possibilities"
+            }}
+        ],
+        "environmental_risks": [
+            {{
+                "risk": "Detailed environmental risk with scientific basis",
+                "severity": "...",
+                "ecological_impact": "Detailed impact on ecosystem",
+                "compliance_requirement": "Specific regulations and clearances",
+                "mitigation": "Detailed environmental management plan",
+                "monitoring_plan": "How to track and manage"
+            }}
+        ],
+        "resource_risks": [
+            {{
+                "risk": "Specific resource availability issue",
+                "severity": "...",
+                "affected_resources": "manpower/materials/equipment",
+                "availability_analysis": "Market analysis and sourcing challenges",
+                "mitigation": "Detailed procurement and mobilization strategy",
+                "alternatives": "Backup resource options"
+            }}
+        ],
+        "social_risks": [
+            {{
+                "risk": "Community/social challenge",
+                "severity": "...",
+                "stakeholders_affected": "list",
+                "mitigation": "Community engagement plan",
+                "benefit_sharing": "How project benefits locals"
+            }}
+        ],
+        "comments": "Comprehensive 8-10 paragraph risk analysis covering: risk identification methodology, inter-dependencies between risks, cumulative impact, risk prioritization, overall risk management strategy, monitoring and control mechanisms"
+    }},
+    "compliance_check": {{
+        "is_compliant": <true/false>,
+        "overall_compliance_score": <0-100>,
+        "mdoner_guidelines": {{
+            "compliant_aspects": ["detailed list with explanations"],
+            "non_compliant_aspects": ["detailed list with explanations"],
+            "gaps": ["specific gaps with impact"]
+        }},
+        "statutory_clearances": {{
+            "environmental_clearance": "status and requirements",
+            "forest_clearance": "status and requirements",
+            "wildlife_clearance": "status and requirements",
+            "other_clearances": ["list all with status"]
+        }},
+        "guideline_gaps": [
+            {{
+                "guideline": "Specific guideline reference",
+                "current_status": "What is present",
+                "gap": "Detailed gap description",
+                "impact": "Impact of non-compliance",
+                "remediation": "Detailed steps to achieve compliance",
+                "timeline": "Time needed to fix"
+            }}
+        ],
+        "documentation_quality": "4-5 paragraphs on document quality, completeness, clarity, professionalism",
+        "comments": "Comprehensive 6-8 paragraph compliance assessment with specific references to guidelines, detailed gap analysis, and actionable remediation plan"
+    }},
+    "stakeholder_analysis": {{
+        "beneficiaries": "Detailed analysis of who benefits and how",
+        "affected_parties": "Detailed analysis of impacted communities",
+        "consultation_status": "Description of consultations done",
+        "social_impact": "5-6 paragraphs on social benefits, displacement, employment, equity"
+    }},
+    "sustainability_assessment": {{
+        "environmental_sustainability": "4-5 paragraphs on environmental impact, conservation, green practices",
+        "financial_sustainability": "3-4 paragraphs on long-term financial viability, O&M costs, revenue",
+        "social_sustainability": "3-4 paragraphs on social acceptance, community ownership, equity",
+        "institutional_sustainability": "Analysis of governance, capacity, maintenance planning"
+    }},
+    "actionable_insights": [
+        "PRIORITY 1 - [Category]: Extremely detailed recommendation with specific steps, responsible parties, timeline, expected outcome, and success metrics (5-7 sentences)",
+        "PRIORITY 2 - [Category]: Extremely detailed recommendation...",
+        "PRIORITY 3 - [Category]: Extremely detailed recommendation...",
+        "PRIORITY 4 - [Category]: Extremely detailed recommendation...",
+        "PRIORITY 5 - [Category]: Extremely detailed recommendation...",
+        "PRIORITY 6 - [Category]: Extremely detailed recommendation...",
+        "PRIORITY 7 - [Category]: Extremely detailed recommendation...",
+        "PRIORITY 8 - [Category]: Extremely detailed recommendation..."
+    ],
+    "recommendations": [
+        "Detailed recommendation 1 with rationale and implementation steps",
+        "Detailed recommendation 2...",
+        "Detailed recommendation 3...",
+        "Detailed recommendation 4...",
+        "Detailed recommendation 5..."
+    ],
+    "overall_score": <0-100>,
+    "scoring_breakdown": {{
+        "completeness": <0-100>,
+        "technical_quality": <0-100>,
+        "financial_soundness": <0-100>,
+        "compliance": <0-100>,
+        "feasibility": <0-100>,
+        "risk_management": <0-100>
+    }},
+    "approval_recommendation": {{
+        "decision": "APPROVE/APPROVE_WITH_CONDITIONS/REVISE/REJECT",
+        "confidence": <0-100>,
+        "reasoning": "Comprehensive 6-8 paragraph reasoning covering all aspects: strengths that support decision, weaknesses that concern, conditions for approval, revision requirements, timeline for resubmission, expected improvements",
+        "conditions": ["Specific condition 1 if APPROVE_WITH_CONDITIONS", "Specific condition 2..."],
+        "revision_requirements": ["Specific requirement 1 if REVISE", "Specific requirement 2..."],
+        "approval_process": "Next steps and timeline for approval"
+    }},
+    "summary": "Comprehensive executive summary in 8-10 sentences covering: project overview, key findings, major strengths, critical concerns, risk level, compliance status, recommendation, and expected impact",
+    "key_highlights": {{
+        "major_strengths": ["strength 1 with detail", "strength 2...", "strength 3..."],
+        "critical_concerns": ["concern 1 with detail", "concern 2...", "concern 3..."],
+        "must_address_immediately": ["urgent item 1", "urgent item 2", "urgent item 3"]
+    }}
+}}
+
+CRITICAL: Provide DETAILED, COMPREHENSIVE, PROFESSIONAL analysis. Each section should have substantial content with specific examples, numbers, analysis, and recommendations. This is for ministerial review - be thorough!
+
+CRITICAL: Provide DETAILED, COMPREHENSIVE, PROFESSIONAL analysis. Each section should have substantial content with specific examples, numbers, analysis, and recommendations. This is for ministerial review - be thorough!
+
+Return ONLY valid JSON, no markdown formatting, no code blocks.
+"""
+    return prompt
+
+
+async def analyze_dpr_comprehensive_fast(dpr_text: str, structured_data: Dict) -> Dict:
+    """OPTIMIZED: Single API call for complete DPR analysis with DETAILED content"""
+    
+    if CHUNKED_ANALYSIS_ENABLED and len(dpr_text) > ANALYSIS_PROMPT_CHARS:
+        return await analyze_dpr_chunked(dpr_text, structured_data)
+    
+    prompt = build_comprehensive_analysis_prompt(dpr_text, structured_data)
+    
+    try:
+        print("[DETAILED-ANALYSIS] Running comprehensive detailed analysis...")
+        response_text = await llm_generate(prompt, generation_config=comprehensive_analysis_config())
+
+        print(f"[DEBUG] Response length: {len(response_text)} characters")
+
+        try:
+            analysis = await parse_json_response_async(response_text)
+            print(f"[COMPLETE] Detailed analysis done. Score: {analysis.get('overall_score', 'N/A')}")
+            return analysis
+        except json.JSONDecodeError as primary_err:
+            print(f"[RETRY] Primary parse failed: {primary_err}. Attempting model-based repair...")
+            # Provide compact schema hint (avoid huge prompt duplication)
+            schema_hint = '{"keys": ["completeness_analysis","budget_validation","timeline_validation","technical_feasibility","risk_assessment","compliance_check","stakeholder_analysis","sustainability_assessment","actionable_insights","recommendations","overall_score","scoring_breakdown","approval_recommendation","summary","key_highlights"]}'
+            repaired = await attempt_model_repair(response_text, schema_hint)
+            if repaired is not None:
+                print("[REPAIR] Model-based repair succeeded.")
+                return repaired
+            else:
+                print("[REPAIR] Model-based repair failed – returning fallback.")
+                raise primary_err
+    except LLMUnavailableError:
+        raise  # An outage is reported to the client (503), not papered over with a fallback analysis
+    except Exception as e:
+        print(f"[ERROR] Analysis error: {e}")
+        print(f"[ERROR] Full error details: {type(e).__name__}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        inc_counter("dpr_fallback_total", kind="analysis_error")
+        return {
+            "error": str(e),
+            "overall_score": 50,
+            "actionable_insights": ["Manual review required due to processing error"],
+            "recommendations": ["System encountered an error - manual expert review is required"],
+            "approval_recommendation": {
+                "decision": "REVISE",
+                "confidence": 0,
+                "reasoning": "Analysis could not be completed due to technical error. Please ensure document is properly formatted and try again, or conduct manual review."
+            },
+            "summary": "Analysis encountered a technical error and could not be completed. Manual review by expert assessor is recommended."
+        }
+
+
+async def analyze_dpr_with_gemini(dpr_text: str, structured_data: Dict) -> Dict:
+    """Comprehensive DPR analysis using Gemini AI"""
+    
+    guidelines_section = ""
+    guidelines_excerpt = guidelines_prompt_context(structured_data, dpr_text)
+    if guidelines_excerpt:
+        guidelines_section = f"""
+**MDONER GUIDELINES CONTEXT:**
+{guidelines_excerpt}
+"""
+    
+    prompt = f"""
+You are an expert DPR (Detailed Project Report) analyst for the Ministry of Development of North Eastern Region (MDoNER), India.
+
+{guidelines_section}
+
+**PROJECT INFORMATION:**
+- Project Title: {structured_data.get('project_title', 'N/A')}
+- Project Type: {structured_data.get('project_type', 'N/A')}
+- Budget: {structured_data.get('budget', {}).get('details', 'Not specified')}
+- Timeline: {structured_data.get('timeline', {}).get('duration', 'N/A')}
+- Location: {structured_data.get('location', 'N/A')}
+
+**DPR TEXT (excerpt):**
+{dpr_text[:15000]}
+
+Analyze this DPR comprehensively and provide assessment in JSON format:
+
+{{
+    "completeness_analysis": {{
+        "score": <0-100>,
+        "missing_sections": [list of missing sections],
+        "comments": "Overall completeness assessment"
+    }},
+    "budget_validation": {{
+        "is_valid": <true/false>,
+        "issues": [list of budget issues with severity and description],
+        "comments": "Budget assessment"
+    }},
+    "timeline_validation": {{
+        "is_realistic": <true/false>,
+        "issues": [list of timeline issues],
+        "comments": "Timeline assessment"
+    }},
+    "technical_feasibility": {{
+        "score": <0-100>,
+        "is_feasible": <true/false>,
+        "strengths": [list],
+        "weaknesses": [list],
+        "comments": "Technical assessment"
+    }},
+    "risk_assessment": {{
+        "overall_risk_level": "low/medium/high/critical",
+        "financial_risks": [list of risks with severity],
+        "timeline_risks": [list of risks],
+        "environmental_risks": [list of risks],
+        "resource_risks": [list of risks],
+        "comments": "Risk assessment"
+    }},
+    "compliance_check": {{
+        "is_compliant": <true/false>,
+        "guideline_gaps": [list of gaps],
+        "comments": "Compliance assessment"
+    }},
+    "recommendations": ["list of actionable recommendations"],
+    "overall_score": <0-100>,
+    "approval_recommendation": {{
+        "decision": "APPROVE/REVISE/REJECT",
+        "confidence": <0-100>,
+        "reasoning": "Detailed reasoning"
+    }},
+    "summary": "Executive summary in 2-3 sentences"
+}}
+
+Return ONLY valid JSON, no markdown.
+"""
+    
+    try:
+        print("[ANALYZING] Analyzing DPR with Gemini AI...")
+        response_text = await llm_generate(prompt)
+        analysis = await parse_json_response_async(response_text)
+        print(f"[COMPLETE] Analysis complete. Score: {analysis.get('overall_score', 'N/A')}")
+        return analysis
+    except Exception as e:
+        print(f"[ERROR] Analysis error: {e}")
+        return {
+            "error": str(e),
+            "overall_score": 50,
+            "recommendations": ["Manual review required due to error"],
+            "approval_recommendation": {"decision": "REVISE", "confidence": 0, "reasoning": "Analysis error"}
+        }
+
+
+async def generate_insights(analysis: Dict) -> List[str]:
+    """Generate actionable insights from analysis"""
+    
+    # Extract key information for context
+    score = analysis.get('overall_score', 0)
+    decision = analysis.get('approval_recommendation', {}).get('decision', 'REVISE')
+    
+    prompt = f"""
+Based on this DPR analysis (Score: {score}/100, Decision: {decision}), generate 5-7 clear, actionable recommendations to improve the DPR.
+
+**Full Analysis Summary:**
+{json.dumps(analysis, indent=2)[:4000]}
+
+Generate specific, actionable recommendations that address:
+1. Budget or financial concerns
+2. Timeline or implementation issues
+3. Technical improvements needed
+4. Compliance requirements
+5. Risk mitigation strategies
+
+Return ONLY a JSON array of strings:
+["Specific actionable recommendation 1", "Specific actionable recommendation 2", ...]
+
+Each recommendation should:
+- Start with an action verb (e.g., "Include", "Revise", "Add", "Clarify")
+- Be specific about what needs to be done
+- Reference the section/area that needs improvement
+"""
+    
+    try:
+        response_text = await llm_generate(prompt)
+        insights = await parse_json_response_async(response_text)
+        if isinstance(insights, list) and len(insights) >= 3:
+            return insights
+        else:
+            # Fallback: extract recommendations from analysis
+            fallback_insights = []
+            if analysis.get('recommendations'):
+                fallback_insights = analysis['recommendations'][:7]
+            return fallback_insights if fallback_insights else ["Review detailed analysis for comprehensive findings"]
+    except Exception as e:
+        print(f"[WARNING] Insights generation error: {e}")
+        # Extract from recommendations as fallback
+        if analysis.get('recommendations'):
+            return analysis['recommendations'][:7]
+        return ["Review detailed analysis for findings"]
+
+
+async def assess_risks(dpr_text: str, project_type: str) -> Dict:
+    """Assess project risks"""
+    prompt = f"""
+Analyze risks for this {project_type} project in North Eastern India:
+
+{slice_dpr_sections(dpr_text, PROMPT_SECTION_TOPICS["risk"], 8000)}
+
+Return JSON:
+{{
+    "overall_risk_level": "low/medium/high/critical",
+    "overall_risk_score": <0-100>,
+    "financial_risks": [{{"risk": "...", "severity": "...", "mitigation": "..."}}],
+    "timeline_risks": [...],
+    "environmental_risks": [...],
+    "resource_risks": [...]
+}}
+"""
+    
+    try:
+        response_text = await llm_generate(prompt)
+        return await parse_json_response_async(response_text)
+    except:
+        return {"overall_risk_level": "medium", "overall_risk_score": 50}
+
+
+@timed_stage("translation")
+async def translate_report(report: Dict, target_language: str) -> Dict:
+    """Translate report to target language"""
+    if target_language == "en":
+        return report
+    
+    language_map = {
+        'hi': 'Hindi (हिन्दी)',
+        'as': 'Assamese (অসমীয়া)',
+        'bn': 'Bengali (বাংলা)',
+        'mni': 'Manipuri',
+        'ne': 'Nepali (नेपाली)'
+    }
+    
+    target_lang = language_map.get(target_language, 'Hindi')
+    
+    prompt = f"""
+Translate this DPR analysis to {target_lang}.
+Maintain JSON structure, only translate text values.
+
+{json.dumps(report, indent=2)[:8000]}
+
+Return translated JSON.
+"""
+    
+    try:
+        response_text = await llm_generate(prompt)
+        return await parse_json_response_async(response_text)
+    except:
+        inc_counter("dpr_fallback_total", kind="translation")
+        return report
+
+
+# ============================================================================
+# CHUNKED (MAP-REDUCE) ANALYSIS
+# ============================================================================
+# DPRs longer than one prompt window are split at section boundaries, each
+# chunk is analysed with the usual prompt (in parallel, bounded by
+# ANALYSIS_CHUNK_MAX_PARALLEL and the LLM client semaphore), and the chunk
+# results are merged back into the normal single-call schema.
+
+# A new chunk may start at a numbered heading ("3.2 Cost Estimate"), an
+# all-caps heading line, or a CHAPTER/SECTION/ANNEXURE/PART marker
+_SECTION_BREAK_PATTERN = re.compile(
+    r'\n(?=\d+(?:\.\d+)*\.?\s+[A-Z]|[A-Z][A-Z0-9 &/,()\-]{4,}\n|(?:CHAPTER|Chapter|SECTION|Section|ANNEXURE|Annexure|PART|Part)\s+[\dIVXA-Z])'
+)
+
+RISK_LEVEL_ORDER = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+MERGE_MAX_LIST_ITEMS = 12
+MERGE_MAX_TEXT_PARTS = 3
+
+
+def _pack_pieces(pieces: List[str], separator: str, max_chars: int) -> List[str]:
+    """Greedily join consecutive pieces into blocks of at most max_chars"""
+    blocks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(separator) + len(piece) > max_chars:
+            blocks.append(current)
+            current = piece
+        else:
+            current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def _split_oversized_block(block: str, max_chars: int, separators=("\n\n", "\n", ". ", " ")) -> List[str]:
+    """Split a block that is larger than max_chars at the coarsest possible boundary"""
+    if len(block) <= max_chars:
+        return [block]
+    if not separators:
+        return [block[i:i + max_chars] for i in range(0, len(block), max_chars)]
+    separator = separators[0]
+    pieces = []
+    for part in block.split(separator):
+        pieces.extend(_split_oversized_block(part, max_chars, separators[1:]))
+    return _pack_pieces(pieces, separator, max_chars)
+
+
+def split_dpr_into_chunks(text: str, max_chars: int = ANALYSIS_PROMPT_CHARS) -> List[str]:
+    """Split DPR text into chunks of at most max_chars, preferring section boundaries"""
+    if len(text) <= max_chars:
+        return [text]
+    pieces = []
+    for section in _SECTION_BREAK_PATTERN.split(text):
+        if section.strip():
+            pieces.extend(_split_oversized_block(section, max_chars))
+    return _pack_pieces(pieces, "\n", max_chars)
+
+
+def next_chunk_end(text: str, max_chars: int) -> int:
+    """Length of the first chunk to cut from `text`: the last section break
+    within max_chars, else the last paragraph, line, sentence or word break.
+    Used to chunk text that is still growing (pipelined extraction)."""
+    if len(text) <= max_chars:
+        return len(text)
+    breaks = [m.start() for m in _SECTION_BREAK_PATTERN.finditer(text, 0, min(len(text), max_chars + 200))
+              if 0 < m.start() <= max_chars]
+    if breaks:
+        return breaks[-1]
+    for separator in ("\n\n", "\n", ". ", " "):
+        position = text.rfind(separator, 1, max_chars)
+        if position > 0:
+            return position + len(separator)
+    return max_chars
+
+
+def chunk_part_note(index: int, total: Optional[int] = None) -> str:
+    """Prompt note telling the model it only sees part of the document (total unknown while extracting)"""
+    of_total = f" of {total}" if total else ""
+    return (
+        f"NOTE: This is PART {index}{of_total} of a long DPR that was split for analysis. "
+        "Base your assessment only on this part, and do not report a section as missing "
+        "just because it is not contained in this part.\n"
+    )
+
+
+async def run_chunked_json_prompt(text: str, build_prompt, max_chars: int, generation_config=None) -> List[tuple]:
+    """Map step: run `build_prompt(chunk, part_note)` over every chunk in parallel.
+
+    Returns (weight, parsed_json) pairs in document order, where weight is the
+    chunk length. Failed chunks are skipped; raises if every chunk fails.
+    """
+    chunks = split_dpr_into_chunks(text, max_chars)
+    print(f"[CHUNKED] Analysing {len(text)} characters as {len(chunks)} chunks")
+
+    async def chunk_stream():
+        for chunk in chunks:
+            yield chunk
+
+    return await run_streamed_json_prompt(chunk_stream(), build_prompt, generation_config, total=len(chunks))
+
+
+async def run_streamed_json_prompt(chunk_stream, build_prompt, generation_config=None,
+                                   total: Optional[int] = None) -> List[tuple]:
+    """Map step over an async iterable of chunks: each chunk's prompt starts as
+    soon as the chunk arrives, so analysis overlaps whatever produces them.
+
+    Same result contract as run_chunked_json_prompt. If the stream itself
+    fails, the chunk calls already running are cancelled and the error raised.
+    """
+    limiter = asyncio.Semaphore(ANALYSIS_CHUNK_MAX_PARALLEL)
+    total_label = total or "?"
+
+    async def analyse_chunk(index: int, chunk: str):
+        async with limiter:
+            prompt = build_prompt(chunk, chunk_part_note(index + 1, total))
+            response_text = await llm_generate(prompt, generation_config=generation_config)
+            parsed = await parse_json_response_async(response_text, enable_aggressive_repair=False)
+            print(f"[CHUNKED] Chunk {index + 1}/{total_label} done")
+            return len(chunk), parsed
+
+    tasks = []
+    try:
+        async for chunk in chunk_stream:
+            tasks.append(asyncio.ensure_future(analyse_chunk(len(tasks), chunk)))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    results = []
+    for index, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            print(f"[CHUNKED] Chunk {index + 1} failed: {outcome}")
+        elif isinstance(outcome[1], dict) and "_error" not in outcome[1]:
+            results.append(outcome)
+    if not results:
+        unavailable = next((outcome for outcome in outcomes if isinstance(outcome, LLMUnavailableError)), None)
+        if unavailable is not None:
+            raise unavailable
+        raise RuntimeError("All chunk analyses failed")
+    return results
+
+
+def _weighted_vote(values: List[tuple]):
+    """Pick the value with the largest total weight from (weight, value) pairs"""
+    totals = {}
+    for weight, value in values:
+        key = json.dumps(value, sort_keys=True)
+        totals[key] = totals.get(key, 0) + weight
+    return json.loads(max(totals, key=totals.get))
+
+
+def _merge_values(key: str, values: List[tuple]):
+    """Merge one field across chunks; `values` holds (weight, value) pairs in document order"""
+    present = [(w, v) for w, v in values if v is not None]
+    if not present:
+        return None
+    samples = [v for _, v in present]
+
+    if all(isinstance(v, dict) for v in samples):
+        return merge_chunk_analyses(present)
+    if all(isinstance(v, list) for v in samples):
+        merged, seen = [], set()
+        for item in (item for v in samples for item in v):
+            marker = json.dumps(item, sort_keys=True)
+            if marker not in seen:
+                seen.add(marker)
+                merged.append(item)
+        return merged[:MERGE_MAX_LIST_ITEMS]
+    if all(isinstance(v, bool) for v in samples):
+        return _weighted_vote(present)
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in samples):
+        total_weight = sum(w for w, _ in present)
+        mean = sum(w * v for w, v in present) / total_weight
+        return round(mean) if all(isinstance(v, int) for v in samples) else round(mean, 2)
+    if all(isinstance(v, str) for v in samples):
+        if key.endswith("risk_level") or key == "severity":
+            return max(samples, key=lambda v: RISK_LEVEL_ORDER.get(v.lower(), -1))
+        if all(len(v) <= 40 for v in samples):
+            return _weighted_vote(present)
+        # Narrative text: keep the paragraphs from the most substantial chunks, in document order
+        heaviest = sorted(range(len(present)), key=lambda i: present[i][0], reverse=True)[:MERGE_MAX_TEXT_PARTS]
+        parts = []
+        for i in sorted(heaviest):
+            text = present[i][1].strip()
+            if text and text not in parts:
+                parts.append(text)
+        return "\n\n".join(parts)
+    return _weighted_vote(present)
+
+
+def merge_chunk_analyses(results: List[tuple]) -> Dict:
+    """Reduce step: merge per-chunk JSON objects that share one schema.
+
+    Numbers are length-weighted means, booleans and short labels are weighted
+    votes, risk levels take the most severe value, lists are de-duplicated
+    unions and narrative text keeps the most substantial chunks.
+    """
+    keys = []
+    for _, result in results:
+        for key in result:
+            if key not in keys:
+                keys.append(key)
+    merged = {}
+    for key in keys:
+        merged[key] = _merge_values(key, [(w, r.get(key)) for w, r in results])
+
+    # A section is only missing if no chunk contains it
+    if isinstance(merged.get("missing_sections"), list):
+        present_sections = {
+            str(s).lower()
+            for _, r in results
+            for s in (r.get("present_sections") or [])
+        }
+        merged["missing_sections"] = [s for s in merged["missing_sections"] if str(s).lower() not in present_sections]
+    return merged
+
+
+async def analyze_dpr_chunked(dpr_text: str, structured_data: Dict, chunk_stream=None) -> Dict:
+    """Map-reduce version of analyze_dpr_comprehensive_fast for DPRs beyond one prompt window.
+
+    `chunk_stream` (an async iterable of chunks) replaces splitting `dpr_text`
+    when the text is still being extracted.
+    """
+    build_prompt = lambda chunk, note: build_comprehensive_analysis_prompt(chunk, structured_data, part_note=note)
+    try:
+        if chunk_stream is not None:
+            results = await run_streamed_json_prompt(chunk_stream, build_prompt, comprehensive_analysis_config())
+        else:
+            results = await run_chunked_json_prompt(
+                dpr_text, build_prompt, ANALYSIS_PROMPT_CHARS, generation_config=comprehensive_analysis_config()
+            )
+        analysis = merge_chunk_analyses(results)
+        analysis["chunked_analysis"] = {"chunks_analyzed": len(results), "document_characters": len(dpr_text)}
+        print(f"[COMPLETE] Chunked analysis done. Score: {analysis.get('overall_score', 'N/A')}")
+        return analysis
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        print(f"[ERROR] Chunked analysis error: {e}")
+        return {
+            "error": str(e),
+            "overall_score": 50,
+            "actionable_insights": ["Manual review required due to processing error"],
+            "recommendations": ["System encountered an error - manual expert review is required"],
+            "approval_recommendation": {
+                "decision": "REVISE",
+                "confidence": 0,
+                "reasoning": "Analysis could not be completed due to technical error. Please ensure document is properly formatted and try again, or conduct manual review."
+            },
+            "summary": "Analysis encountered a technical error and could not be completed. Manual review by expert assessor is recommended."
+        }
+
+
+# Mandatory MDoNER requirements, numbered as in the compliance prompt
+MDONER_MANDATORY_REQUIREMENTS = {
+    1: "Project Location in North Eastern Region",
+    2: "Budget Documentation with detailed cost breakdown",
+    3: "Timeline with implementation schedule and milestones",
+    4: "Technical Specifications and design standards",
+    5: "Environmental Clearance status",
+    6: "Social Impact Assessment",
+    7: "Risk Assessment with mitigation strategies",
+    8: "Funding Mechanism with central-state split",
+    9: "Implementing Agency with nodal officer details",
+    10: "Statutory Approvals",
+}
+
+
+def merge_chunk_compliance(results: List[tuple]) -> Dict:
+    """Merge per-chunk compliance checks: a requirement is met if any chunk satisfies it"""
+    met = set()
+    for _, result in results:
+        for number in result.get("requirements_met") or []:
+            try:
+                met.add(int(number))
+            except (TypeError, ValueError):
+                continue
+    unmet = [MDONER_MANDATORY_REQUIREMENTS[n] for n in sorted(MDONER_MANDATORY_REQUIREMENTS) if n not in met]
+    merged = merge_chunk_analyses(results)
+    merged["requirements_met"] = sorted(n for n in met if n in MDONER_MANDATORY_REQUIREMENTS)
+    merged["critical_violations"] = unmet
+    merged["compliant"] = not unmet
+    merged["compliance_score"] = round(100 * len(merged["requirements_met"]) / len(MDONER_MANDATORY_REQUIREMENTS))
+    merged["rejection_reason"] = (
+        None if not unmet
+        else "The DPR does not satisfy these mandatory MDoNER requirements anywhere in the document: " + "; ".join(unmet)
+    )
+    merged["chunked_analysis"] = {"chunks_analyzed": len(results)}
+    return merged
+
+
+def merge_chunk_recommendations(results: List[tuple], limit: int = 8) -> Dict:
+    """Merge fast-mode recommendation sets, interleaving each chunk's priorities"""
+    assessments = [r.get("standard_assessment", "") for _, r in results if r.get("standard_assessment")]
+    queues = [list(r.get("detailed_recommendations", [])) for _, r in results]
+    merged, seen = [], set()
+    while len(merged) < limit and any(queues):
+        for queue in queues:
+            if queue and len(merged) < limit:
+                item = re.sub(r'^PRIORITY\s+\d+\s*-\s*', '', str(queue.pop(0)))
+                if item not in seen:
+                    seen.add(item)
+                    merged.append(f"PRIORITY {len(merged) + 1} - {item}")
+    return {
+        "standard_assessment": assessments[0] if assessments else "",
+        "detailed_recommendations": merged
+    }
+
+
+async def run_dpr_json_prompt(text: str, build_prompt, max_chars: int, merge) -> Dict:
+    """One JSON prompt over the DPR, map-reduced with `merge` when the text exceeds `max_chars`"""
+    if CHUNKED_ANALYSIS_ENABLED and len(text) > max_chars:
+        return merge(await run_chunked_json_prompt(text, build_prompt, max_chars))
+    response_text = await llm_generate(build_prompt(text))
+    return await parse_json_response_async(response_text)
+
+
+@timed_stage("generate_structured_json_sections")
+def generate_structured_json_sections(analysis: Dict, insights: List, risks: Dict, structured_dpr: Dict) -> Dict:
+    """Generate structured sections for JSON output without formatting lines"""
+    
+    overall_score = analysis.get('overall_score', 0)
+    approval = analysis.get('approval_recommendation', {})
+    decision = approval.get('decision', 'N/A')
+    reasoning = approval.get('reasoning', '')
+    summary = analysis.get('summary', '')
+    
+    project_title = structured_dpr.get('project_title', 'this project')
+    project_type = structured_dpr.get('project_type', 'Infrastructure Project')
+    location = structured_dpr.get('location', 'Not specified')
+    implementing_agency = structured_dpr.get('implementing_agency', 'Not specified')
+    duration = structured_dpr.get('duration', 'Not specified')
+    budget = structured_dpr.get('budget', {}).get('total', 0)
+    budget_details = structured_dpr.get('budget', {}).get('details', 'Not specified')
+    
+    # Format budget
+    budget_formatted = "Not specified"
+    if budget > 0:
+        budget_crores = budget / 10000000
+        budget_formatted = f"Rs. {budget_crores:.2f} Crores"
+    
+    sections = {}
+    
+    # Executive Summary Section
+    sections['executive_summary'] = {
+        'overall_score': f"{overall_score}/100",
+        'recommendation': decision,
+        'analysis_date': datetime.now().strftime('%B %d, %Y at %I:%M %p'),
+        'summary': summary if summary else reasoning
+    }
+    
+    # Budget Analysis Section
+    budget_eval = analysis.get('budget_validation', {})
+    budget_section = ""
+    
+    if budget_eval:
+        is_valid = budget_eval.get('is_valid')
+        
+        # Pure paragraph format - no labels
+        if is_valid:
+            budget_section += f"After careful review of the project budget totaling {budget_details}, "
+            budget_section += "the financial allocation appears realistic and well-structured. "
+            budget_section += "The cost breakdown demonstrates proper planning with adequate provisions for contingencies. "
+        else:
+            budget_section += f"The project budget of {budget_details} has been thoroughly analyzed, and several concerns have been identified. "
+            
+            # Convert issues to flowing text
+            issues = budget_eval.get('issues', [])
+            if issues:
+                issue_descriptions = []
+                for issue in issues:
+                    if isinstance(issue, dict):
+                        desc = issue.get('description', str(issue))
+                        severity = issue.get('severity', 'medium')
+                        issue_descriptions.append(f"there is a {severity} severity concern regarding {desc.lower().rstrip('.')}")
+                    else:
+                        issue_descriptions.append(str(issue).lower().rstrip('.'))
+                
+                if issue_descriptions:
+                    if len(issue_descriptions) == 1:
+                        budget_section += f"Specifically, {issue_descriptions[0]}. "
+                    elif len(issue_descriptions) == 2:
+                        budget_section += f"Specifically, {issue_descriptions[0]} and {issue_descriptions[1]}. "
+                    else:
+                        budget_section += f"Specifically, {issue_descriptions[0]}, {', '.join(issue_descriptions[1:-1])}, and {issue_descriptions[-1]}. "
+        
+        # Add detailed comments as flowing text
+        if budget_eval.get('comments'):
+            comments = budget_eval.get('comments')
+            # Handle both string and dict types
+            if isinstance(comments, dict):
+                comments = str(comments)
+            elif not isinstance(comments, str):
+                comments = str(comments)
+            comments = comments.strip()
+            if not budget_section.endswith('. '):
+                budget_section += " "
+            budget_section += comments
+    else:
+        # Generate comprehensive budget analysis from available data
+        budget_section = f"The proposed project budget of {budget_details} has been reviewed against standard cost norms and industry benchmarks for similar infrastructure projects in the North Eastern Region. "
+        
+        # Extract budget-related insights from recommendations
+        budget_insights = [i for i in insights if any(term in i.lower() for term in ['budget', 'cost', 'contingency', 'financial', 'rate', 'expenditure', 'unit', 'price'])]
+        
+        if budget_insights:
+            budget_section += "The financial analysis has identified several important considerations. "
+            for insight in budget_insights[:3]:  # Use top 3 budget-related insights
+                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
+                clean_insight = clean_insight.replace('[Budget]', '').replace('[Financial]', '').replace('[Cost]', '').replace('[', '').replace(']', '').strip()
+                if not clean_insight.endswith('.'):
+                    clean_insight += '.'
+                budget_section += clean_insight + " "
+            budget_section += "These aspects require immediate attention to ensure fiscal prudence and optimal resource utilization. "
+        else:
+            budget_section += "The cost structure requires detailed scrutiny to ensure all components are adequately justified with proper market rate comparisons. "
+            budget_section += "Contingency provisions should be maintained at industry-standard levels (typically 5-10% for infrastructure projects) to accommodate unforeseen expenses. "
+            budget_section += "All unit rates and quantities should be verified against current market conditions and authenticated through competitive quotations. "
+        
+        budget_section += "Regular budget monitoring and variance analysis will be essential during implementation to prevent cost overruns and ensure value for money."
+    
+    sections['budget_analysis'] = budget_section.strip()
+    
+    # Timeline Evaluation Section
+    timeline_eval = analysis.get('timeline_validation', {})
+    timeline_section = ""
+    
+    if timeline_eval:
+        is_realistic = timeline_eval.get('is_realistic')
+        
+        # Pure paragraph format
+        if is_realistic:
+            timeline_section += f"The proposed project duration of {duration} has been carefully evaluated and appears realistic and achievable. "
+            timeline_section += "The phasing and scheduling demonstrate sound project management principles with adequate buffer time for unforeseen circumstances. "
+        else:
+            timeline_section += f"Upon reviewing the proposed timeline of {duration}, several concerns have emerged regarding its feasibility. "
+            
+            issues = timeline_eval.get('issues', [])
+            if issues:
+                issue_texts = []
+                for issue in issues:
+                    if isinstance(issue, dict):
+                        desc = issue.get('description', str(issue))
+                        issue_texts.append(desc.rstrip('.'))
+                    else:
+                        issue_texts.append(str(issue).rstrip('.'))
+                
+                if issue_texts:
+                    timeline_section += "Key challenges include "
+                    if len(issue_texts) == 1:
+                        timeline_section += issue_texts[0].lower()
+                    elif len(issue_texts) == 2:
+                        timeline_section += issue_texts[0].lower() + " and " + issue_texts[1].lower()
+                    else:
+                        timeline_section += ", ".join([t.lower() for t in issue_texts[:-1]]) + ", and " + issue_texts[-1].lower()
+                    timeline_section += ". "
+        
+        # Add detailed comments
+        if timeline_eval.get('comments'):
+            comments = timeline_eval.get('comments')
+            # Handle both string and dict types
+            if isinstance(comments, dict):
+                comments = str(comments)
+            elif not isinstance(comments, str):
+                comments = str(comments)
+            comments = comments.strip()
+            if not timeline_section.endswith('. '):
+                timeline_section += " "
+            timeline_section += comments
+    else:
+        # Generate comprehensive timeline analysis from available data
+        timeline_section = f"The proposed project implementation timeline of {duration} has been assessed against typical execution periods for comparable infrastructure projects in the North Eastern Region. "
+        
+        # Extract timeline-related insights
+        timeline_insights = [i for i in insights if any(term in i.lower() for term in ['timeline', 'schedule', 'delay', 'duration', 'phase', 'completion', 'milestone'])]
+        
+        if timeline_insights:
+            timeline_section += "The temporal analysis reveals several critical factors. "
+            for insight in timeline_insights[:2]:  # Use top 2 timeline insights
+                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
+                clean_insight = clean_insight.replace('[Timeline]', '').replace('[Schedule]', '').replace('[', '').replace(']', '').strip()
+                if not clean_insight.endswith('.'):
+                    clean_insight += '.'
+                timeline_section += clean_insight + " "
+        else:
+            timeline_section += "The execution timeline should account for several region-specific factors including seasonal monsoon patterns, terrain accessibility challenges, and material procurement logistics. "
+            timeline_section += "A detailed activity schedule with clearly defined milestones and critical path analysis would strengthen the implementation plan. "
+        
+        timeline_section += "Adequate buffer time should be incorporated to handle unforeseen delays, particularly those related to weather conditions and logistical constraints typical of the North Eastern Region. "
+        timeline_section += "Regular progress monitoring with quarterly reviews will be essential to ensure timely completion and early identification of potential delays."
+    
+    sections['timeline_evaluation'] = timeline_section.strip()
+    
+    # Technical Feasibility Section
+    tech_eval = analysis.get('technical_feasibility', {})
+    tech_section = ""
+    
+    if tech_eval:
+        tech_score = tech_eval.get('score', 0)
+        
+        # Pure paragraph format - no score labels
+        if tech_score >= 80:
+            tech_section += "The technical assessment reveals strong project feasibility with robust engineering design and sound technical foundations. "
+        elif tech_score >= 60:
+            tech_section += "The technical evaluation indicates moderate feasibility with generally acceptable design standards, though some aspects require attention. "
+        else:
+            tech_section += "The technical review has identified significant feasibility concerns that need to be addressed to ensure project success. "
+        
+        # Strengths in flowing text
+        if tech_eval.get('strengths'):
+            strengths_list = []
+            for s in tech_eval.get('strengths', []):
+                if isinstance(s, str):
+                    strengths_list.append(s.strip().rstrip('.'))
+                else:
+                    strengths_list.append(str(s).strip().rstrip('.'))
+            if strengths_list:
+                tech_section += "Notable strengths include "
+                if len(strengths_list) == 1:
+                    tech_section += strengths_list[0].lower()
+                elif len(strengths_list) == 2:
+                    tech_section += strengths_list[0].lower() + " and " + strengths_list[1].lower()
+                else:
+                    tech_section += ", ".join([s.lower() for s in strengths_list[:-1]]) + ", and " + strengths_list[-1].lower()
+                tech_section += ". "
+        
+        # Weaknesses in flowing text
+        if tech_eval.get('weaknesses'):
+            weaknesses_list = []
+            for w in tech_eval.get('weaknesses', []):
+                if isinstance(w, str):
+                    weaknesses_list.append(w.strip().rstrip('.'))
+                else:
+                    weaknesses_list.append(str(w).strip().rstrip('.'))
+            if weaknesses_list:
+                tech_section += "However, areas requiring improvement encompass "
+                if len(weaknesses_list) == 1:
+                    tech_section += weaknesses_list[0].lower()
+                elif len(weaknesses_list) == 2:
+                    tech_section += weaknesses_list[0].lower() + " and " + weaknesses_list[1].lower()
+                else:
+                    tech_section += ", ".join([w.lower() for w in weaknesses_list[:-1]]) + ", and " + weaknesses_list[-1].lower()
+                tech_section += ". "
+        
+        # Add detailed comments
+        if tech_eval.get('comments'):
+            comments = tech_eval.get('comments')
+            # Handle both string and dict types
+            if isinstance(comments, dict):
+                comments = str(comments)
+            elif not isinstance(comments, str):
+                comments = str(comments)
+            comments = comments.strip()
+            if not tech_section.endswith('. '):
+                tech_section += " "
+            tech_section += comments
+    else:
+        # Generate comprehensive technical analysis from available data
+        overall_score = analysis.get('overall_score', 70)
+        
+        if overall_score >= 80:
+            tech_section += "The technical assessment reveals strong engineering foundations with appropriate design standards for the proposed infrastructure. "
+        elif overall_score >= 60:
+            tech_section += "The technical evaluation indicates generally sound engineering principles, though certain aspects would benefit from additional detail and validation. "
+        else:
+            tech_section += "The technical review suggests that several engineering and design elements require further development and refinement. "
+        
+        # Extract technical insights
+        tech_insights = [i for i in insights if any(term in i.lower() for term in ['technical', 'design', 'engineering', 'specification', 'quality', 'construction', 'material', 'survey'])]
+        
+        if tech_insights:
+            tech_section += "Specific technical considerations include the following. "
+            for insight in tech_insights[:3]:  # Use top 3 technical insights
+                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
+                clean_insight = clean_insight.replace('[Technical]', '').replace('[Design]', '').replace('[Engineering]', '').replace('[', '').replace(']', '').strip()
+                if not clean_insight.endswith('.'):
+                    clean_insight += '.'
+                tech_section += clean_insight + " "
+        else:
+            tech_section += "The project should incorporate detailed technical specifications covering design parameters, material quality standards, construction methodology, and quality assurance protocols. "
+            tech_section += "Comprehensive geological and geotechnical surveys should be conducted to validate design assumptions and identify potential ground-related challenges. "
+        
+        tech_section += "Technical review at each project milestone will ensure adherence to approved standards and specifications, while also allowing for adaptive management based on field conditions."
+    
+    sections['technical_feasibility'] = tech_section.strip()
+    
+    # Risk Assessment Section
+    risk_eval = analysis.get('risk_assessment', {})
+    risk_section = ""
+    
+    if risk_eval:
+        risk_level = risk_eval.get('overall_risk_level', 'unknown').lower()
+        
+        # Pure paragraph format - no risk level labels
+        if risk_level == 'low':
+            risk_section += "The comprehensive risk assessment indicates a favorable outlook with manageable uncertainties throughout the project lifecycle. "
+        elif risk_level == 'medium':
+            risk_section += "The risk evaluation reveals a moderate level of exposure that is typical for infrastructure projects of this scale and complexity. "
+        elif risk_level == 'high':
+            risk_section += "The risk analysis has identified significant concerns that require careful attention and robust mitigation strategies to ensure project success. "
+        else:
+            risk_section += "A thorough risk assessment has been conducted to identify potential challenges and mitigation approaches. "
+        
+        # Collect all risks in flowing paragraphs
+        all_risks = []
+        
+        # Financial risks
+        if risk_eval.get('financial_risks'):
+            for risk in risk_eval.get('financial_risks', []):
+                if isinstance(risk, dict):
+                    risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
+                    mitigation = risk.get('mitigation', '')
+                    # Ensure we have strings
+                    if not isinstance(risk_text, str):
+                        risk_text = str(risk_text)
+                    if not isinstance(mitigation, str):
+                        mitigation = str(mitigation)
+                    risk_desc = risk_text.strip().rstrip('.')
+                    if mitigation:
+                        risk_desc += f", which can be addressed through {mitigation.strip().rstrip('.').lower()}"
+                    all_risks.append(('financial', risk_desc))
+                else:
+                    all_risks.append(('financial', str(risk).strip().rstrip('.')))
+        
+        # Timeline risks
+        if risk_eval.get('timeline_risks'):
+            for risk in risk_eval.get('timeline_risks', []):
+                if isinstance(risk, dict):
+                    risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
+                    mitigation = risk.get('mitigation', '')
+                    # Ensure we have strings
+                    if not isinstance(risk_text, str):
+                        risk_text = str(risk_text)
+                    if not isinstance(mitigation, str):
+                        mitigation = str(mitigation)
+                    risk_desc = risk_text.strip().rstrip('.')
+                    if mitigation:
+                        risk_desc += f", with recommended mitigation being to {mitigation.strip().rstrip('.').lower()}"
+                    all_risks.append(('timeline', risk_desc))
+                else:
+                    all_risks.append(('timeline', str(risk).strip().rstrip('.')))
+        
+        # Environmental risks
+        if risk_eval.get('environmental_risks'):
+            for risk in risk_eval.get('environmental_risks', []):
+                if isinstance(risk, dict):
+                    risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
+                    mitigation = risk.get('mitigation', '')
+                    # Ensure we have strings
+                    if not isinstance(risk_text, str):
+                        risk_text = str(risk_text)
+                    if not isinstance(mitigation, str):
+                        mitigation = str(mitigation)
+                    risk_desc = risk_text.strip().rstrip('.')
+                    if mitigation:
+                        risk_desc += f", manageable through {mitigation.strip().rstrip('.').lower()}"
+                    all_risks.append(('environmental', risk_desc))
+                else:
+                    all_risks.append(('environmental', str(risk).strip().rstrip('.')))
+        
+        # Resource risks
+        if risk_eval.get('resource_risks'):
+            for risk in risk_eval.get('resource_risks', []):
+                if isinstance(risk, dict):
+                    risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
+                    mitigation = risk.get('mitigation', '')
+                    # Ensure we have strings
+                    if not isinstance(risk_text, str):
+                        risk_text = str(risk_text)
+                    if not isinstance(mitigation, str):
+                        mitigation = str(mitigation)
+                    risk_desc = risk_text.strip().rstrip('.')
+                    if mitigation:
+                        risk_desc += f", which can be managed by {mitigation.strip().rstrip('.').lower()}"
+                    all_risks.append(('resource', risk_desc))
+                else:
+                    all_risks.append(('resource', str(risk).strip().rstrip('.')))
+        
+        # Group risks by category and write in flowing text
+        if all_risks:
+            financial_risks = [r[1] for r in all_risks if r[0] == 'financial']
+            timeline_risks = [r[1] for r in all_risks if r[0] == 'timeline']
+            env_risks = [r[1] for r in all_risks if r[0] == 'environmental']
+            resource_risks = [r[1] for r in all_risks if r[0] == 'resource']
+            
+            if financial_risks:
+                risk_section += "From a financial perspective, key considerations include "
+                risk_section += " and ".join(financial_risks) if len(financial_risks) <= 2 else ", ".join(financial_risks[:-1]) + ", and " + financial_risks[-1]
+                risk_section += ". "
+            
+            if timeline_risks:
+                risk_section += "Schedule-related concerns involve "
+                risk_section += " and ".join(timeline_risks) if len(timeline_risks) <= 2 else ", ".join(timeline_risks[:-1]) + ", and " + timeline_risks[-1]
+                risk_section += ". "
+            
+            if env_risks:
+                risk_section += "Environmental factors to monitor include "
+                risk_section += " and ".join(env_risks) if len(env_risks) <= 2 else ", ".join(env_risks[:-1]) + ", and " + env_risks[-1]
+                risk_section += ". "
+            
+            if resource_risks:
+                risk_section += "Resource availability challenges encompass "
+                risk_section += " and ".join(resource_risks) if len(resource_risks) <= 2 else ", ".join(resource_risks[:-1]) + ", and " + resource_risks[-1]
+                risk_section += ". "
+    else:
+        # Generate comprehensive risk analysis from available data
+        overall_score = analysis.get('overall_score', 70)
+        decision = analysis.get('approval_recommendation', {}).get('decision', 'REVISE')
+        
+        if decision == 'APPROVE' or overall_score >= 85:
+            risk_section += "The risk assessment indicates manageable project uncertainties with standard mitigation strategies applicable throughout the implementation lifecycle. "
+        elif decision == 'REVISE' or overall_score >= 60:
+            risk_section += "The risk evaluation reveals moderate exposure typical for infrastructure projects of this nature, requiring vigilant monitoring and proactive management. "
+        else:
+            risk_section += "The risk analysis identifies significant concerns that necessitate careful attention, robust mitigation planning, and contingency arrangements. "
+        
+        # Extract risk-related insights
+        risk_insights = [i for i in insights if any(term in i.lower() for term in ['risk', 'challenge', 'issue', 'concern', 'problem', 'vulnerability', 'threat'])]
+        
+        if risk_insights:
+            risk_section += "Critical risk factors include the following areas. "
+            for insight in risk_insights[:3]:  # Use top 3 risk insights
+                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
+                clean_insight = clean_insight.replace('[Risk]', '').replace('[Challenge]', '').replace('[', '').replace(']', '').strip()
+                if not clean_insight.endswith('.'):
+                    clean_insight += '.'
+                risk_section += clean_insight + " "
+        else:
+            risk_section += "Standard project risks including cost escalation, schedule delays, quality deviations, and resource constraints should be addressed through a comprehensive risk management framework. "
+            risk_section += "Specific attention should be given to region-specific challenges such as seasonal accessibility, material transportation logistics, and availability of skilled workforce. "
+        
+        risk_section += "A dedicated risk register should be maintained and regularly updated, with clear ownership assigned for monitoring and mitigating each identified risk throughout the project duration."
+    
+    sections['risk_assessment'] = risk_section.strip()
+    
+    # Actionable Recommendations Section
+    recommendations_section = ""
+    if insights and len(insights) > 0:
+        recommendations_section += "Based on our comprehensive analysis, the following actionable recommendations are provided to strengthen this DPR and enhance the project's success potential. "
+        
+        # Convert list to flowing text - clean and merge into paragraphs
+        rec_texts = []
+        for insight in insights:
+            # Clean up any numbering or priority markers
+            clean_insight = insight.strip().rstrip('.')
+            # Remove patterns like "PRIORITY 1 -", "[Category]", numbers, etc.
+            import re
+            clean_insight = re.sub(r'PRIORITY \d+ -\s*', '', clean_insight)
+            clean_insight = re.sub(r'\[.*?\]\s*', '', clean_insight)
+            clean_insight = re.sub(r'^\d+\.\s*', '', clean_insight)
+            if clean_insight:
+                rec_texts.append(clean_insight)
+        
+        # Join all recommendations into flowing text
+        if len(rec_texts) > 0:
+            # First set of recommendations
+            if len(rec_texts) <= 3:
+                recommendations_section += " Additionally, ".join(rec_texts) + ". "
+            else:
+                # Split into multiple sentences for better flow
+                recommendations_section += rec_texts[0] + ". "
+                recommendations_section += "Furthermore, " + rec_texts[1] + ". "
+                recommendations_section += "It is also important to " + rec_texts[2].lower() + ". "
+                
+                if len(rec_texts) > 3:
+                    recommendations_section += "\n\n"
+                    recommendations_section += "In addition, " + rec_texts[3] + ". "
+                    
+                if len(rec_texts) > 4:
+                    recommendations_section += "Moreover, " + rec_texts[4] + ". "
+                    
+                if len(rec_texts) > 5:
+                    recommendations_section += "Finally, " + rec_texts[5] + ". "
+                    
+                # Add remaining recommendations if any
+                if len(rec_texts) > 6:
+                    remaining = " ".join([r + "." for r in rec_texts[6:]])
+                    recommendations_section += remaining
+    else:
+        recommendations_section = "Please review the detailed analysis sections above for specific recommendations tailored to this project."
+    
+    sections['actionable_recommendations'] = recommendations_section.rstrip()
+    
+    # Compliance Check Section
+    compliance = analysis.get('compliance_check', {})
+    compliance_section = ""
+    
+    if compliance:
+        is_compliant = compliance.get('is_compliant')
+        
+        if is_compliant:
+            compliance_section += "The DPR demonstrates strong compliance with MDoNER guidelines and regulatory requirements. "
+            compliance_section += "All necessary statutory clearances and documentation standards appear to be adequately addressed. "
         else:
-            # Fallback: extract recommendations from analysis
-            fallback_insights = []
-            if analysis.get('recommendations'):
-                fallback_insights = analysis['recommendations'][:7]
-            return fallback_insights if fallback_insights else ["Review detailed analysis for comprehensive findings"]
-    except Exception as e:
-        print(f"[WARNING] Insights generation error: {e}")
-        # Extract from recommendations as fallback
-        if analysis.get('recommendations'):
-            return analysis['recommendations'][:7]
-        return ["Review detailed analysis for findings"]
-
-
-async def assess_risks(dpr_text: str, project_type: str) -> Dict:
-    """Assess project risks"""
-    prompt = f"""
-Analyze risks for this {project_type} project in North Eastern India:
-
-{dpr_text[:8000]}
-
-Return JSON:
-{{
-    "overall_risk_level": "low/medium/high/critical",
-    "overall_risk_score": <0-100>,
-    "financial_risks": [{{"risk": "...", "severity": "...", "mitigation": "..."}}],
-    "timeline_risks": [...],
-    "environmental_risks": [...],
-    "resource_risks": [...]
-}}
-"""
+            compliance_section += "While the DPR shows effort in meeting regulatory requirements, several compliance gaps have been identified that need attention. "
+            
+            gaps = compliance.get('guideline_gaps', [])
+            if gaps:
+                clean_gaps = [g.strip().rstrip('.') for g in gaps]
+                compliance_section += "Specifically, the following areas require improvement including "
+                if len(clean_gaps) == 1:
+                    compliance_section += clean_gaps[0]
+                elif len(clean_gaps) == 2:
+                    compliance_section += clean_gaps[0] + " and " + clean_gaps[1]
+                else:
+                    compliance_section += ", ".join(clean_gaps[:-1]) + ", and " + clean_gaps[-1]
+                compliance_section += ". "
+        
+        if compliance.get('comments'):
+            compliance_section += f" {compliance.get('comments')}"
+    else:
+        # Generate comprehensive compliance analysis from available data
+        overall_score = analysis.get('overall_score', 70)
+        
+        if overall_score >= 80:
+            compliance_section += "The documentation demonstrates strong adherence to MDoNER guidelines and statutory requirements for project proposals in the North Eastern Region. "
+            compliance_section += "The DPR format, content structure, and level of detail align well with prescribed standards for infrastructure projects. "
+        elif overall_score >= 60:
+            compliance_section += "The DPR shows reasonable compliance with MDoNER guidelines, though certain areas would benefit from additional documentation and clarity. "
+            compliance_section += "The overall structure follows required standards, but some specific sections require strengthening. "
+        else:
+            compliance_section += "The compliance assessment reveals several gaps in meeting MDoNER guideline requirements that must be addressed for approval consideration. "
+            compliance_section += "Both the documentation completeness and content quality need significant improvement. "
+        
+        # Extract compliance-related insights
+        compliance_insights = [i for i in insights if any(term in i.lower() for term in ['compliance', 'guideline', 'requirement', 'standard', 'regulation', 'clearance', 'approval', 'documentation', 'section', 'missing'])]
+        
+        if compliance_insights:
+            compliance_section += "Specific compliance considerations include the following aspects. "
+            for insight in compliance_insights[:3]:  # Use top 3 compliance insights
+                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
+                clean_insight = clean_insight.replace('[Compliance]', '').replace('[Documentation]', '').replace('[Guideline]', '').replace('[', '').replace(']', '').strip()
+                if not clean_insight.endswith('.'):
+                    clean_insight += '.'
+                compliance_section += clean_insight + " "
+        else:
+            compliance_section += "Essential statutory clearances including environmental, forest, and wildlife approvals (where applicable) must be secured before project commencement. "
+            compliance_section += "All sections mandated by MDoNER guidelines should be present with adequate depth and supporting documentation. "
+        
+        compliance_section += "Regular compliance audits during implementation will ensure continued adherence to approved standards and regulatory requirements."
     
-    try:
-        response = gemini_model.generate_content(prompt)
-        return parse_json_response(response.text)
-    except:
-        return {"overall_risk_level": "medium", "overall_risk_score": 50}
-
-
-async def translate_report(report: Dict, target_language: str) -> Dict:
-    """Translate report to target language"""
-    if target_language == "en":
-        return report
+    sections['compliance_check'] = compliance_section.rstrip()
     
-    language_map = {
-        'hi': 'Hindi (हिन्दी)',
-        'as': 'Assamese (অসমীয়া)',
-        'bn': 'Bengali (বাংলা)',
-        'mni': 'Manipuri',
-        'ne': 'Nepali (नेपाली)'
-    }
+    # Final Assessment Section
+    final_assessment = ""
+    if decision == "APPROVE":
+        final_assessment += "After thorough evaluation of all aspects of this project, I recommend approval for implementation. "
+        final_assessment += "The DPR demonstrates strong planning, technical feasibility, and alignment with MDoNER's development objectives for the North Eastern Region. "
+        final_assessment += "The project is well-prepared and ready to move forward to the execution phase."
+    elif decision == "REVISE":
+        final_assessment += "Based on this comprehensive analysis, I recommend that the DPR be revised to address the concerns identified throughout this assessment. "
+        final_assessment += "While the project shows promise and has several strong elements, the issues highlighted need to be resolved before approval. "
+        final_assessment += "Once these revisions are made, the project should be well-positioned for successful implementation."
+    else:
+        final_assessment += "After careful evaluation, I must recommend rejection of this DPR in its current form. "
+        final_assessment += "The analysis has revealed significant issues that fundamentally impact the project's viability and alignment with MDoNER guidelines. "
+        final_assessment += "These concerns need to be thoroughly addressed through a substantially revised submission."
     
-    target_lang = language_map.get(target_language, 'Hindi')
+    if reasoning:
+        final_assessment += f"\n\n{reasoning}"
     
-    prompt = f"""
-Translate this DPR analysis to {target_lang}.
-Maintain JSON structure, only translate text values.
-
-{json.dumps(report, indent=2)[:8000]}
-
-Return translated JSON.
-"""
+    sections['final_assessment'] = final_assessment
     
-    try:
-        response = gemini_model.generate_content(prompt)
-        return parse_json_response(response.text)
-    except:
-        return report
+    return sections
 
 
-def generate_structured_json_sections(analysis: Dict, insights: List, risks: Dict, structured_dpr: Dict) -> Dict:
-    """Generate structured sections for JSON output without formatting lines"""
+def generate_chatgpt_style_response(analysis: Dict, insights: List, risks: Dict, structured_dpr: Dict) -> str:
+    """Generate a structured, detailed, and human-readable response"""
     
     overall_score = analysis.get('overall_score', 0)
     approval = analysis.get('approval_recommendation', {})
@@ -1002,839 +3858,2461 @@ def generate_structured_json_sections(analysis: Dict, insights: List, risks: Dic
         budget_crores = budget / 10000000
         budget_formatted = f"Rs. {budget_crores:.2f} Crores"
     
-    sections = {}
-    
-    # Executive Summary Section
-    sections['executive_summary'] = {
-        'overall_score': f"{overall_score}/100",
-        'recommendation': decision,
-        'analysis_date': datetime.now().strftime('%B %d, %Y at %I:%M %p'),
-        'summary': summary if summary else reasoning
-    }
+    response = f"""
+================================================================================
+                        DPR ANALYSIS REPORT
+================================================================================
+
+PROJECT INFORMATION:
+-------------------
+Project Title       : {project_title}
+Project Type        : {project_type}
+Location            : {location}
+Implementing Agency : {implementing_agency}
+Project Duration    : {duration}
+Estimated Budget    : {budget_formatted}
+
+================================================================================
+                        EXECUTIVE SUMMARY
+================================================================================
+
+Overall Score       : {overall_score}/100
+Recommendation      : {decision}
+Analysis Date       : {datetime.now().strftime('%B %d, %Y at %I:%M %p')}
+
+{summary if summary else reasoning}
+
+================================================================================
+                        SECTION 1: BUDGET ANALYSIS
+================================================================================
+"""
     
-    # Budget Analysis Section
     budget_eval = analysis.get('budget_validation', {})
-    budget_section = ""
     
     if budget_eval:
-        is_valid = budget_eval.get('is_valid')
+        validity_status = "VALID" if budget_eval.get('is_valid') else "REQUIRES ATTENTION"
+        response += f"\nBudget Status: [{validity_status}]\n"
+        response += f"Budget Amount: {budget_details}\n\n"
         
-        # Pure paragraph format - no labels
-        if is_valid:
-            budget_section += f"After careful review of the project budget totaling {budget_details}, "
-            budget_section += "the financial allocation appears realistic and well-structured. "
-            budget_section += "The cost breakdown demonstrates proper planning with adequate provisions for contingencies. "
+        if budget_eval.get('is_valid'):
+            response += "Assessment: The budget allocation appears realistic and well-structured.\n"
         else:
-            budget_section += f"The project budget of {budget_details} has been thoroughly analyzed, and several concerns have been identified. "
-            
-            # Convert issues to flowing text
-            issues = budget_eval.get('issues', [])
-            if issues:
-                issue_descriptions = []
-                for issue in issues:
-                    if isinstance(issue, dict):
-                        desc = issue.get('description', str(issue))
-                        severity = issue.get('severity', 'medium')
-                        issue_descriptions.append(f"there is a {severity} severity concern regarding {desc.lower().rstrip('.')}")
-                    else:
-                        issue_descriptions.append(str(issue).lower().rstrip('.'))
-                
-                if issue_descriptions:
-                    if len(issue_descriptions) == 1:
-                        budget_section += f"Specifically, {issue_descriptions[0]}. "
-                    elif len(issue_descriptions) == 2:
-                        budget_section += f"Specifically, {issue_descriptions[0]} and {issue_descriptions[1]}. "
-                    else:
-                        budget_section += f"Specifically, {issue_descriptions[0]}, {', '.join(issue_descriptions[1:-1])}, and {issue_descriptions[-1]}. "
+            response += "Assessment: Budget concerns have been identified that require attention.\n\n"
+            response += "IDENTIFIED ISSUES:\n"
+            for idx, issue in enumerate(budget_eval.get('issues', []), 1):
+                if isinstance(issue, dict):
+                    severity = issue.get('severity', 'medium')
+                    description = issue.get('description', str(issue))
+                    response += f"  {idx}. {description}\n"
+                    response += f"     Severity: {severity.upper()}\n"
+                else:
+                    response += f"  {idx}. {issue}\n"
         
-        # Add detailed comments as flowing text
         if budget_eval.get('comments'):
-            comments = budget_eval.get('comments')
-            # Handle both string and dict types
-            if isinstance(comments, dict):
-                comments = str(comments)
-            elif not isinstance(comments, str):
-                comments = str(comments)
-            comments = comments.strip()
-            if not budget_section.endswith('. '):
-                budget_section += " "
-            budget_section += comments
+            response += f"\nDetailed Assessment:\n{budget_eval.get('comments')}\n"
     else:
-        # Generate comprehensive budget analysis from available data
-        budget_section = f"The proposed project budget of {budget_details} has been reviewed against standard cost norms and industry benchmarks for similar infrastructure projects in the North Eastern Region. "
-        
-        # Extract budget-related insights from recommendations
-        budget_insights = [i for i in insights if any(term in i.lower() for term in ['budget', 'cost', 'contingency', 'financial', 'rate', 'expenditure', 'unit', 'price'])]
-        
-        if budget_insights:
-            budget_section += "The financial analysis has identified several important considerations. "
-            for insight in budget_insights[:3]:  # Use top 3 budget-related insights
-                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
-                clean_insight = clean_insight.replace('[Budget]', '').replace('[Financial]', '').replace('[Cost]', '').replace('[', '').replace(']', '').strip()
-                if not clean_insight.endswith('.'):
-                    clean_insight += '.'
-                budget_section += clean_insight + " "
-            budget_section += "These aspects require immediate attention to ensure fiscal prudence and optimal resource utilization. "
-        else:
-            budget_section += "The cost structure requires detailed scrutiny to ensure all components are adequately justified with proper market rate comparisons. "
-            budget_section += "Contingency provisions should be maintained at industry-standard levels (typically 5-10% for infrastructure projects) to accommodate unforeseen expenses. "
-            budget_section += "All unit rates and quantities should be verified against current market conditions and authenticated through competitive quotations. "
-        
-        budget_section += "Regular budget monitoring and variance analysis will be essential during implementation to prevent cost overruns and ensure value for money."
-    
-    sections['budget_analysis'] = budget_section.strip()
+        response += "\nNo detailed budget validation data available.\n"
     
-    # Timeline Evaluation Section
-    timeline_eval = analysis.get('timeline_validation', {})
-    timeline_section = ""
+    response += "\n"
+    response += "="*80 + "\n"
+    response += "                    SECTION 2: TIMELINE EVALUATION\n"
+    response += "="*80 + "\n"
     
+    timeline_eval = analysis.get('timeline_validation', {})
     if timeline_eval:
-        is_realistic = timeline_eval.get('is_realistic')
+        timeline_status = "REALISTIC" if timeline_eval.get('is_realistic') else "REQUIRES REVIEW"
+        response += f"\nTimeline Status: [{timeline_status}]\n"
+        response += f"Project Duration: {duration}\n\n"
         
-        # Pure paragraph format
-        if is_realistic:
-            timeline_section += f"The proposed project duration of {duration} has been carefully evaluated and appears realistic and achievable. "
-            timeline_section += "The phasing and scheduling demonstrate sound project management principles with adequate buffer time for unforeseen circumstances. "
+        if timeline_eval.get('is_realistic'):
+            response += "Assessment: The project timeline appears realistic and achievable.\n"
         else:
-            timeline_section += f"Upon reviewing the proposed timeline of {duration}, several concerns have emerged regarding its feasibility. "
-            
-            issues = timeline_eval.get('issues', [])
-            if issues:
-                issue_texts = []
-                for issue in issues:
-                    if isinstance(issue, dict):
-                        desc = issue.get('description', str(issue))
-                        issue_texts.append(desc.rstrip('.'))
-                    else:
-                        issue_texts.append(str(issue).rstrip('.'))
-                
-                if issue_texts:
-                    timeline_section += "Key challenges include "
-                    if len(issue_texts) == 1:
-                        timeline_section += issue_texts[0].lower()
-                    elif len(issue_texts) == 2:
-                        timeline_section += issue_texts[0].lower() + " and " + issue_texts[1].lower()
-                    else:
-                        timeline_section += ", ".join([t.lower() for t in issue_texts[:-1]]) + ", and " + issue_texts[-1].lower()
-                    timeline_section += ". "
+            response += "Assessment: Timeline concerns have been identified.\n\n"
+            response += "IDENTIFIED CONCERNS:\n"
+            for idx, issue in enumerate(timeline_eval.get('issues', []), 1):
+                if isinstance(issue, dict):
+                    severity = issue.get('severity', 'medium')
+                    description = issue.get('description', str(issue))
+                    response += f"  {idx}. {description}\n"
+                    response += f"     Severity: {severity.upper()}\n"
+                else:
+                    response += f"  {idx}. {issue}\n"
         
-        # Add detailed comments
         if timeline_eval.get('comments'):
-            comments = timeline_eval.get('comments')
-            # Handle both string and dict types
-            if isinstance(comments, dict):
-                comments = str(comments)
-            elif not isinstance(comments, str):
-                comments = str(comments)
-            comments = comments.strip()
-            if not timeline_section.endswith('. '):
-                timeline_section += " "
-            timeline_section += comments
+            response += f"\nDetailed Assessment:\n{timeline_eval.get('comments')}\n"
     else:
-        # Generate comprehensive timeline analysis from available data
-        timeline_section = f"The proposed project implementation timeline of {duration} has been assessed against typical execution periods for comparable infrastructure projects in the North Eastern Region. "
-        
-        # Extract timeline-related insights
-        timeline_insights = [i for i in insights if any(term in i.lower() for term in ['timeline', 'schedule', 'delay', 'duration', 'phase', 'completion', 'milestone'])]
-        
-        if timeline_insights:
-            timeline_section += "The temporal analysis reveals several critical factors. "
-            for insight in timeline_insights[:2]:  # Use top 2 timeline insights
-                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
-                clean_insight = clean_insight.replace('[Timeline]', '').replace('[Schedule]', '').replace('[', '').replace(']', '').strip()
-                if not clean_insight.endswith('.'):
-                    clean_insight += '.'
-                timeline_section += clean_insight + " "
-        else:
-            timeline_section += "The execution timeline should account for several region-specific factors including seasonal monsoon patterns, terrain accessibility challenges, and material procurement logistics. "
-            timeline_section += "A detailed activity schedule with clearly defined milestones and critical path analysis would strengthen the implementation plan. "
-        
-        timeline_section += "Adequate buffer time should be incorporated to handle unforeseen delays, particularly those related to weather conditions and logistical constraints typical of the North Eastern Region. "
-        timeline_section += "Regular progress monitoring with quarterly reviews will be essential to ensure timely completion and early identification of potential delays."
+        response += "\nNo detailed timeline validation data available.\n"
     
-    sections['timeline_evaluation'] = timeline_section.strip()
+    response += "\n"
+    response += "="*80 + "\n"
+    response += "                   SECTION 3: TECHNICAL FEASIBILITY\n"
+    response += "="*80 + "\n"
     
-    # Technical Feasibility Section
     tech_eval = analysis.get('technical_feasibility', {})
-    tech_section = ""
-    
     if tech_eval:
         tech_score = tech_eval.get('score', 0)
+        response += f"\nTechnical Feasibility Score: {tech_score}/100\n\n"
         
-        # Pure paragraph format - no score labels
-        if tech_score >= 80:
-            tech_section += "The technical assessment reveals strong project feasibility with robust engineering design and sound technical foundations. "
-        elif tech_score >= 60:
-            tech_section += "The technical evaluation indicates moderate feasibility with generally acceptable design standards, though some aspects require attention. "
-        else:
-            tech_section += "The technical review has identified significant feasibility concerns that need to be addressed to ensure project success. "
-        
-        # Strengths in flowing text
         if tech_eval.get('strengths'):
-            strengths_list = []
-            for s in tech_eval.get('strengths', []):
-                if isinstance(s, str):
-                    strengths_list.append(s.strip().rstrip('.'))
-                else:
-                    strengths_list.append(str(s).strip().rstrip('.'))
-            if strengths_list:
-                tech_section += "Notable strengths include "
-                if len(strengths_list) == 1:
-                    tech_section += strengths_list[0].lower()
-                elif len(strengths_list) == 2:
-                    tech_section += strengths_list[0].lower() + " and " + strengths_list[1].lower()
-                else:
-                    tech_section += ", ".join([s.lower() for s in strengths_list[:-1]]) + ", and " + strengths_list[-1].lower()
-                tech_section += ". "
+            response += "STRENGTHS IDENTIFIED:\n"
+            for idx, strength in enumerate(tech_eval.get('strengths', []), 1):
+                response += f"  {idx}. {strength}\n"
+            response += "\n"
         
-        # Weaknesses in flowing text
         if tech_eval.get('weaknesses'):
-            weaknesses_list = []
-            for w in tech_eval.get('weaknesses', []):
-                if isinstance(w, str):
-                    weaknesses_list.append(w.strip().rstrip('.'))
-                else:
-                    weaknesses_list.append(str(w).strip().rstrip('.'))
-            if weaknesses_list:
-                tech_section += "However, areas requiring improvement encompass "
-                if len(weaknesses_list) == 1:
-                    tech_section += weaknesses_list[0].lower()
-                elif len(weaknesses_list) == 2:
-                    tech_section += weaknesses_list[0].lower() + " and " + weaknesses_list[1].lower()
-                else:
-                    tech_section += ", ".join([w.lower() for w in weaknesses_list[:-1]]) + ", and " + weaknesses_list[-1].lower()
-                tech_section += ". "
+            response += "AREAS FOR IMPROVEMENT:\n"
+            for idx, weakness in enumerate(tech_eval.get('weaknesses', []), 1):
+                response += f"  {idx}. {weakness}\n"
+            response += "\n"
         
-        # Add detailed comments
         if tech_eval.get('comments'):
-            comments = tech_eval.get('comments')
-            # Handle both string and dict types
-            if isinstance(comments, dict):
-                comments = str(comments)
-            elif not isinstance(comments, str):
-                comments = str(comments)
-            comments = comments.strip()
-            if not tech_section.endswith('. '):
-                tech_section += " "
-            tech_section += comments
+            response += f"Detailed Assessment:\n{tech_eval.get('comments')}\n"
     else:
-        # Generate comprehensive technical analysis from available data
-        overall_score = analysis.get('overall_score', 70)
-        
-        if overall_score >= 80:
-            tech_section += "The technical assessment reveals strong engineering foundations with appropriate design standards for the proposed infrastructure. "
-        elif overall_score >= 60:
-            tech_section += "The technical evaluation indicates generally sound engineering principles, though certain aspects would benefit from additional detail and validation. "
-        else:
-            tech_section += "The technical review suggests that several engineering and design elements require further development and refinement. "
-        
-        # Extract technical insights
-        tech_insights = [i for i in insights if any(term in i.lower() for term in ['technical', 'design', 'engineering', 'specification', 'quality', 'construction', 'material', 'survey'])]
-        
-        if tech_insights:
-            tech_section += "Specific technical considerations include the following. "
-            for insight in tech_insights[:3]:  # Use top 3 technical insights
-                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
-                clean_insight = clean_insight.replace('[Technical]', '').replace('[Design]', '').replace('[Engineering]', '').replace('[', '').replace(']', '').strip()
-                if not clean_insight.endswith('.'):
-                    clean_insight += '.'
-                tech_section += clean_insight + " "
-        else:
-            tech_section += "The project should incorporate detailed technical specifications covering design parameters, material quality standards, construction methodology, and quality assurance protocols. "
-            tech_section += "Comprehensive geological and geotechnical surveys should be conducted to validate design assumptions and identify potential ground-related challenges. "
-        
-        tech_section += "Technical review at each project milestone will ensure adherence to approved standards and specifications, while also allowing for adaptive management based on field conditions."
+        response += "\nNo detailed technical feasibility data available.\n"
     
-    sections['technical_feasibility'] = tech_section.strip()
+    response += "\n"
+    response += "="*80 + "\n"
+    response += "                     SECTION 4: RISK ASSESSMENT\n"
+    response += "="*80 + "\n"
     
-    # Risk Assessment Section
     risk_eval = analysis.get('risk_assessment', {})
-    risk_section = ""
-    
     if risk_eval:
-        risk_level = risk_eval.get('overall_risk_level', 'unknown').lower()
-        
-        # Pure paragraph format - no risk level labels
-        if risk_level == 'low':
-            risk_section += "The comprehensive risk assessment indicates a favorable outlook with manageable uncertainties throughout the project lifecycle. "
-        elif risk_level == 'medium':
-            risk_section += "The risk evaluation reveals a moderate level of exposure that is typical for infrastructure projects of this scale and complexity. "
-        elif risk_level == 'high':
-            risk_section += "The risk analysis has identified significant concerns that require careful attention and robust mitigation strategies to ensure project success. "
-        else:
-            risk_section += "A thorough risk assessment has been conducted to identify potential challenges and mitigation approaches. "
-        
-        # Collect all risks in flowing paragraphs
-        all_risks = []
+        risk_level = risk_eval.get('overall_risk_level', 'unknown')
+        response += f"\nOverall Risk Level: {risk_level.upper()}\n\n"
         
-        # Financial risks
+        # Financial Risks
         if risk_eval.get('financial_risks'):
-            for risk in risk_eval.get('financial_risks', []):
+            response += "4.1 FINANCIAL RISKS:\n"
+            response += "-" * 40 + "\n"
+            for idx, risk in enumerate(risk_eval.get('financial_risks', []), 1):
                 if isinstance(risk, dict):
                     risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
+                    severity = risk.get('severity', 'unknown')
                     mitigation = risk.get('mitigation', '')
-                    # Ensure we have strings
-                    if not isinstance(risk_text, str):
-                        risk_text = str(risk_text)
-                    if not isinstance(mitigation, str):
-                        mitigation = str(mitigation)
-                    risk_desc = risk_text.strip().rstrip('.')
+                    
+                    response += f"  Risk {idx}: {risk_text}\n"
+                    response += f"    Severity Level: {severity.upper()}\n"
                     if mitigation:
-                        risk_desc += f", which can be addressed through {mitigation.strip().rstrip('.').lower()}"
-                    all_risks.append(('financial', risk_desc))
+                        response += f"    Mitigation Strategy: {mitigation}\n"
+                    response += "\n"
                 else:
-                    all_risks.append(('financial', str(risk).strip().rstrip('.')))
+                    response += f"  Risk {idx}: {risk}\n\n"
         
-        # Timeline risks
+        # Timeline Risks
         if risk_eval.get('timeline_risks'):
-            for risk in risk_eval.get('timeline_risks', []):
+            response += "4.2 TIMELINE RISKS:\n"
+            response += "-" * 40 + "\n"
+            for idx, risk in enumerate(risk_eval.get('timeline_risks', []), 1):
                 if isinstance(risk, dict):
                     risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
+                    severity = risk.get('severity', 'unknown')
                     mitigation = risk.get('mitigation', '')
-                    # Ensure we have strings
-                    if not isinstance(risk_text, str):
-                        risk_text = str(risk_text)
-                    if not isinstance(mitigation, str):
-                        mitigation = str(mitigation)
-                    risk_desc = risk_text.strip().rstrip('.')
+                    
+                    response += f"  Risk {idx}: {risk_text}\n"
+                    response += f"    Severity Level: {severity.upper()}\n"
                     if mitigation:
-                        risk_desc += f", with recommended mitigation being to {mitigation.strip().rstrip('.').lower()}"
-                    all_risks.append(('timeline', risk_desc))
+                        response += f"    Mitigation Strategy: {mitigation}\n"
+                    response += "\n"
                 else:
-                    all_risks.append(('timeline', str(risk).strip().rstrip('.')))
+                    response += f"  Risk {idx}: {risk}\n\n"
         
-        # Environmental risks
+        # Environmental Risks
         if risk_eval.get('environmental_risks'):
-            for risk in risk_eval.get('environmental_risks', []):
+            response += "4.3 ENVIRONMENTAL RISKS:\n"
+            response += "-" * 40 + "\n"
+            for idx, risk in enumerate(risk_eval.get('environmental_risks', []), 1):
                 if isinstance(risk, dict):
                     risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
+                    severity = risk.get('severity', 'unknown')
                     mitigation = risk.get('mitigation', '')
-                    # Ensure we have strings
-                    if not isinstance(risk_text, str):
-                        risk_text = str(risk_text)
-                    if not isinstance(mitigation, str):
-                        mitigation = str(mitigation)
-                    risk_desc = risk_text.strip().rstrip('.')
+                    
+                    response += f"  Risk {idx}: {risk_text}\n"
+                    response += f"    Severity Level: {severity.upper()}\n"
                     if mitigation:
-                        risk_desc += f", manageable through {mitigation.strip().rstrip('.').lower()}"
-                    all_risks.append(('environmental', risk_desc))
+                        response += f"    Mitigation Strategy: {mitigation}\n"
+                    response += "\n"
                 else:
-                    all_risks.append(('environmental', str(risk).strip().rstrip('.')))
+                    response += f"  Risk {idx}: {risk}\n\n"
         
-        # Resource risks
+        # Resource Risks
         if risk_eval.get('resource_risks'):
-            for risk in risk_eval.get('resource_risks', []):
+            response += "4.4 RESOURCE RISKS:\n"
+            response += "-" * 40 + "\n"
+            for idx, risk in enumerate(risk_eval.get('resource_risks', []), 1):
                 if isinstance(risk, dict):
                     risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
+                    severity = risk.get('severity', 'unknown')
                     mitigation = risk.get('mitigation', '')
-                    # Ensure we have strings
-                    if not isinstance(risk_text, str):
-                        risk_text = str(risk_text)
-                    if not isinstance(mitigation, str):
-                        mitigation = str(mitigation)
-                    risk_desc = risk_text.strip().rstrip('.')
+                    
+                    response += f"  Risk {idx}: {risk_text}\n"
+                    response += f"    Severity Level: {severity.upper()}\n"
                     if mitigation:
-                        risk_desc += f", which can be managed by {mitigation.strip().rstrip('.').lower()}"
-                    all_risks.append(('resource', risk_desc))
+                        response += f"    Mitigation Strategy: {mitigation}\n"
+                    response += "\n"
                 else:
-                    all_risks.append(('resource', str(risk).strip().rstrip('.')))
-        
-        # Group risks by category and write in flowing text
-        if all_risks:
-            financial_risks = [r[1] for r in all_risks if r[0] == 'financial']
-            timeline_risks = [r[1] for r in all_risks if r[0] == 'timeline']
-            env_risks = [r[1] for r in all_risks if r[0] == 'environmental']
-            resource_risks = [r[1] for r in all_risks if r[0] == 'resource']
-            
-            if financial_risks:
-                risk_section += "From a financial perspective, key considerations include "
-                risk_section += " and ".join(financial_risks) if len(financial_risks) <= 2 else ", ".join(financial_risks[:-1]) + ", and " + financial_risks[-1]
-                risk_section += ". "
-            
-            if timeline_risks:
-                risk_section += "Schedule-related concerns involve "
-                risk_section += " and ".join(timeline_risks) if len(timeline_risks) <= 2 else ", ".join(timeline_risks[:-1]) + ", and " + timeline_risks[-1]
-                risk_section += ". "
-            
-            if env_risks:
-                risk_section += "Environmental factors to monitor include "
-                risk_section += " and ".join(env_risks) if len(env_risks) <= 2 else ", ".join(env_risks[:-1]) + ", and " + env_risks[-1]
-                risk_section += ". "
-            
-            if resource_risks:
-                risk_section += "Resource availability challenges encompass "
-                risk_section += " and ".join(resource_risks) if len(resource_risks) <= 2 else ", ".join(resource_risks[:-1]) + ", and " + resource_risks[-1]
-                risk_section += ". "
+                    response += f"  Risk {idx}: {risk}\n\n"
     else:
-        # Generate comprehensive risk analysis from available data
-        overall_score = analysis.get('overall_score', 70)
-        decision = analysis.get('approval_recommendation', {}).get('decision', 'REVISE')
+        response += "\nNo detailed risk assessment data available.\n"
+    
+    response += "\n"
+    response += "="*80 + "\n"
+    response += "                 SECTION 5: ACTIONABLE RECOMMENDATIONS\n"
+    response += "="*80 + "\n\n"
+    
+    if insights and len(insights) > 0:
+        response += "Based on the comprehensive analysis, the following actionable steps are\n"
+        response += "recommended to strengthen this DPR:\n\n"
+        for idx, insight in enumerate(insights, 1):
+            response += f"  {idx}. {insight}\n"
+    else:
+        response += "Please review the detailed analysis sections above for specific recommendations.\n"
+    
+    response += "\n"
+    response += "="*80 + "\n"
+    response += "                   SECTION 6: COMPLIANCE CHECK\n"
+    response += "="*80 + "\n\n"
+    
+    compliance = analysis.get('compliance_check', {})
+    if compliance:
+        compliance_status = "COMPLIANT" if compliance.get('is_compliant') else "NON-COMPLIANT"
+        response += f"Compliance Status: [{compliance_status}]\n\n"
         
-        if decision == 'APPROVE' or overall_score >= 85:
-            risk_section += "The risk assessment indicates manageable project uncertainties with standard mitigation strategies applicable throughout the implementation lifecycle. "
-        elif decision == 'REVISE' or overall_score >= 60:
-            risk_section += "The risk evaluation reveals moderate exposure typical for infrastructure projects of this nature, requiring vigilant monitoring and proactive management. "
+        if compliance.get('is_compliant'):
+            response += "Assessment: The DPR appears to be compliant with MDoNER guidelines.\n"
         else:
-            risk_section += "The risk analysis identifies significant concerns that necessitate careful attention, robust mitigation planning, and contingency arrangements. "
+            response += "Assessment: Compliance gaps have been identified:\n\n"
+            response += "IDENTIFIED GAPS:\n"
+            for idx, gap in enumerate(compliance.get('guideline_gaps', []), 1):
+                response += f"  {idx}. {gap}\n"
         
-        # Extract risk-related insights
-        risk_insights = [i for i in insights if any(term in i.lower() for term in ['risk', 'challenge', 'issue', 'concern', 'problem', 'vulnerability', 'threat'])]
+        if compliance.get('comments'):
+            response += f"\nDetailed Assessment:\n{compliance.get('comments')}\n"
+    else:
+        response += "No detailed compliance data available.\n"
+    
+    response += "\n"
+    response += "="*80 + "\n"
+    response += "                      FINAL ASSESSMENT\n"
+    response += "="*80 + "\n\n"
+    
+    if decision == "APPROVE":
+        response += "RECOMMENDATION: APPROVE\n"
+        response += "-" * 40 + "\n"
+        response += "This DPR is well-prepared and ready for approval. The project demonstrates\n"
+        response += "strong planning, feasibility, and alignment with MDoNER guidelines.\n"
+    elif decision == "REVISE":
+        response += "RECOMMENDATION: REVISE\n"
+        response += "-" * 40 + "\n"
+        response += "This DPR shows promise but requires revisions to address the concerns\n"
+        response += "identified in the analysis above.\n"
+    else:
+        response += "RECOMMENDATION: REJECT\n"
+        response += "-" * 40 + "\n"
+        response += "This DPR has significant issues that need to be resolved before it can\n"
+        response += "be approved for implementation.\n"
+    
+    response += "\n"
+    response += "="*80 + "\n"
+    response += "                    END OF ANALYSIS REPORT\n"
+    response += "="*80 + "\n\n"
+    response += "DISCLAIMER: This analysis was generated by AI and should be reviewed by\n"
+    response += "            qualified professionals before making final decisions.\n"
+    response += "\n" + "="*80
+    
+    return response
+
+
+@timed_stage("save_analysis_to_json")
+def save_analysis_to_json(result: Dict, filename: str, structured_sections: Dict = None) -> str:
+    """Save analysis results to a JSON file with structured sections"""
+    os.makedirs("analysis_results", exist_ok=True)
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    json_filename = f"analysis_results/analysis_{timestamp}_{filename.replace('.pdf', '.json').replace('.docx', '.json')}"
+    
+    # Add structured sections to result if provided
+    if structured_sections:
+        result['structured_analysis'] = structured_sections
+        result['structured_analysis_metadata'] = {
+            'generated_at': datetime.now().isoformat(),
+            'format': 'plain_text',
+            'exportable': True,
+            'sections': list(structured_sections.keys())
+        }
+    
+    with open(json_filename, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    
+    try:
+        index_download(result, json_filename)
+    except Exception as e:
+        print(f"[WARNING] Could not update download index: {e}")
+    
+    return json_filename
+
+
+# ============================================================================
+# COMPLIANCE CHECKLIST ENGINE
+# ============================================================================
+# Local, deterministic first pass over the 10 mandatory MDoNER requirements.
+# Each requirement has a topic pattern (is it discussed at all?) and evidence
+# patterns; enough evidence marks it met, with the matching spans returned as
+# evidence. A location outside the eight NER states, or an English DPR that
+# never mentions a requirement's topic, marks it not met. Whatever the rules
+# cannot settle is left "undecided" for the model.
+
+NER_STATES = {
+    "Assam": ["assam", "असम", "অসম"],
+    "Arunachal Pradesh": ["arunachal pradesh", "arunachal", "अरुणाचल प्रदेश", "অৰুণাচল প্ৰদেশ"],
+    "Manipur": ["manipur", "मणिपुर", "মণিপুৰ", "মণিপুর"],
+    "Meghalaya": ["meghalaya", "मेघालय", "মেঘালয়"],
+    "Mizoram": ["mizoram", "मिजोरम", "मिज़ोरम", "মিজোৰাম"],
+    "Nagaland": ["nagaland", "नागालैंड", "নাগালেণ্ড"],
+    "Sikkim": ["sikkim", "सिक्किम", "ছিক্কিম"],
+    "Tripura": ["tripura", "त्रिपुरा", "ত্ৰিপুৰা", "ত্রিপুরা"],
+}
+NER_PLACES = [
+    "guwahati", "dispur", "shillong", "imphal", "aizawl", "kohima", "dimapur", "agartala", "gangtok",
+    "itanagar", "dibrugarh", "silchar", "tezpur", "jorhat", "tura", "ukhrul", "tawang", "पूर्वोत्तर",
+]
+OTHER_STATES = [
+    "andhra pradesh", "bihar", "chhattisgarh", "goa", "gujarat", "haryana", "himachal pradesh", "jharkhand",
+    "karnataka", "kerala", "madhya pradesh", "maharashtra", "odisha", "orissa", "punjab", "rajasthan",
+    "tamil nadu", "telangana", "uttar pradesh", "uttarakhand", "west bengal", "jammu and kashmir", "ladakh",
+    "puducherry", "chandigarh",
+]
+# Cities that only count in a declared location (Delhi appears in every DPR as the Ministry's address)
+OTHER_PLACES = [
+    "delhi", "mumbai", "kolkata", "chennai", "bengaluru", "bangalore", "hyderabad", "pune", "ahmedabad",
+    "jaipur", "lucknow", "patna", "bhopal", "bhubaneswar", "ranchi", "dehradun", "shimla", "srinagar",
+]
+
+
+def _alternation(terms: List[str]) -> str:
+    return "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+
+
+_NER_PATTERN = re.compile(
+    r'(?<!\w)(' + _alternation([t for names in NER_STATES.values() for t in names] + NER_PLACES) + r')(?!\w)'
+)
+_OTHER_STATE_PATTERN = re.compile(r'(?<!\w)(' + _alternation(OTHER_STATES) + r')(?!\w)')
+_OTHER_PLACE_PATTERN = re.compile(r'(?<!\w)(' + _alternation(OTHER_STATES + OTHER_PLACES) + r')(?!\w)')
+
+# requirement -> (topic pattern, [(evidence name, pattern, minimum matches, decisive)], evidence needed)
+COMPLIANCE_RULES = {
+    2: (r'cost estimate|budget|abstract of cost|project cost|estimated cost|लागत|बजट', [
+        ("itemised amounts", r'(?:rs\.?|₹|inr|रु\.?)\s*[\d,]+(?:\.\d+)?', 3, False),
+        ("rates or quantities", r'\b(?:unit rate|rate|quantity|qty|cum|sqm|rmt|nos)\b|दर|मात्रा', 2, False),
+        ("cost heads", r'civil works?|contingenc\w*|escalation|\bgst\b|supervision charges|sub-?total|total (?:project )?cost', 2, False),
+    ], 2),
+    3: (r'schedule|timeline|milestone|phase|duration|months|अवधि|महीने|समय', [
+        ("schedule", r'implementation schedule|work schedule|project schedule|construction schedule|bar chart|gantt|timeline|कार्यक्रम|समय-सारणी', 1, False),
+        ("milestones", r'milestones?|\bphase\s*[-:]?\s*(?:\d|i{1,3}\b|iv\b)|\bquarter\b|\bq[1-4]\b|चरण', 1, False),
+        ("durations", r'\b\d+\s*(?:months?|years?)\b|\d+\s*(?:महीने|वर्ष)', 2, False),
+    ], 2),
+    4: (r'specification|design|standard|technical|\birc\b|\bis\s*[:\-]?\s*\d|तकनीकी|डिजाइन', [
+        ("code references", r'\b(?:irc|is|bis|morth|nbc|cpwd|iso|sp)\s*[:\-]?\s*\d+', 2, False),
+        ("design standards", r'design (?:standards?|criteria|loads?|speed|basis|life)|technical specifications?|डिजाइन मानक', 1, False),
+        ("technical details", r'\b(?:span|carriageway|foundation|pavement|capacity|grade of concrete|m\d{2})\b', 2, False),
+    ], 2),
+    5: (r'environment\w*|\beia\b|forest clearance|pollution|\bmoef|पर्यावरण', [
+        ("clearance status",
+         r'(?:environment(?:al)? clearance|forest clearance|\bec\b|consent to establish|पर्यावरण(?:ीय)? (?:मंजूरी|स्वीकृति))'
+         r'[\s\S]{0,300}?(?:obtained|granted|received|applied|submitted|exempt(?:ed)?|not required|pending|under process|approved|प्राप्त|आवेदन)',
+         1, True),
+    ], 1),
+    6: (r'social|land acquisition|rehabilitation|resettlement|consultation|सामाजिक|भूमि अधिग्रहण|पुनर्वास', [
+        ("social impact assessment", r'social impact(?: assessment)?|\bsia\b|सामाजिक प्रभाव', 1, False),
+        ("land / R&R", r'land acquisition|rehabilitation|resettlement|\br\s*&\s*r\b|भूमि अधिग्रहण|पुनर्वास', 1, False),
+        ("consultation", r'stakeholder consultation|public (?:consultation|hearing)|gram sabha|community (?:consultation|meeting)|ग्राम सभा|परामर्श', 1, False),
+    ], 2),
+    7: (r'risk|जोखिम', [
+        ("risk section", r'risk (?:assessment|analysis|management|register|matrix|rating|mitigation)|जोखिम (?:मूल्यांकन|विश्लेषण|प्रबंधन)', 1, False),
+        ("mitigation", r'mitigat\w+|contingency plan|शमन|न्यूनीकरण', 1, False),
+    ], 2),
+    8: (r'fund\w*|central share|state share|\bgrant|financ\w*|वित्त|निधि', [
+        ("funding split", r'\b90\s*[:/]\s*10\b|\b100\s*%\s*(?:central|centrally)|centrally (?:sponsored|funded)|\b90\s*%[\s\S]{0,120}?\b10\s*%', 1, True),
+        ("central/state shares", r'(?:central|centre|state|goi)\s+share|केंद्र(?:ीय)? (?:हिस्सा|अंश)|राज्य (?:हिस्सा|अंश)', 1, False),
+        ("funding scheme", r'\b(?:nesids|nlcpr|doner|pm-devine|funding pattern|sharing pattern)\b', 1, False),
+    ], 2),
+    9: (r'agency|department|\bpwd\b|corporation|board|एजेंसी|विभाग', [
+        ("implementing agency", r'(?:implementing|executing|nodal|implementation) agency|कार्यान्वयन एजेंसी', 1, False),
+        ("nodal officer", r'nodal officer|project director|executive engineer|chief engineer|superintending engineer|contact (?:person|details)|नोडल अधिकारी', 1, False),
+    ], 2),
+    10: (r'clearance|\bnoc\b|no objection|approval|permission|consent|sanction|मंजूरी|अनुमति|स्वीकृति', [
+        ("environmental clearance", r'environment(?:al)? clearance|\bec\b', 1, False),
+        ("forest / wildlife clearance", r'forest clearance|wildlife clearance|\bfc\b', 1, False),
+        ("NOCs", r'\bnoc\b|no objection', 1, False),
+        ("land", r'land (?:acquisition|allotment|transfer|possession)', 1, False),
+        ("other statutory approvals", r'pollution control board|consent to (?:establish|operate)|technical sanction|administrative approval|railway|\bcwc\b|navigation|\bcrz\b', 1, False),
+    ], 3),
+}
+
+_COMPILED_COMPLIANCE_RULES = {
+    number: (
+        re.compile(topic),
+        [(name, re.compile(pattern), minimum, decisive) for name, pattern, minimum, decisive in evidence],
+        needed,
+    )
+    for number, (topic, evidence, needed) in COMPLIANCE_RULES.items()
+}
+# Sections that can settle each requirement; the model only reads those of undecided ones
+REQUIREMENT_SECTION_TOPICS = {
+    1: ("executive_summary", "background"),
+    2: ("cost_estimate",),
+    3: ("implementation_schedule",),
+    4: ("technical",),
+    5: ("environment", "clearances"),
+    6: ("social",),
+    7: ("risk",),
+    8: ("funding", "cost_estimate"),
+    9: ("institutional",),
+    10: ("clearances", "environment"),
+}
+# Requirement lines of the compliance prompt; only undecided ones are sent to the model
+COMPLIANCE_PROMPT_LINES = {
+    1: "**Project Location**: Must be in North Eastern Region (Assam, Arunachal Pradesh, Manipur, Meghalaya, Mizoram, Nagaland, Sikkim, Tripura)",
+    2: "**Budget Documentation**: Detailed cost breakdown with quantities, rates, and totals",
+    3: "**Timeline**: Clear implementation schedule with milestones",
+    4: "**Technical Specifications**: Design standards, technical details, compliance codes",
+    5: "**Environmental Clearance**: Status of environmental approvals (EC/2024 or similar)",
+    6: "**Social Impact Assessment**: Land acquisition, R&R plan, stakeholder consultation",
+    7: "**Risk Assessment**: Identified risks with mitigation strategies",
+    8: "**Funding Mechanism**: Clear central-state funding split (typically 90:10 for NER)",
+    9: "**Implementing Agency**: Clearly identified with nodal officer details",
+    10: "**Statutory Approvals**: List of obtained/pending clearances",
+}
+CHECKLIST_EVIDENCE_LIMIT = 3
+CHECKLIST_SNIPPET_CHARS = 80
+
+
+def _evidence_span(text: str, start: int, end: int) -> Dict:
+    snippet_start = max(0, start - CHECKLIST_SNIPPET_CHARS // 2)
+    snippet = " ".join(text[snippet_start:end + CHECKLIST_SNIPPET_CHARS // 2].split())
+    return {"start": start, "end": end, "match": text[start:end], "snippet": snippet}
+
+
+def _mostly_english(text: str) -> bool:
+    """True unless a large share of the letters are non-Latin (our topic keywords are English-first)"""
+    sample = text[:20000]
+    letters = sum(1 for c in sample if c.isalpha())
+    return not letters or sum(1 for c in sample if c.isascii() and c.isalpha()) / letters > 0.8
+
+
+def _check_location(text: str, text_lower: str, declared: str) -> Dict:
+    declared_lower = (declared or "").lower()
+    item = {"number": 1, "requirement": MDONER_MANDATORY_REQUIREMENTS[1], "evidence": []}
+    ner_in_text = list(_NER_PATTERN.finditer(text_lower))
+    item["evidence"] = [_evidence_span(text, m.start(), m.end()) for m in ner_in_text[:CHECKLIST_EVIDENCE_LIMIT]]
+    
+    if declared_lower:
+        if _NER_PATTERN.search(declared_lower):
+            item.update(status="met", reason=f"Declared location '{declared}' is in the North Eastern Region")
+            return item
+        outside = _OTHER_PLACE_PATTERN.search(declared_lower)
+        if outside:
+            item.update(
+                status="not_met",
+                reason=f"Declared location '{declared}' is outside the eight NER states ({outside.group(1).title()})",
+                evidence=[{"start": None, "end": None, "match": declared, "snippet": f"Location: {declared}"}],
+            )
+            return item
+    
+    other_in_text = list(_OTHER_STATE_PATTERN.finditer(text_lower))
+    if ner_in_text and len(ner_in_text) >= len(other_in_text):
+        item.update(status="met", reason=f"NER state or place named {len(ner_in_text)} times in the DPR")
+    elif not ner_in_text and len(other_in_text) >= 2:
+        item.update(
+            status="not_met",
+            reason=f"The DPR names only non-NER states ({', '.join(sorted({m.group(1).title() for m in other_in_text}))})",
+            evidence=[_evidence_span(text, m.start(), m.end()) for m in other_in_text[:CHECKLIST_EVIDENCE_LIMIT]],
+        )
+    else:
+        item.update(status="undecided", reason="Location could not be determined from the text")
+    return item
+
+
+_DECLARED_LOCATION_PATTERN = re.compile(r'(?:project\s+)?location\s*[:\-]\s*([^\n]{2,200})')
+
+
+def declared_dpr_location(project_data: Dict, dpr_text: str) -> str:
+    """The location the submitter declared: project info first, then a "Location:" line in the DPR"""
+    if not isinstance(project_data, dict):
+        project_data = {}
+    for source in (project_data, project_data.get("extracted_data") or {}):
+        value = source.get("location") if isinstance(source, dict) else None
+        if isinstance(value, str) and value.strip() and value.strip().lower() not in ("not found", "not specified", "n/a"):
+            return value.strip()
+    match = _DECLARED_LOCATION_PATTERN.search(dpr_text[:20000].lower())
+    return match.group(1).strip() if match else ""
+
+
+def run_compliance_checklist(dpr_text: str, declared_location: str = "") -> Dict:
+    """
+    Score the 10 mandatory requirements locally. Returns items (status met /
+    not_met / undecided, reason, evidence spans) plus the met / not_met /
+    undecided requirement numbers.
+    """
+    started = time.perf_counter()
+    text_lower = dpr_text.lower()
+    if len(text_lower) != len(dpr_text):
+        text_lower = dpr_text  # Offsets must line up; patterns are lower-case so this only loses case-folding
+    absence_decides = _mostly_english(dpr_text)
+    
+    items = [_check_location(dpr_text, text_lower, declared_location)]
+    for number, (topic, evidence_rules, needed) in _COMPILED_COMPLIANCE_RULES.items():
+        item = {"number": number, "requirement": MDONER_MANDATORY_REQUIREMENTS[number], "evidence": []}
+        topic_match = topic.search(text_lower)
+        if topic_match is None:
+            if absence_decides:
+                item.update(status="not_met", reason="Not mentioned anywhere in the DPR")
+            else:
+                item.update(status="undecided", reason="No English keywords found; needs model review")
+            items.append(item)
+            continue
         
-        if risk_insights:
-            risk_section += "Critical risk factors include the following areas. "
-            for insight in risk_insights[:3]:  # Use top 3 risk insights
-                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
-                clean_insight = clean_insight.replace('[Risk]', '').replace('[Challenge]', '').replace('[', '').replace(']', '').strip()
-                if not clean_insight.endswith('.'):
-                    clean_insight += '.'
-                risk_section += clean_insight + " "
+        satisfied = []
+        for name, pattern, minimum, decisive in evidence_rules:
+            matches = []
+            for match in pattern.finditer(text_lower):
+                matches.append(match)
+                if len(matches) >= minimum:
+                    break
+            if len(matches) >= minimum:
+                satisfied.append((name, decisive))
+                item["evidence"].extend(_evidence_span(dpr_text, m.start(), m.end()) for m in matches[:CHECKLIST_EVIDENCE_LIMIT])
+        item["evidence"] = item["evidence"][:CHECKLIST_EVIDENCE_LIMIT]
+        if any(decisive for _, decisive in satisfied) or len(satisfied) >= needed:
+            item.update(status="met", reason="Found: " + ", ".join(name for name, _ in satisfied))
         else:
-            risk_section += "Standard project risks including cost escalation, schedule delays, quality deviations, and resource constraints should be addressed through a comprehensive risk management framework. "
-            risk_section += "Specific attention should be given to region-specific challenges such as seasonal accessibility, material transportation logistics, and availability of skilled workforce. "
-        
-        risk_section += "A dedicated risk register should be maintained and regularly updated, with clear ownership assigned for monitoring and mitigating each identified risk throughout the project duration."
+            if not item["evidence"]:
+                item["evidence"] = [_evidence_span(dpr_text, topic_match.start(), topic_match.end())]
+            found = ", ".join(name for name, _ in satisfied) or "topic mentioned only"
+            item.update(status="undecided", reason=f"Partial evidence ({found}); needs model review")
+        items.append(item)
     
-    sections['risk_assessment'] = risk_section.strip()
+    by_status = {"met": [], "not_met": [], "undecided": []}
+    for item in items:
+        by_status[item["status"]].append(item["number"])
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    observe_stage("compliance_checklist", elapsed_ms / 1000)
+    return {"items": items, **by_status, "elapsed_ms": elapsed_ms}
+
+
+def compliance_from_checklist(checklist: Dict, model_result: Optional[Dict] = None) -> Dict:
+    """
+    Build the compliance response from the checklist, taking undecided items
+    from `model_result` (a compliance prompt answer) when the model was asked.
+    """
+    undecided = set(checklist["undecided"])
+    model_met = set()
+    for number in (model_result or {}).get("requirements_met") or []:
+        try:
+            if int(number) in undecided:
+                model_met.add(int(number))
+        except (TypeError, ValueError):
+            continue
     
-    # Actionable Recommendations Section
-    recommendations_section = ""
-    if insights and len(insights) > 0:
-        recommendations_section += "Based on our comprehensive analysis, the following actionable recommendations are provided to strengthen this DPR and enhance the project's success potential. "
-        
-        # Convert list to flowing text - clean and merge into paragraphs
-        rec_texts = []
-        for insight in insights:
-            # Clean up any numbering or priority markers
-            clean_insight = insight.strip().rstrip('.')
-            # Remove patterns like "PRIORITY 1 -", "[Category]", numbers, etc.
-            import re
-            clean_insight = re.sub(r'PRIORITY \d+ -\s*', '', clean_insight)
-            clean_insight = re.sub(r'\[.*?\]\s*', '', clean_insight)
-            clean_insight = re.sub(r'^\d+\.\s*', '', clean_insight)
-            if clean_insight:
-                rec_texts.append(clean_insight)
-        
-        # Join all recommendations into flowing text
-        if len(rec_texts) > 0:
-            # First set of recommendations
-            if len(rec_texts) <= 3:
-                recommendations_section += " Additionally, ".join(rec_texts) + ". "
+    items = []
+    for item in checklist["items"]:
+        item = dict(item, decided_by=None if item["status"] == "undecided" else "checklist")
+        if item["number"] in undecided and model_result is not None:
+            item["status"] = "met" if item["number"] in model_met else "not_met"
+            item["decided_by"] = "model"
+        items.append(item)
+    
+    met = [item["number"] for item in items if item["status"] == "met"]
+    unmet = [item for item in items if item["status"] != "met"]
+    compliant = not unmet
+    violations = [
+        f"{item['requirement']}: {item['reason']}" if item["decided_by"] == "checklist" else item["requirement"]
+        for item in unmet if item["status"] == "not_met"
+    ]
+    missing_sections = list((model_result or {}).get("missing_sections") or [])
+    for item in unmet:
+        if item["status"] == "not_met" and item.get("reason") == "Not mentioned anywhere in the DPR":
+            missing_sections.append(item["requirement"])
+    
+    rejection_reason = None if compliant else (
+        "The DPR does not satisfy these mandatory MDoNER requirements: " + "; ".join(violations)
+    )
+    summary = (model_result or {}).get("compliance_summary") or (
+        f"{len(met)} of {len(items)} mandatory MDoNER requirements verified"
+        + ("." if compliant else f"; not satisfied: {', '.join(str(item['number']) for item in unmet)}.")
+    )
+    return {
+        "compliant": compliant,
+        "compliance_score": round(100 * len(met) / len(items)),
+        "critical_violations": violations,
+        "missing_sections": missing_sections,
+        "rejection_reason": rejection_reason,
+        "compliance_summary": summary,
+        "requirements_met": met,
+        "undecided_requirements": [item["number"] for item in items if item["status"] == "undecided"],
+        "checklist": items,
+        "checklist_elapsed_ms": checklist["elapsed_ms"],
+        "model_consulted": model_result is not None,
+    }
+
+
+# ============================================================================
+# BUDGET ANALYSIS ENGINE
+# ============================================================================
+# Cost tables are parsed locally into line items in rupees. The rows come from
+# the extracted text, or from the pdfplumber / python-docx tables when the
+# upload has them. The arithmetic needs no model call: items against their
+# subtotal, subtotals and adjustments against the grand total, quantity x
+# rate against amount, declared percentages against their base. Contingency
+# and consultancy shares and outlier items are computed the same way. The
+# model is only asked to narrate the findings.
+
+BUDGET_UNIT_SCALES = {"crore": 1e7, "lakh": 1e5, "thousand": 1e3, "rupee": 1.0}
+BUDGET_BLOCK_GAP_LINES = 8              # Non-row lines that end a cost table
+BUDGET_QTY_RATE_TOLERANCE = 0.02        # Relative slack for quantity x rate vs amount
+BUDGET_PERCENT_TOLERANCE = 0.05         # Relative slack for "3% of civil" style declarations
+BUDGET_CONTINGENCY_MAX_PERCENT = 5.0    # Usual ceiling on contingencies, % of civil works
+BUDGET_CONSULTANCY_MAX_PERCENT = 8.0    # Usual ceiling on design / PMC / QA, % of civil works
+BUDGET_OUTLIER_Z = 3.5                  # Robust z-score (median / MAD of log amounts) for outliers
+
+_BUDGET_HEADER_PATTERN = re.compile(
+    r'(?:amount|cost|राशि|लागत)\s*\(\s*(?:in\s+)?(?:(?:rs\.?|₹|रु\.?)\s*(?:in\s+)?)?'
+    r'(crores?|cr\b|lakhs?|lacs?|करोड़|लाख|thousands?|rs\.?|₹|रु\.?|rupees)'
+)
+_BUDGET_CELL_SPLIT = re.compile(r'\s{2,}|\t|\s*\|\s*')
+_BUDGET_NUMBER = r'-?\s*\d[\d,]*(?:\.\d+)?'
+_BUDGET_UNIT_WORDS = r'crores?|cr\.?|करोड़|lakhs?|lacs?|लाख'
+_BUDGET_AMOUNT_CELL = re.compile(
+    r'^(?:(?:rs\.?|₹|inr|रु\.?)\s*)?(' + _BUDGET_NUMBER + r')\s*(' + _BUDGET_UNIT_WORDS + r')?\s*(?:only)?$'
+)
+_BUDGET_INLINE_ROW = re.compile(
+    r'^(.*?[^\W\d_].*?)\s*[:=\-–]\s*((?:rs\.?|₹|inr|रु\.?)\s*' + _BUDGET_NUMBER + r'\s*(?:' + _BUDGET_UNIT_WORDS + r')?)\s*$',
+    re.IGNORECASE,
+)
+_BUDGET_QUANTITY_CELL = re.compile(r'^(\d[\d,]*(?:\.\d+)?)\s*([^\d\s%][^\d%]{0,15})?$')
+_BUDGET_RATE_CELL = re.compile(r'^(?:(?:rs\.?|₹|रु\.?)\s*)?(\d[\d,]*(?:\.\d+)?)$')
+_BUDGET_PERCENT = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+_BUDGET_PLACEHOLDER_CELL = re.compile(r'^(?:-+|—|lump\s*sum|l\.?\s?s\.?|एकमुश्त|job|ls)$')
+_BUDGET_SERIAL_CELL = re.compile(r'^(?:\d+|[a-z]|[ivx]+)[.)]?$')
+_BUDGET_SEPARATOR_LINE = re.compile(r'^[\s\-=_|+*]*$')
+
+_BUDGET_ROW_KINDS = [
+    ("grand_total", re.compile(r'grand\s+total|महायोग|सकल\s+योग')),
+    ("subtotal", re.compile(r'sub[\s-]*total|उप-?\s*योग|उपयोग')),
+    ("adjustment", re.compile(r'^(?:less|add|deduct|घटाएं|घटाइए|जोड़ें)(?=[\s:.\-]|$)')),
+    ("total", re.compile(r'^(?:total|कुल)\b|total\s+(?:project\s+)?cost|कुल\s+(?:परियोजना\s+)?लागत')),
+]
+_BUDGET_DEDUCTION = re.compile(r'^(?:less|deduct|घटाएं|घटाइए)(?=[\s:.\-]|$)')
+_BUDGET_CONTINGENCY = re.compile(r'contingenc|आकस्मिक')
+_BUDGET_CONSULTANCY = re.compile(
+    r'consultan|design\s*(?:&|and)\s*engineering|project\s+management|supervision|quality\s+(?:assurance|control)'
+    r'|परामर्श|डिजाइन|प्रबंधन|गुणवत्ता'
+)
+_BUDGET_CIVIL_BASE = re.compile(r'of\s+(?:the\s+)?civil|civil\s+(?:works\s+)?cost|सिविल')
+
+BUDGET_RECOMMENDATIONS = {
+    "subtotal": "Reconcile each subtotal with its line items and correct the cost abstract",
+    "total": "Recompute the total project cost from the subtotals and adjustments before resubmission",
+    "quantity_rate": "Recheck quantity x rate for the flagged items against the Schedule of Rates (check unit conversions)",
+    "percentage": "Recompute percentage-based provisions against the base they are declared on",
+    "contingency": "Limit contingencies to the usual 3-5% of civil works or justify the higher provision",
+    "consultancy": "Justify design, PMC and QA charges above the usual share of civil works",
+    "declared_total": "Make the estimated cost quoted in the DPR match the cost abstract",
+    "outlier": "Provide rate analysis or quotations for unusually large line items",
+    "no_cost_table": "Include an itemised cost abstract with quantities, rates and amounts",
+}
+
+
+def _budget_unit(word: Optional[str]) -> Optional[str]:
+    if not word:
+        return None
+    word = word.strip(". ")
+    if word.startswith(("cr", "करोड़")):
+        return "crore"
+    if word.startswith(("lakh", "lac", "लाख")):
+        return "lakh"
+    if word.startswith("thousand"):
+        return "thousand"
+    return "rupee"
+
+
+def _budget_number(text: str) -> tuple:
+    """(value, decimals) for an Indian or western grouped number"""
+    text = text.replace(",", "").replace(" ", "")
+    decimals = len(text.split(".", 1)[1]) if "." in text else 0
+    return float(text), decimals
+
+
+def parse_budget_row(line: str, unit: str) -> Optional[Dict]:
+    """One cost-table row as a dict (amounts in rupees), or None if the line has no amount"""
+    cells = [cell for cell in _BUDGET_CELL_SPLIT.split(line.strip()) if cell]
+    if not cells:
+        return None
+    lowered = [cell.lower() for cell in cells]
+    amount_match = _BUDGET_AMOUNT_CELL.match(lowered[-1])
+    if amount_match is None or len(cells) == 1:
+        inline = _BUDGET_INLINE_ROW.match(" ".join(cells))
+        if inline is None:
+            return None
+        cells = [inline.group(1), inline.group(2)]
+        lowered = [cell.lower() for cell in cells]
+        amount_match = _BUDGET_AMOUNT_CELL.match(lowered[-1])
+        if amount_match is None:
+            return None
+    
+    value, decimals = _budget_number(amount_match.group(1))
+    scale = BUDGET_UNIT_SCALES[_budget_unit(amount_match.group(2)) or unit]
+    
+    # Leading text cells form the label; numeric cells before the amount are quantity / rate / percent
+    label_cells, value_cells = [], []
+    for cell, low in zip(cells[:-1], lowered[:-1]):
+        is_value = bool(
+            _BUDGET_QUANTITY_CELL.match(low) or _BUDGET_RATE_CELL.match(low)
+            or _BUDGET_PLACEHOLDER_CELL.match(low) or (_BUDGET_PERCENT.search(low) and label_cells)
+        )
+        if is_value and label_cells:
+            value_cells.append(low)
+        elif not (not label_cells and _BUDGET_SERIAL_CELL.match(low)):
+            label_cells.append(cell)
+    label = re.sub(r'^[\s\-•*]+|^\d+\.\s*', '', " ".join(label_cells)).strip()
+    if not label or not re.search(r'[^\W\d_]', label):
+        return None
+    label_lower = label.lower()
+    
+    quantity = rate = percent = None
+    numbers = []
+    for cell in value_cells:
+        percent_match = _BUDGET_PERCENT.search(cell)
+        if percent_match:
+            percent = float(percent_match.group(1))
+            continue
+        quantity_match = _BUDGET_QUANTITY_CELL.match(cell)
+        if quantity_match:
+            numbers.append((_budget_number(quantity_match.group(1))[0], bool(quantity_match.group(2))))
+    if len(numbers) >= 2:
+        quantity, rate = numbers[-2][0], numbers[-1][0]
+    elif len(numbers) == 1 and numbers[0][1]:
+        quantity = numbers[0][0]
+    if percent is None:
+        percent_match = _BUDGET_PERCENT.search(label_lower)
+        percent = float(percent_match.group(1)) if percent_match else None
+    
+    kind = "item"
+    for candidate, pattern in _BUDGET_ROW_KINDS:
+        if pattern.search(label_lower):
+            kind = candidate
+            break
+    return {
+        "label": label,
+        "kind": kind,
+        "amount": value * scale,
+        "step": scale / (10 ** decimals),
+        "quantity": quantity,
+        "rate": rate,
+        "percent": percent,
+        "percent_of_civil": bool(percent is not None and _BUDGET_CIVIL_BASE.search(" ".join(value_cells + [label_lower]))),
+        "contingency": bool(_BUDGET_CONTINGENCY.search(label_lower)),
+        "consultancy": bool(_BUDGET_CONSULTANCY.search(label_lower)),
+    }
+
+
+def extract_budget_rows(lines: List[str]) -> List[Dict]:
+    """Rows of every cost table in `lines`; a table starts at an "Amount (Crores)" style header"""
+    rows = []
+    unit, gap, group = None, 0, ""
+    for number, line in enumerate(lines, 1):
+        lower = line.lower()
+        header = _BUDGET_HEADER_PATTERN.search(lower)
+        if header and not _BUDGET_AMOUNT_CELL.match(_BUDGET_CELL_SPLIT.split(lower.strip())[-1]):
+            unit, gap, group = _budget_unit(header.group(1)), 0, ""
+            continue
+        if unit is None or _BUDGET_SEPARATOR_LINE.match(line):
+            continue
+        row = parse_budget_row(line, unit)
+        if row is None:
+            stripped = line.strip(" |")
+            if stripped and not re.fullmatch(_BUDGET_UNIT_WORDS + r'|only', stripped.lower()):
+                gap += 1
+                if len(stripped) < 80 and not re.search(r'\d{2,}', stripped):
+                    group = re.sub(r'^(?:[^\W\d_]|\d+)[.)]\s*', '', stripped)
+                if gap > BUDGET_BLOCK_GAP_LINES:
+                    unit = None
+            continue
+        gap = 0
+        row.update(line=number, group=group)
+        rows.append(row)
+        if row["kind"] == "grand_total":
+            unit = None
+    return rows
+
+
+def extract_document_budget_lines(file_path: str, file_extension: str, text: str) -> tuple:
+    """
+    Cost-table rows from the upload's own tables as " | "-joined lines, with
+    the source name. PDF tables are only extracted on pages whose text has a
+    cost-table header; falls back to the text lines.
+    """
+    file_extension = file_extension.lower().replace('.', '')
+    lines = []
+    try:
+        if file_extension == 'pdf':
+            page_offsets = extract_document(file_path, file_extension).get("page_offsets") or []
+            bounds = list(page_offsets) + [len(text)]
+            pages = set()
+            for i in range(len(page_offsets)):
+                if _BUDGET_HEADER_PATTERN.search(text[bounds[i]:bounds[i + 1]].lower()):
+                    pages.update((i, i + 1))  # Cost tables often run onto the next page
+            if pages:
+                with pdfplumber.open(file_path) as pdf:
+                    for index in sorted(i for i in pages if i < len(pdf.pages)):
+                        for table in pdf.pages[index].extract_tables() or []:
+                            lines.extend(" | ".join((cell or "").replace("\n", " ") for cell in row) for row in table)
+        elif file_extension in ('docx', 'doc'):
+            for table in docx.Document(file_path).tables:
+                for row in table.rows:
+                    cells = []
+                    for cell in row.cells:
+                        if not cells or cells[-1] != cell.text:  # Merged cells repeat their text
+                            cells.append(cell.text)
+                    lines.append(" | ".join(cell.replace("\n", " ") for cell in cells))
+    except Exception as e:
+        print(f"[BUDGET] Table extraction failed ({e}), using text lines")
+        lines = []
+    if lines and extract_budget_rows(lines):
+        return lines, f"{file_extension}_tables"
+    return text.splitlines(), "text"
+
+
+def _robust_outliers(values: List[float]) -> List[int]:
+    """Indices whose log amount lies more than BUDGET_OUTLIER_Z robust z-scores from the median"""
+    if len(values) < 5:
+        return []
+    if np is not None:
+        logs = np.log10(np.asarray(values, dtype=float))
+        median = np.median(logs)
+        mad = np.median(np.abs(logs - median))
+        if mad == 0:
+            return []
+        z = 0.6745 * (logs - median) / mad
+        return [int(i) for i in np.flatnonzero(np.abs(z) > BUDGET_OUTLIER_Z)]
+    logs = [math.log10(v) for v in values]
+    ordered = sorted(logs)
+    median = (ordered[(len(ordered) - 1) // 2] + ordered[len(ordered) // 2]) / 2
+    deviations = sorted(abs(v - median) for v in logs)
+    mad = (deviations[(len(deviations) - 1) // 2] + deviations[len(deviations) // 2]) / 2
+    if mad == 0:
+        return []
+    return [i for i, v in enumerate(logs) if abs(0.6745 * (v - median) / mad) > BUDGET_OUTLIER_Z]
+
+
+def _quantity_rate_mismatches(items: List[Dict]) -> List[tuple]:
+    """(item, quantity x rate) for items whose amount disagrees with quantity x rate"""
+    priced = [item for item in items if item["quantity"] and item["rate"] and item["amount"] > 0]
+    if not priced:
+        return []
+    if np is not None:
+        quantity = np.array([item["quantity"] for item in priced])
+        rate = np.array([item["rate"] for item in priced])
+        amount = np.array([item["amount"] for item in priced])
+        step = np.array([item["step"] for item in priced])
+        expected = quantity * rate
+        tolerance = np.maximum(BUDGET_QTY_RATE_TOLERANCE * expected, step / 2)
+        bad = np.flatnonzero(np.abs(amount - expected) > tolerance)
+        return [(priced[i], float(expected[i])) for i in bad]
+    mismatches = []
+    for item in priced:
+        expected = item["quantity"] * item["rate"]
+        if abs(item["amount"] - expected) > max(BUDGET_QTY_RATE_TOLERANCE * expected, item["step"] / 2):
+            mismatches.append((item, expected))
+    return mismatches
+
+
+def format_rupees(amount: float) -> str:
+    """Rs. amount in Crores (or Lakhs below one crore)"""
+    if abs(amount) >= 1e7:
+        return f"Rs. {amount / 1e7:,.2f} Crores"
+    return f"Rs. {amount / 1e5:,.2f} Lakhs"
+
+
+def analyze_budget(lines: List[str], declared_total: float = 0, source: str = "text") -> Dict:
+    """
+    Check the cost tables in `lines` and return validation findings:
+    is_valid, total_budget, issues (severity, category, message, line),
+    checks, percentages, outliers and recommendations.
+    """
+    started = time.perf_counter()
+    rows = extract_budget_rows(lines)
+    checks, issues = [], []
+    
+    def check(category: str, row: Dict, computed: float, operands: List[Dict], description: str):
+        tolerance = (row["step"] + sum(op["step"] for op in operands)) / 2 + 1e-6
+        difference = row["amount"] - computed
+        ok = abs(difference) <= tolerance
+        checks.append({
+            "check": category, "label": row["label"], "line": row["line"], "ok": ok,
+            "stated": round(row["amount"], 2), "computed": round(computed, 2), "difference": round(difference, 2),
+        })
+        if not ok:
+            relative = abs(difference) / max(abs(computed), 1.0)
+            issues.append({
+                "severity": "high" if relative > 0.01 else "medium",
+                "category": category,
+                "message": f"{row['label']} is {format_rupees(row['amount'])} but {description} "
+                           f"add up to {format_rupees(computed)} (difference {format_rupees(difference)})",
+                "line": row["line"],
+            })
+    
+    items = [row for row in rows if row["kind"] == "item"]
+    group_items, subtotals, running, running_operands, grand_total = [], [], None, [], None
+    civil_base, civil_groups = 0.0, []
+    for row in rows:
+        kind = row["kind"]
+        if kind == "item":
+            group_items.append(row)
+        elif kind == "subtotal":
+            if group_items:
+                check("subtotal", row, sum(item["amount"] for item in group_items), group_items,
+                      f"the {len(group_items)} items above it")
+                if not any(item["contingency"] or item["consultancy"] for item in group_items):
+                    civil_base += row["amount"]
+                subtotals.append(row)
+                group_items = []
+            elif running is not None:
+                check("total", row, running, running_operands, "the total and adjustments above it")
+                running, running_operands = row["amount"], [row]
             else:
-                # Split into multiple sentences for better flow
-                recommendations_section += rec_texts[0] + ". "
-                recommendations_section += "Furthermore, " + rec_texts[1] + ". "
-                recommendations_section += "It is also important to " + rec_texts[2].lower() + ". "
-                
-                if len(rec_texts) > 3:
-                    recommendations_section += "\n\n"
-                    recommendations_section += "In addition, " + rec_texts[3] + ". "
-                    
-                if len(rec_texts) > 4:
-                    recommendations_section += "Moreover, " + rec_texts[4] + ". "
-                    
-                if len(rec_texts) > 5:
-                    recommendations_section += "Finally, " + rec_texts[5] + ". "
-                    
-                # Add remaining recommendations if any
-                if len(rec_texts) > 6:
-                    remaining = " ".join([r + "." for r in rec_texts[6:]])
-                    recommendations_section += remaining
-    else:
-        recommendations_section = "Please review the detailed analysis sections above for specific recommendations tailored to this project."
+                subtotals.append(row)
+        elif kind == "total":
+            operands = subtotals + group_items
+            if operands:
+                check("total", row, sum(op["amount"] for op in operands), operands, "the subtotals above it")
+            civil_base += sum(item["amount"] for item in group_items if not (item["contingency"] or item["consultancy"]))
+            running, running_operands, subtotals, group_items = row["amount"], [row], [], []
+        elif kind == "adjustment":
+            if running is None:
+                running_operands = subtotals + group_items
+                running = sum(op["amount"] for op in running_operands)
+                subtotals, group_items = [], []
+            signed = -abs(row["amount"]) if _BUDGET_DEDUCTION.search(row["label"].lower()) else row["amount"]
+            if row["percent"] is not None and running and row["amount"]:
+                row["percent_base"] = running
+            running += signed
+            running_operands = running_operands + [row]
+        elif kind == "grand_total":
+            if running is not None:
+                check("total", row, running, running_operands, "the total and adjustments above it")
+            elif subtotals or group_items:
+                operands = subtotals + group_items
+                check("total", row, sum(op["amount"] for op in operands), operands, "the subtotals above it")
+            grand_total = row
+    if not civil_base:
+        civil_base = sum(item["amount"] for item in items if not (item["contingency"] or item["consultancy"]))
     
-    sections['actionable_recommendations'] = recommendations_section.rstrip()
+    # Quantity x rate, vectorised over every priced item
+    for item, expected in _quantity_rate_mismatches(items):
+        ratio = item["amount"] / expected if expected else 0
+        hint = " (looks like a unit or decimal error)" if ratio and abs(math.log10(ratio)) > 0.9 else ""
+        issues.append({
+            "severity": "high" if abs(item["amount"] - expected) > 0.1 * expected else "medium",
+            "category": "quantity_rate",
+            "message": f"{item['label']}: {item['quantity']:,.10g} x Rs. {item['rate']:,.10g} = {format_rupees(expected)}, "
+                       f"but the amount is {format_rupees(item['amount'])}{hint}",
+            "line": item["line"],
+        })
     
-    # Compliance Check Section
-    compliance = analysis.get('compliance_check', {})
-    compliance_section = ""
+    # Declared percentages ("5% of civil", "Less: rationalisation (5%)")
+    for row in rows:
+        base = row.get("percent_base") or (civil_base if row["percent_of_civil"] else None)
+        if row["percent"] is None or not base or not row["amount"]:
+            continue
+        actual = 100 * abs(row["amount"]) / base
+        if abs(actual - row["percent"]) > max(0.25, BUDGET_PERCENT_TOLERANCE * row["percent"]):
+            issues.append({
+                "severity": "medium",
+                "category": "percentage",
+                "message": f"{row['label']} is declared as {row['percent']:g}% but is {actual:.2f}% "
+                           f"of its base ({format_rupees(base)})",
+                "line": row["line"],
+            })
     
-    if compliance:
-        is_compliant = compliance.get('is_compliant')
-        
-        if is_compliant:
-            compliance_section += "The DPR demonstrates strong compliance with MDoNER guidelines and regulatory requirements. "
-            compliance_section += "All necessary statutory clearances and documentation standards appear to be adequately addressed. "
-        else:
-            compliance_section += "While the DPR shows effort in meeting regulatory requirements, several compliance gaps have been identified that need attention. "
-            
-            gaps = compliance.get('guideline_gaps', [])
-            if gaps:
-                clean_gaps = [g.strip().rstrip('.') for g in gaps]
-                compliance_section += "Specifically, the following areas require improvement including "
-                if len(clean_gaps) == 1:
-                    compliance_section += clean_gaps[0]
-                elif len(clean_gaps) == 2:
-                    compliance_section += clean_gaps[0] + " and " + clean_gaps[1]
-                else:
-                    compliance_section += ", ".join(clean_gaps[:-1]) + ", and " + clean_gaps[-1]
-                compliance_section += ". "
-        
-        if compliance.get('comments'):
-            compliance_section += f" {compliance.get('comments')}"
-    else:
-        # Generate comprehensive compliance analysis from available data
-        overall_score = analysis.get('overall_score', 70)
-        
-        if overall_score >= 80:
-            compliance_section += "The documentation demonstrates strong adherence to MDoNER guidelines and statutory requirements for project proposals in the North Eastern Region. "
-            compliance_section += "The DPR format, content structure, and level of detail align well with prescribed standards for infrastructure projects. "
-        elif overall_score >= 60:
-            compliance_section += "The DPR shows reasonable compliance with MDoNER guidelines, though certain areas would benefit from additional documentation and clarity. "
-            compliance_section += "The overall structure follows required standards, but some specific sections require strengthening. "
-        else:
-            compliance_section += "The compliance assessment reveals several gaps in meeting MDoNER guideline requirements that must be addressed for approval consideration. "
-            compliance_section += "Both the documentation completeness and content quality need significant improvement. "
-        
-        # Extract compliance-related insights
-        compliance_insights = [i for i in insights if any(term in i.lower() for term in ['compliance', 'guideline', 'requirement', 'standard', 'regulation', 'clearance', 'approval', 'documentation', 'section', 'missing'])]
-        
-        if compliance_insights:
-            compliance_section += "Specific compliance considerations include the following aspects. "
-            for insight in compliance_insights[:3]:  # Use top 3 compliance insights
-                clean_insight = insight.replace('PRIORITY 1 - ', '').replace('PRIORITY 2 - ', '').replace('PRIORITY 3 - ', '').replace('PRIORITY 4 - ', '').replace('PRIORITY 5 - ', '')
-                clean_insight = clean_insight.replace('[Compliance]', '').replace('[Documentation]', '').replace('[Guideline]', '').replace('[', '').replace(']', '').strip()
-                if not clean_insight.endswith('.'):
-                    clean_insight += '.'
-                compliance_section += clean_insight + " "
-        else:
-            compliance_section += "Essential statutory clearances including environmental, forest, and wildlife approvals (where applicable) must be secured before project commencement. "
-            compliance_section += "All sections mandated by MDoNER guidelines should be present with adequate depth and supporting documentation. "
-        
-        compliance_section += "Regular compliance audits during implementation will ensure continued adherence to approved standards and regulatory requirements."
+    # Contingency and consultancy shares
+    total = grand_total["amount"] if grand_total else (running if running is not None else sum(r["amount"] for r in items))
+    contingency = sum(row["amount"] for row in rows if row["kind"] == "item" and row["contingency"])
+    consultancy = sum(row["amount"] for row in rows if row["kind"] == "item" and row["consultancy"])
+    percentages = {
+        "civil_works": round(civil_base, 2),
+        "contingency_percent_of_civil": round(100 * contingency / civil_base, 2) if civil_base else None,
+        "consultancy_percent_of_civil": round(100 * consultancy / civil_base, 2) if civil_base else None,
+        "contingency_percent_of_total": round(100 * contingency / total, 2) if total else None,
+        "consultancy_percent_of_total": round(100 * consultancy / total, 2) if total else None,
+    }
+    if items and civil_base:
+        if not contingency:
+            issues.append({"severity": "low", "category": "contingency", "line": None,
+                           "message": "No contingency provision found in the cost estimate"})
+        elif percentages["contingency_percent_of_civil"] > BUDGET_CONTINGENCY_MAX_PERCENT:
+            issues.append({"severity": "medium", "category": "contingency", "line": None,
+                           "message": f"Contingencies are {percentages['contingency_percent_of_civil']}% of civil works "
+                                      f"(usual ceiling {BUDGET_CONTINGENCY_MAX_PERCENT:g}%)"})
+        if percentages["consultancy_percent_of_civil"] and percentages["consultancy_percent_of_civil"] > BUDGET_CONSULTANCY_MAX_PERCENT:
+            issues.append({"severity": "medium", "category": "consultancy", "line": None,
+                           "message": f"Consultancy and supervision charges are {percentages['consultancy_percent_of_civil']}% "
+                                      f"of civil works (usual ceiling {BUDGET_CONSULTANCY_MAX_PERCENT:g}%)"})
     
-    sections['compliance_check'] = compliance_section.rstrip()
+    # Items far larger or smaller than the rest
+    positive = [item for item in items if item["amount"] > 0]
+    outliers = [positive[i] for i in _robust_outliers([item["amount"] for item in positive])]
+    for item in outliers:
+        issues.append({
+            "severity": "low",
+            "category": "outlier",
+            "message": f"{item['label']} ({format_rupees(item['amount'])}) is far outside the range of the other line items",
+            "line": item["line"],
+        })
     
-    # Final Assessment Section
-    final_assessment = ""
-    if decision == "APPROVE":
-        final_assessment += "After thorough evaluation of all aspects of this project, I recommend approval for implementation. "
-        final_assessment += "The DPR demonstrates strong planning, technical feasibility, and alignment with MDoNER's development objectives for the North Eastern Region. "
-        final_assessment += "The project is well-prepared and ready to move forward to the execution phase."
-    elif decision == "REVISE":
-        final_assessment += "Based on this comprehensive analysis, I recommend that the DPR be revised to address the concerns identified throughout this assessment. "
-        final_assessment += "While the project shows promise and has several strong elements, the issues highlighted need to be resolved before approval. "
-        final_assessment += "Once these revisions are made, the project should be well-positioned for successful implementation."
-    else:
-        final_assessment += "After careful evaluation, I must recommend rejection of this DPR in its current form. "
-        final_assessment += "The analysis has revealed significant issues that fundamentally impact the project's viability and alignment with MDoNER guidelines. "
-        final_assessment += "These concerns need to be thoroughly addressed through a substantially revised submission."
+    if declared_total and total and abs(declared_total - total) > max(0.005 * total, grand_total["step"] if grand_total else 0):
+        issues.append({
+            "severity": "high",
+            "category": "declared_total",
+            "message": f"The DPR quotes an estimated cost of {format_rupees(declared_total)} but the cost abstract totals {format_rupees(total)}",
+            "line": grand_total["line"] if grand_total else None,
+        })
+    if not items:
+        issues.append({"severity": "high", "category": "no_cost_table", "line": None,
+                       "message": "No itemised cost table with amounts was found in the document"})
     
-    if reasoning:
-        final_assessment += f"\n\n{reasoning}"
+    recommendations = [BUDGET_RECOMMENDATIONS[c] for c in dict.fromkeys(issue["category"] for issue in issues)]
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    observe_stage("budget_analysis", elapsed_ms / 1000)
+    return {
+        "is_valid": not any(issue["severity"] == "high" for issue in issues),
+        "total_budget": round(total or declared_total, 2),
+        "total_budget_display": format_rupees(total or declared_total),
+        "declared_total": declared_total,
+        "issues": issues,
+        "recommendations": recommendations,
+        "checks": checks,
+        "percentages": percentages,
+        "line_items": [
+            {key: row[key] for key in ("line", "group", "label", "kind", "amount", "quantity", "rate", "percent")}
+            for row in rows
+        ],
+        "outliers": [item["label"] for item in outliers],
+        "source": source,
+        "elapsed_ms": elapsed_ms,
+    }
+
+
+# ============================================================================
+# DOWNLOAD INDEX
+# ============================================================================
+# Maps original filename and dpr_id to the stored upload so /api/download is a
+# single primary-key lookup instead of a scan over every analysis JSON. Kept
+# in the document store database; save_analysis_to_json updates it and
+# rebuild_download_index() recreates it from analysis_results on disk.
+
+ANALYSIS_RESULT_DIRS = ["analysis_results", "../analysis_results"]
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_MEDIA_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'doc': 'application/msword',
+    'txt': 'text/plain'
+}
+
+
+def _resolve_upload_path(record: Dict) -> Optional[str]:
+    """Locate the uploaded file an analysis record points at"""
+    stored_filename = record.get('stored_filename')
+    if stored_filename and os.path.exists(f"uploads/{stored_filename}"):
+        return f"uploads/{stored_filename}"
+    file_path = record.get('file_path')
+    if file_path and os.path.exists(file_path):
+        return file_path
+    return None
+
+
+def _download_index_rows(record: Dict, analysis_path: str) -> List[tuple]:
+    file_path = _resolve_upload_path(record)
+    if not file_path:
+        return []
+    keys = {record.get('filename'), record.get('original_filename'), record.get('dpr_id')}
+    stored_filename = record.get('stored_filename') or os.path.basename(file_path)
+    indexed_at = datetime.now().isoformat()
+    return [
+        (str(key), file_path, stored_filename, analysis_path, indexed_at)
+        for key in keys if key
+    ]
+
+
+def _upsert_download_rows(conn: sqlite3.Connection, rows: List[tuple]):
+    conn.executemany(
+        "INSERT OR REPLACE INTO download_index (lookup_key, file_path, stored_filename, analysis_path, indexed_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+
+
+def index_download(record: Dict, analysis_path: str):
+    """Point the record's filename and dpr_id at its stored upload (latest analysis wins)"""
+    rows = _download_index_rows(record, analysis_path)
+    if rows:
+        _upsert_download_rows(get_documents_db(), rows)
+
+
+def rebuild_download_index() -> int:
+    """Recreate the download index from the analysis JSON files; returns keys indexed"""
+    analysis_files = []
+    for analysis_dir in ANALYSIS_RESULT_DIRS:
+        if os.path.isdir(analysis_dir):
+            analysis_files.extend(
+                (name, os.path.join(analysis_dir, name))
+                for name in os.listdir(analysis_dir) if name.endswith('.json')
+            )
+    # analysis_<timestamp>_... names sort chronologically, so later saves overwrite earlier ones
+    analysis_files.sort()
     
-    sections['final_assessment'] = final_assessment
+    rows = {}
+    for name, json_path in analysis_files:
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except Exception as e:
+            print(f"[WARNING] Error reading {name}: {e}")
+            continue
+        if isinstance(record, dict):
+            for row in _download_index_rows(record, json_path):
+                rows[row[0]] = row
     
-    return sections
+    conn = get_documents_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM download_index")
+        _upsert_download_rows(conn, list(rows.values()))
+        conn.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('download_index_built', ?)",
+            (datetime.now().isoformat(),)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    print(f"[DOWNLOAD-INDEX] Indexed {len(rows)} keys from {len(analysis_files)} analysis files")
+    return len(rows)
 
 
-def generate_chatgpt_style_response(analysis: Dict, insights: List, risks: Dict, structured_dpr: Dict) -> str:
-    """Generate a structured, detailed, and human-readable response"""
+def ensure_download_index(force: bool = False):
+    """Build the download index on first start (or when forced); later starts reuse it"""
+    conn = get_documents_db()
+    built = conn.execute("SELECT value FROM store_meta WHERE key = 'download_index_built'").fetchone()
+    if force or not built:
+        rebuild_download_index()
+
+
+def lookup_download(document_id: str) -> Optional[tuple]:
+    """(file_path, stored_filename) for an original filename or dpr_id, if the file still exists"""
+    row = get_documents_db().execute(
+        "SELECT file_path, stored_filename FROM download_index WHERE lookup_key = ?",
+        (document_id,)
+    ).fetchone()
+    if row and os.path.exists(row[0]):
+        return row[0], row[1]
+    return None
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    return '"' + hashlib.md5(f"{stat_result.st_mtime_ns}-{stat_result.st_size}".encode()).hexdigest() + '"'
+
+
+def parse_byte_range(range_header: str, size: int) -> Optional[tuple]:
+    """
+    Parse a single 'bytes=' range into an inclusive (start, end).
+    Returns None when the header should be ignored (malformed or multi-range)
+    and raises ValueError when the range cannot be satisfied.
+    """
+    match = re.fullmatch(r'\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*', range_header)
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    first, last = match.group(1), match.group(2)
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        # Suffix range: the final N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("empty suffix range")
+        start, end = max(size - suffix, 0), size - 1
+    if start >= size:
+        raise ValueError("range starts beyond end of file")
+    return start, end
+
+
+def attachment_disposition(filename: str) -> str:
+    """Content-Disposition header value, matching what FileResponse sends"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _iter_file_range(file_path: str, start: int, end: int):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def ranged_file_response(request: Request, file_path: str, download_name: str, media_type: str) -> Response:
+    """Serve a file with ETag revalidation and single-range (206) support"""
+    stat_result = os.stat(file_path)
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    headers = {"etag": etag, "accept-ranges": "bytes"}
     
-    overall_score = analysis.get('overall_score', 0)
-    approval = analysis.get('approval_recommendation', {})
-    decision = approval.get('decision', 'N/A')
-    reasoning = approval.get('reasoning', '')
-    summary = analysis.get('summary', '')
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
     
-    project_title = structured_dpr.get('project_title', 'this project')
-    project_type = structured_dpr.get('project_type', 'Infrastructure Project')
-    location = structured_dpr.get('location', 'Not specified')
-    implementing_agency = structured_dpr.get('implementing_agency', 'Not specified')
-    duration = structured_dpr.get('duration', 'Not specified')
-    budget = structured_dpr.get('budget', {}).get('total', 0)
-    budget_details = structured_dpr.get('budget', {}).get('details', 'Not specified')
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            return StreamingResponse(
+                _iter_file_range(file_path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers={
+                    **headers,
+                    "content-range": f"bytes {start}-{end}/{size}",
+                    "content-length": str(end - start + 1),
+                    "content-disposition": attachment_disposition(download_name),
+                }
+            )
     
-    # Format budget
-    budget_formatted = "Not specified"
-    if budget > 0:
-        budget_crores = budget / 10000000
-        budget_formatted = f"Rs. {budget_crores:.2f} Crores"
+    return FileResponse(
+        path=file_path,
+        media_type=media_type,
+        filename=download_name,
+        headers=headers,
+        stat_result=stat_result
+    )
+
+
+# ============================================================================
+# GUIDELINE CORPUS (BM25 RETRIEVAL)
+# ============================================================================
+# Every guideline file in GUIDELINES_DIR is chunked at section boundaries and
+# indexed with BM25. Prompts get the top passages for the DPR's project type
+# and section headings instead of a fixed prefix of one file, so they stay
+# small while covering the whole rulebook. The index is persisted as JSON with
+# a manifest of the files it was built from; startup reuses it unless a file
+# was added, removed or modified.
+
+GUIDELINE_INDEX_VERSION = "1"
+GUIDELINE_FILE_TYPES = ('.pdf', '.docx', '.doc', '.txt', '.md')
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_GUIDELINE_TOKEN_PATTERN = re.compile(r'\w+')
+_GUIDELINE_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall should that the their this to "
+    "was were will with which be been not any all such may must under per into".split()
+)
+
+_guideline_index_lock = threading.Lock()
+_guideline_index: Optional[Dict] = None
+
+
+def tokenize_guideline_text(text: str) -> List[str]:
+    """Lower-cased word tokens (any script) without stopwords or single characters; plural 's' folded"""
+    tokens = []
+    for token in _GUIDELINE_TOKEN_PATTERN.findall(text.lower()):
+        if len(token) < 2 or token in _GUIDELINE_STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _guideline_files() -> Dict[str, Dict]:
+    """Manifest of guideline files: name -> size and modification time"""
+    manifest = {}
+    if os.path.isdir(GUIDELINES_DIR):
+        for name in sorted(os.listdir(GUIDELINES_DIR)):
+            if name.lower().endswith(GUIDELINE_FILE_TYPES):
+                stat_result = os.stat(os.path.join(GUIDELINES_DIR, name))
+                manifest[name] = {"size": stat_result.st_size, "mtime_ns": stat_result.st_mtime_ns}
+    return manifest
+
+
+def _guideline_file_text(name: str) -> str:
+    path = os.path.join(GUIDELINES_DIR, name)
+    extension = name.rsplit('.', 1)[-1].lower()
+    if extension in ('txt', 'md'):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+    return extract_document(path, extension)["text"]
+
+
+def build_guideline_index() -> Dict:
+    """Chunk and BM25-index every guideline file, then persist the index"""
+    started = time.perf_counter()
+    manifest = _guideline_files()
+    chunks, postings = [], {}
+    fingerprint = hashlib.sha256(f"{GUIDELINE_INDEX_VERSION}:{GUIDELINE_CHUNK_CHARS}:{GUIDELINE_TOP_K}".encode())
     
-    response = f"""
-================================================================================
-                        DPR ANALYSIS REPORT
-================================================================================
+    for name in manifest:
+        try:
+            text = _guideline_file_text(name)
+        except Exception as e:
+            print(f"[GUIDELINES] Skipping {name}: {e}")
+            continue
+        fingerprint.update(name.encode("utf-8") + b"\x00" + hashlib.sha256(text.encode("utf-8")).digest())
+        for passage in split_dpr_into_chunks(text, GUIDELINE_CHUNK_CHARS):
+            passage = passage.strip()
+            tokens = tokenize_guideline_text(passage)
+            if not tokens:
+                continue
+            chunk_id = len(chunks)
+            chunks.append({"file": name, "text": passage, "length": len(tokens)})
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append([chunk_id, count])
+    
+    index = {
+        "version": GUIDELINE_INDEX_VERSION,
+        "chunk_chars": GUIDELINE_CHUNK_CHARS,
+        "manifest": manifest,
+        "fingerprint": fingerprint.hexdigest()[:16] if chunks else "none",
+        "built_at": datetime.now().isoformat(),
+        "average_length": (sum(c["length"] for c in chunks) / len(chunks)) if chunks else 0.0,
+        "chunks": chunks,
+        "postings": postings,
+    }
+    try:
+        os.makedirs(os.path.dirname(GUIDELINE_INDEX_PATH), exist_ok=True)
+        tmp_path = f"{GUIDELINE_INDEX_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, GUIDELINE_INDEX_PATH)
+    except OSError as e:
+        print(f"[GUIDELINES] Could not persist index: {e}")
+    print(f"[GUIDELINES] Indexed {len(chunks)} passages from {len(manifest)} files in {time.perf_counter() - started:.2f}s")
+    return index
+
+
+def load_guideline_index(force_rebuild: bool = False) -> Dict:
+    """Load the persisted index if it matches the files on disk, otherwise rebuild it"""
+    global _guideline_index
+    with _guideline_index_lock:
+        index = None
+        if not force_rebuild:
+            try:
+                with open(GUIDELINE_INDEX_PATH, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                if (index.get("version") != GUIDELINE_INDEX_VERSION
+                        or index.get("chunk_chars") != GUIDELINE_CHUNK_CHARS
+                        or index.get("manifest") != _guideline_files()):
+                    index = None
+            except (OSError, ValueError):
+                index = None
+        if index is None:
+            index = build_guideline_index()
+        _guideline_index = index
+        return index
+
+
+def get_guideline_index() -> Dict:
+    return _guideline_index if _guideline_index is not None else load_guideline_index()
+
+
+def retrieve_guideline_passages(query: str, top_k: int = GUIDELINE_TOP_K) -> List[Dict]:
+    """BM25 top-k guideline passages for a free-text query"""
+    index = get_guideline_index()
+    chunks = index["chunks"]
+    if not chunks:
+        return []
+    postings = index["postings"]
+    average_length = index["average_length"] or 1.0
+    total = len(chunks)
+    scores: Dict[int, float] = {}
+    for token in set(tokenize_guideline_text(query)):
+        matches = postings.get(token)
+        if not matches:
+            continue
+        idf = math.log(1 + (total - len(matches) + 0.5) / (len(matches) + 0.5))
+        for chunk_id, count in matches:
+            length = chunks[chunk_id]["length"]
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * count * (BM25_K1 + 1) / (
+                count + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            )
+    best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+    return [
+        {"file": chunks[chunk_id]["file"], "text": chunks[chunk_id]["text"], "score": round(score, 3)}
+        for chunk_id, score in best
+    ]
 
-PROJECT INFORMATION:
--------------------
-Project Title       : {project_title}
-Project Type        : {project_type}
-Location            : {location}
-Implementing Agency : {implementing_agency}
-Project Duration    : {duration}
-Estimated Budget    : {budget_formatted}
 
-================================================================================
-                        EXECUTIVE SUMMARY
-================================================================================
+def dpr_guideline_query(structured_data: Dict, dpr_text: str) -> str:
+    """Retrieval query for a DPR: project type (weighted), title, location and section headings"""
+    project_type = str(structured_data.get('project_type', '') or '')
+    sections = structured_data.get('sections')
+    if sections is None:
+        sections = build_section_index(dpr_text)  # Structured data cached before the section index existed
+    headings = [section["title"] for section in sections]
+    return " ".join([project_type] * 3 + [
+        str(structured_data.get('project_title', '') or ''),
+        str(structured_data.get('location', '') or ''),
+    ] + headings[:40])
+
+
+def guidelines_prompt_context(structured_data: Dict, dpr_text: str, max_chars: int = GUIDELINE_CONTEXT_CHARS) -> str:
+    """Relevant guideline passages for a DPR prompt, within max_chars; empty if no guidelines are loaded"""
+    passages = retrieve_guideline_passages(dpr_guideline_query(structured_data, dpr_text))
+    parts, used = [], 0
+    for passage in passages:
+        block = f"[{passage['file']}]\n{passage['text']}"
+        if used + len(block) > max_chars:
+            block = block[:max_chars - used]
+        if block.strip():
+            parts.append(block)
+            used += len(block) + 2
+        if used >= max_chars:
+            break
+    return "\n\n".join(parts)
 
-Overall Score       : {overall_score}/100
-Recommendation      : {decision}
-Analysis Date       : {datetime.now().strftime('%B %d, %Y at %I:%M %p')}
 
-{summary if summary else reasoning}
+def guideline_index_stats() -> Dict:
+    index = get_guideline_index()
+    return {
+        "files": len(index["manifest"]),
+        "passages": len(index["chunks"]),
+        "fingerprint": index["fingerprint"],
+        "built_at": index["built_at"],
+    }
+
+
+# ============================================================================
+# ANALYSIS RESULT CACHE
+# ============================================================================
+# Content-addressed cache of finished analyses. The key covers everything that
+# determines the model output: the extracted text, the model, the prompt
+# template version and the loaded guidelines. Entries live as one JSON file
+# each under ANALYSIS_CACHE_DIR and are evicted least-recently-used once the
+# entry or size budget is exceeded, or when they are older than the max age.
+
+_analysis_cache_lock = threading.Lock()
+_analysis_cache_index: Optional["OrderedDict[str, int]"] = None  # key -> size in bytes, LRU order
+_analysis_cache_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+
+def guidelines_fingerprint() -> str:
+    """Short hash of the indexed guideline corpus (retrieval is deterministic given corpus and DPR)"""
+    return get_guideline_index()["fingerprint"]
+
+
+def analysis_cache_key(text: str, mode: str) -> str:
+    """Build the cache key for analysing `text` in the given mode ("full" or "fast")"""
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    parts = [mode, llm_backend.model_name, PROMPT_TEMPLATE_VERSIONS.get(mode, "v0"), guidelines_fingerprint(), text_hash]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _analysis_cache_path(key: str) -> str:
+    return os.path.join(ANALYSIS_CACHE_DIR, f"{key}.json")
+
+
+def _load_analysis_cache_index() -> "OrderedDict[str, int]":
+    """Build the LRU index from the cache directory, oldest access first"""
+    global _analysis_cache_index
+    if _analysis_cache_index is None:
+        os.makedirs(ANALYSIS_CACHE_DIR, exist_ok=True)
+        entries = []
+        for name in os.listdir(ANALYSIS_CACHE_DIR):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(ANALYSIS_CACHE_DIR, name))
+                entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        entries.sort()
+        _analysis_cache_index = OrderedDict((key, size) for _, key, size in entries)
+    return _analysis_cache_index
+
+
+def _drop_analysis_cache_entry(index: "OrderedDict[str, int]", key: str):
+    index.pop(key, None)
+    try:
+        os.remove(_analysis_cache_path(key))
+    except OSError:
+        pass
+
+
+def analysis_cache_get(key: str) -> Optional[Dict]:
+    """Return the cached value for `key`, or None on a miss"""
+    with _analysis_cache_lock:
+        index = _load_analysis_cache_index()
+        path = _analysis_cache_path(key)
+        if key not in index:
+            _analysis_cache_stats["misses"] += 1
+            inc_counter("dpr_cache_requests_total", cache="analysis", outcome="miss")
+            return None
+        try:
+            age_seconds = datetime.now().timestamp() - os.path.getmtime(path)
+            if age_seconds > ANALYSIS_CACHE_MAX_AGE_DAYS * 86400:
+                _drop_analysis_cache_entry(index, key)
+                _analysis_cache_stats["expired"] += 1
+                _analysis_cache_stats["misses"] += 1
+                inc_counter("dpr_cache_requests_total", cache="analysis", outcome="expired")
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # Refresh access time so LRU order survives restarts
+        except (OSError, ValueError) as e:
+            print(f"[CACHE] Dropping unreadable entry {key[:12]}: {e}")
+            _drop_analysis_cache_entry(index, key)
+            _analysis_cache_stats["misses"] += 1
+            inc_counter("dpr_cache_requests_total", cache="analysis", outcome="unreadable")
+            return None
+        index.move_to_end(key)
+        _analysis_cache_stats["hits"] += 1
+        inc_counter("dpr_cache_requests_total", cache="analysis", outcome="hit")
+        return entry.get("value")
+
+
+# Top-level keys a comprehensive analysis needs before it is worth caching
+ANALYSIS_REQUIRED_KEYS = ("overall_score", "summary", "approval_recommendation", "actionable_insights")
+
+
+def analysis_cacheable(analysis: Dict, required_keys=ANALYSIS_REQUIRED_KEYS) -> bool:
+    """False for error fallbacks, results recovered from truncated output and results missing required keys"""
+    if not isinstance(analysis, dict) or any(key in analysis for key in ("error", "_error", "_partial")):
+        return False
+    return all(key in analysis for key in required_keys)
+
+
+def analysis_cache_put(key: str, value: Dict, mode: str):
+    """Store `value` under `key` and evict old entries beyond the cache budget"""
+    entry = {"key": key, "mode": mode, "model": llm_backend.model_name, "created_at": datetime.now().isoformat(), "value": value}
+    payload = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+    with _analysis_cache_lock:
+        index = _load_analysis_cache_index()
+        path = _analysis_cache_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[CACHE] Could not store entry {key[:12]}: {e}")
+            return
+        index[key] = len(payload)
+        index.move_to_end(key)
+        _analysis_cache_stats["stores"] += 1
+
+        max_bytes = ANALYSIS_CACHE_MAX_MB * 1024 * 1024
+        total_bytes = sum(index.values())
+        while index and (len(index) > ANALYSIS_CACHE_MAX_ENTRIES or total_bytes > max_bytes):
+            oldest_key, oldest_size = next(iter(index.items()))
+            _drop_analysis_cache_entry(index, oldest_key)
+            total_bytes -= oldest_size
+            _analysis_cache_stats["evictions"] += 1
+
+
+def analysis_cache_stats() -> Dict:
+    """Cache counters and current footprint for health reporting"""
+    with _analysis_cache_lock:
+        index = _load_analysis_cache_index()
+        stats = dict(_analysis_cache_stats)
+        stats["entries"] = len(index)
+        stats["size_bytes"] = sum(index.values())
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    return stats
+
+
+# ============================================================================
+# SINGLE-FLIGHT REQUEST COALESCING
+# ============================================================================
+# Identical concurrent requests (a double-clicked upload, several admins
+# opening the same DPR) share one in-flight computation instead of each
+# paying for its own Gemini call. The computation runs as its own task, so a
+# caller that disconnects does not cancel it for the others; every caller
+# gets a private copy of the result.
+
+_single_flight_tasks: Dict[str, asyncio.Task] = {}
+
+
+def single_flight_key(mode: str, *parts: str) -> str:
+    """Key for coalescing: the mode plus a hash of every input that shapes the prompt"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8", "surrogatepass"))
+        digest.update(b"\x00")
+    return f"{mode}:{digest.hexdigest()}"
+
+
+async def single_flight(key: str, compute):
+    """Run `compute()` once per key among concurrent callers and share its result"""
+    mode = key.split(":", 1)[0]
+    task = _single_flight_tasks.get(key)
+    if task is None:
+        task = asyncio.ensure_future(compute())
+        _single_flight_tasks[key] = task
+        task.add_done_callback(lambda _: _single_flight_tasks.pop(key, None))
+        inc_counter("dpr_single_flight_total", mode=mode, role="leader")
+    else:
+        print(f"[SINGLE-FLIGHT] Joining in-flight {mode} computation {key[-12:]}")
+        inc_counter("dpr_single_flight_total", mode=mode, role="follower")
+    result = await asyncio.shield(task)
+    return copy.deepcopy(result)
+
+
+def single_flight_stats() -> Dict:
+    return {"in_flight": len(_single_flight_tasks)}
+
+
+# ============================================================================
+# PIPELINED EXTRACTION
+# ============================================================================
+# A large PDF that is not in the extraction store is parsed on a background
+# thread (its page batches on the extraction process pool) while the event
+# loop consumes the text as pages arrive: the DPR is structured from its
+# head and each analysis chunk is sent to the model as soon as it is
+# complete, instead of waiting for the last page. Once every page is in,
+# the extraction is stored and the full text is re-structured for the report.
+
+class PipelinedExtraction:
+    """Text of a PDF that grows, in page order, while it is being extracted"""
+
+    def __init__(self, file_path: str, content_hash: str, page_count: int):
+        self.file_path = file_path
+        self.content_hash = content_hash
+        self.page_count = page_count
+        self.records: List[tuple] = []
+        self.characters = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.started = time.perf_counter()
+        self._parts: List[str] = []
+        self._changed = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+
+    def start(self) -> "PipelinedExtraction":
+        threading.Thread(target=self._extract, name=f"pipeline-{self.content_hash[:8]}", daemon=True).start()
+        return self
+
+    def _extract(self):
+        """Worker thread: hand every page to the event loop as soon as it is parsed"""
+        error = None
+        try:
+            for record in iter_pdf_page_records(self.file_path, page_count=self.page_count):
+                self._loop.call_soon_threadsafe(self._add_page, record)
+        except Exception as e:
+            error = e
+        try:
+            self._loop.call_soon_threadsafe(self._finish, error)
+        except RuntimeError:
+            pass  # Event loop closed while extracting (shutdown)
+
+    def _add_page(self, record: tuple):
+        self.records.append(record)
+        if record[0]:
+            self._parts.append(record[0] + "\n")
+            self.characters += len(record[0]) + 1
+        self._changed.set()
+
+    def _finish(self, error: Optional[BaseException]):
+        self.done = True
+        self.error = error
+        observe_stage("pipelined_extraction", time.perf_counter() - self.started, "error" if error else "")
+        self._changed.set()
+
+    @property
+    def text(self) -> str:
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    async def _wait_for_change(self):
+        self._changed.clear()
+        await self._changed.wait()
+
+    async def wait_for(self, characters: int) -> str:
+        """Text once at least `characters` are extracted (or everything, if less); raises on failure"""
+        while self.characters < characters and not self.done:
+            await self._wait_for_change()
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+    async def chunks(self, max_chars: int):
+        """Yield analysis chunks of at most max_chars as soon as each is complete"""
+        emitted = 0
+        while True:
+            while self.characters - emitted <= max_chars and not self.done:
+                await self._wait_for_change()
+            if self.error is not None:
+                raise self.error
+            pending = self.text[emitted:]
+            if not pending.strip():
+                return
+            end = next_chunk_end(pending, max_chars)
+            emitted += end
+            if pending[:end].strip():
+                if emitted == end:
+                    observe_stage("pipeline_first_chunk", time.perf_counter() - self.started)
+                yield pending[:end]
+
+    async def result(self) -> Dict:
+        """The stored extraction entry once every page is in"""
+        while not self.done:
+            await self._wait_for_change()
+        if self.error is not None:
+            raise self.error
+        entry = assemble_pdf_extraction(self.records)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, store_extraction, self.content_hash, "pdf", entry)
+
+
+def pipeline_candidate(file_path: str, file_extension: str) -> Optional[tuple]:
+    """(content_hash, page_count) when a document should be analysed while it is extracted:
+    a PDF of at least PIPELINE_MIN_PAGES pages that is not in the extraction store"""
+    if not PIPELINED_EXTRACTION_ENABLED or file_extension != 'pdf':
+        return None
+    content_hash = file_content_hash(file_path)
+    if os.path.exists(_extraction_store_path(content_hash)):
+        return None
+    page_count = count_pdf_pages(file_path)
+    return (content_hash, page_count) if page_count >= PIPELINE_MIN_PAGES else None
+
+
+async def analyze_pdf_pipelined(file_path: str, content_hash: str, page_count: int, report) -> tuple:
+    """Extract, structure and analyse a large PDF with the stages overlapped.
+
+    Returns (structured_dpr, analysis) for the full document; the analysis is
+    cached under the full text exactly as the sequential pipeline caches it.
+    """
+    with _extraction_store_lock:
+        _extraction_store_stats["misses"] += 1
+    inc_counter("dpr_cache_requests_total", cache="extraction", outcome="miss")
+    print(f"[PIPELINE] Extracting {page_count} pages while analysing {content_hash[:12]}")
+    pipeline = PipelinedExtraction(file_path, content_hash, page_count).start()
+
+    head = await pipeline.wait_for(ANALYSIS_PROMPT_CHARS + 1)
+    if pipeline.done and len(head.strip()) < 100:
+        raise HTTPException(400, "Could not extract sufficient text from document")
+    report("structuring")
+    head_structure = structure_dpr_data(head)
+
+    report("analyzing")
+    if pipeline.done and len(head) <= ANALYSIS_PROMPT_CHARS:
+        # The whole document fits in one prompt after all
+        analysis = await analyze_dpr_comprehensive_fast(head, head_structure)
+    elif CHUNKED_ANALYSIS_ENABLED:
+        analysis = await analyze_dpr_chunked(head, head_structure, chunk_stream=pipeline.chunks(ANALYSIS_PROMPT_CHARS))
+    else:
+        # Single-call mode only ever reads the first ANALYSIS_PROMPT_CHARS
+        analysis = await analyze_dpr_comprehensive_fast(head, head_structure)
+
+    entry = await pipeline.result()
+    extracted_text = entry["text"]
+    print(f"[EXTRACTED] Extracted {len(extracted_text)} characters ({entry['page_count']} pages, pipelined)")
+    structured_dpr = structure_dpr_data(extracted_text)
+    if "chunked_analysis" in analysis:
+        analysis["chunked_analysis"]["document_characters"] = len(extracted_text)
+    if analysis_cacheable(analysis):
+        analysis_cache_put(analysis_cache_key(extracted_text, "full"),
+                           {"structured_dpr": structured_dpr, "analysis": analysis}, "full")
+    return structured_dpr, analysis
+
+
+# ============================================================================
+# DPR ANALYSIS PIPELINE
+# ============================================================================
 
-================================================================================
-                        SECTION 1: BUDGET ANALYSIS
-================================================================================
-"""
+async def finalize_dpr_analysis(
+    analysis: Dict,
+    structured_dpr: Dict,
+    dpr_id: str,
+    original_filename: str,
+    stored_filename: str,
+    file_path: str,
+    language: str,
+    cache_hit: bool = False
+) -> Dict:
+    """Turn a comprehensive analysis into the saved, optionally translated, upload result"""
     
-    budget_eval = analysis.get('budget_validation', {})
+    # Extract insights and risks from the comprehensive analysis
+    insights = analysis.get('actionable_insights', analysis.get('recommendations', []))
+    risks = {
+        "overall_risk_level": analysis.get('risk_assessment', {}).get('overall_risk_level', 'medium'),
+        "overall_risk_score": analysis.get('risk_assessment', {}).get('overall_risk_score', 50),
+        "financial_risks": analysis.get('risk_assessment', {}).get('financial_risks', []),
+        "timeline_risks": analysis.get('risk_assessment', {}).get('timeline_risks', []),
+        "environmental_risks": analysis.get('risk_assessment', {}).get('environmental_risks', []),
+        "resource_risks": analysis.get('risk_assessment', {}).get('resource_risks', []),
+    }
     
-    if budget_eval:
-        validity_status = "VALID" if budget_eval.get('is_valid') else "REQUIRES ATTENTION"
-        response += f"\nBudget Status: [{validity_status}]\n"
-        response += f"Budget Amount: {budget_details}\n\n"
-        
-        if budget_eval.get('is_valid'):
-            response += "Assessment: The budget allocation appears realistic and well-structured.\n"
-        else:
-            response += "Assessment: Budget concerns have been identified that require attention.\n\n"
-            response += "IDENTIFIED ISSUES:\n"
-            for idx, issue in enumerate(budget_eval.get('issues', []), 1):
-                if isinstance(issue, dict):
-                    severity = issue.get('severity', 'medium')
-                    description = issue.get('description', str(issue))
-                    response += f"  {idx}. {description}\n"
-                    response += f"     Severity: {severity.upper()}\n"
-                else:
-                    response += f"  {idx}. {issue}\n"
-        
-        if budget_eval.get('comments'):
-            response += f"\nDetailed Assessment:\n{budget_eval.get('comments')}\n"
-    else:
-        response += "\nNo detailed budget validation data available.\n"
+    # Combine results
+    result = {
+        "dpr_id": dpr_id,
+        "filename": original_filename,
+        "stored_filename": stored_filename,  # Add the actual stored filename
+        "file_path": file_path,  # Add the full file path
+        "upload_time": datetime.now().isoformat(),
+        "extracted_data": structured_dpr,
+        "analysis": analysis,
+        "actionable_insights": insights,
+        "risk_assessment": risks,
+        "language": language,
+        "cache_hit": cache_hit
+    }
     
-    response += "\n"
-    response += "="*80 + "\n"
-    response += "                    SECTION 2: TIMELINE EVALUATION\n"
-    response += "="*80 + "\n"
+    # Generate structured sections for JSON (without formatting lines)
+    print("Generating structured analysis sections...")
+    structured_sections = generate_structured_json_sections(analysis, insights, risks, structured_dpr)
     
-    timeline_eval = analysis.get('timeline_validation', {})
-    if timeline_eval:
-        timeline_status = "REALISTIC" if timeline_eval.get('is_realistic') else "REQUIRES REVIEW"
-        response += f"\nTimeline Status: [{timeline_status}]\n"
-        response += f"Project Duration: {duration}\n\n"
-        
-        if timeline_eval.get('is_realistic'):
-            response += "Assessment: The project timeline appears realistic and achievable.\n"
-        else:
-            response += "Assessment: Timeline concerns have been identified.\n\n"
-            response += "IDENTIFIED CONCERNS:\n"
-            for idx, issue in enumerate(timeline_eval.get('issues', []), 1):
-                if isinstance(issue, dict):
-                    severity = issue.get('severity', 'medium')
-                    description = issue.get('description', str(issue))
-                    response += f"  {idx}. {description}\n"
-                    response += f"     Severity: {severity.upper()}\n"
-                else:
-                    response += f"  {idx}. {issue}\n"
-        
-        if timeline_eval.get('comments'):
-            response += f"\nDetailed Assessment:\n{timeline_eval.get('comments')}\n"
-    else:
-        response += "\nNo detailed timeline validation data available.\n"
+    # Also generate formatted response for terminal display only
+    chatgpt_response = generate_chatgpt_style_response(analysis, insights, risks, structured_dpr)
     
-    response += "\n"
-    response += "="*80 + "\n"
-    response += "                   SECTION 3: TECHNICAL FEASIBILITY\n"
-    response += "="*80 + "\n"
+    # Save to JSON file with structured sections only (no formatted output)
+    print("Saving analysis to JSON...")
+    json_file_path = save_analysis_to_json(result, original_filename, structured_sections=structured_sections)
+    result['saved_to'] = json_file_path
+    print(f"[SAVED] Analysis saved to: {json_file_path}")
     
-    tech_eval = analysis.get('technical_feasibility', {})
-    if tech_eval:
-        tech_score = tech_eval.get('score', 0)
-        response += f"\nTechnical Feasibility Score: {tech_score}/100\n\n"
-        
-        if tech_eval.get('strengths'):
-            response += "STRENGTHS IDENTIFIED:\n"
-            for idx, strength in enumerate(tech_eval.get('strengths', []), 1):
-                response += f"  {idx}. {strength}\n"
-            response += "\n"
-        
-        if tech_eval.get('weaknesses'):
-            response += "AREAS FOR IMPROVEMENT:\n"
-            for idx, weakness in enumerate(tech_eval.get('weaknesses', []), 1):
-                response += f"  {idx}. {weakness}\n"
-            response += "\n"
-        
-        if tech_eval.get('comments'):
-            response += f"Detailed Assessment:\n{tech_eval.get('comments')}\n"
-    else:
-        response += "\nNo detailed technical feasibility data available.\n"
+    # Translate if needed
+    if language != "en":
+        print(f"Translating to {language}...")
+        result = await translate_report(result, language)
     
-    response += "\n"
-    response += "="*80 + "\n"
-    response += "                     SECTION 4: RISK ASSESSMENT\n"
-    response += "="*80 + "\n"
+    print("[COMPLETE] Analysis complete!")
     
-    risk_eval = analysis.get('risk_assessment', {})
-    if risk_eval:
-        risk_level = risk_eval.get('overall_risk_level', 'unknown')
-        response += f"\nOverall Risk Level: {risk_level.upper()}\n\n"
-        
-        # Financial Risks
-        if risk_eval.get('financial_risks'):
-            response += "4.1 FINANCIAL RISKS:\n"
-            response += "-" * 40 + "\n"
-            for idx, risk in enumerate(risk_eval.get('financial_risks', []), 1):
-                if isinstance(risk, dict):
-                    risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
-                    severity = risk.get('severity', 'unknown')
-                    mitigation = risk.get('mitigation', '')
-                    
-                    response += f"  Risk {idx}: {risk_text}\n"
-                    response += f"    Severity Level: {severity.upper()}\n"
-                    if mitigation:
-                        response += f"    Mitigation Strategy: {mitigation}\n"
-                    response += "\n"
-                else:
-                    response += f"  Risk {idx}: {risk}\n\n"
-        
-        # Timeline Risks
-        if risk_eval.get('timeline_risks'):
-            response += "4.2 TIMELINE RISKS:\n"
-            response += "-" * 40 + "\n"
-            for idx, risk in enumerate(risk_eval.get('timeline_risks', []), 1):
-                if isinstance(risk, dict):
-                    risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
-                    severity = risk.get('severity', 'unknown')
-                    mitigation = risk.get('mitigation', '')
-                    
-                    response += f"  Risk {idx}: {risk_text}\n"
-                    response += f"    Severity Level: {severity.upper()}\n"
-                    if mitigation:
-                        response += f"    Mitigation Strategy: {mitigation}\n"
-                    response += "\n"
-                else:
-                    response += f"  Risk {idx}: {risk}\n\n"
-        
-        # Environmental Risks
-        if risk_eval.get('environmental_risks'):
-            response += "4.3 ENVIRONMENTAL RISKS:\n"
-            response += "-" * 40 + "\n"
-            for idx, risk in enumerate(risk_eval.get('environmental_risks', []), 1):
-                if isinstance(risk, dict):
-                    risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
-                    severity = risk.get('severity', 'unknown')
-                    mitigation = risk.get('mitigation', '')
-                    
-                    response += f"  Risk {idx}: {risk_text}\n"
-                    response += f"    Severity Level: {severity.upper()}\n"
-                    if mitigation:
-                        response += f"    Mitigation Strategy: {mitigation}\n"
-                    response += "\n"
-                else:
-                    response += f"  Risk {idx}: {risk}\n\n"
-        
-        # Resource Risks
-        if risk_eval.get('resource_risks'):
-            response += "4.4 RESOURCE RISKS:\n"
-            response += "-" * 40 + "\n"
-            for idx, risk in enumerate(risk_eval.get('resource_risks', []), 1):
-                if isinstance(risk, dict):
-                    risk_text = risk.get('risk') or risk.get('name') or risk.get('description') or str(risk)
-                    severity = risk.get('severity', 'unknown')
-                    mitigation = risk.get('mitigation', '')
-                    
-                    response += f"  Risk {idx}: {risk_text}\n"
-                    response += f"    Severity Level: {severity.upper()}\n"
-                    if mitigation:
-                        response += f"    Mitigation Strategy: {mitigation}\n"
-                    response += "\n"
-                else:
-                    response += f"  Risk {idx}: {risk}\n\n"
-    else:
-        response += "\nNo detailed risk assessment data available.\n"
+    # ========================================
+    # PRINT STRUCTURED RESPONSE IN CLI
+    # ========================================
+    print("\n" + "="*80)
+    print("DPR ANALYSIS REPORT")
+    print("="*80)
+    print(chatgpt_response)
+    print("\n" + "="*80)
+    print(f"File: {original_filename}")
+    print(f"Saved to: {json_file_path}")
+    print(f"Completed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("="*80 + "\n")
     
-    response += "\n"
-    response += "="*80 + "\n"
-    response += "                 SECTION 5: ACTIONABLE RECOMMENDATIONS\n"
-    response += "="*80 + "\n\n"
+    return result
+
+
+async def analyze_dpr_full(extracted_text: str, structured_dpr: Dict, cache_key: str) -> Dict:
+    """Comprehensive analysis (chunked when the text exceeds one prompt), coalesced
+    per cache key and cached only when complete"""
+    async def analyze():
+        analysis = await analyze_dpr_comprehensive_fast(extracted_text, structured_dpr)
+        # Only cache complete analyses, never error fallbacks or truncated output
+        if analysis_cacheable(analysis):
+            analysis_cache_put(cache_key, {"structured_dpr": structured_dpr, "analysis": analysis}, "full")
+        return analysis
     
-    if insights and len(insights) > 0:
-        response += "Based on the comprehensive analysis, the following actionable steps are\n"
-        response += "recommended to strengthen this DPR:\n\n"
-        for idx, insight in enumerate(insights, 1):
-            response += f"  {idx}. {insight}\n"
-    else:
-        response += "Please review the detailed analysis sections above for specific recommendations.\n"
+    return await single_flight(f"full:{cache_key}", analyze)
+
+
+async def run_dpr_analysis(
+    file_path: str,
+    file_extension: str,
+    original_filename: str,
+    stored_filename: str,
+    dpr_id: str,
+    language: str,
+    on_stage=None
+) -> Dict:
+    """
+    Full upload pipeline for a saved file: extract, structure, analyse (or reuse
+    the cached analysis) and finalize. Large PDFs not yet in the extraction
+    store are analysed while they are extracted (see PIPELINED EXTRACTION).
+    `on_stage(name)` is called as each stage starts, for callers that report
+    progress (background jobs).
+    """
+    def report(stage: str):
+        if on_stage is not None:
+            on_stage(stage)
     
-    response += "\n"
-    response += "="*80 + "\n"
-    response += "                   SECTION 6: COMPLIANCE CHECK\n"
-    response += "="*80 + "\n\n"
+    # Extract text
+    report("extracting")
+    print(f"[EXTRACTING] Extracting text from {file_extension.upper()}...")
+    loop = asyncio.get_running_loop()
+    candidate = await loop.run_in_executor(None, pipeline_candidate, file_path, file_extension)
+    if candidate is not None:
+        # Large PDF seen for the first time: analyse it while it is extracted
+        content_hash, page_count = candidate
+        structured_dpr, analysis = await single_flight(
+            f"pipeline:{content_hash}",
+            lambda: analyze_pdf_pipelined(file_path, content_hash, page_count, report)
+        )
+        report("finalizing")
+        return await finalize_dpr_analysis(
+            analysis,
+            structured_dpr,
+            dpr_id=dpr_id,
+            original_filename=original_filename,
+            stored_filename=stored_filename,
+            file_path=file_path,
+            language=language,
+        )
     
-    compliance = analysis.get('compliance_check', {})
-    if compliance:
-        compliance_status = "COMPLIANT" if compliance.get('is_compliant') else "NON-COMPLIANT"
-        response += f"Compliance Status: [{compliance_status}]\n\n"
-        
-        if compliance.get('is_compliant'):
-            response += "Assessment: The DPR appears to be compliant with MDoNER guidelines.\n"
-        else:
-            response += "Assessment: Compliance gaps have been identified:\n\n"
-            response += "IDENTIFIED GAPS:\n"
-            for idx, gap in enumerate(compliance.get('guideline_gaps', []), 1):
-                response += f"  {idx}. {gap}\n"
-        
-        if compliance.get('comments'):
-            response += f"\nDetailed Assessment:\n{compliance.get('comments')}\n"
-    else:
-        response += "No detailed compliance data available.\n"
+    extracted_text = await loop.run_in_executor(None, extract_text, file_path, file_extension)
     
-    response += "\n"
-    response += "="*80 + "\n"
-    response += "                      FINAL ASSESSMENT\n"
-    response += "="*80 + "\n\n"
+    if len(extracted_text.strip()) < 100:
+        raise HTTPException(400, "Could not extract sufficient text from document")
     
-    if decision == "APPROVE":
-        response += "RECOMMENDATION: APPROVE\n"
-        response += "-" * 40 + "\n"
-        response += "This DPR is well-prepared and ready for approval. The project demonstrates\n"
-        response += "strong planning, feasibility, and alignment with MDoNER guidelines.\n"
-    elif decision == "REVISE":
-        response += "RECOMMENDATION: REVISE\n"
-        response += "-" * 40 + "\n"
-        response += "This DPR shows promise but requires revisions to address the concerns\n"
-        response += "identified in the analysis above.\n"
-    else:
-        response += "RECOMMENDATION: REJECT\n"
-        response += "-" * 40 + "\n"
-        response += "This DPR has significant issues that need to be resolved before it can\n"
-        response += "be approved for implementation.\n"
+    print(f"[EXTRACTED] Extracted {len(extracted_text)} characters")
     
-    response += "\n"
-    response += "="*80 + "\n"
-    response += "                    END OF ANALYSIS REPORT\n"
-    response += "="*80 + "\n\n"
-    response += "DISCLAIMER: This analysis was generated by AI and should be reviewed by\n"
-    response += "            qualified professionals before making final decisions.\n"
-    response += "\n" + "="*80
+    cache_key = analysis_cache_key(extracted_text, "full")
+    cached = analysis_cache_get(cache_key)
+    if cached is not None:
+        print(f"[CACHE-HIT] Reusing analysis {cache_key[:12]}")
+        structured_dpr = cached["structured_dpr"]
+        analysis = cached["analysis"]
+    else:
+        # Structure data
+        report("structuring")
+        print("[STRUCTURING] Structuring DPR data...")
+        structured_dpr = structure_dpr_data(extracted_text)
+        
+        # OPTIMIZED: Single AI Analysis call (includes insights + risks)
+        report("analyzing")
+        print("[FAST-AI-ANALYSIS] Starting optimized single-call analysis...")
+        analysis = await analyze_dpr_full(extracted_text, structured_dpr, cache_key)
     
-    return response
+    report("finalizing")
+    return await finalize_dpr_analysis(
+        analysis,
+        structured_dpr,
+        dpr_id=dpr_id,
+        original_filename=original_filename,
+        stored_filename=stored_filename,
+        file_path=file_path,
+        language=language,
+        cache_hit=cached is not None,
+    )
+
+
+# ============================================================================
+# STREAMING ANALYSIS (SERVER-SENT EVENTS)
+# ============================================================================
+
+class JsonSectionStreamer:
+    """Incrementally scan a streamed JSON object and emit each top-level member once complete.
+
+    Feed raw model output chunks with `feed()`; it returns the (key, value)
+    pairs whose values finished in that chunk. Scanning is a single pass over
+    the accumulated text, so the cost is linear in the response length.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_start = -1
+        self._key = None
+        self._value_start = -1
+
+    def feed(self, chunk: str) -> List[tuple]:
+        self.buffer += chunk
+        buf = self.buffer
+        sections = []
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None and self._value_start < 0:
+                        try:
+                            self._key = json.loads(buf[self._key_start:i + 1])
+                        except ValueError:
+                            self._key = None
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._value_start < 0:
+                    self._key_start = i
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                if self._depth == 1:
+                    self._emit(buf, i, sections)
+                self._depth -= 1
+            elif self._depth == 1:
+                if ch == ':' and self._key is not None and self._value_start < 0:
+                    self._value_start = i + 1
+                elif ch == ',':
+                    self._emit(buf, i, sections)
+            i += 1
+        self._pos = i
+        return sections
+
+    def _emit(self, buf: str, end: int, sections: List[tuple]):
+        if self._key is not None and self._value_start >= 0:
+            try:
+                sections.append((self._key, json.loads(buf[self._value_start:end])))
+            except ValueError:
+                pass
+        self._key = None
+        self._value_start = -1
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_dpr_analysis(
+    file_path: str,
+    file_extension: str,
+    original_filename: str,
+    stored_filename: str,
+    dpr_id: str,
+    language: str
+):
+    """Run the upload pipeline, yielding SSE frames for each stage, model token and finished section"""
+    loop = asyncio.get_running_loop()
+    yield sse_event("stage", {"stage": "saved", "stored_filename": stored_filename})
+    try:
+        extracted_text = await loop.run_in_executor(None, extract_text, file_path, file_extension)
+        if len(extracted_text.strip()) < 100:
+            yield sse_event("error", {"message": "Could not extract sufficient text from document"})
+            return
+        print(f"[STREAM] Extracted {len(extracted_text)} characters")
+        yield sse_event("stage", {"stage": "extracted", "characters": len(extracted_text)})
+        
+        cache_key = analysis_cache_key(extracted_text, "full")
+        cached = analysis_cache_get(cache_key)
+        if cached is not None:
+            print(f"[CACHE-HIT] Streaming cached analysis {cache_key[:12]}")
+            structured_dpr = cached["structured_dpr"]
+            analysis = cached["analysis"]
+            yield sse_event("stage", {"stage": "structured", "extracted_data": structured_dpr, "cache_hit": True})
+            for name, content in analysis.items():
+                yield sse_event("section", {"name": name, "content": content})
+        else:
+            structured_dpr = structure_dpr_data(extracted_text)
+            yield sse_event("stage", {"stage": "structured", "extracted_data": structured_dpr, "cache_hit": False})
+            
+            if CHUNKED_ANALYSIS_ENABLED and len(extracted_text) > ANALYSIS_PROMPT_CHARS:
+                # Too long for one prompt: the chunked analysis has no single token stream,
+                # so sections are sent once the chunk results are merged
+                yield sse_event("stage", {"stage": "analyzing", "chunked": True})
+                analysis = await analyze_dpr_full(extracted_text, structured_dpr, cache_key)
+                for name, content in analysis.items():
+                    yield sse_event("section", {"name": name, "content": content})
+            else:
+                yield sse_event("stage", {"stage": "analyzing"})
+                prompt = build_comprehensive_analysis_prompt(extracted_text, structured_dpr)
+                streamer = JsonSectionStreamer()
+                async for chunk in llm_generate_stream(prompt, generation_config=comprehensive_analysis_config()):
+                    yield sse_event("token", {"text": chunk})
+                    for name, content in streamer.feed(chunk):
+                        yield sse_event("section", {"name": name, "content": content})
+                
+                print(f"[STREAM] Model output complete ({len(streamer.buffer)} characters)")
+                analysis = await parse_json_response_async(streamer.buffer)
+                if analysis_cacheable(analysis):
+                    analysis_cache_put(cache_key, {"structured_dpr": structured_dpr, "analysis": analysis}, "full")
+        
+        yield sse_event("stage", {"stage": "finalizing"})
+        result = await finalize_dpr_analysis(
+            analysis,
+            structured_dpr,
+            dpr_id=dpr_id,
+            original_filename=original_filename,
+            stored_filename=stored_filename,
+            file_path=file_path,
+            language=language,
+            cache_hit=cached is not None,
+        )
+        yield sse_event("complete", {"status": "success", "result": result})
+    except LLMUnavailableError as e:
+        print(f"[STREAM ERROR] {e}")
+        yield sse_event("error", {"message": str(e), "status": 503, "retry_after": e.retry_after})
+    except Exception as e:
+        print(f"[STREAM ERROR] {e}")
+        yield sse_event("error", {"message": f"Error processing DPR: {str(e)}"})
 
 
-def save_analysis_to_json(result: Dict, filename: str, structured_sections: Dict = None) -> str:
-    """Save analysis results to a JSON file with structured sections"""
-    os.makedirs("analysis_results", exist_ok=True)
+# ============================================================================
+# ADMISSION CONTROL
+# ============================================================================
+# A burst of uploads would otherwise start every analysis at once, pile up
+# behind the LLM semaphore and turn into quota errors and timeouts. The
+# analysis endpoints take a slot here first: at most ANALYSIS_MAX_IN_FLIGHT
+# analyses run, up to ANALYSIS_MAX_QUEUE more wait in FIFO order, and anything
+# beyond that (or waiting longer than ANALYSIS_QUEUE_TIMEOUT_SECONDS) gets 429
+# with a Retry-After estimated from the queue length and how long analyses
+# have recently taken. Limits are per worker process.
+
+class AdmissionController:
+    """Bounded FIFO admission for analysis requests (event-loop only, no locking)"""
     
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    json_filename = f"analysis_results/analysis_{timestamp}_{filename.replace('.pdf', '.json').replace('.docx', '.json')}"
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float, expected_seconds: float):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        self._service_seconds = expected_seconds   # Moving average of how long an admitted analysis holds its slot
+        self._waits: "deque[float]" = deque(maxlen=256)
+        self._counts = {"admitted": 0, "queue_full": 0, "queue_timeout": 0}
     
-    # Add structured sections to result if provided
-    if structured_sections:
-        result['structured_analysis'] = structured_sections
-        result['structured_analysis_metadata'] = {
-            'generated_at': datetime.now().isoformat(),
-            'format': 'plain_text',
-            'exportable': True,
-            'sections': list(structured_sections.keys())
-        }
+    def retry_after(self) -> int:
+        """Seconds until a request arriving now would likely get a slot"""
+        waves = math.ceil((len(self._waiters) + 1) / self.max_in_flight)
+        return int(min(RETRY_AFTER_MAX_SECONDS, max(1, math.ceil(waves * self._service_seconds))))
     
-    with open(json_filename, 'w', encoding='utf-8') as f:
-        json.dump(result, f, indent=2, ensure_ascii=False)
+    def _reject(self, endpoint: str, reason: str) -> HTTPException:
+        self._counts[reason] += 1
+        inc_counter("dpr_admission_total", endpoint=endpoint, outcome=reason)
+        retry_after = self.retry_after()
+        print(f"[ADMISSION] Rejected {endpoint} ({reason}): {self._in_flight} running, "
+              f"{len(self._waiters)} queued, retry after {retry_after}s")
+        return HTTPException(
+            429,
+            f"Server is busy with other analyses; retry in {retry_after}s or submit via /api/jobs/upload-dpr",
+            headers={"Retry-After": str(retry_after)}
+        )
     
-    return json_filename
+    def _release_slot(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # The slot passes straight to the longest waiter
+                return
+        self._in_flight -= 1
+    
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done():
+            self._release_slot()  # Handed a slot just as the wait ended
+        else:
+            self._waiters.remove(waiter)
+            waiter.cancel()
+    
+    async def acquire(self, endpoint: str, bounded: bool = True) -> Callable[[], None]:
+        """Wait for a slot and return the function that gives it back.
+
+        Raises HTTPException 429 when the queue is full or the wait times out.
+        `bounded=False` (background jobs, already queued durably) waits as
+        long as it takes and is never rejected.
+        """
+        queued = time.perf_counter()
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+        else:
+            if bounded and len(self._waiters) >= self.max_queue:
+                raise self._reject(endpoint, "queue_full")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout if bounded else None)
+            except asyncio.TimeoutError:
+                self._abandon(waiter)
+                raise self._reject(endpoint, "queue_timeout")
+            except asyncio.CancelledError:
+                self._abandon(waiter)  # Client went away while queued
+                raise
+        
+        waited = time.perf_counter() - queued
+        self._waits.append(waited)
+        self._counts["admitted"] += 1
+        observe_stage("admission_wait", waited)
+        inc_counter("dpr_admission_total", endpoint=endpoint, outcome="admitted")
+        admitted = time.perf_counter()
+        released = False
+        
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            self._service_seconds += 0.2 * (time.perf_counter() - admitted - self._service_seconds)
+            self._release_slot()
+        
+        return release
+    
+    def stats(self) -> Dict:
+        """Slots, queue depth, wait times and rejections for health reporting"""
+        waits = sorted(self._waits)
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "admitted": self._counts["admitted"],
+            "rejected": {"queue_full": self._counts["queue_full"], "queue_timeout": self._counts["queue_timeout"]},
+            "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "p95_wait_seconds": round(waits[min(len(waits) - 1, math.ceil(0.95 * len(waits)) - 1)], 3) if waits else 0.0,
+            "avg_analysis_seconds": round(self._service_seconds, 2),
+            "retry_after_seconds": self.retry_after(),
+        }
+
+
+analysis_admission = AdmissionController(
+    ANALYSIS_MAX_IN_FLIGHT, ANALYSIS_MAX_QUEUE, ANALYSIS_QUEUE_TIMEOUT_SECONDS, ANALYSIS_EXPECTED_SECONDS
+)
+
+
+# ============================================================================
+# BACKGROUND JOBS
+# ============================================================================
+# Long analyses run as jobs so the HTTP request returns immediately with a job
+# ID. Jobs are rows in the document store database (status, stage, params,
+# result), so a finished result survives client disconnects. Workers are
+# asyncio tasks pulling job IDs from an in-process queue; the heavy lifting
+# still goes through the LLM client's semaphore.
+# Several server processes can share the database: a job is claimed with one
+# conditional UPDATE, and the claiming process owns it and refreshes its
+# heartbeat. A running job is only requeued once its heartbeat is stale, i.e.
+# its process has died; queued jobs are picked up again on the next start.
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+_job_owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # This process, as recorded in jobs.owner
+_job_queue: Optional[asyncio.Queue] = None
+_job_worker_tasks: List[asyncio.Task] = []
+_job_monitor_task: Optional[asyncio.Task] = None
+
+
+def _job_from_row(row: Dict) -> Dict:
+    job = {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "stage": row["stage"],
+        "attempts": row["attempts"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+    }
+    if row["status"] == "succeeded" and row["result"]:
+        job["result"] = json.loads(row["result"])
+    if row["status"] == "failed":
+        job["error"] = row["error"]
+        job["error_status"] = row["error_status"]
+    return job
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Job status, stage and (once finished) result or error"""
+    conn = get_documents_db()
+    cursor = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+    columns = [c[0] for c in cursor.description]
+    row = cursor.fetchone()
+    return _job_from_row(dict(zip(columns, row))) if row else None
+
+
+def _update_job(job_id: str, **fields):
+    """Update a job this process owns (a no-op once it has been requeued to someone else)"""
+    fields["heartbeat_at"] = datetime.now().isoformat()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    get_documents_db().execute(
+        f"UPDATE jobs SET {assignments} WHERE id = ? AND owner = ?", (*fields.values(), job_id, _job_owner)
+    )
+
+
+def submit_job(kind: str, params: Dict) -> str:
+    """Persist a new job and queue it for the workers; returns the job ID"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job_id = f"job_{uuid.uuid4().hex}"
+    get_documents_db().execute(
+        "INSERT INTO jobs (id, kind, status, stage, params, created_at) VALUES (?, ?, 'queued', 'queued', ?, ?)",
+        (job_id, kind, json.dumps(params, ensure_ascii=False), datetime.now().isoformat())
+    )
+    if _job_queue is not None:
+        _job_queue.put_nowait(job_id)
+    print(f"[JOB] Queued {kind} job {job_id}")
+    return job_id
+
+
+async def _dpr_analysis_job(params: Dict, on_stage) -> Dict:
+    if not os.path.exists(params["file_path"]):
+        raise HTTPException(404, f"Uploaded file no longer exists: {params['stored_filename']}")
+    release = await analysis_admission.acquire("job", bounded=False)
+    try:
+        return await run_dpr_analysis(
+            params["file_path"],
+            params["file_extension"],
+            params["original_filename"],
+            params["stored_filename"],
+            params["dpr_id"],
+            params["language"],
+            on_stage=on_stage,
+        )
+    except LLMUnavailableError as e:
+        raise llm_unavailable(e)
+    finally:
+        release()
+
+
+JOB_HANDLERS = {
+    "dpr_analysis": _dpr_analysis_job,
+}
+
+
+async def run_job(job_id: str):
+    """Execute one queued job and record its result or error"""
+    conn = get_documents_db()
+    now = datetime.now().isoformat()
+    claimed = conn.execute(
+        "UPDATE jobs SET status = 'running', stage = 'starting', attempts = attempts + 1, owner = ?, "
+        "started_at = ?, heartbeat_at = ? WHERE id = ? AND status = 'queued'",
+        (_job_owner, now, now, job_id)
+    )
+    if claimed.rowcount != 1:
+        return  # Unknown, finished, or claimed by another process
+    row = conn.execute("SELECT kind, params, attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    kind, params, attempts = row[0], json.loads(row[1]), row[2]
+    print(f"[JOB] Running {kind} job {job_id} (attempt {attempts})")
+    
+    started = time.perf_counter()
+    try:
+        result = await JOB_HANDLERS[kind](params, lambda stage: _update_job(job_id, stage=stage))
+        _update_job(
+            job_id,
+            status="succeeded",
+            stage="complete",
+            result=json.dumps(result, ensure_ascii=False),
+            finished_at=datetime.now().isoformat()
+        )
+        inc_counter("dpr_jobs_total", kind=kind, status="succeeded")
+        print(f"[JOB] Finished {job_id}")
+    except Exception as e:
+        status_code = e.status_code if isinstance(e, HTTPException) else 500
+        message = e.detail if isinstance(e, HTTPException) else f"Error processing DPR: {str(e)}"
+        _update_job(job_id, status="failed", error=message, error_status=status_code, finished_at=datetime.now().isoformat())
+        inc_counter("dpr_jobs_total", kind=kind, status="failed")
+        print(f"[JOB ERROR] {job_id}: {message}")
+    finally:
+        observe_stage(f"job_{kind}", time.perf_counter() - started)
+
+
+async def _job_worker(worker_index: int):
+    while True:
+        job_id = await _job_queue.get()
+        try:
+            await run_job(job_id)
+        except Exception as e:
+            # run_job records handler errors itself; this only guards the worker loop
+            print(f"[JOB ERROR] Worker {worker_index} failed on {job_id}: {e}")
+        finally:
+            _job_queue.task_done()
+
+
+def recover_jobs(prune: bool = False) -> List[str]:
+    """
+    Requeue running jobs whose process stopped sending heartbeats; returns
+    their IDs. Stale jobs that already used JOB_MAX_ATTEMPTS starts are failed
+    instead, so a job that crashes the server cannot loop forever. Jobs of
+    live processes are never touched. prune=True also deletes old finished jobs.
+    """
+    conn = get_documents_db()
+    now = datetime.now()
+    stale_before = datetime.fromtimestamp(now.timestamp() - JOB_STALE_SECONDS).isoformat()
+    stale = "status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)"
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart too many times', "
+            f"error_status = 500, finished_at = ? WHERE {stale} AND attempts >= ?",
+            (now.isoformat(), stale_before, JOB_MAX_ATTEMPTS)
+        )
+        requeued = [row[0] for row in conn.execute(f"SELECT id FROM jobs WHERE {stale}", (stale_before,))]
+        conn.executemany(
+            "UPDATE jobs SET status = 'queued', stage = 'queued', owner = NULL WHERE id = ?",
+            [(job_id,) for job_id in requeued]
+        )
+        if prune:
+            cutoff = datetime.fromtimestamp(now.timestamp() - JOB_RETENTION_DAYS * 86400).isoformat()
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+                (cutoff,)
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return requeued
+
+
+async def _job_monitor():
+    """Keep this process's running jobs alive and take over jobs of processes that died"""
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            get_documents_db().execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = 'running'",
+                (datetime.now().isoformat(), _job_owner)
+            )
+            requeued = recover_jobs()
+        except sqlite3.Error as e:
+            print(f"[JOB ERROR] Heartbeat failed: {e}")
+            continue
+        for job_id in requeued:
+            _job_queue.put_nowait(job_id)
+        if requeued:
+            print(f"[JOB] Requeued {len(requeued)} jobs from a stopped process")
+
+
+def start_job_workers():
+    """Create the job queue, requeue unfinished jobs and start the worker tasks (call from the running loop)"""
+    global _job_queue, _job_monitor_task
+    _job_queue = asyncio.Queue()
+    recover_jobs(prune=True)
+    conn = get_documents_db()
+    pending = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at")]
+    for job_id in pending:
+        _job_queue.put_nowait(job_id)
+    _job_worker_tasks[:] = [asyncio.create_task(_job_worker(i)) for i in range(JOB_WORKERS)]
+    _job_monitor_task = asyncio.create_task(_job_monitor())
+    if pending:
+        print(f"[JOB] Resuming {len(pending)} unfinished jobs")
+
+
+def release_jobs() -> int:
+    """Hand this process's running jobs back to the queue on shutdown; returns how many"""
+    cursor = get_documents_db().execute(
+        "UPDATE jobs SET status = 'queued', stage = 'queued', owner = NULL WHERE owner = ? AND status = 'running'",
+        (_job_owner,)
+    )
+    return cursor.rowcount
+
+
+def job_queue_stats() -> Dict:
+    """Job counts by status for health reporting"""
+    counts = dict(get_documents_db().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+    return {
+        "workers": len(_job_worker_tasks),
+        "queue_depth": _job_queue.qsize() if _job_queue is not None else 0,
+        **{status: counts.get(status, 0) for status in JOB_STATUSES},
+    }
 
 
 # ============================================================================
@@ -1847,6 +6325,46 @@ app = FastAPI(
     version="2.0.0"
 )
 
+class UploadSizeLimitMiddleware:
+    """Refuse request bodies over the upload limit with 413 before they are read.
+
+    A declared Content-Length is checked up front; chunked bodies are counted
+    as they arrive, so an oversized upload is never spooled to disk in full.
+    """
+    
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_body_bytes:
+            inc_counter("dpr_uploads_rejected_total", limit="content_length")
+            response = JSONResponse({"detail": upload_too_large().detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    inc_counter("dpr_uploads_rejected_total", limit="body")
+                    raise upload_too_large()
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+
+# Registered before CORS so 413 responses still carry the CORS headers
+app.add_middleware(UploadSizeLimitMiddleware, max_body_bytes=MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD_BYTES)
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -1884,6 +6402,10 @@ async def root():
         "endpoints": {
             "docs": "/docs",
             "upload_dpr": "/api/upload-dpr",
+            "upload_dpr_stream": "/api/upload-dpr-stream",
+            "submit_job": "/api/jobs/upload-dpr",
+            "job_status": "/api/jobs/{job_id}",
+            "metrics": "/metrics",
             "load_guidelines": "/api/load-guidelines",
             "health": "/api/health"
         }
@@ -1896,97 +6418,82 @@ async def health_check():
     return {
         "status": "healthy",
         "gemini_configured": bool(GEMINI_API_KEY),
-        "model": GEMINI_MODEL,
-        "guidelines_loaded": bool(guidelines_context)
+        "llm_backend": llm_backend.name,
+        "model": llm_backend.model_name,
+        "guidelines_loaded": bool(get_guideline_index()["chunks"]),
+        "guidelines": guideline_index_stats(),
+        "llm_client": llm_client_stats(),
+        "admission": analysis_admission.stats(),
+        "jobs": job_queue_stats(),
+        "single_flight": single_flight_stats(),
+        "analysis_cache": analysis_cache_stats(),
+        "extraction_store": extraction_store_stats()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms, event counters and LLM/cache gauges"""
+    llm = llm_client_stats()
+    cache = analysis_cache_stats()
+    admission = analysis_admission.stats()
+    gauges = {
+        "dpr_llm_in_flight": llm["in_flight"],
+        "dpr_llm_waiting": llm["waiting"],
+        "dpr_llm_max_in_flight": llm["max_in_flight"],
+        "dpr_llm_circuit_open": int(llm["circuit"]["state"] != "closed"),
+        "dpr_analysis_in_flight": admission["in_flight"],
+        "dpr_analysis_queue_depth": admission["queue_depth"],
+        "dpr_analysis_cache_entries": cache["entries"],
+        "dpr_analysis_cache_bytes": cache["size_bytes"],
     }
+    return PlainTextResponse(
+        render_prometheus_metrics(gauges),
+        media_type="text/plain; version=0.0.4"
+    )
 
 
 @app.get("/api/download/{document_id}")
-async def download_document(document_id: str):
+async def download_document(document_id: str, request: Request):
     """
     Download uploaded DPR document by document ID
-    Document ID format: original_filename (e.g., sampledpr.pdf)
+    Document ID format: original_filename (e.g., sampledpr.pdf) or dpr_id
     
-    Returns the actual uploaded file from the uploads directory
+    Returns the actual uploaded file from the uploads directory.
+    Supports ETag revalidation (If-None-Match) and single byte ranges (Range / If-Range).
     """
-    from fastapi.responses import FileResponse
-    
     try:
-        # First, try to find the stored filename in analysis results
-        # Check both backend/analysis_results and root analysis_results
-        analysis_dirs = ["analysis_results", "../analysis_results"]
-        
-        for analysis_dir in analysis_dirs:
-            if os.path.exists(analysis_dir):
-                json_files = [f for f in os.listdir(analysis_dir) if f.endswith('.json')]
-                
-                for json_file in json_files:
-                    json_path = os.path.join(analysis_dir, json_file)
-                    try:
-                        with open(json_path, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            
-                        # Check if this analysis corresponds to the requested document
-                        if data.get('filename') == document_id or data.get('original_filename') == document_id:
-                            stored_filename = data.get('stored_filename')
-                            file_path_from_json = data.get('file_path')
-                            
-                            if stored_filename and os.path.exists(f"uploads/{stored_filename}"):
-                                file_path = f"uploads/{stored_filename}"
-                            elif file_path_from_json and os.path.exists(file_path_from_json):
-                                file_path = file_path_from_json
-                            else:
-                                continue
-                            
-                            # Determine media type
-                            extension = stored_filename.split('.')[-1].lower() if stored_filename else 'pdf'
-                            media_type = {
-                                'pdf': 'application/pdf',
-                                'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                                'doc': 'application/msword',
-                                'txt': 'text/plain'
-                            }.get(extension, 'application/octet-stream')
-                            
-                            print(f"[DOWNLOAD] Sending file: {file_path} as {document_id}")
-                            return FileResponse(
-                                path=file_path,
-                                media_type=media_type,
-                                filename=document_id  # Use original filename for download
-                            )
-                    except Exception as e:
-                        print(f"[WARNING] Error reading {json_file}: {e}")
-                        continue
+        # Indexed lookup: original filename / dpr_id -> stored upload
+        found = lookup_download(document_id)
+        if found:
+            file_path, stored_filename = found
+            extension = stored_filename.split('.')[-1].lower() if stored_filename else 'pdf'
+            media_type = DOWNLOAD_MEDIA_TYPES.get(extension, 'application/octet-stream')
+            
+            print(f"[DOWNLOAD] Sending file: {file_path} as {document_id}")
+            return ranged_file_response(request, file_path, document_id, media_type)
         
         # Fallback: Search uploads directory for matching files
         uploads_dir = "uploads"
         if not os.path.exists(uploads_dir):
             raise HTTPException(404, "Uploads directory not found")
         
-        files = os.listdir(uploads_dir)
+        files = [f for f in os.listdir(uploads_dir) if f.lower().endswith(tuple(f".{ext}" for ext in DOWNLOAD_MEDIA_TYPES))]
         
         # If document_id is the original name, find the corresponding dpr_timestamp file
         # We'll return the most recent file that matches
         if document_id.lower().endswith(('.pdf', '.docx', '.doc', '.txt')):
             # Return the most recent file (assuming one file for now)
             if files:
-                latest_file = sorted(files, reverse=True)[0]  # Get most recent file
+                latest_file = max(files, key=lambda f: os.path.getmtime(os.path.join(uploads_dir, f)))  # Get most recent file
                 file_path = os.path.join(uploads_dir, latest_file)
                 
                 # Determine media type
                 extension = latest_file.split('.')[-1].lower()
-                media_type = {
-                    'pdf': 'application/pdf',
-                    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-                    'doc': 'application/msword',
-                    'txt': 'text/plain'
-                }.get(extension, 'application/octet-stream')
+                media_type = DOWNLOAD_MEDIA_TYPES.get(extension, 'application/octet-stream')
                 
                 print(f"[DOWNLOAD-FALLBACK] Sending most recent file: {file_path} as {document_id}")
-                return FileResponse(
-                    path=file_path,
-                    media_type=media_type,
-                    filename=document_id  # Use original filename for download
-                )
+                return ranged_file_response(request, file_path, document_id, media_type)
         
         raise HTTPException(404, f"Document not found: {document_id}")
         
@@ -2011,103 +6518,132 @@ async def upload_and_analyze_dpr(
     - **language**: en, hi, as, bn, mni, ne
     """
     
+    # Validate file type before taking an analysis slot
+    file_extension = file.filename.split(".")[-1].lower()
+    if file_extension not in ['pdf', 'docx', 'doc']:
+        raise HTTPException(400, f"Unsupported file type: {file_extension}")
+    
+    release = await analysis_admission.acquire("upload_dpr")
     try:
-        # Validate file type
-        file_extension = file.filename.split(".")[-1].lower()
-        if file_extension not in ['pdf', 'docx', 'doc']:
-            raise HTTPException(400, f"Unsupported file type: {file_extension}")
-        
         # Save file
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"dpr_{timestamp}.{file_extension}"
-        file_path = f"uploads/{filename}"
-        
-        print(f"[SAVE] Saving file: {filename}")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Extract text
-        print(f"[EXTRACTING] Extracting text from {file_extension.upper()}...")
-        extracted_text = extract_text(file_path, file_extension)
-        
-        if len(extracted_text.strip()) < 100:
-            raise HTTPException(400, "Could not extract sufficient text from document")
-        
-        print(f"[EXTRACTED] Extracted {len(extracted_text)} characters")
-        
-        # Structure data
-        print("[STRUCTURING] Structuring DPR data...")
-        structured_dpr = structure_dpr_data(extracted_text)
-        
-        # OPTIMIZED: Single AI Analysis call (includes insights + risks)
-        print("[FAST-AI-ANALYSIS] Starting optimized single-call analysis...")
-        analysis = await analyze_dpr_comprehensive_fast(extracted_text, structured_dpr)
-        
-        # Extract insights and risks from the comprehensive analysis
-        insights = analysis.get('actionable_insights', analysis.get('recommendations', []))
-        risks = {
-            "overall_risk_level": analysis.get('risk_assessment', {}).get('overall_risk_level', 'medium'),
-            "overall_risk_score": analysis.get('risk_assessment', {}).get('overall_risk_score', 50),
-            "financial_risks": analysis.get('risk_assessment', {}).get('financial_risks', []),
-            "timeline_risks": analysis.get('risk_assessment', {}).get('timeline_risks', []),
-            "environmental_risks": analysis.get('risk_assessment', {}).get('environmental_risks', []),
-            "resource_risks": analysis.get('risk_assessment', {}).get('resource_risks', []),
-        }
-        
-        # Combine results
-        result = {
-            "dpr_id": timestamp,
-            "filename": file.filename,
-            "stored_filename": filename,  # Add the actual stored filename
-            "file_path": file_path,  # Add the full file path
-            "upload_time": datetime.now().isoformat(),
-            "extracted_data": structured_dpr,
-            "analysis": analysis,
-            "actionable_insights": insights,
-            "risk_assessment": risks,
-            "language": language
-        }
+        upload = await ingest_upload(file, file_extension)
+        filename, file_path = upload["stored_filename"], upload["file_path"]
+        print(f"[SAVE] Saved file: {filename} ({upload['size']} bytes)")
         
-        # Generate structured sections for JSON (without formatting lines)
-        print("Generating structured analysis sections...")
-        structured_sections = generate_structured_json_sections(analysis, insights, risks, structured_dpr)
-        
-        # Also generate formatted response for terminal display only
-        chatgpt_response = generate_chatgpt_style_response(analysis, insights, risks, structured_dpr)
-        
-        # Save to JSON file with structured sections only (no formatted output)
-        print("Saving analysis to JSON...")
-        json_file_path = save_analysis_to_json(result, file.filename, structured_sections=structured_sections)
-        result['saved_to'] = json_file_path
-        print(f"[SAVED] Analysis saved to: {json_file_path}")
-        
-        # Translate if needed
-        if language != "en":
-            print(f"Translating to {language}...")
-            result = await translate_report(result, language)
-        
-        print("[COMPLETE] Analysis complete!")
-        
-        # ========================================
-        # PRINT STRUCTURED RESPONSE IN CLI
-        # ========================================
-        print("\n" + "="*80)
-        print("DPR ANALYSIS REPORT")
-        print("="*80)
-        print(chatgpt_response)
-        print("\n" + "="*80)
-        print(f"File: {file.filename}")
-        print(f"Saved to: {json_file_path}")
-        print(f"Completed: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print("="*80 + "\n")
+        result = await run_dpr_analysis(file_path, file_extension, file.filename, filename, timestamp, language)
         
         return {"status": "success", "result": result}
         
+    except LLMUnavailableError as e:
+        raise llm_unavailable(e)
     except HTTPException:
         raise
     except Exception as e:
         print(f"[ERROR] Error: {e}")
         raise HTTPException(500, f"Error processing DPR: {str(e)}")
+    finally:
+        release()
+
+
+@app.post("/api/upload-dpr-stream")
+async def upload_and_analyze_dpr_stream(
+    file: UploadFile = File(...),
+    language: str = Form("en")
+):
+    """
+    Upload DPR and stream the analysis as Server-Sent Events
+    
+    Emits `stage` events (saved, extracted, structured, analyzing, finalizing),
+    `token` events with raw model output, a `section` event as soon as each
+    top-level analysis section is complete, then `complete` with the same
+    result as /api/upload-dpr (or `error`). DPRs longer than one prompt are
+    analysed in chunks: no `token` events, and the sections arrive together.
+    
+    - **file**: PDF or DOCX file
+    - **language**: en, hi, as, bn, mni, ne
+    """
+    
+    # Validate file type
+    file_extension = file.filename.split(".")[-1].lower()
+    if file_extension not in ['pdf', 'docx', 'doc']:
+        raise HTTPException(400, f"Unsupported file type: {file_extension}")
+    
+    # The slot is held until the stream ends (or the client disconnects)
+    release = await analysis_admission.acquire("upload_dpr_stream")
+    try:
+        # Save file before streaming starts (the upload is closed once we return)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        upload = await ingest_upload(file, file_extension)
+    except BaseException:
+        release()
+        raise
+    filename, file_path = upload["stored_filename"], upload["file_path"]
+    print(f"[STREAM] Saved file: {filename} ({upload['size']} bytes)")
+    
+    async def events():
+        try:
+            async for frame in stream_dpr_analysis(file_path, file_extension, file.filename, filename, timestamp, language):
+                yield frame
+        finally:
+            release()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/jobs/upload-dpr", status_code=202)
+async def submit_dpr_analysis_job(
+    file: UploadFile = File(...),
+    language: str = Form("en")
+):
+    """
+    Upload DPR and run the /api/upload-dpr analysis as a background job
+    
+    Returns immediately with a job ID; poll GET /api/jobs/{job_id} for the
+    stage and, once status is `succeeded`, the same result /api/upload-dpr returns.
+    
+    - **file**: PDF or DOCX file
+    - **language**: en, hi, as, bn, mni, ne
+    """
+    
+    # Validate file type
+    file_extension = file.filename.split(".")[-1].lower()
+    if file_extension not in ['pdf', 'docx', 'doc']:
+        raise HTTPException(400, f"Unsupported file type: {file_extension}")
+    
+    # Save file (the job reads it after this request has returned)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    upload = await ingest_upload(file, file_extension)
+    filename, file_path = upload["stored_filename"], upload["file_path"]
+    print(f"[JOB] Saved file: {filename} ({upload['size']} bytes)")
+    
+    job_id = submit_job("dpr_analysis", {
+        "file_path": file_path,
+        "file_extension": file_extension,
+        "original_filename": file.filename,
+        "stored_filename": filename,
+        "dpr_id": timestamp,
+        "language": language,
+    })
+    
+    return {
+        "status": "queued",
+        "job_id": job_id,
+        "status_url": f"/api/jobs/{job_id}"
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Status (queued, running, succeeded, failed), current stage and result of a background job"""
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job not found: {job_id}")
+    return job
 
 
 @app.post("/api/upload-dpr-fast")
@@ -2123,24 +6659,23 @@ async def upload_and_analyze_dpr_fast(
     - **language**: en, hi, as, bn, mni, ne
     """
     
+    # Validate file type before taking an analysis slot
+    file_extension = file.filename.split(".")[-1].lower()
+    if file_extension not in ['pdf', 'docx', 'doc', 'txt']:
+        raise HTTPException(400, f"Unsupported file type: {file_extension}")
+    
+    release = await analysis_admission.acquire("upload_dpr_fast")
     try:
-        # Validate file type
-        file_extension = file.filename.split(".")[-1].lower()
-        if file_extension not in ['pdf', 'docx', 'doc', 'txt']:
-            raise HTTPException(400, f"Unsupported file type: {file_extension}")
-        
         # Save file
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"dpr_{timestamp}.{file_extension}"
-        file_path = f"uploads/{filename}"
-        
-        print(f"[FAST-MODE] Saving file: {filename}")
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        upload = await ingest_upload(file, file_extension)
+        filename, file_path = upload["stored_filename"], upload["file_path"]
+        print(f"[FAST-MODE] Saved file: {filename} ({upload['size']} bytes)")
         
         # Extract text
         print(f"[FAST-MODE] Extracting text from {file_extension.upper()}...")
-        extracted_text = extract_text(file_path, file_extension)
+        loop = asyncio.get_running_loop()
+        extracted_text = await loop.run_in_executor(None, extract_text, file_path, file_extension)
         
         if len(extracted_text.strip()) < 100:
             raise HTTPException(400, "Could not extract sufficient text from document")
@@ -2148,12 +6683,16 @@ async def upload_and_analyze_dpr_fast(
         print(f"[FAST-MODE] Extracted {len(extracted_text)} characters")
         
         # Structure basic data (quick pass)
-        structured_dpr = structure_dpr_data(extracted_text)
+        structured_dpr = await loop.run_in_executor(None, structure_dpr_data, extracted_text)
+        
+        cache_key = analysis_cache_key(extracted_text, "fast")
+        cached_insights = analysis_cache_get(cache_key)
         
         # OPTIMIZED: Direct recommendations generation only (skip full analysis)
         print("[FAST-MODE] Generating recommendations directly...")
         
-        prompt = f"""
+        def recommendations_prompt(text: str, part_note: str = "") -> str:
+            return f"""
 You are an AI expert analyzing DPRs for India's Ministry of Development of North Eastern Region (MDoNER).
 
 Analyze this DPR and provide 6-8 PRIORITY-BASED recommendations for improvement:
@@ -2165,8 +6704,9 @@ PROJECT DETAILS:
 - Timeline: {structured_dpr.get('timeline', {}).get('duration', 'Not specified')}
 - Location: {structured_dpr.get('location', 'North Eastern Region')}
 
+{part_note}
 DPR CONTENT (First 15000 characters):
-{extracted_text[:15000]}
+{text[:FAST_PROMPT_CHARS]}
 
 CRITICAL INSTRUCTIONS:
 1. Analyze gaps against MDoNER approval requirements
@@ -2193,8 +6733,14 @@ Return ONLY a JSON object:
 """
         
         try:
-            response = gemini_model.generate_content(prompt)
-            insights_data = parse_json_response(response.text)
+            if cached_insights is not None:
+                print(f"[CACHE-HIT] Reusing recommendations {cache_key[:12]}")
+                insights_data = cached_insights
+            else:
+                insights_data = await single_flight(
+                    f"fast:{cache_key}",
+                    lambda: run_dpr_json_prompt(extracted_text, recommendations_prompt, FAST_PROMPT_CHARS, merge_chunk_recommendations)
+                )
             
             # Handle the format with standard assessment and detailed recommendations
             if isinstance(insights_data, dict) and 'detailed_recommendations' in insights_data:
@@ -2217,15 +6763,21 @@ Return ONLY a JSON object:
                     enhanced_insights.insert(0, f"ASSESSMENT - {standard_assessment}")
                 
                 actionable_insights = enhanced_insights[:10]
+                if cached_insights is None and analysis_cacheable(insights_data, ("detailed_recommendations",)):
+                    analysis_cache_put(cache_key, insights_data, "fast")
             else:
                 # Fallback
+                inc_counter("dpr_fallback_total", kind="recommendations")
                 actionable_insights = [
                     "ASSESSMENT - The DPR provides a solid foundation but requires revisions to address gaps in environmental and social impact assessments, risk assessment, and financial viability.",
                     "PRIORITY 1 - [REVIEW] Conduct a comprehensive review of all DPR sections to ensure completeness and accuracy - A thorough review is essential to identify and address any gaps that could delay MDoNER approval or cause implementation issues, particularly in areas of environmental assessment, social impact analysis, and financial viability documentation."
                 ]
         
+        except LLMUnavailableError:
+            raise
         except Exception as e:
             print(f"[FAST-MODE ERROR] Recommendations generation failed: {e}")
+            inc_counter("dpr_fallback_total", kind="recommendations")
             actionable_insights = [
                 "ASSESSMENT - The DPR provides a solid foundation but requires revisions to address gaps in environmental and social impact assessments, risk assessment, and financial viability.",
                 "PRIORITY 1 - [REVIEW] Conduct a comprehensive review of all DPR sections to ensure completeness and accuracy - A thorough review is essential to identify and address any gaps that could delay MDoNER approval."
@@ -2253,18 +6805,23 @@ Return ONLY a JSON object:
             },
             "actionable_insights": actionable_insights,
             "language": language,
-            "full_text": extracted_text
+            "full_text": extracted_text,
+            "cache_hit": cached_insights is not None
         }
         
         print(f"[FAST-MODE COMPLETE] Generated {len(actionable_insights)} recommendations in optimized mode")
         
         return {"status": "success", "result": result}
         
+    except LLMUnavailableError as e:
+        raise llm_unavailable(e)
     except HTTPException:
         raise
     except Exception as e:
         print(f"[FAST-MODE ERROR] Error: {e}")
         raise HTTPException(500, f"Error processing DPR: {str(e)}")
+    finally:
+        release()
 
 
 @app.post("/api/admin/review-compliance")
@@ -2279,6 +6836,10 @@ async def admin_review_compliance(
     - compliance_only=true: Returns only compliance check (no auto-rejection, no feasibility)
     - get_recommendation=true: Returns detailed feasibility assessment (Technical, Financial, Risk)
     """
+    if not dpr_text or len(dpr_text) < 100:
+        raise HTTPException(400, "DPR text is too short or empty")
+    
+    release = await analysis_admission.acquire("admin_review_compliance")
     try:
         compliance_only_mode = compliance_only.lower() == "true"
         get_recommendation_mode = get_recommendation.lower() == "true"
@@ -2287,9 +6848,6 @@ async def admin_review_compliance(
         print(f"[ADMIN-REVIEW] DPR text length: {len(dpr_text)}")
         print(f"[ADMIN-REVIEW] Project info: {project_info[:200]}...")
         
-        if not dpr_text or len(dpr_text) < 100:
-            raise HTTPException(400, "DPR text is too short or empty")
-        
         # Parse project info
         try:
             project_data = json.loads(project_info)
@@ -2303,14 +6861,15 @@ async def admin_review_compliance(
         if get_recommendation_mode:
             print(f"[ADMIN-REVIEW] 📊 Generating detailed feasibility recommendations...")
             
-            assessment_prompt = f"""
+            def recommendation_prompt(text: str, part_note: str = "") -> str:
+                return f"""
 You are a senior MDoNER approval committee member providing detailed recommendations.
 
 PROJECT INFORMATION:
 {json.dumps(project_data, indent=2)}
-
-DPR CONTENT:
-{dpr_text[:20000]}
+{part_note}
+DPR CONTENT (sections relevant to feasibility):
+{text[:ANALYSIS_PROMPT_CHARS]}
 
 ANALYZE THESE THREE CRITICAL DIMENSIONS IN ORDER:
 
@@ -2378,8 +6937,13 @@ Be specific and actionable in your analysis.
 """
             
             print(f"[ADMIN-REVIEW] Calling Gemini for detailed assessment...")
-            assessment_response = gemini_model.generate_content(assessment_prompt)
-            assessment_data = parse_json_response(assessment_response.text)
+            assessment_data = await single_flight(
+                single_flight_key("admin-recommendation", dpr_text, project_info),
+                lambda: run_dpr_json_prompt(
+                    slice_dpr_sections(dpr_text, PROMPT_SECTION_TOPICS["feasibility"]),
+                    recommendation_prompt, ANALYSIS_PROMPT_CHARS, merge_chunk_analyses
+                )
+            )
             
             print(f"[ADMIN-REVIEW] ✅ Recommendation generated:")
             print(f"  - Technical Score: {assessment_data.get('assessment', {}).get('technical', {}).get('score', 0)}/100")
@@ -2395,46 +6959,59 @@ Be specific and actionable in your analysis.
             }
         
         # Otherwise, perform compliance check
-        # Step 1: MDoNER Guidelines Compliance Check
-        compliance_prompt = f"""
+        # Step 1: MDoNER Guidelines Compliance Check - local checklist first, the model
+        # only rules on requirements the checklist cannot decide
+        checklist = run_compliance_checklist(dpr_text, declared_dpr_location(project_data, dpr_text))
+        print(f"[ADMIN-REVIEW] Checklist ({checklist['elapsed_ms']} ms): met {checklist['met']}, "
+              f"not met {checklist['not_met']}, undecided {checklist['undecided']}")
+        inc_counter("dpr_compliance_decisions_total", len(checklist["met"]) + len(checklist["not_met"]), decided_by="checklist")
+        
+        if checklist["not_met"] or not checklist["undecided"]:
+            # Already rejected (or fully verified) - no model call needed
+            compliance_data = compliance_from_checklist(checklist)
+        else:
+            undecided = checklist["undecided"]
+            requirement_lines = "\n".join(f"{n}. {COMPLIANCE_PROMPT_LINES[n]}" for n in undecided)
+            compliance_text = slice_dpr_sections(
+                dpr_text, [topic for n in undecided for topic in REQUIREMENT_SECTION_TOPICS[n]]
+            )
+            
+            def compliance_prompt(text: str, part_note: str = "") -> str:
+                return f"""
 You are an expert MDoNER compliance officer reviewing a DPR submission.
 
 PROJECT INFORMATION:
 {json.dumps(project_data, indent=2)}
-
-DPR CONTENT (First 20000 characters):
-{dpr_text[:20000]}
+{part_note}
+DPR CONTENT (sections relevant to these requirements):
+{text[:ANALYSIS_PROMPT_CHARS]}
 
 CRITICAL TASK: Evaluate if this DPR meets MANDATORY MDoNER guidelines for North Eastern Region projects.
+The other mandatory requirements have already been verified; judge ONLY these:
 
-CHECK THESE MANDATORY REQUIREMENTS:
-1. **Project Location**: Must be in North Eastern Region (Assam, Arunachal Pradesh, Manipur, Meghalaya, Mizoram, Nagaland, Sikkim, Tripura)
-2. **Budget Documentation**: Detailed cost breakdown with quantities, rates, and totals
-3. **Timeline**: Clear implementation schedule with milestones
-4. **Technical Specifications**: Design standards, technical details, compliance codes
-5. **Environmental Clearance**: Status of environmental approvals (EC/2024 or similar)
-6. **Social Impact Assessment**: Land acquisition, R&R plan, stakeholder consultation
-7. **Risk Assessment**: Identified risks with mitigation strategies
-8. **Funding Mechanism**: Clear central-state funding split (typically 90:10 for NER)
-9. **Implementing Agency**: Clearly identified with nodal officer details
-10. **Statutory Approvals**: List of obtained/pending clearances
+{requirement_lines}
 
 RESPOND IN STRICT JSON FORMAT:
 {{
   "compliant": true/false,
   "compliance_score": 0-100,
-  "critical_violations": ["list of mandatory requirements NOT met"],
+  "critical_violations": ["list of the requirements above NOT met"],
   "missing_sections": ["list of missing critical sections"],
   "rejection_reason": "Detailed reason if non-compliant, null if compliant",
-  "compliance_summary": "Brief 2-3 sentence summary"
+  "compliance_summary": "Brief 2-3 sentence summary",
+  "requirements_met": [numbers of the requirements above that ARE satisfied by this content]
 }}
 
-If ANY critical violations exist, set compliant=false and provide detailed rejection_reason.
+If ANY of these requirements is not met, set compliant=false and provide detailed rejection_reason.
 """
-
-        print(f"[ADMIN-REVIEW] Checking MDoNER compliance...")
-        compliance_response = gemini_model.generate_content(compliance_prompt)
-        compliance_data = parse_json_response(compliance_response.text)
+            
+            print(f"[ADMIN-REVIEW] Checking undecided MDoNER requirements {undecided} with the model...")
+            model_result = await single_flight(
+                single_flight_key("admin-compliance", dpr_text, project_info, ",".join(map(str, undecided))),
+                lambda: run_dpr_json_prompt(compliance_text, compliance_prompt, ANALYSIS_PROMPT_CHARS, merge_chunk_compliance)
+            )
+            inc_counter("dpr_compliance_decisions_total", len(undecided), decided_by="model")
+            compliance_data = compliance_from_checklist(checklist, model_result)
         
         print(f"[ADMIN-REVIEW] Compliance Score: {compliance_data.get('compliance_score', 0)}%")
         print(f"[ADMIN-REVIEW] Compliant: {compliance_data.get('compliant', False)}")
@@ -2466,7 +7043,8 @@ If ANY critical violations exist, set compliant=false and provide detailed rejec
         # Step 2: If compliant, perform detailed feasibility assessment
         print(f"[ADMIN-REVIEW] ✅ Compliant - Generating approval recommendations...")
         
-        assessment_prompt = f"""
+        def assessment_prompt(text: str, part_note: str = "") -> str:
+            return f"""
 You are a senior MDoNER approval committee member providing detailed recommendations to the admin.
 
 The DPR has PASSED mandatory compliance checks. Now provide DETAILED APPROVAL RECOMMENDATIONS.
@@ -2474,8 +7052,9 @@ The DPR has PASSED mandatory compliance checks. Now provide DETAILED APPROVAL RE
 PROJECT INFORMATION:
 {json.dumps(project_data, indent=2)}
 
-DPR CONTENT:
-{dpr_text[:20000]}
+{part_note}
+DPR CONTENT (sections relevant to feasibility):
+{text[:ANALYSIS_PROMPT_CHARS]}
 
 COMPLIANCE STATUS: ✅ PASSED (Score: {compliance_data.get('compliance_score', 0)}%)
 
@@ -2551,8 +7130,13 @@ Be thorough, specific, and provide actionable insights. The admin will use this
 """
 
         print(f"[ADMIN-REVIEW] Generating detailed feasibility assessment...")
-        assessment_response = gemini_model.generate_content(assessment_prompt)
-        assessment_data = parse_json_response(assessment_response.text)
+        assessment_data = await single_flight(
+            single_flight_key("admin-assessment", dpr_text, project_info, str(compliance_data.get('compliance_score', 0))),
+            lambda: run_dpr_json_prompt(
+                slice_dpr_sections(dpr_text, PROMPT_SECTION_TOPICS["feasibility"]),
+                assessment_prompt, ANALYSIS_PROMPT_CHARS, merge_chunk_analyses
+            )
+        )
         
         print(f"[ADMIN-REVIEW] ✅ Assessment complete - Recommendation: {assessment_data.get('overall_recommendation', 'N/A')}")
         
@@ -2569,17 +7153,20 @@ Be thorough, specific, and provide actionable insights. The admin will use this
             }
         }
         
+    except LLMUnavailableError as e:
+        raise llm_unavailable(e)
     except Exception as e:
         print(f"[ADMIN-REVIEW ERROR] {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(500, f"Error during compliance review: {str(e)}")
+    finally:
+        release()
 
 
 @app.post("/api/load-guidelines")
 async def load_guidelines(file: UploadFile = File(...)):
-    """Load MDoNER guideline documents"""
-    global guidelines_context
+    """Load an MDoNER guideline document into the guideline corpus and re-index it"""
     
     try:
         file_extension = file.filename.split(".")[-1].lower()
@@ -2587,65 +7174,80 @@ async def load_guidelines(file: UploadFile = File(...)):
             raise HTTPException(400, f"Unsupported file type")
         
         # Save file
-        guideline_path = f"data/guidelines/{file.filename}"
-        with open(guideline_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        upload = await ingest_upload(file, file_extension, GUIDELINES_DIR, filename=os.path.basename(file.filename))
+        guideline_path = upload["file_path"]
         
-        # Extract text
-        text = extract_text(guideline_path, file_extension)
-        guidelines_context = text[:30000]  # Store first 30k chars
+        # Extract text and rebuild the corpus index (other files come from the extraction store)
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(None, extract_text, guideline_path, file_extension)
+        index = await loop.run_in_executor(None, load_guideline_index, True)
         
         return {
             "status": "success",
             "message": f"Guideline '{file.filename}' loaded",
-            "characters_loaded": len(text)
+            "characters_loaded": len(text),
+            "corpus_files": len(index["manifest"]),
+            "corpus_passages": len(index["chunks"])
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Error loading guidelines: {str(e)}")
 
 
 @app.post("/api/validate-budget")
-async def validate_budget(file: UploadFile = File(...)):
-    """Dedicated budget validation endpoint"""
+async def validate_budget(file: UploadFile = File(...), narrate: str = Form("false")):
+    """
+    Dedicated budget validation endpoint
+    The cost tables are checked locally; narrate=true also asks the model for a
+    short narrative of the findings.
+    """
     try:
         file_extension = file.filename.split(".")[-1].lower()
-        file_path = f"uploads/temp_{datetime.now().timestamp()}.{file_extension}"
+        # Unique (not content-addressed) name: the file is removed once validated
+        upload = await ingest_upload(file, file_extension, filename=f"temp_{uuid.uuid4().hex}.{file_extension}")
+        file_path = upload["file_path"]
         
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        text = extract_text(file_path, file_extension)
-        structured = structure_dpr_data(text)
+        loop = asyncio.get_running_loop()
+        try:
+            text = await loop.run_in_executor(None, extract_text, file_path, file_extension)
+            structured = structure_dpr_data(text)
+            lines, source = await loop.run_in_executor(None, extract_document_budget_lines, file_path, file_extension, text)
+            validation = analyze_budget(lines, structured['budget'].get('total', 0), source)
+        finally:
+            # Cleanup
+            try:
+                os.remove(file_path)
+            except:
+                pass
+        print(f"[BUDGET] {len(validation['line_items'])} rows from {source}, {len(validation['issues'])} issues "
+              f"in {validation['elapsed_ms']} ms")
         
-        prompt = f"""
-Analyze budget for issues:
+        if narrate.lower() == "true":
+            findings = {key: validation[key] for key in ("total_budget_display", "is_valid", "issues", "percentages")}
+            prompt = f"""
+You are reviewing the budget of a DPR. The arithmetic has already been checked; do not recompute it.
+Explain these findings for the reviewing officer in 3-5 sentences, most serious first.
 
-Budget: {json.dumps(structured['budget'], indent=2)}
-Text: {text[:5000]}
+Findings: {json.dumps(findings, indent=2, ensure_ascii=False)}
 
 Return JSON:
 {{
-    "is_valid": <true/false>,
-    "total_budget": <number>,
-    "issues": [list of issues with severity],
-    "recommendations": [list]
+    "narrative": "3-5 sentence explanation of the findings"
 }}
 """
-        
-        response = gemini_model.generate_content(prompt)
-        validation = parse_json_response(response.text)
-        
-        # Cleanup
-        try:
-            os.remove(file_path)
-        except:
-            pass
+            narration = await parse_json_response_async(await llm_generate(prompt))
+            validation["narrative"] = narration.get("narrative", "")
         
         return {
             "status": "success",
             "budget_extracted": structured['budget'],
             "validation": validation
         }
+    except LLMUnavailableError as e:
+        raise llm_unavailable(e)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Budget validation error: {str(e)}")
 
@@ -2677,10 +7279,10 @@ async def list_guidelines():
         files = [
             {
                 "filename": f,
-                "size_bytes": os.path.getsize(f"data/guidelines/{f}")
+                "size_bytes": os.path.getsize(os.path.join(GUIDELINES_DIR, f))
             }
-            for f in os.listdir("data/guidelines")
-            if f.endswith(('.pdf', '.docx', '.doc'))
+            for f in os.listdir(GUIDELINES_DIR)
+            if f.lower().endswith(GUIDELINE_FILE_TYPES)
         ]
         return {"guidelines": files, "count": len(files)}
     except:
@@ -2693,34 +7295,216 @@ async def list_guidelines():
 
 # Create documents storage directory
 os.makedirs("data/documents", exist_ok=True)
-DOCUMENTS_FILE = "data/documents/documents.json"
+DOCUMENTS_FILE = "data/documents/documents.json"   # Legacy store, migrated into DOCUMENTS_DB once
+DOCUMENTS_DB = "data/documents/documents.db"
+
+# ----------------------------------------------------------------------------
+# SQLite document repository (WAL mode)
+# ----------------------------------------------------------------------------
+# Each document is one row holding the full JSON payload, with the fields we
+# filter on (status, uploader email, upload date) copied into indexed columns.
+# Connections are per thread; writes run in IMMEDIATE transactions so
+# concurrent writers serialise instead of losing updates.
+
+_documents_db_local = threading.local()
+_documents_db_init_lock = threading.Lock()
+_documents_db_ready = False
+
+DOCUMENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    status TEXT,
+    uploaded_by_email TEXT,
+    upload_date TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status);
+CREATE INDEX IF NOT EXISTS idx_documents_uploaded_by_email ON documents(uploaded_by_email);
+CREATE INDEX IF NOT EXISTS idx_documents_upload_date ON documents(upload_date);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    error_status INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    finished_at TEXT,
+    owner TEXT,
+    heartbeat_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+CREATE TABLE IF NOT EXISTS download_index (
+    lookup_key TEXT PRIMARY KEY,
+    file_path TEXT NOT NULL,
+    stored_filename TEXT,
+    analysis_path TEXT,
+    indexed_at TEXT
+);
+"""
 
-def load_documents():
-    """Load documents from JSON file"""
-    try:
-        if os.path.exists(DOCUMENTS_FILE):
+
+def _open_documents_db() -> sqlite3.Connection:
+    conn = sqlite3.connect(DOCUMENTS_DB, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def _document_row_values(document: Dict) -> tuple:
+    """Indexed column values for a document payload"""
+    uploaded_by = document.get('uploadedBy')
+    email = uploaded_by.get('email') if isinstance(uploaded_by, dict) else None
+    return (
+        document['id'],
+        document.get('status'),
+        email,
+        document.get('uploadDate'),
+        json.dumps(document, ensure_ascii=False),
+    )
+
+
+def migrate_documents_json(conn: sqlite3.Connection) -> int:
+    """One-shot import of the legacy documents.json into SQLite; returns documents imported"""
+    if conn.execute("SELECT value FROM store_meta WHERE key = 'json_migrated'").fetchone():
+        return 0
+    documents = []
+    if os.path.exists(DOCUMENTS_FILE):
+        try:
             with open(DOCUMENTS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
-    except:
-        return []
+                documents = json.load(f)
+        except Exception as e:
+            print(f"[DOCUMENTS] Could not read {DOCUMENTS_FILE} for migration: {e}")
+            return 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        imported = 0
+        for document in documents:
+            if isinstance(document, dict) and document.get('id'):
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO documents (id, status, uploaded_by_email, upload_date, data) VALUES (?, ?, ?, ?, ?)",
+                    _document_row_values(document)
+                )
+                imported += cursor.rowcount
+        conn.execute(
+            "INSERT INTO store_meta (key, value) VALUES ('json_migrated', ?)",
+            (datetime.now().isoformat(),)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if documents:
+        print(f"[DOCUMENTS] Migrated {imported} documents from {DOCUMENTS_FILE} to {DOCUMENTS_DB}")
+    return imported
+
 
-def save_documents(documents):
-    """Save documents to JSON file"""
+def migrate_jobs_table(conn: sqlite3.Connection):
+    """Add the job ownership columns to a jobs table created before they existed"""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+    for column in ("owner", "heartbeat_at"):
+        if column not in columns:
+            try:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):  # Another process added it first
+                    raise
+
+
+def get_documents_db() -> sqlite3.Connection:
+    """Per-thread connection to the document store, creating the schema on first use"""
+    global _documents_db_ready
+    conn = getattr(_documents_db_local, "conn", None)
+    if conn is None:
+        conn = _open_documents_db()
+        _documents_db_local.conn = conn
+    if not _documents_db_ready:
+        with _documents_db_init_lock:
+            if not _documents_db_ready:
+                conn.executescript(DOCUMENTS_SCHEMA)
+                migrate_jobs_table(conn)
+                migrate_documents_json(conn)
+                _documents_db_ready = True
+    return conn
+
+
+def load_documents(user_email: str = None, status: str = None) -> List[Dict]:
+    """Load documents in insertion order, optionally filtered by uploader email and/or status"""
+    query = "SELECT data FROM documents"
+    clauses, params = [], []
+    if user_email:
+        clauses.append("uploaded_by_email = ?")
+        params.append(user_email)
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY seq"
+    return [json.loads(row[0]) for row in get_documents_db().execute(query, params)]
+
+
+def get_document(document_id: str) -> Optional[Dict]:
+    """Fetch a single document by ID"""
+    row = get_documents_db().execute("SELECT data FROM documents WHERE id = ?", (document_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def insert_document(document: Dict) -> bool:
+    """Insert a document; returns False if its ID already exists"""
     try:
-        with open(DOCUMENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(documents, f, indent=2, ensure_ascii=False)
+        get_documents_db().execute(
+            "INSERT INTO documents (id, status, uploaded_by_email, upload_date, data) VALUES (?, ?, ?, ?, ?)",
+            _document_row_values(document)
+        )
         return True
-    except Exception as e:
-        print(f"Error saving documents: {e}")
+    except sqlite3.IntegrityError:
         return False
 
+
+def update_document(document_id: str, apply_changes) -> Optional[Dict]:
+    """Read-modify-write one document atomically; returns the updated document or None if missing"""
+    conn = get_documents_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT data FROM documents WHERE id = ?", (document_id,)).fetchone()
+        if row is None:
+            conn.execute("ROLLBACK")
+            return None
+        document = json.loads(row[0])
+        apply_changes(document)
+        values = _document_row_values(document)
+        conn.execute(
+            "UPDATE documents SET status = ?, uploaded_by_email = ?, upload_date = ?, data = ? WHERE id = ?",
+            values[1:] + (document_id,)
+        )
+        conn.execute("COMMIT")
+        return document
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def remove_document(document_id: str) -> bool:
+    """Delete a document; returns True if it existed"""
+    cursor = get_documents_db().execute("DELETE FROM documents WHERE id = ?", (document_id,))
+    return cursor.rowcount > 0
+
+
 @app.post("/api/documents/add")
 async def add_document(document_data: dict):
     """Add a new document to the system"""
     try:
-        documents = load_documents()
-        
         # Add timestamp and unique ID if not present
         if 'id' not in document_data:
             document_data['id'] = f"doc_{int(datetime.now().timestamp() * 1000)}"
@@ -2728,12 +7512,12 @@ async def add_document(document_data: dict):
         if 'uploadDate' not in document_data:
             document_data['uploadDate'] = datetime.now().isoformat().split('T')[0]
         
-        documents.append(document_data)
-        
-        if save_documents(documents):
+        if insert_document(document_data):
             return {"status": "success", "message": "Document added successfully", "document": document_data}
         else:
-            raise HTTPException(500, "Failed to save document")
+            raise HTTPException(409, f"Document with ID {document_data['id']} already exists")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Error adding document: {str(e)}")
 
@@ -2741,15 +7525,9 @@ async def add_document(document_data: dict):
 async def list_documents(user_email: str = None):
     """List all documents or documents for a specific user"""
     try:
-        documents = load_documents()
-        
-        if user_email:
-            # Filter documents for specific user
-            user_documents = [doc for doc in documents if doc.get('uploadedBy', {}).get('email') == user_email]
-            return {"status": "success", "documents": user_documents, "count": len(user_documents)}
-        else:
-            # Return all documents (for admin)
-            return {"status": "success", "documents": documents, "count": len(documents)}
+        # Filtered by uploader (indexed) or all documents (for admin)
+        documents = load_documents(user_email=user_email)
+        return {"status": "success", "documents": documents, "count": len(documents)}
     except Exception as e:
         return {"status": "error", "documents": [], "count": 0, "error": str(e)}
 
@@ -2757,28 +7535,18 @@ async def list_documents(user_email: str = None):
 async def update_document_status(document_id: str, status_data: dict):
     """Update document status"""
     try:
-        documents = load_documents()
-        
-        # Find and update the document
-        updated = False
-        for doc in documents:
-            if doc.get('id') == document_id:
-                doc['status'] = status_data.get('status', doc.get('status'))
-                if 'reviewerComments' in status_data:
-                    doc['reviewerComments'] = status_data['reviewerComments']
-                if 'reviewedBy' in status_data:
-                    doc['reviewedBy'] = status_data['reviewedBy']
-                doc['lastUpdated'] = datetime.now().isoformat()
-                updated = True
-                break
+        def apply_status(doc):
+            doc['status'] = status_data.get('status', doc.get('status'))
+            if 'reviewerComments' in status_data:
+                doc['reviewerComments'] = status_data['reviewerComments']
+            if 'reviewedBy' in status_data:
+                doc['reviewedBy'] = status_data['reviewedBy']
+            doc['lastUpdated'] = datetime.now().isoformat()
         
-        if not updated:
+        if update_document(document_id, apply_status) is None:
             raise HTTPException(404, f"Document with ID {document_id} not found")
         
-        if save_documents(documents):
-            return {"status": "success", "message": "Document status updated successfully"}
-        else:
-            raise HTTPException(500, "Failed to save document changes")
+        return {"status": "success", "message": "Document status updated successfully"}
     except HTTPException:
         raise
     except Exception as e:
@@ -2788,8 +7556,7 @@ async def update_document_status(document_id: str, status_data: dict):
 async def get_submitted_documents():
     """Get all documents with status 'submitted' for admin review"""
     try:
-        documents = load_documents()
-        submitted_docs = [doc for doc in documents if doc.get('status') == 'submitted']
+        submitted_docs = load_documents(status='submitted')
         return {"status": "success", "documents": submitted_docs, "count": len(submitted_docs)}
     except Exception as e:
         return {"status": "error", "documents": [], "count": 0, "error": str(e)}
@@ -2798,15 +7565,8 @@ async def get_submitted_documents():
 async def delete_document(document_id: str):
     """Delete a document"""
     try:
-        documents = load_documents()
-        
-        # Find and remove the document
-        documents = [doc for doc in documents if doc.get('id') != document_id]
-        
-        if save_documents(documents):
-            return {"status": "success", "message": "Document deleted successfully"}
-        else:
-            raise HTTPException(500, "Failed to save changes")
+        remove_document(document_id)
+        return {"status": "success", "message": "Document deleted successfully"}
     except Exception as e:
         raise HTTPException(500, f"Error deleting document: {str(e)}")
 
@@ -2823,13 +7583,38 @@ async def startup_event():
     print("="*60)
     print(f"[SERVER] API Server: http://localhost:{APP_PORT}")
     print(f"[DOCS] API Docs: http://localhost:{APP_PORT}/docs")
-    print(f"[AI-MODEL] {GEMINI_MODEL}")
+    print(f"[AI-MODEL] {llm_backend.model_name} ({llm_backend.name} backend)")
     print("="*60 + "\n")
+    
+    # Open the document store (runs the one-shot documents.json migration)
+    get_documents_db()
+    
+    # Build the download index from analysis_results on first start
+    ensure_download_index(force=os.getenv("DPR_REBUILD_DOWNLOAD_INDEX", "").lower() in ("1", "true", "yes"))
+    
+    # Load the guideline corpus index (rebuilt only if data/guidelines changed)
+    await asyncio.get_running_loop().run_in_executor(None, load_guideline_index)
+    
+    # Start background job workers (requeues jobs interrupted by the last shutdown)
+    start_job_workers()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Run on application shutdown"""
+    released = release_jobs()
+    if released:
+        print(f"[JOB] Returned {released} running jobs to the queue")
 
 
 if __name__ == "__main__":
+    import importlib.machinery
     import uvicorn
     
+    # Run as a script, multiprocessing would re-execute this whole file in every
+    # PDF extraction worker; a "__main__" spec tells it there is nothing to re-run
+    __spec__ = importlib.machinery.ModuleSpec("__main__", None)
+    
     print("\n[STARTING] DPR Analysis System...")
     print(f"[API-KEY] Gemini API Key: {'Configured' if GEMINI_API_KEY else 'Missing'}")
     